@@ -5,7 +5,8 @@ Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 
 import re
 import json
-import spacy
+import time
+from pathlib import Path
 import nltk
 from typing import Dict, Any, List, Tuple, Optional
 from datetime import datetime, timedelta
@@ -13,20 +14,10 @@ import structlog
 from dataclasses import dataclass
 from enum import Enum
 
-# Medical NLP imports
-try:
-    import medspacy
-    import scispacy
-    MEDICAL_NLP_AVAILABLE = True
-except ImportError:
-    MEDICAL_NLP_AVAILABLE = False
-
-# Spanish NLP support
-try:
-    from spacy.lang.es import Spanish
-    SPANISH_SUPPORT = True
-except ImportError:
-    SPANISH_SUPPORT = False
+from config import NLP_CONFIG
+from medical_extraction import medical_extractor
+from term_matcher import get_term_matcher
+from nlp_service import get_nlp_service
 
 logger = structlog.get_logger(__name__)
 
@@ -93,55 +84,88 @@ class AdvancedMedicalNLP:
     Advanced NLP processor for medical documents with Spanish language support
     """
     
+    # Shared extraction fields -> keys of patient_info / medical_info
+    PATIENT_FIELDS = {
+        "PATIENT_ID": "id",
+        "PATIENT_NAME": "name",
+        "AGE": "age",
+        "PHONE": "phone",
+        "INSURANCE": "insurance"
+    }
+    MEDICAL_FIELDS = {
+        "diagnosis": ["DIAGNOSIS", "DIAGNOSIS_CODE"],
+        "medications": ["MEDICATIONS"],
+        "vital_signs": ["VITAL_SIGNS"]
+    }
+    
     def __init__(self):
         self.logger = logger.bind(component="advanced_nlp")
-        self.nlp_es = None
-        self.nlp_en = None
-        self.medical_nlp = None
+        self.nlp_service = None
         
         # Initialize NLP models
         self._initialize_models()
         
         # Medical terminology dictionaries
+        self.terminology_file = Path(NLP_CONFIG["TERMINOLOGY_FILE"]) if NLP_CONFIG["TERMINOLOGY_FILE"] else None
+        self._terminology_mtime = None
+        self._terminology_checked_at = time.monotonic()
         self.medical_terms = self._load_medical_terminology()
+        self.term_matcher = get_term_matcher(self.medical_terms)
         self.specialty_mapping = self._load_specialty_mapping()
         self.urgency_keywords = self._load_urgency_keywords()
         
-        # Regex patterns for medical information
-        self.patterns = self._compile_medical_patterns()
+        # Regex patterns for medical information, compiled once per process
+        self.extractor = medical_extractor
     
     def _initialize_models(self):
-        """Initialize SpaCy and medical NLP models"""
-        try:
-            # Load Spanish model
-            if SPANISH_SUPPORT:
-                try:
-                    self.nlp_es = spacy.load("es_core_news_sm")
-                    self.logger.info("Spanish NLP model loaded successfully")
-                except OSError:
-                    self.logger.warning("Spanish model not found, using basic Spanish")
-                    self.nlp_es = Spanish()
-            
-            # Load English model as fallback
-            try:
-                self.nlp_en = spacy.load("en_core_web_sm")
-                self.logger.info("English NLP model loaded successfully")
-            except OSError:
-                self.logger.warning("English model not found")
-            
-            # Load medical NLP if available
-            if MEDICAL_NLP_AVAILABLE:
-                try:
-                    self.medical_nlp = medspacy.load("es_core_news_sm")
-                    self.logger.info("Medical NLP model loaded successfully")
-                except:
-                    self.logger.warning("Medical NLP model not available")
-                    
-        except Exception as e:
-            self.logger.error("Failed to initialize NLP models", error=str(e))
+        """Attach the SpaCy model shared by every NLP user in this process; it loads on first use"""
+        self.nlp_service = get_nlp_service()
     
     def _load_medical_terminology(self) -> Dict[str, List[str]]:
-        """Load medical terminology dictionaries"""
+        """Load medical terminology dictionaries, with categories from TERMINOLOGY_FILE replacing built-in ones"""
+        terminology = self._builtin_medical_terminology()
+        
+        if self.terminology_file:
+            try:
+                self._terminology_mtime = self.terminology_file.stat().st_mtime
+                with open(self.terminology_file, 'r', encoding='utf-8') as f:
+                    overrides = json.load(f)
+                terminology.update({category: list(terms) for category, terms in overrides.items()})
+            except Exception as e:
+                self.logger.error("Failed to load medical terminology file",
+                                  file=str(self.terminology_file), error=str(e))
+        
+        return terminology
+    
+    def reload_terminology(self, force: bool = False) -> bool:
+        """
+        Reload the terminology when TERMINOLOGY_FILE changed on disk
+        
+        Checks the file at most every TERMINOLOGY_CHECK_INTERVAL seconds.
+        Returns True if the dictionaries were reloaded.
+        """
+        if not self.terminology_file:
+            return False
+        
+        now = time.monotonic()
+        if not force and now - self._terminology_checked_at < NLP_CONFIG["TERMINOLOGY_CHECK_INTERVAL"]:
+            return False
+        self._terminology_checked_at = now
+        
+        try:
+            mtime = self.terminology_file.stat().st_mtime
+        except OSError:
+            mtime = None
+        if not force and mtime == self._terminology_mtime:
+            return False
+        
+        self.medical_terms = self._load_medical_terminology()
+        self.term_matcher = get_term_matcher(self.medical_terms)
+        self.logger.info("Medical terminology reloaded", terms=self.term_matcher.term_count)
+        return True
+    
+    def _builtin_medical_terminology(self) -> Dict[str, List[str]]:
+        """Built-in medical terminology dictionaries"""
         return {
             "symptoms": [
                 "dolor", "fiebre", "nausea", "vomito", "diarrea", "estreñimiento",
@@ -221,52 +245,6 @@ class AdvancedMedicalNLP:
             ]
         }
     
-    def _compile_medical_patterns(self) -> Dict[str, List[re.Pattern]]:
-        """Compile regex patterns for medical information extraction"""
-        return {
-            "patient_id": [
-                re.compile(r"(?:cedula|cc|documento|identificacion)[\s:]*(\d{6,12})", re.IGNORECASE),
-                re.compile(r"(?:numero de documento)[\s:]*(\d{6,12})", re.IGNORECASE),
-                re.compile(r"(?:id|identificacion)[\s:]*(\d{6,12})", re.IGNORECASE)
-            ],
-            "patient_name": [
-                re.compile(r"(?:paciente|nombre)[\s:]*([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)*)", re.IGNORECASE),
-                re.compile(r"(?:apellidos y nombres)[\s:]*([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)*)", re.IGNORECASE)
-            ],
-            "age": [
-                re.compile(r"(?:edad)[\s:]*(\d{1,3})(?:\s*años?)?", re.IGNORECASE),
-                re.compile(r"(\d{1,3})\s*años?", re.IGNORECASE)
-            ],
-            "diagnosis": [
-                re.compile(r"(?:diagnostico|dx)[\s:]*([^.\n]+)", re.IGNORECASE),
-                re.compile(r"(?:impresion diagnostica)[\s:]*([^.\n]+)", re.IGNORECASE),
-                re.compile(r"(?:cie-?10?)[\s:]*([A-Z]\d{2}\.?\d?)", re.IGNORECASE)
-            ],
-            "medications": [
-                re.compile(r"(?:medicamentos?|farmacos?)[\s:]*([^.\n]+)", re.IGNORECASE),
-                re.compile(r"(?:tratamiento)[\s:]*([^.\n]+)", re.IGNORECASE),
-                re.compile(r"(\w+)\s+(\d+(?:\.\d+)?)\s*(mg|ml|gr|ui|mcg)", re.IGNORECASE)
-            ],
-            "vital_signs": [
-                re.compile(r"(?:presion arterial|pa)[\s:]*(\d{2,3}/\d{2,3})", re.IGNORECASE),
-                re.compile(r"(?:frecuencia cardiaca|fc)[\s:]*(\d{2,3})", re.IGNORECASE),
-                re.compile(r"(?:temperatura|temp)[\s:]*(\d{2}\.\d)", re.IGNORECASE),
-                re.compile(r"(?:saturacion|spo2)[\s:]*(\d{2,3})%?", re.IGNORECASE)
-            ],
-            "dates": [
-                re.compile(r"(\d{1,2})[/-](\d{1,2})[/-](\d{2,4})", re.IGNORECASE),
-                re.compile(r"(\d{1,2})\s+de\s+(\w+)\s+de\s+(\d{4})", re.IGNORECASE)
-            ],
-            "phone": [
-                re.compile(r"(?:telefono|tel|celular|movil)[\s:]*(\d{10})", re.IGNORECASE),
-                re.compile(r"(\d{3}[-.\s]?\d{3}[-.\s]?\d{4})", re.IGNORECASE)
-            ],
-            "insurance": [
-                re.compile(r"(?:eps|ips|seguro)[\s:]*([^.\n]+)", re.IGNORECASE),
-                re.compile(r"(?:aseguradora|entidad)[\s:]*([^.\n]+)", re.IGNORECASE)
-            ]
-        }
-    
     def process_medical_document(self, text: str, document_type: str = None) -> Dict[str, Any]:
         """
         Main method to process medical documents and extract structured information
@@ -349,27 +327,27 @@ class AdvancedMedicalNLP:
         patient_info = {}
         medical_info = {}
         
+        extraction = self.extractor.extract(
+            text,
+            fields=list(self.PATIENT_FIELDS) + [f for fields in self.MEDICAL_FIELDS.values() for f in fields],
+            find_all=[f for fields in self.MEDICAL_FIELDS.values() for f in fields]
+        )
+        
         # Extract patient information
-        for field, patterns in self.patterns.items():
-            if field.startswith("patient_"):
-                field_name = field.replace("patient_", "")
-                for pattern in patterns:
-                    match = pattern.search(text)
-                    if match:
-                        patient_info[field_name] = match.group(1).strip()
-                        break
-            elif field in ["age", "phone", "insurance"]:
-                for pattern in patterns:
-                    match = pattern.search(text)
-                    if match:
-                        patient_info[field] = match.group(1).strip()
-                        break
-            elif field in ["diagnosis", "medications", "vital_signs"]:
-                matches = []
-                for pattern in patterns:
-                    matches.extend(pattern.findall(text))
-                if matches:
-                    medical_info[field] = matches
+        for field, name in self.PATIENT_FIELDS.items():
+            value = extraction.get(field)
+            if value is not None:
+                patient_info[name] = value
+        
+        # Medical fields keep every match; multi-group patterns give (name, dose, unit)
+        for name, fields in self.MEDICAL_FIELDS.items():
+            matches = [
+                match.groups if len(match.groups) > 1 else match.value
+                for field in fields
+                for match in extraction.all(field)
+            ]
+            if matches:
+                medical_info[name] = matches
         
         return {"patient": patient_info, "medical": medical_info}
     
@@ -378,15 +356,10 @@ class AdvancedMedicalNLP:
         entities = []
         
         try:
-            # Use Spanish model if available
-            nlp_model = self.nlp_es or self.nlp_en
-            if not nlp_model:
-                return entities
-            
-            doc = nlp_model(text)
+            doc = self.nlp_service.parse(text) if self.nlp_service else None
             
             # Extract named entities
-            for ent in doc.ents:
+            for ent in (doc.ents if doc is not None else ()):
                 entity = MedicalEntity(
                     text=ent.text,
                     label=ent.label_,
@@ -396,20 +369,18 @@ class AdvancedMedicalNLP:
                 )
                 entities.append(entity)
             
-            # Extract medical terms using custom dictionaries
-            for category, terms in self.medical_terms.items():
-                for term in terms:
-                    pattern = re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
-                    for match in pattern.finditer(text):
-                        entity = MedicalEntity(
-                            text=match.group(),
-                            label=f"MEDICAL_{category.upper()}",
-                            confidence=0.9,
-                            start=match.start(),
-                            end=match.end(),
-                            normalized=term
-                        )
-                        entities.append(entity)
+            # Extract medical terms using custom dictionaries, accent-insensitive, in one pass
+            self.reload_terminology()
+            for match in self.term_matcher.find(text):
+                entity = MedicalEntity(
+                    text=match.text,
+                    label=f"MEDICAL_{match.category.upper()}",
+                    confidence=0.9,
+                    start=match.start,
+                    end=match.end,
+                    normalized=match.term
+                )
+                entities.append(entity)
             
         except Exception as e:
             self.logger.error("Entity extraction failed", error=str(e))
@@ -0,0 +1,173 @@
+"""
+Aggregated Statistics for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, Optional
+import structlog
+
+from sqlalchemy import and_, case, func
+
+from database import db_manager, DatabaseManager
+from models import EmailMessage, MedicalReferral, PatientRecord, ProcessingLog, User
+from rollups import referral_rollups
+from config import PERFORMANCE_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+DAILY_ACTIVITY_DAYS = 7
+
+def count_if(condition):
+    """SUM(CASE WHEN condition THEN 1 ELSE 0 END)"""
+    return func.sum(case((condition, 1), else_=0))
+
+def _ints(row) -> list:
+    # SUM over an empty table is NULL
+    return [int(value or 0) for value in row]
+
+def email_stats(session, now: datetime) -> Dict[str, Any]:
+    """Email counts by status, in one pass over email_messages"""
+    row = session.query(
+        func.count(EmailMessage.id),
+        count_if(EmailMessage.processing_status == "pending"),
+        count_if(EmailMessage.processing_status == "completed"),
+        count_if(EmailMessage.processing_status == "error"),
+        count_if(EmailMessage.status == "processed"),
+        count_if(EmailMessage.status == "pending"),
+        count_if(EmailMessage.is_medical_referral == True),
+        count_if(EmailMessage.created_at >= now - timedelta(days=30)),
+        count_if(and_(EmailMessage.date_processed >= now - timedelta(hours=1),
+                      EmailMessage.processing_status == "completed"))
+    ).one()
+    (total, pending, completed, error, status_processed, status_pending,
+     medical_referrals, last_30_days, completed_last_hour) = _ints(row)
+    return {
+        'total': total,
+        'pending': pending,
+        'completed': completed,
+        'error': error,
+        'status_processed': status_processed,
+        'status_pending': status_pending,
+        'medical_referrals': medical_referrals,
+        'last_30_days': last_30_days,
+        'completed_last_hour': completed_last_hour
+    }
+
+def referral_stats(session, now: datetime) -> Dict[str, Any]:
+    """Referral counts by status plus the last days of activity, in one pass"""
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    days = [today - timedelta(days=i) for i in range(DAILY_ACTIVITY_DAYS)]
+    row = session.query(
+        func.count(MedicalReferral.id),
+        count_if(MedicalReferral.status == "pending"),
+        count_if(MedicalReferral.status == "approved"),
+        count_if(MedicalReferral.created_at >= now - timedelta(days=30)),
+        *[count_if(and_(MedicalReferral.created_at >= day, MedicalReferral.created_at < day + timedelta(days=1)))
+          for day in days]
+    ).one()
+    total, pending, approved, last_30_days, *daily = _ints(row)
+    return {
+        'total': total,
+        'pending': pending,
+        'approved': approved,
+        'last_30_days': last_30_days,
+        'daily': [{'date': day.isoformat(), 'referrals': count} for day, count in zip(days, daily)]
+    }
+
+def user_stats(session, now: datetime) -> Dict[str, Any]:
+    """User counts by role and active state, in one pass"""
+    total, active, administrators, evaluators = _ints(session.query(
+        func.count(User.id),
+        count_if(User.is_active == True),
+        count_if(User.role == "administrator"),
+        count_if(User.role == "medical_evaluator")
+    ).one())
+    return {'total': total, 'active': active, 'administrators': administrators, 'evaluators': evaluators}
+
+def patient_stats(session, now: datetime) -> Dict[str, Any]:
+    return {'total': session.query(func.count(PatientRecord.id)).scalar() or 0}
+
+def processing_stats(session, now: datetime) -> Dict[str, Any]:
+    """Average processing step time over the last hour"""
+    avg_step = session.query(func.avg(ProcessingLog.duration_seconds)).filter(
+        ProcessingLog.start_time >= now - timedelta(hours=1),
+        ProcessingLog.duration_seconds.isnot(None)
+    ).scalar()
+    return {'avg_step_seconds': float(avg_step or 0.0)}
+
+def response_time_stats(session, now: datetime) -> Dict[str, Any]:
+    """Average hours from a referral's creation to its first decision, from the daily rollups"""
+    return {'avg_hours': referral_rollups.average_response_hours(session)}
+
+SECTIONS: Dict[str, Callable] = {
+    'emails': email_stats,
+    'referrals': referral_stats,
+    'users': user_stats,
+    'patients': patient_stats,
+    'processing': processing_stats,
+    'response_time': response_time_stats,
+}
+
+class StatisticsAggregator:
+    """
+    Dashboard, WebSocket and monitoring statistics from one grouped query per table
+
+    Each section is a single aggregate query (conditional SUMs instead of
+    one COUNT per filter). Sections are cached for a few seconds and shared
+    by every consumer; the sections a snapshot needs that are missing or
+    expired are computed together in one session, and concurrent callers
+    wait for that refresh instead of running their own.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = db_manager, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db_manager = db_manager
+        self.ttl = ttl if ttl is not None else PERFORMANCE_CONFIG["STATS_CACHE_TTL"]
+        self.clock = clock
+        self.logger = logger.bind(component="statistics_aggregator")
+        self._lock = threading.Lock()
+        self._sections: Dict[str, tuple] = {}  # name -> (computed_at, as_of, data)
+        self.stats = {'hits': 0, 'refreshes': 0, 'queries': 0}
+
+    def _fresh(self, name: str) -> bool:
+        entry = self._sections.get(name)
+        return entry is not None and self.clock() - entry[0] < self.ttl
+
+    def get_snapshot(self, sections: Iterable[str] = tuple(SECTIONS)) -> Dict[str, Any]:
+        """
+        Requested sections by name, plus as_of: when the oldest one was computed
+
+        Raises on database errors so each consumer can report them its own way.
+        """
+        sections = list(sections)
+        with self._lock:
+            stale = [name for name in sections if not self._fresh(name)]
+            if stale:
+                now = datetime.now()
+                with self.db_manager.get_session() as session:
+                    computed = {name: SECTIONS[name](session, now) for name in stale}
+                computed_at = self.clock()
+                for name, data in computed.items():
+                    self._sections[name] = (computed_at, now, data)
+                self.stats['refreshes'] += 1
+                self.stats['queries'] += len(stale)
+            self.stats['hits'] += len(sections) - len(stale)
+            snapshot = {name: self._sections[name][2] for name in sections}
+            snapshot['as_of'] = min(self._sections[name][1] for name in sections).isoformat()
+        return snapshot
+
+    def invalidate(self, *sections: str):
+        """Drop cached sections (all when none given) so the next snapshot recomputes them"""
+        with self._lock:
+            for name in sections or list(self._sections):
+                self._sections.pop(name, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.stats, cached=sorted(self._sections), ttl_seconds=self.ttl)
+
+# Global statistics aggregator instance
+statistics_aggregator = StatisticsAggregator()
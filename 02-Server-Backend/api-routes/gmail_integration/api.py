@@ -15,6 +15,8 @@ from database import db_manager, email_repo, patient_repo, referral_repo
 from models import EmailMessage, EmailAttachment, PatientRecord, MedicalReferral
 from main_service import gmail_service
 from config import API_CONFIG, FRONTEND_CONFIG
+from readiness import readiness
+from aggregates import statistics_aggregator
 
 logger = structlog.get_logger(__name__)
 
@@ -84,14 +86,19 @@ class ReferralUpdateRequest(BaseModel):
     notes: Optional[str] = Field(None, description="Additional notes")
     assigned_to: Optional[str] = Field(None, description="Assigned physician/department")
 
-# Health check endpoint
+# Health check endpoints
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        health_status = db_manager.health_check()
+        ready = readiness.get_status()
+        # The database is not touched while the warm-up is still connecting
+        health_status = db_manager.health_check() if db_manager.is_initialized else None
         return {
             "status": "healthy",
+            "live": True,
+            "ready": ready["ready"],
+            "readiness": ready["components"],
             "timestamp": datetime.now().isoformat(),
             "service": "gmail_integration",
             "database": health_status
@@ -100,6 +107,17 @@ async def health_check():
         logger.error("Health check failed", error=str(e))
         raise HTTPException(status_code=503, detail="Service unhealthy")
 
+@app.get("/health/live")
+async def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return readiness.liveness()
+
+@app.get("/health/ready")
+async def readiness_check():
+    """Readiness: database, keys and models are loaded; 503 until then"""
+    ready = readiness.get_status()
+    return JSONResponse(status_code=200 if ready["ready"] else 503, content=ready)
+
 # Service management endpoints
 @app.get("/service/status", response_model=ServiceStatusResponse)
 async def get_service_status():
@@ -235,8 +253,7 @@ async def get_patients(
         if search:
             patients = patient_repo.search_patients(search, limit)
         else:
-            with db_manager.get_session() as session:
-                patients = session.query(PatientRecord).limit(limit).all()
+            patients = patient_repo.get_patients(limit=limit)
         
         return [PatientResponse(
             id=patient.id,
@@ -380,35 +397,22 @@ async def update_referral(referral_id: int, update_data: ReferralUpdateRequest):
 async def get_statistics():
     """Get system statistics"""
     try:
-        with db_manager.get_session() as session:
-            # Email statistics
-            total_emails = session.query(EmailMessage).count()
-            pending_emails = session.query(EmailMessage).filter_by(processing_status="pending").count()
-            medical_referrals = session.query(EmailMessage).filter_by(is_medical_referral=True).count()
-            
-            # Patient statistics
-            total_patients = session.query(PatientRecord).count()
-            
-            # Referral statistics
-            total_referrals = session.query(MedicalReferral).count()
-            pending_referrals = session.query(MedicalReferral).filter_by(status="pending").count()
-            
-            return {
-                "emails": {
-                    "total": total_emails,
-                    "pending": pending_emails,
-                    "medical_referrals": medical_referrals
-                },
-                "patients": {
-                    "total": total_patients
-                },
-                "referrals": {
-                    "total": total_referrals,
-                    "pending": pending_referrals
-                },
-                "service": gmail_service.get_service_status()
-            }
-            
+        snapshot = statistics_aggregator.get_snapshot(("emails", "patients", "referrals"))
+        
+        return {
+            "emails": {
+                "total": snapshot["emails"]["total"],
+                "pending": snapshot["emails"]["pending"],
+                "medical_referrals": snapshot["emails"]["medical_referrals"]
+            },
+            "patients": snapshot["patients"],
+            "referrals": {
+                "total": snapshot["referrals"]["total"],
+                "pending": snapshot["referrals"]["pending"]
+            },
+            "service": gmail_service.get_service_status()
+        }
+        
     except Exception as e:
         logger.error("Failed to get statistics", error=str(e))
         raise HTTPException(status_code=500, detail="Failed to retrieve statistics")
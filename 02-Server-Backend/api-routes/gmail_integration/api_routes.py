@@ -3,27 +3,31 @@ API Routes for VITAL RED Gmail Integration
 Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
+import hashlib
+import secrets
 import structlog
 
-from database import DatabaseManager, EmailRepository, PatientRepository, ReferralRepository
+from database import db_manager, email_repo, patient_repo, referral_repo, UnitOfWork
 from models import EmailMessage, PatientRecord, MedicalReferral, User
-from security import SecurityManager
+from security import security_manager
 from email_processor import EmailProcessor
 from gmail_client import GmailClient
+from readiness import readiness
+from principal_cache import principal_cache
+from pagination import InvalidCursor, count_cache, keyset_page
+from aggregates import statistics_aggregator
+from rollups import referral_rollups
+from response_cache import response_cache
 
 logger = structlog.get_logger(__name__)
 security = HTTPBearer()
 
-# Initialize components
-db_manager = DatabaseManager()
-email_repo = EmailRepository(db_manager)
-patient_repo = PatientRepository(db_manager)
-referral_repo = ReferralRepository(db_manager)
-security_manager = SecurityManager()
+# Shared components; database connections and keys are opened on first use or by the warm-up
 email_processor = None  # Will be initialized when needed
 gmail_client = GmailClient()
 
@@ -55,27 +59,17 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
                 headers={"WWW-Authenticate": "Bearer"},
             )
 
-        # Verify user still exists and is active
-        with db_manager.get_session() as session:
-            from models import User
-            user = session.query(User).filter(
-                User.id == user_id,
-                User.is_active == True
-            ).first()
-
-            if not user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="User not found or inactive",
-                    headers={"WWW-Authenticate": "Bearer"},
-                )
+        # Verify user still exists and is active; cached briefly per token
+        token_id = payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+        principal = principal_cache.get_or_load(user_id, token_id, lambda: _load_principal(user_id))
+        if not principal:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="User not found or inactive",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
 
-            return {
-                "id": user.id,
-                "email": user.email,
-                "name": user.name,
-                "role": user.role
-            }
+        return principal
 
     except HTTPException:
         raise
@@ -87,11 +81,80 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def _load_principal(user_id: int) -> Optional[Dict[str, Any]]:
+    """Active user as the authentication principal, None if missing or inactive"""
+    with db_manager.get_session() as session:
+        user = session.query(User).filter(
+            User.id == user_id,
+            User.is_active == True
+        ).first()
+
+        if not user:
+            return None
+
+        return {
+            "id": user.id,
+            "email": user.email,
+            "name": user.name,
+            "role": user.role
+        }
+
+def get_unit_of_work():
+    """One database session, and connection, for all repository calls of a request"""
+    with db_manager.unit_of_work() as uow:
+        yield uow
+
+def _invalid_cursor() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+def _reject_offset(skip: Optional[int]):
+    """Offset paging was replaced by cursors; ignoring skip would silently serve the first page"""
+    if skip is not None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="skip is not supported; pass next_cursor back as cursor for the next page"
+        )
+
+def _list_total(include_total: bool, key, count_fn) -> Optional[Dict[str, Any]]:
+    """
+    Total for a list endpoint, only when asked for; counted in the background and cached
+
+    Returned as {"value": int, "as_of": ISO timestamp, "stale": bool}, or None
+    when include_total is not set or the first count is still running.
+    """
+    return count_cache.get(key, count_fn) if include_total else None
+
+def _referral_changed(referral_id: int):
+    """Make cached responses and statistics built from referrals stale after a write"""
+    response_cache.invalidate("referrals", f"referral:{referral_id}", "statistics")
+    statistics_aggregator.invalidate("referrals", "response_time")
+
 # Health Check Routes
 @health_router.get("/")
 async def health_check():
-    """Basic health check"""
-    return {"status": "healthy", "timestamp": datetime.utcnow()}
+    """Liveness plus readiness; answers while heavy resources are still loading"""
+    ready = readiness.get_status()
+    return {
+        "status": "healthy",
+        "live": True,
+        "ready": ready["ready"],
+        "readiness": ready,
+        "database_pool": db_manager.get_pool_status(),
+        "principal_cache": principal_cache.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "timestamp": datetime.utcnow()
+    }
+
+@health_router.get("/live")
+async def liveness_check():
+    """Liveness: the process is up and serving requests"""
+    return readiness.liveness()
+
+@health_router.get("/ready")
+async def readiness_check():
+    """Readiness: database, keys and models are loaded; 503 until then"""
+    ready = readiness.get_status()
+    return JSONResponse(status_code=200 if ready["ready"] else 503, content=ready)
 
 @health_router.get("/detailed")
 async def detailed_health_check():
@@ -138,6 +201,7 @@ async def login(credentials: Dict[str, str]):
             "user_id": user["id"],
             "email": user["email"],
             "role": user["role"],
+            "jti": secrets.token_hex(16),  # Token id, keys the principal cache
             "exp": datetime.utcnow() + timedelta(hours=24)
         }
 
@@ -205,20 +269,31 @@ async def authenticate_user(email: str, password: str) -> Optional[Dict[str, Any
 # Email Routes
 @api_router.get("/emails")
 async def get_emails(
-    skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
-    current_user: Dict = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    skip: Optional[int] = None,
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
-    """Get emails with pagination and filtering"""
+    """
+    Get a page of emails, newest first; pass next_cursor back as cursor for the next page
+
+    total is null unless include_total is set, then {value, as_of, stale}
+    (see _list_total). skip is rejected with 400.
+    """
+    _reject_offset(skip)
     try:
-        emails = email_repo.get_emails(skip=skip, limit=limit, status=status)
+        page = uow.emails.get_emails(limit=limit, status=status, cursor=cursor)
         return {
-            "emails": emails,
-            "total": len(emails),
-            "skip": skip,
-            "limit": limit
+            "emails": page.items,
+            "next_cursor": page.next_cursor,
+            "total": _list_total(include_total, ("emails", status), lambda: email_repo.count_emails(status)),
+            "limit": page.limit
         }
+    except InvalidCursor:
+        raise _invalid_cursor()
     except Exception as e:
         logger.error("Failed to get emails", error=str(e))
         raise HTTPException(
@@ -229,11 +304,12 @@ async def get_emails(
 @api_router.get("/emails/{email_id}")
 async def get_email(
     email_id: int,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
     """Get specific email by ID"""
     try:
-        email = email_repo.get_email_by_id(email_id)
+        email = uow.emails.get_email_by_id(email_id)
         if not email:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -254,11 +330,12 @@ async def get_email(
 async def get_patients(
     skip: int = 0,
     limit: int = 50,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
     """Get patients with pagination"""
     try:
-        patients = patient_repo.get_patients(skip=skip, limit=limit)
+        patients = uow.patients.get_patients(skip=skip, limit=limit)
         return {
             "patients": patients,
             "total": len(patients),
@@ -275,11 +352,12 @@ async def get_patients(
 @api_router.get("/patients/{patient_id}")
 async def get_patient(
     patient_id: int,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
     """Get specific patient by ID"""
     try:
-        patient = patient_repo.get_patient_by_id(patient_id)
+        patient = uow.patients.get_patient_by_id(patient_id)
         if not patient:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -298,26 +376,45 @@ async def get_patient(
 # Medical Referral Routes
 @api_router.get("/referrals")
 async def get_referrals(
-    skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
     priority: Optional[str] = None,
-    current_user: Dict = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    skip: Optional[int] = None,
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
-    """Get medical referrals with pagination and filtering"""
+    """
+    Get a page of medical referrals, newest first, with filtering
+
+    total is null unless include_total is set, then {value, as_of, stale}
+    (see _list_total). skip is rejected with 400.
+    """
+    _reject_offset(skip)
     try:
-        referrals = referral_repo.get_referrals(
-            skip=skip, 
-            limit=limit, 
-            status=status, 
-            priority=priority
+        def load():
+            page = uow.referrals.get_referrals(
+                limit=limit, 
+                status=status, 
+                priority=priority,
+                cursor=cursor
+            )
+            return {"referrals": page.items, "next_cursor": page.next_cursor, "limit": page.limit}
+
+        body = response_cache.get_or_load(
+            "referrals", {"limit": limit, "status": status, "priority": priority, "cursor": cursor},
+            load, tags=("referrals",)
         )
         return {
-            "referrals": referrals,
-            "total": len(referrals),
-            "skip": skip,
-            "limit": limit
+            "referrals": body["referrals"],
+            "next_cursor": body["next_cursor"],
+            "total": _list_total(include_total, ("referrals", status, priority),
+                                 lambda: referral_repo.count_referrals(status, priority)),
+            "limit": body["limit"]
         }
+    except InvalidCursor:
+        raise _invalid_cursor()
     except Exception as e:
         logger.error("Failed to get referrals", error=str(e))
         raise HTTPException(
@@ -328,11 +425,15 @@ async def get_referrals(
 @api_router.get("/referrals/{referral_id}")
 async def get_referral(
     referral_id: int,
-    current_user: Dict = Depends(get_current_user)
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
     """Get specific referral by ID"""
     try:
-        referral = referral_repo.get_referral_by_id(referral_id)
+        referral = response_cache.get_or_load(
+            "referral", {"id": referral_id}, lambda: uow.referrals.get_referral_by_id(referral_id),
+            tags=(f"referral:{referral_id}",)
+        )
         if not referral:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -353,17 +454,20 @@ async def get_referral(
 async def get_statistics(current_user: Dict = Depends(get_current_user)):
     """Get system statistics"""
     try:
-        stats = {
-            "total_emails": email_repo.count_emails(),
-            "processed_emails": email_repo.count_emails(status="processed"),
-            "pending_emails": email_repo.count_emails(status="pending"),
-            "total_patients": patient_repo.count_patients(),
-            "total_referrals": referral_repo.count_referrals(),
-            "pending_referrals": referral_repo.count_referrals(status="pending"),
-            "approved_referrals": referral_repo.count_referrals(status="approved"),
-            "last_updated": datetime.utcnow()
-        }
-        return stats
+        def load():
+            snapshot = statistics_aggregator.get_snapshot(("emails", "patients", "referrals"))
+            return {
+                "total_emails": snapshot["emails"]["total"],
+                "processed_emails": snapshot["emails"]["status_processed"],
+                "pending_emails": snapshot["emails"]["status_pending"],
+                "total_patients": snapshot["patients"]["total"],
+                "total_referrals": snapshot["referrals"]["total"],
+                "pending_referrals": snapshot["referrals"]["pending"],
+                "approved_referrals": snapshot["referrals"]["approved"],
+                "last_updated": snapshot["as_of"]
+            }
+
+        return response_cache.get_or_load("statistics", None, load, tags=("statistics",))
     except Exception as e:
         logger.error("Failed to get statistics", error=str(e))
         raise HTTPException(
@@ -393,19 +497,91 @@ async def sync_gmail(current_user: Dict = Depends(get_current_user)):
 # Medical Cases Routes
 @api_router.get("/medical-cases")
 async def get_medical_cases(
-    skip: int = 0,
+    response: Response,
     limit: int = 50,
     status: Optional[str] = None,
     priority: Optional[str] = None,
-    current_user: Dict = Depends(get_current_user)
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    skip: Optional[int] = None,
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
 ):
-    """Get medical cases with filtering"""
+    """
+    Get a page of medical cases with filtering
+
+    The body stays a plain list for the frontend; the next page cursor and
+    the requested total are returned in the X-Next-Cursor and X-Total-Count headers.
+    X-Total-Count is the last background count and is absent until one finished.
+    skip is rejected with 400.
+    """
+    _reject_offset(skip)
     try:
-        # Convert referrals to medical cases format for frontend compatibility
-        referrals = referral_repo.get_referrals(skip=skip, limit=limit, status=status, priority=priority)
+        def load():
+            # Convert referrals to medical cases format for frontend compatibility
+            page = uow.referrals.get_referrals(limit=limit, status=status, priority=priority, cursor=cursor)
+            referrals = page.items
+
+            medical_cases = []
+            for referral in referrals:
+                medical_case = {
+                    "id": str(referral.id),
+                    "patientName": referral.patient_name,
+                    "documentNumber": referral.patient_document,
+                    "age": referral.patient_age or 0,
+                    "gender": referral.patient_gender or "N/A",
+                    "diagnosis": referral.diagnosis or "Sin diagnóstico",
+                    "specialty": referral.specialty or "General",
+                    "referringPhysician": referral.referring_physician or "No especificado",
+                    "referringInstitution": referral.referring_institution or "No especificado",
+                    "priority": referral.priority_level or "media",
+                    "status": referral.status or "nueva",
+                    "receivedDate": referral.created_at.isoformat() if referral.created_at else None,
+                    "dueDate": referral.due_date.isoformat() if referral.due_date else None,
+                    "attachments": referral.attachment_count or 0,
+                    "aiExtracted": referral.ai_processed or False
+                }
+                medical_cases.append(medical_case)
+
+            return {"cases": medical_cases, "next_cursor": page.next_cursor}
+
+        body = response_cache.get_or_load(
+            "medical_cases", {"limit": limit, "status": status, "priority": priority, "cursor": cursor},
+            load, tags=("referrals",)
+        )
+        if body["next_cursor"]:
+            response.headers["X-Next-Cursor"] = body["next_cursor"]
+        total = _list_total(include_total, ("referrals", status, priority),
+                            lambda: referral_repo.count_referrals(status, priority))
+        if total:
+            response.headers["X-Total-Count"] = str(total["value"])
+
+        return body["cases"]
+    except InvalidCursor:
+        raise _invalid_cursor()
+    except Exception as e:
+        logger.error("Failed to get medical cases", error=str(e))
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to retrieve medical cases"
+        )
+
+@api_router.get("/medical-cases/{case_id}")
+async def get_medical_case(
+    case_id: str,
+    current_user: Dict = Depends(get_current_user),
+    uow: UnitOfWork = Depends(get_unit_of_work)
+):
+    """Get specific medical case by ID"""
+    try:
+        referral_id = int(case_id)
+
+        def load():
+            referral = uow.referrals.get_referral_by_id(referral_id)
+            if not referral:
+                return None
 
-        medical_cases = []
-        for referral in referrals:
+            # Convert to medical case format
             medical_case = {
                 "id": str(referral.id),
                 "patientName": referral.patient_name,
@@ -421,55 +597,24 @@ async def get_medical_cases(
                 "receivedDate": referral.created_at.isoformat() if referral.created_at else None,
                 "dueDate": referral.due_date.isoformat() if referral.due_date else None,
                 "attachments": referral.attachment_count or 0,
-                "aiExtracted": referral.ai_processed or False
+                "aiExtracted": referral.ai_processed or False,
+                "notes": referral.notes or "",
+                "medicalHistory": referral.medical_history or "",
+                "currentTreatment": referral.current_treatment or "",
+                "reasonForReferral": referral.reason_for_referral or ""
             }
-            medical_cases.append(medical_case)
 
-        return medical_cases
-    except Exception as e:
-        logger.error("Failed to get medical cases", error=str(e))
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to retrieve medical cases"
-        )
+            return medical_case
 
-@api_router.get("/medical-cases/{case_id}")
-async def get_medical_case(
-    case_id: str,
-    current_user: Dict = Depends(get_current_user)
-):
-    """Get specific medical case by ID"""
-    try:
-        referral = referral_repo.get_referral_by_id(int(case_id))
-        if not referral:
+        medical_case = response_cache.get_or_load(
+            "medical_case", {"id": referral_id}, load, tags=(f"referral:{referral_id}",)
+        )
+        if not medical_case:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Medical case not found"
             )
 
-        # Convert to medical case format
-        medical_case = {
-            "id": str(referral.id),
-            "patientName": referral.patient_name,
-            "documentNumber": referral.patient_document,
-            "age": referral.patient_age or 0,
-            "gender": referral.patient_gender or "N/A",
-            "diagnosis": referral.diagnosis or "Sin diagnóstico",
-            "specialty": referral.specialty or "General",
-            "referringPhysician": referral.referring_physician or "No especificado",
-            "referringInstitution": referral.referring_institution or "No especificado",
-            "priority": referral.priority_level or "media",
-            "status": referral.status or "nueva",
-            "receivedDate": referral.created_at.isoformat() if referral.created_at else None,
-            "dueDate": referral.due_date.isoformat() if referral.due_date else None,
-            "attachments": referral.attachment_count or 0,
-            "aiExtracted": referral.ai_processed or False,
-            "notes": referral.notes or "",
-            "medicalHistory": referral.medical_history or "",
-            "currentTreatment": referral.current_treatment or "",
-            "reasonForReferral": referral.reason_for_referral or ""
-        }
-
         return medical_case
     except HTTPException:
         raise
@@ -500,6 +645,7 @@ async def update_medical_case(
                 detail="Medical case not found"
             )
 
+        _referral_changed(int(case_id))
         return {"message": "Medical case updated successfully"}
     except HTTPException:
         raise
@@ -527,6 +673,7 @@ async def approve_medical_case(
                 detail="Medical case not found"
             )
 
+        _referral_changed(int(case_id))
         return {"message": "Medical case approved successfully"}
     except HTTPException:
         raise
@@ -554,6 +701,7 @@ async def reject_medical_case(
                 detail="Medical case not found"
             )
 
+        _referral_changed(int(case_id))
         return {"message": "Medical case rejected successfully"}
     except HTTPException:
         raise
@@ -695,7 +843,10 @@ async def update_user(
 
             session.commit()
 
-            return {"message": "User updated successfully"}
+        # Role, active state and profile are cached with the user's tokens
+        principal_cache.invalidate(user_id)
+
+        return {"message": "User updated successfully"}
     except HTTPException:
         raise
     except Exception as e:
@@ -706,50 +857,67 @@ async def update_user(
         )
 
 # Request History Routes
+def _filter_request_history(query, start_date: Optional[str], end_date: Optional[str], status: Optional[str],
+                            patient_name: Optional[str], referring_physician: Optional[str],
+                            institution: Optional[str]):
+    """Apply the request history filters to a MedicalReferral query"""
+    if start_date:
+        start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        query = query.filter(MedicalReferral.created_at >= start_dt)
+
+    if end_date:
+        end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+        query = query.filter(MedicalReferral.created_at <= end_dt)
+
+    if status:
+        query = query.filter(MedicalReferral.status == status)
+
+    if patient_name:
+        query = query.filter(MedicalReferral.patient_name.ilike(f"%{patient_name}%"))
+
+    if referring_physician:
+        query = query.filter(MedicalReferral.referring_physician.ilike(f"%{referring_physician}%"))
+
+    if institution:
+        query = query.filter(MedicalReferral.referring_institution.ilike(f"%{institution}%"))
+
+    return query
+
 @api_router.get("/request-history")
 async def get_request_history(
-    skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
     status: Optional[str] = None,
     patient_name: Optional[str] = None,
     referring_physician: Optional[str] = None,
     institution: Optional[str] = None,
+    skip: Optional[int] = None,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Get request history with advanced filtering"""
-    try:
-        with db_manager.get_session() as session:
-            from models import MedicalReferral
-            query = session.query(MedicalReferral)
-
-            # Apply filters
-            if start_date:
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(MedicalReferral.created_at >= start_dt)
-
-            if end_date:
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(MedicalReferral.created_at <= end_dt)
+    """
+    Get request history with advanced filtering, a page at a time
 
-            if status:
-                query = query.filter(MedicalReferral.status == status)
-
-            if patient_name:
-                query = query.filter(MedicalReferral.patient_name.ilike(f"%{patient_name}%"))
+    total is null unless include_total is set, then {value, as_of, stale}
+    (see _list_total). skip is rejected with 400.
+    """
+    _reject_offset(skip)
+    try:
+        filters = (start_date, end_date, status, patient_name, referring_physician, institution)
 
-            if referring_physician:
-                query = query.filter(MedicalReferral.referring_physician.ilike(f"%{referring_physician}%"))
+        def count_history() -> int:
+            with db_manager.get_session() as count_session:
+                return _filter_request_history(count_session.query(MedicalReferral), *filters).count()
 
-            if institution:
-                query = query.filter(MedicalReferral.referring_institution.ilike(f"%{institution}%"))
+        total = _list_total(include_total, ("request-history",) + filters, count_history)
 
-            # Get total count
-            total = query.count()
+        with db_manager.get_session() as session:
+            query = _filter_request_history(session.query(MedicalReferral), *filters)
 
-            # Apply pagination and ordering
-            referrals = query.order_by(MedicalReferral.created_at.desc()).offset(skip).limit(limit).all()
+            # Seek to the page instead of counting and skipping rows
+            referrals, next_cursor = keyset_page(query, MedicalReferral, cursor, limit)
 
             history_items = []
             for referral in referrals:
@@ -773,11 +941,13 @@ async def get_request_history(
 
             return {
                 "items": history_items,
+                "next_cursor": next_cursor,
                 "total": total,
-                "skip": skip,
                 "limit": limit
             }
 
+    except InvalidCursor:
+        raise _invalid_cursor()
     except Exception as e:
         logger.error("Failed to get request history", error=str(e))
         raise HTTPException(
@@ -791,56 +961,24 @@ async def get_request_analytics(
     end_date: Optional[str] = None,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Get analytics data for request history"""
+    """Get analytics data for request history, from the daily referral rollups"""
     try:
+        # Rollups are per creation day; every distribution honours the date range
+        start_day = datetime.fromisoformat(start_date.replace('Z', '+00:00')).date() if start_date else None
+        end_day = datetime.fromisoformat(end_date.replace('Z', '+00:00')).date() if end_date else None
+
         with db_manager.get_session() as session:
-            from models import MedicalReferral
-            from sqlalchemy import func, extract
-
-            query = session.query(MedicalReferral)
-
-            # Apply date filters
-            if start_date:
-                start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(MedicalReferral.created_at >= start_dt)
-
-            if end_date:
-                end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(MedicalReferral.created_at <= end_dt)
-
-            # Status distribution
-            status_stats = session.query(
-                MedicalReferral.status,
-                func.count(MedicalReferral.id).label('count')
-            ).group_by(MedicalReferral.status).all()
-
-            # Monthly trends
-            monthly_stats = session.query(
-                extract('year', MedicalReferral.created_at).label('year'),
-                extract('month', MedicalReferral.created_at).label('month'),
-                func.count(MedicalReferral.id).label('count')
-            ).group_by('year', 'month').order_by('year', 'month').all()
-
-            # Priority distribution
-            priority_stats = session.query(
-                MedicalReferral.priority_level,
-                func.count(MedicalReferral.id).label('count')
-            ).group_by(MedicalReferral.priority_level).all()
-
-            # Specialty distribution
-            specialty_stats = session.query(
-                MedicalReferral.specialty,
-                func.count(MedicalReferral.id).label('count')
-            ).group_by(MedicalReferral.specialty).order_by(func.count(MedicalReferral.id).desc()).limit(10).all()
+            analytics = referral_rollups.analytics(session, start_day, end_day)
 
-            return {
-                "statusDistribution": [{"status": s[0], "count": s[1]} for s in status_stats],
-                "monthlyTrends": [{"year": int(m[0]), "month": int(m[1]), "count": m[2]} for m in monthly_stats],
-                "priorityDistribution": [{"priority": p[0], "count": p[1]} for p in priority_stats],
-                "specialtyDistribution": [{"specialty": s[0], "count": s[1]} for s in specialty_stats],
-                "totalRequests": query.count(),
-                "avgResponseTime": calculate_avg_response_time()
-            }
+        avg_hours = analytics["avg_response_hours"]
+        return {
+            "statusDistribution": [{"status": s, "count": c} for s, c in analytics["status"].items()],
+            "monthlyTrends": [{"year": y, "month": m, "count": c} for (y, m), c in analytics["monthly"]],
+            "priorityDistribution": [{"priority": p, "count": c} for p, c in analytics["priority"].items()],
+            "specialtyDistribution": [{"specialty": s, "count": c} for s, c in analytics["specialty"]],
+            "totalRequests": analytics["total"],
+            "avgResponseTime": f"{avg_hours:.1f}h" if avg_hours else "N/A"
+        }
 
     except Exception as e:
         logger.error("Failed to get request analytics", error=str(e))
@@ -860,20 +998,8 @@ def calculate_response_time(referral):
 def calculate_avg_response_time():
     """Calculate average response time"""
     try:
-        with db_manager.get_session() as session:
-            from models import MedicalReferral
-            from sqlalchemy import func
-
-            result = session.query(
-                func.avg(
-                    func.extract('epoch', MedicalReferral.updated_at - MedicalReferral.created_at) / 3600
-                )
-            ).filter(
-                MedicalReferral.updated_at.isnot(None),
-                MedicalReferral.created_at.isnot(None)
-            ).scalar()
-
-            return f"{result:.1f}h" if result else "N/A"
+        result = statistics_aggregator.get_snapshot(("response_time",))["response_time"]["avg_hours"]
+        return f"{result:.1f}h" if result else "N/A"
     except:
         return "N/A"
 
@@ -889,65 +1015,25 @@ async def get_admin_dashboard(current_user: Dict = Depends(get_current_user)):
                 detail="Admin access required"
             )
 
-        with db_manager.get_session() as session:
-            from models import User, MedicalReferral, EmailMessage
-            from sqlalchemy import func, extract
-
-            # User statistics
-            total_users = session.query(User).count()
-            active_users = session.query(User).filter(User.is_active == True).count()
-            admin_users = session.query(User).filter(User.role == "administrator").count()
-            evaluator_users = session.query(User).filter(User.role == "medical_evaluator").count()
-
-            # System activity (last 30 days)
-            thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-            recent_referrals = session.query(MedicalReferral).filter(
-                MedicalReferral.created_at >= thirty_days_ago
-            ).count()
-
-            recent_emails = session.query(EmailMessage).filter(
-                EmailMessage.created_at >= thirty_days_ago
-            ).count()
-
-            # Performance metrics
-            avg_response_time = calculate_avg_response_time()
-
-            # Daily activity (last 7 days)
-            daily_activity = []
-            for i in range(7):
-                date = datetime.utcnow() - timedelta(days=i)
-                day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-                day_end = day_start + timedelta(days=1)
-
-                referrals_count = session.query(MedicalReferral).filter(
-                    MedicalReferral.created_at >= day_start,
-                    MedicalReferral.created_at < day_end
-                ).count()
-
-                daily_activity.append({
-                    "date": day_start.isoformat(),
-                    "referrals": referrals_count
-                })
+        # One aggregate query per table, shared with the WebSocket and monitoring consumers
+        snapshot = statistics_aggregator.get_snapshot(("users", "emails", "referrals", "response_time"))
+        avg_hours = snapshot["response_time"]["avg_hours"]
 
-            return {
-                "userStats": {
-                    "total": total_users,
-                    "active": active_users,
-                    "administrators": admin_users,
-                    "evaluators": evaluator_users
-                },
-                "systemActivity": {
-                    "recentReferrals": recent_referrals,
-                    "recentEmails": recent_emails,
-                    "avgResponseTime": avg_response_time
-                },
-                "dailyActivity": daily_activity,
-                "systemHealth": {
-                    "database": "connected",
-                    "emailService": "active",
-                    "apiStatus": "operational"
-                }
-            }
+        return {
+            "userStats": snapshot["users"],
+            "systemActivity": {
+                "recentReferrals": snapshot["referrals"]["last_30_days"],
+                "recentEmails": snapshot["emails"]["last_30_days"],
+                "avgResponseTime": f"{avg_hours:.1f}h" if avg_hours else "N/A"
+            },
+            "dailyActivity": snapshot["referrals"]["daily"],
+            "systemHealth": {
+                "database": "connected",
+                "emailService": "active",
+                "apiStatus": "operational"
+            },
+            "asOf": snapshot["as_of"]
+        }
 
     except HTTPException:
         raise
@@ -1029,58 +1115,61 @@ async def get_system_configuration(current_user: Dict = Depends(get_current_user
                 detail="Admin access required"
             )
 
-        # Return current system configuration
-        # In production, this would be stored in database
-        config = {
-            "hospital": {
-                "name": "Hospital Universitaria ESE",
-                "address": "Calle 15 #25-30, Cali, Colombia",
-                "phone": "+57 2 555-0123",
-                "email": "info@hospital-ese.com",
-                "timezone": "America/Bogota",
-                "workingHours": {
-                    "start": "06:00",
-                    "end": "22:00"
-                }
-            },
-            "notifications": {
-                "emailEnabled": True,
-                "smsEnabled": False,
-                "urgentCaseThreshold": 30,  # minutes
-                "reminderInterval": 60,  # minutes
-                "escalationTime": 120  # minutes
-            },
-            "ai": {
-                "enabled": True,
-                "confidenceThreshold": 0.8,
-                "autoProcessing": True,
-                "extractionRules": [
-                    "patient_name",
-                    "document_number",
-                    "diagnosis",
-                    "referring_physician",
-                    "priority_level"
-                ]
-            },
-            "security": {
-                "sessionTimeout": 480,  # minutes
-                "passwordPolicy": {
-                    "minLength": 8,
-                    "requireUppercase": True,
-                    "requireNumbers": True,
-                    "requireSpecialChars": True
+        def load():
+            # Return current system configuration
+            # In production, this would be stored in database
+            config = {
+                "hospital": {
+                    "name": "Hospital Universitaria ESE",
+                    "address": "Calle 15 #25-30, Cali, Colombia",
+                    "phone": "+57 2 555-0123",
+                    "email": "info@hospital-ese.com",
+                    "timezone": "America/Bogota",
+                    "workingHours": {
+                        "start": "06:00",
+                        "end": "22:00"
+                    }
                 },
-                "maxLoginAttempts": 3
-            },
-            "backup": {
-                "enabled": True,
-                "frequency": "daily",
-                "retentionDays": 30,
-                "location": "/backups/vital_red"
+                "notifications": {
+                    "emailEnabled": True,
+                    "smsEnabled": False,
+                    "urgentCaseThreshold": 30,  # minutes
+                    "reminderInterval": 60,  # minutes
+                    "escalationTime": 120  # minutes
+                },
+                "ai": {
+                    "enabled": True,
+                    "confidenceThreshold": 0.8,
+                    "autoProcessing": True,
+                    "extractionRules": [
+                        "patient_name",
+                        "document_number",
+                        "diagnosis",
+                        "referring_physician",
+                        "priority_level"
+                    ]
+                },
+                "security": {
+                    "sessionTimeout": 480,  # minutes
+                    "passwordPolicy": {
+                        "minLength": 8,
+                        "requireUppercase": True,
+                        "requireNumbers": True,
+                        "requireSpecialChars": True
+                    },
+                    "maxLoginAttempts": 3
+                },
+                "backup": {
+                    "enabled": True,
+                    "frequency": "daily",
+                    "retentionDays": 30,
+                    "location": "/backups/vital_red"
+                }
             }
-        }
 
-        return config
+            return config
+
+        return response_cache.get_or_load("configuration", None, load, tags=("configuration",))
 
     except HTTPException:
         raise
@@ -1119,6 +1208,7 @@ async def update_system_configuration(
 
         # Log configuration change
         logger.info("System configuration updated", user=current_user.get("email"))
+        response_cache.invalidate("configuration")
 
         return {"message": "System configuration updated successfully"}
 
@@ -1360,13 +1450,23 @@ async def restore_backup(
 # Email Monitor Routes
 @api_router.get("/emails")
 async def get_emails(
-    skip: int = 0,
     limit: int = 50,
     status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    skip: Optional[int] = None,
     current_user: Dict = Depends(get_current_user)
 ):
-    """Get emails with processing status"""
+    """
+    Get emails with processing status, a page at a time
+
+    total is null unless include_total is set, then {value, as_of, stale}
+    (see _list_total). skip is rejected with 400.
+    """
+    _reject_offset(skip)
     try:
+        total = _list_total(include_total, ("emails", status), lambda: email_repo.count_emails(status))
+
         with db_manager.get_session() as session:
             from models import EmailMessage
             query = session.query(EmailMessage)
@@ -1374,8 +1474,7 @@ async def get_emails(
             if status:
                 query = query.filter(EmailMessage.status == status)
 
-            total = query.count()
-            emails = query.order_by(EmailMessage.created_at.desc()).offset(skip).limit(limit).all()
+            emails, next_cursor = keyset_page(query, EmailMessage, cursor, limit)
 
             email_list = []
             for email in emails:
@@ -1396,11 +1495,13 @@ async def get_emails(
 
             return {
                 "emails": email_list,
+                "next_cursor": next_cursor,
                 "total": total,
-                "skip": skip,
                 "limit": limit
             }
 
+    except InvalidCursor:
+        raise _invalid_cursor()
     except Exception as e:
         logger.error("Failed to get emails", error=str(e))
         raise HTTPException(
@@ -1675,20 +1776,23 @@ async def get_email_detail(
 async def get_templates(current_user: Dict = Depends(get_current_user)):
     """Get all templates"""
     try:
-        # Mock templates for now
-        templates = [
-            {
-                "id": "1",
-                "name": "Formulario de Referencia Cardiología",
-                "type": "medical_form",
-                "description": "Plantilla estándar para referencias de cardiología",
-                "isActive": True,
-                "usageCount": 156,
-                "createdAt": "2025-01-15T10:00:00Z",
-                "updatedAt": "2025-01-18T14:30:00Z"
-            }
-        ]
-        return templates
+        def load():
+            # Mock templates for now
+            templates = [
+                {
+                    "id": "1",
+                    "name": "Formulario de Referencia Cardiología",
+                    "type": "medical_form",
+                    "description": "Plantilla estándar para referencias de cardiología",
+                    "isActive": True,
+                    "usageCount": 156,
+                    "createdAt": "2025-01-15T10:00:00Z",
+                    "updatedAt": "2025-01-18T14:30:00Z"
+                }
+            ]
+            return templates
+
+        return response_cache.get_or_load("templates", None, load, tags=("templates",))
 
     except Exception as e:
         logger.error("Failed to get templates", error=str(e))
@@ -1713,6 +1817,7 @@ async def create_template(
 
         # In production, save to database
         logger.info("Template created", user=current_user.get("email"))
+        response_cache.invalidate("templates")
 
         return {"message": "Template created successfully", "id": "new_template_id"}
 
@@ -1887,6 +1992,7 @@ async def update_template(
 
         # In production, this would update template in database
         logger.info("Template updated", template_id=template_id, user=current_user.get("email"))
+        response_cache.invalidate("templates")
 
         return {"message": f"Template {template_id} updated successfully"}
 
@@ -1915,6 +2021,7 @@ async def delete_template(
 
         # In production, this would delete template from database
         logger.info("Template deleted", template_id=template_id, user=current_user.get("email"))
+        response_cache.invalidate("templates")
 
         return {"message": f"Template {template_id} deleted successfully"}
 
@@ -1978,6 +2085,7 @@ async def restore_config_backup(
 
         # In production, this would restore actual backup
         logger.info("Configuration backup restored", backup_id=backup_id, user=current_user.get("email"))
+        response_cache.invalidate("configuration")
 
         return {
             "message": f"Configuration backup {backup_id} restored successfully",
@@ -12,8 +12,9 @@ from datetime import datetime
 import structlog
 
 # Import our modules
-from database import DatabaseManager
+from database import db_manager
 from api_routes import api_router, auth_router, health_router
+from readiness import readiness
 
 logger = structlog.get_logger(__name__)
 
@@ -35,8 +36,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database
-db_manager = DatabaseManager()
+@app.on_event("startup")
+async def start_warm_up():
+    """Load database, keys and models in the background; see /health/ready"""
+    readiness.start_background_warm_up()
 
 # Include routers
 app.include_router(health_router)
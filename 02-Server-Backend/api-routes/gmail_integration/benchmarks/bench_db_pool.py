@@ -0,0 +1,120 @@
+"""
+Database Connection Pool Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Simulates concurrent dashboard users, each loading the statistics counts,
+and compares opening a connection per request against the shared pooled
+engine. By default runs against a SQLite file with a simulated connect
+and query latency; pass --url to run against a real server instead.
+
+Usage: python benchmarks/bench_db_pool.py [--users 50] [--requests 20]
+       [--connect-ms 30] [--query-ms 2] [--url mysql+mysqlconnector://...]
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import structlog
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.pool import NullPool
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from db_pool import create_pooled_engine, pool_status
+from models import Base
+
+DASHBOARD_QUERIES = [
+    "SELECT COUNT(*) FROM email_messages",
+    "SELECT processing_status, COUNT(*) FROM email_messages GROUP BY processing_status",
+    "SELECT COUNT(*) FROM medical_referrals WHERE status = 'pending'",
+]
+
+def simulated_latency(engine, connect_delay: float, query_delay: float):
+    """Sleep on each new DBAPI connection and each statement, like a remote server"""
+    @event.listens_for(engine, "do_connect")
+    def slow_connect(dialect, conn_rec, cargs, cparams):
+        time.sleep(connect_delay)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def slow_query(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(query_delay)
+    return engine
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+def run_users(engine, users: int, requests: int):
+    """Each user thread loads the dashboard `requests` times; returns per-request latencies"""
+    latencies, errors = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(users)
+
+    def user():
+        barrier.wait()
+        for _ in range(requests):
+            start = time.perf_counter()
+            try:
+                with engine.connect() as connection:
+                    for query in DASHBOARD_QUERIES:
+                        connection.execute(text(query)).fetchall()
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=user) for _ in range(users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+def report(label: str, latencies, errors, elapsed: float):
+    if not latencies:
+        print(f"{label}: all {len(errors)} requests failed ({errors[0]})")
+        return
+    print(f"{label}: {len(latencies) / elapsed:7.1f} req/s  "
+          f"p50={percentile(latencies, 0.50) * 1000:7.1f}ms  "
+          f"p95={percentile(latencies, 0.95) * 1000:7.1f}ms  "
+          f"p99={percentile(latencies, 0.99) * 1000:7.1f}ms  errors={len(errors)}")
+
+def run(url: str, users: int, requests: int, connect_delay: float, query_delay: float):
+    """Run both strategies against the same database and print latency percentiles"""
+    options = {}
+    if url.startswith("sqlite"):
+        options['connect_args'] = {"check_same_thread": False}
+        Base.metadata.create_all(create_engine(url))
+
+    unpooled = simulated_latency(create_engine(url, poolclass=NullPool, **options), connect_delay, query_delay)
+    pooled = simulated_latency(create_pooled_engine(url, **options), connect_delay, query_delay)
+
+    print(f"users={users} requests/user={requests} connect={connect_delay * 1000:.0f}ms "
+          f"query={query_delay * 1000:.0f}ms x{len(DASHBOARD_QUERIES)}")
+    report("connect per request", *run_users(unpooled, users, requests))
+    report("pooled engine      ", *run_users(pooled, users, requests))
+    print(f"pool: {pool_status(pooled)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=20, help="dashboard loads per user")
+    parser.add_argument("--connect-ms", type=float, default=30.0, help="simulated connect latency")
+    parser.add_argument("--query-ms", type=float, default=2.0, help="simulated query latency")
+    parser.add_argument("--url", help="database URL (defaults to a temporary SQLite file)")
+    args = parser.parse_args()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url or f"sqlite:///{Path(tmp) / 'vital_red.db'}"
+        connect_delay = args.connect_ms / 1000 if not args.url else 0.0
+        query_delay = args.query_ms / 1000 if not args.url else 0.0
+        run(url, args.users, args.requests, connect_delay, query_delay)
@@ -0,0 +1,123 @@
+"""
+Gmail Batch Fetch Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Compares serial get_message_details/get_attachment calls against the batch
+API using a stubbed HTTP transport with a fixed per-round-trip latency.
+
+Usage: python benchmarks/bench_gmail_batch.py [--messages 100] [--latency-ms 80]
+"""
+
+import argparse
+import base64
+import json
+import logging
+import sys
+import time
+from email.parser import Parser
+from pathlib import Path
+from urllib.parse import urlparse
+
+import httplib2
+import structlog
+from googleapiclient.discovery import build
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gmail_client import GmailClient
+
+class StubGmailTransport:
+    """httplib2-compatible transport answering Gmail message/attachment requests"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.round_trips = 0
+
+    def _answer(self, method: str, uri: str):
+        path = urlparse(uri).path
+        parts = path.rstrip('/').split('/')
+        if '/attachments/' in path:
+            body = {'data': base64.urlsafe_b64encode(b'%PDF-1.4 stub' * 64).decode(), 'size': 832}
+        else:
+            message_id = parts[-1]
+            body = {
+                'id': message_id,
+                'threadId': f'thread_{message_id}',
+                'snippet': 'Remision paciente',
+                'payload': {'headers': [{'name': 'Subject', 'value': 'Remision'}]},
+            }
+        return 200, json.dumps(body)
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+        if not urlparse(uri).path.startswith('/batch'):
+            status, content = self._answer(method, uri)
+            return httplib2.Response({'status': status, 'content-type': 'application/json'}), content.encode()
+
+        # Answer each sub-request of the multipart batch body
+        content_type = headers['content-type']
+        message = Parser().parsestr(f"content-type: {content_type}\r\n\r\n{body}")
+        boundary = 'batch_stub_boundary'
+        out = []
+        for part in message.get_payload():
+            request_line = part.get_payload().split('\n', 1)[0].strip()
+            sub_method, sub_uri = request_line.split(' ')[:2]
+            status, content = self._answer(sub_method, sub_uri)
+            content_id = part['Content-ID'].replace('<', '<response-', 1)
+            out.append(
+                f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                f"HTTP/1.1 {status} OK\r\nContent-Type: application/json\r\n\r\n{content}\r\n"
+            )
+        out.append(f"--{boundary}--")
+        response = httplib2.Response({
+            'status': 200, 'content-type': f'multipart/mixed; boundary={boundary}'
+        })
+        return response, ''.join(out).encode()
+
+def make_client(latency: float) -> GmailClient:
+    """Gmail client wired to the stub transport"""
+    client = GmailClient()
+    client.service = build('gmail', 'v1', http=StubGmailTransport(latency), static_discovery=True)
+    return client
+
+def run(messages: int, attachments_per_message: int, latency: float):
+    """Run serial and batched fetches and print round trips and wall time"""
+    message_ids = [f'msg{i:05d}' for i in range(messages)]
+    pairs = [(m, f'att{j}') for m in message_ids for j in range(attachments_per_message)]
+
+    client = make_client(latency)
+    transport = client.service._http
+    start = time.perf_counter()
+    for message_id in message_ids:
+        client.get_message_details(message_id)
+    for message_id, attachment_id in pairs:
+        client.get_attachment(message_id, attachment_id)
+    serial_time = time.perf_counter() - start
+    serial_trips = transport.round_trips
+
+    client = make_client(latency)
+    transport = client.service._http
+    start = time.perf_counter()
+    details, detail_errors = client.get_messages_details_batch(message_ids)
+    attachments, attachment_errors = client.get_attachments_batch(pairs)
+    batch_time = time.perf_counter() - start
+    batch_trips = transport.round_trips
+
+    assert len(details) == messages and not detail_errors
+    assert len(attachments) == len(pairs) and not attachment_errors
+
+    print(f"messages={messages} attachments={len(pairs)} latency={latency * 1000:.0f}ms")
+    print(f"serial : {serial_trips:5d} round trips  {serial_time:7.2f}s")
+    print(f"batch  : {batch_trips:5d} round trips  {batch_time:7.2f}s")
+    print(f"speedup: {serial_time / batch_time:.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100)
+    parser.add_argument("--attachments", type=int, default=1, help="attachments per message")
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    args = parser.parse_args()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    run(args.messages, args.attachments, args.latency_ms / 1000)
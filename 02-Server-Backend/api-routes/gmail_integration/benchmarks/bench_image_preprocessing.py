@@ -0,0 +1,119 @@
+"""
+OCR Image Preprocessing Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Runs the previous PIL -> RGB -> BGR -> gray preprocessing and the
+ImagePreprocessor pipeline over a corpus of scans and reports images/sec
+and peak RSS. Each variant runs in its own process so peak RSS is not
+shared between them. Without --corpus a synthetic corpus of phone photos
+and small scans is generated.
+
+Usage: python benchmarks/bench_image_preprocessing.py [--corpus DIR] [--photos 20] [--scans 60]
+"""
+
+import argparse
+import logging
+import multiprocessing as mp
+import random
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import structlog
+from PIL import Image, ImageDraw, ImageFilter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from image_preprocessor import ImagePreprocessor
+
+IMAGE_SUFFIXES = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.bmp', '.gif'}
+
+def legacy_preprocess(file_path: Path) -> Image.Image:
+    """TextExtractor._preprocess_image before ImagePreprocessor"""
+    image = Image.open(file_path)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+    gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
+    denoised = cv2.medianBlur(gray, 3)
+    thresh = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+    return Image.fromarray(thresh)
+
+def make_page(size, seed: int) -> Image.Image:
+    """Off-white page with lines of dark 'text' blocks and some sensor noise"""
+    rng = random.Random(seed)
+    width, height = size
+    page = Image.new('RGB', size, (235, 232, 225))
+    draw = ImageDraw.Draw(page)
+    line_height = max(8, height // 60)
+    for y in range(line_height * 3, height - line_height * 3, line_height * 2):
+        x = width // 12
+        while x < width - width // 12:
+            word = rng.randint(line_height, line_height * 6)
+            draw.rectangle([x, y, x + word, y + line_height], fill=(40, 40, 50))
+            x += word + line_height
+    noise = np.random.default_rng(seed).integers(-12, 12, (height, width, 1), dtype=np.int16)
+    pixels = np.clip(np.asarray(page, dtype=np.int16) + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(0.8))
+
+def build_corpus(directory: Path, photos: int, scans: int):
+    """12MP phone photos (JPEG) and small scanned snippets (PNG)"""
+    for i in range(photos):
+        make_page((4032, 3024), i).save(directory / f"photo_{i:03d}.jpg", quality=90)
+    for i in range(scans):
+        make_page((900, 650), 1000 + i).save(directory / f"scan_{i:03d}.png")
+
+def run_variant(name: str, corpus: list, rounds: int):
+    """Preprocess the corpus and return (images, seconds, peak RSS in MB)"""
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+    if name == "legacy":
+        results = lambda paths: (legacy_preprocess(path) for path in paths)
+    else:
+        preprocessor = ImagePreprocessor()
+        results = lambda paths: (image for _, image in preprocessor.preprocess_batch(paths))
+
+    paths = [Path(p) for p in corpus]
+    for _ in results(paths[:2]):  # Warm-up: imports and first allocations
+        pass
+    start = time.perf_counter()
+    count = 0
+    for _ in range(rounds):
+        for _ in results(paths):  # One image alive at a time in both variants
+            count += 1
+    seconds = time.perf_counter() - start
+    return count, seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", type=Path, help="directory of sample scans")
+    parser.add_argument("--photos", type=int, default=20, help="synthetic phone photos")
+    parser.add_argument("--scans", type=int, default=60, help="synthetic small scans")
+    parser.add_argument("--rounds", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.corpus
+        context = mp.get_context("spawn")
+        if directory is None:
+            directory = Path(tmp)
+            # In a child: Linux carries peak RSS across fork/exec into later children
+            with context.Pool(1) as pool:
+                pool.apply(build_corpus, (directory, args.photos, args.scans))
+        corpus = sorted(str(p) for p in directory.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+        print(f"corpus: {len(corpus)} images from {directory}")
+
+        results = {}
+        for name in ("legacy", "pipeline"):
+            with context.Pool(1) as pool:
+                results[name] = pool.apply(run_variant, (name, corpus, args.rounds))
+
+        for name, (count, seconds, peak_mb) in results.items():
+            print(f"{name:9s}: {count / seconds:7.1f} images/sec  {seconds:6.2f}s  peak RSS {peak_mb:7.1f} MB")
+        print(f"speedup  : {results['legacy'][1] / results['pipeline'][1]:.1f}x")
+
+if __name__ == "__main__":
+    main()
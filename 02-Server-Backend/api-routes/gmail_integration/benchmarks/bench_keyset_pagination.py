@@ -0,0 +1,100 @@
+"""
+Keyset Pagination Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Seeds email_messages with --rows rows (several per created_at second, so
+ties on the timestamp are exercised) and times fetching one page at
+increasing depths with OFFSET/LIMIT and with a (created_at, id) cursor,
+plus the COUNT(*) the old endpoints ran on every request.
+
+Usage: python benchmarks/bench_keyset_pagination.py [--rows 1000000] [--limit 50] [--url sqlite:///...]
+"""
+
+import argparse
+import logging
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import structlog
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from models import Base, EmailMessage
+from pagination import encode_cursor, keyset_page
+
+def seed(engine, rows: int, chunk: int = 20000):
+    """Insert rows emails, three per second of created_at, oldest first"""
+    start = datetime(2024, 1, 1)
+    with engine.begin() as connection:
+        for offset in range(0, rows, chunk):
+            connection.execute(insert(EmailMessage), [
+                {
+                    'gmail_id': f'g{n:08d}', 'subject': f'Remision {n}', 'sender_email': 'remisiones@eps.com.co',
+                    'recipient_email': 'vitalred@hospital.com', 'date_received': start,
+                    'status': 'processed' if n % 4 else 'pending',
+                    'created_at': start + timedelta(seconds=n // 3)
+                }
+                for n in range(offset, min(offset + chunk, rows))
+            ])
+
+def timed(fn, repeat: int = 3) -> float:
+    """Best of repeat runs, in milliseconds"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+def run(url: str, rows: int, limit: int):
+    """Seed the table and print page latency by depth for both strategies"""
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+
+    with Session() as session:
+        existing = session.query(EmailMessage).count()
+    if existing:
+        rows = existing
+        print(f"using the {rows} rows already in email_messages")
+    else:
+        start = time.perf_counter()
+        seed(engine, rows)
+        print(f"seeded {rows} rows in {time.perf_counter() - start:.1f}s")
+
+    ordered = (EmailMessage.created_at.desc(), EmailMessage.id.desc())
+    depths = [d for d in (0, 1000, 10000, 100000, 500000, rows - limit) if 0 <= d <= rows - limit]
+
+    with Session() as session:
+        count_ms = timed(lambda: session.query(EmailMessage).count())
+        print(f"rows={rows} limit={limit}  COUNT(*)={count_ms:.1f}ms")
+        print(f"{'depth':>9}  {'offset':>10}  {'keyset':>10}")
+        for depth in sorted(set(depths)):
+            offset_ms = timed(lambda: session.query(EmailMessage).order_by(*ordered)
+                              .offset(depth).limit(limit).all())
+
+            # The cursor a client would hold after reading `depth` rows
+            cursor = None
+            if depth:
+                last = session.query(EmailMessage.created_at, EmailMessage.id) \
+                    .order_by(*ordered).offset(depth - 1).limit(1).one()
+                cursor = encode_cursor(last.created_at, last.id)
+            keyset_ms = timed(lambda: keyset_page(session.query(EmailMessage), EmailMessage, cursor, limit))
+
+            print(f"{depth:>9}  {offset_ms:>8.2f}ms  {keyset_ms:>8.2f}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--url", help="database URL (defaults to a temporary SQLite file)")
+    args = parser.parse_args()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run(args.url or f"sqlite:///{Path(tmp) / 'vital_red.db'}", args.rows, args.limit)
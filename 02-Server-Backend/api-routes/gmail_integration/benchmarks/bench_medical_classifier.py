@@ -0,0 +1,140 @@
+"""
+Medical Classifier Keyword Scan Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Classifies a fixed, seeded corpus of referral-like emails with the previous
+per-keyword implementation (`keyword in text`, `text.count`, uncompiled
+re.search over MEDICAL_PATTERNS) and with the single-pass KeywordScanner,
+checks that both give the same answers and reports emails/sec.
+
+Usage: python benchmarks/bench_medical_classifier.py [--emails 500] [--rounds 3]
+"""
+
+import argparse
+import logging
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import structlog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import MEDICAL_PATTERNS
+from medical_classifier import MedicalClassifier
+
+VOCABULARY = (
+    "paciente remision interconsulta cardiologia neurologia valoracion urgente control seguimiento "
+    "diagnostico tratamiento sintomas examen laboratorio hemograma epicrisis historia clinica "
+    "dolor toracico disnea hipertension arterial diabetes enalapril metformina cita programado "
+    "traslado derivacion critico emergencia inmediato moderado importante rutina electivo "
+    "se solicita por favor adjunto resultados de la consulta anterior con evolucion estable"
+).split()
+
+def build_corpus(count: int, seed: int = 42):
+    """Deterministic emails of 1-8 KB with header fields the patterns look for"""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        words = rng.choices(VOCABULARY, k=rng.randint(150, 1200))
+        header = (
+            f"Remision paciente Juan Perez\nCedula: {10000000 + i}\nEdad: {rng.randint(1, 95)} años\n"
+            f"Diagnostico: {' '.join(rng.choices(VOCABULARY, k=4))}\n"
+        )
+        corpus.append(header + " ".join(words))
+    return corpus
+
+class LegacyClassifier:
+    """The per-keyword classification rules before KeywordScanner"""
+
+    def __init__(self, classifier: MedicalClassifier):
+        self.c = classifier
+
+    def referral_score(self, text):
+        total_words = len(text.split())
+        if total_words == 0:
+            return 0.0
+        referral_matches = sum(text.count(k) for k in self.c.referral_keywords if k in text)
+        specialty_matches = sum(1 for s in self.c.medical_specialties if s in text)
+        pattern_matches = 0
+        for pattern_list in MEDICAL_PATTERNS.values():
+            for pattern in pattern_list:
+                if re.search(pattern, text, re.IGNORECASE):
+                    pattern_matches += 1
+                    break
+        score = (referral_matches / total_words) * 10
+        score += (specialty_matches / len(self.c.medical_specialties)) * 5
+        score += (pattern_matches / len(MEDICAL_PATTERNS)) * 3
+        score += (sum(1 for t in self.c.medical_terms if t in text) / len(self.c.medical_terms)) * 2
+        return min(1.0, score)
+
+    def best(self, indicator_sets, text, default):
+        scores = {}
+        for name, indicators in indicator_sets.items():
+            score = sum(1 for indicator in indicators if indicator in text)
+            if score > 0:
+                scores[name] = score
+        return max(scores, key=scores.get) if scores else default
+
+    def urgency(self, text):
+        text_lower = text.lower()
+        scores = {}
+        for level, indicators in self.c.urgency_indicators.items():
+            score = 0
+            for indicator in indicators:
+                for match in re.finditer(re.escape(indicator), text_lower):
+                    score += 1.0 - (match.start() / len(text_lower)) * 0.5
+            if score > 0:
+                scores[level] = score
+        if not scores:
+            return 'media', 0.5
+        level = max(scores, key=scores.get)
+        return level, min(1.0, scores[level] / sum(scores.values()))
+
+    def classify(self, text):
+        text_lower = text.lower()
+        score = self.referral_score(text_lower)
+        if score > 0.3:
+            referral = (True, self.best(self.c.referral_type_indicators, text_lower, 'interconsulta'),
+                        self.best(self.c.urgency_indicators, text_lower, 'media'))
+        else:
+            referral = (False, None, None)
+        return referral, self.urgency(text)
+
+def classify_scanner(classifier: MedicalClassifier, text: str):
+    """Current implementation: one scan shared by all rules"""
+    scan = classifier.scan(text)
+    return classifier.classify_referral(text, scan), classifier.classify_urgency_level(text, scan)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    # The keyword rules do not use the spaCy/NLTK models
+    MedicalClassifier._initialize_nlp = lambda self: None
+    classifier = MedicalClassifier()
+    legacy = LegacyClassifier(classifier)
+    corpus = build_corpus(args.emails)
+
+    mismatches = sum(1 for text in corpus if legacy.classify(text) != classify_scanner(classifier, text))
+    print(f"corpus: {len(corpus)} emails, {sum(map(len, corpus)) / len(corpus) / 1024:.1f} KB avg, "
+          f"mismatches: {mismatches}")
+
+    timings = {}
+    for name, classify in (("legacy", legacy.classify), ("scanner", lambda t: classify_scanner(classifier, t))):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for text in corpus:
+                classify(text)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:8s}: {len(corpus) * args.rounds / timings[name]:8.1f} emails/sec")
+
+    print(f"speedup : {timings['legacy'] / timings['scanner']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Medical Field Extraction Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Extracts every field of MEDICAL_PATTERNS and MEDICAL_DETAIL_PATTERNS from a
+fixed, seeded corpus with the previous approach (re.search with the raw
+pattern strings, first pattern that matches wins) and with the shared
+MedicalPatternEngine, checks that both give the same matches and reports
+documents/sec.
+
+Usage: python benchmarks/bench_medical_extraction.py [--emails 500] [--rounds 3]
+"""
+
+import argparse
+import logging
+import re
+import sys
+import time
+from pathlib import Path
+
+import structlog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from config import MEDICAL_PATTERNS, MEDICAL_DETAIL_PATTERNS
+from medical_extraction import medical_extractor
+from bench_medical_classifier import build_corpus
+
+PATTERN_SETS = {**MEDICAL_PATTERNS, **MEDICAL_DETAIL_PATTERNS}
+
+def legacy_extract(text: str):
+    """(field, start, value) per field, searched pattern by pattern"""
+    found = {}
+    for field, patterns in PATTERN_SETS.items():
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+            if match:
+                found[field] = (match.start(), match.group(1).strip())
+                break
+    return found
+
+def engine_extract(text: str):
+    return {name: (m.start, m.value) for name, m in medical_extractor.extract(text).fields.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--emails", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    corpus = build_corpus(args.emails)
+    # Upper-cased copies exercise the case-insensitive keyword lookup
+    corpus += [text.upper() for text in corpus[::10]]
+
+    mismatches = sum(1 for text in corpus if legacy_extract(text) != engine_extract(text))
+    print(f"corpus: {len(corpus)} emails, {sum(map(len, corpus)) / len(corpus) / 1024:.1f} KB avg, "
+          f"mismatches: {mismatches}")
+
+    timings = {}
+    for name, extract in (("legacy", legacy_extract), ("engine", engine_extract)):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for text in corpus:
+                extract(text)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:7s}: {len(corpus) * args.rounds / timings[name]:8.1f} emails/sec")
+
+    print(f"speedup: {timings['legacy'] / timings['engine']:.1f}x")
+    print(f"engine stats: {medical_extractor.get_stats()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Startup Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+For each server entry point, starts a fresh interpreter and records:
+  - import: seconds to import the module (app construction included)
+  - first_request: seconds for the first GET /health/live after startup
+  - ready: seconds until GET /health/ready returns 200 (background warm-up)
+
+Each entry point runs in its own process so nothing is already imported or
+loaded. Results are printed and optionally appended as JSON lines to
+--output, to compare runs across changes.
+
+Usage: python benchmarks/bench_startup.py [--modules complete_server api_server api]
+                                          [--ready-timeout 120] [--output startup.jsonl]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def measure(module: str, ready_timeout: float) -> dict:
+    """Runs in the child interpreter"""
+    sys.path.insert(0, str(ROOT))
+    result = {"module": module}
+
+    started = time.perf_counter()
+    app = __import__(module).app
+    result["import"] = round(time.perf_counter() - started, 3)
+
+    from fastapi.testclient import TestClient
+
+    with TestClient(app) as client:  # runs startup events and the lifespan
+        started = time.perf_counter()
+        response = client.get("/health/live")
+        result["first_request"] = round(time.perf_counter() - started, 4)
+        result["first_request_status"] = response.status_code
+
+        started = time.perf_counter()
+        deadline = started + ready_timeout
+        result["ready"] = None
+        while time.perf_counter() < deadline:
+            response = client.get("/health/ready")
+            if response.status_code == 200:
+                result["ready"] = round(time.perf_counter() - started, 3)
+                break
+            time.sleep(0.05)
+        result["readiness"] = {
+            name: {"status": c["status"], "seconds": c["seconds"]}
+            for name, c in response.json().get("components", {}).items()
+        }
+
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", default=["complete_server", "api_server", "api"])
+    parser.add_argument("--ready-timeout", type=float, default=120)
+    parser.add_argument("--output", type=Path, help="append results as JSON lines")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.ready_timeout)))
+        return
+
+    for module in args.modules:
+        started = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, __file__, "--child", module, "--ready-timeout", str(args.ready_timeout)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        wall = round(time.perf_counter() - started, 3)
+        lines = process.stdout.strip().splitlines()
+        if process.returncode != 0 or not lines:
+            print(f"{module:16s}: failed ({process.returncode})\n{process.stderr[-2000:]}")
+            continue
+
+        result = json.loads(lines[-1])
+        result.update({"process_wall": wall, "recorded_at": datetime.now().isoformat()})
+        print(f"{module:16s}: import {result['import']:6.2f}s  first request {result['first_request'] * 1000:7.1f} ms  "
+              f"ready {result['ready'] if result['ready'] is not None else 'timeout'}s  {result['readiness']}")
+
+        if args.output:
+            with open(args.output, "a") as f:
+                f.write(json.dumps(result) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Medical Term Matching Benchmark for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+
+Finds the AdvancedMedicalNLP terminology in a fixed, seeded corpus of long
+epicrisis-like documents with the previous per-term \\b...\\b regex loop and
+with TermMatcher, checks that both find the same spans on unaccented text
+and reports documents/sec.
+
+Usage: python benchmarks/bench_term_matcher.py [--documents 100] [--rounds 3]
+"""
+
+import argparse
+import logging
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+import structlog
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from advanced_nlp import AdvancedMedicalNLP
+from term_matcher import get_term_matcher
+
+FILLER = (
+    "paciente ingresa por cuadro de evolucion con manejo medico y control de signos vitales "
+    "se realiza valoracion por el servicio se indica continuar tratamiento y seguimiento ambulatorio"
+).split()
+
+def build_corpus(terminology, count: int, seed: int = 7):
+    """Deterministic 20-60 KB documents mixing filler words and terminology"""
+    rng = random.Random(seed)
+    terms = [term for terms in terminology.values() for term in terms]
+    corpus = []
+    for _ in range(count):
+        words = [rng.choice(terms) if rng.random() < 0.08 else rng.choice(FILLER)
+                 for _ in range(rng.randint(3000, 9000))]
+        corpus.append(" ".join(words).capitalize() + ".")
+    return corpus
+
+def legacy_find(terminology, text):
+    """_extract_medical_entities before TermMatcher: one regex per term, compiled per call"""
+    found = []
+    for category, terms in terminology.items():
+        for term in terms:
+            pattern = re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
+            for match in pattern.finditer(text):
+                found.append((match.start(), match.end(), category, term))
+    return sorted(found)
+
+def matcher_find(matcher, text):
+    return sorted((m.start, m.end, m.category, m.term) for m in matcher.find(text))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+    terminology = AdvancedMedicalNLP._builtin_medical_terminology(None)
+    matcher = get_term_matcher(terminology)
+    corpus = build_corpus(terminology, args.documents)
+
+    mismatches = sum(1 for text in corpus if legacy_find(terminology, text) != matcher_find(matcher, text))
+    print(f"corpus: {len(corpus)} documents, {sum(map(len, corpus)) / len(corpus) / 1024:.1f} KB avg, "
+          f"{matcher.term_count} terms, mismatches: {mismatches}")
+
+    timings = {}
+    for name, find in (("legacy", lambda t: legacy_find(terminology, t)), ("matcher", lambda t: matcher.find(t))):
+        start = time.perf_counter()
+        for _ in range(args.rounds):
+            for text in corpus:
+                find(text)
+        timings[name] = time.perf_counter() - start
+        print(f"{name:8s}: {len(corpus) * args.rounds / timings[name]:8.1f} documents/sec")
+
+    print(f"speedup : {timings['legacy'] / timings['matcher']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Content-Addressed Attachment Store for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+import structlog
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models import AttachmentBlob, EmailAttachment
+from config import FILE_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class BlobStore:
+    """
+    Stores one physical copy per attachment SHA-256
+
+    Files live at <root>/<aa>/<bb>/<sha256>. AttachmentBlob rows keep a
+    reference count of the EmailAttachment rows pointing at each blob;
+    unreferenced blobs are removed by collect_garbage().
+    """
+
+    def __init__(self, root: Path = None):
+        self.root = Path(root or FILE_CONFIG["BLOB_STORE"]["DIR"])
+        self.logger = logger.bind(component="blob_store")
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def blob_path(self, sha256: str) -> Path:
+        """Path of the blob for a hash"""
+        if not SHA256_RE.match(sha256 or ""):
+            raise ValueError(f"Invalid SHA-256: {sha256!r}")
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    def exists(self, sha256: str) -> bool:
+        """Check if a blob is stored"""
+        return self.blob_path(sha256).exists()
+
+    def store_file(self, source_path: Path, sha256: str) -> Path:
+        """
+        Move a file into the store, dropping it if the content is already there
+
+        Args:
+            source_path: File to ingest; it no longer exists afterwards
+            sha256: Hash of the file content, computed by the caller
+
+        Returns:
+            Path of the stored blob
+        """
+        blob_path = self.blob_path(sha256)
+
+        if blob_path.exists():
+            os.utime(blob_path)  # Keeps the garbage collector's grace period from expiring it
+            Path(source_path).unlink(missing_ok=True)
+            self.logger.debug("Duplicate attachment content, reusing blob", sha256=sha256)
+            return blob_path
+
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = blob_path.with_name(f"{sha256}.{os.getpid()}.tmp")
+        shutil.move(str(source_path), str(tmp_path))
+        os.replace(tmp_path, blob_path)  # Atomic; a concurrent writer of the same hash wrote identical bytes
+
+        return blob_path
+
+    def add_reference(self, session, sha256: str, file_size: int, mime_type: str = None):
+        """Count one more attachment using a blob, in the caller's transaction"""
+        now = datetime.now()
+        updated = session.query(AttachmentBlob).filter_by(sha256=sha256).update({
+            AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1,
+            AttachmentBlob.last_referenced_at: now
+        }, synchronize_session=False)
+
+        if updated:
+            return
+
+        try:
+            # Savepoint so a concurrent insert of the same hash only costs a retry
+            with session.begin_nested():
+                session.add(AttachmentBlob(
+                    sha256=sha256, file_size=file_size, mime_type=mime_type,
+                    ref_count=1, last_referenced_at=now
+                ))
+        except IntegrityError:
+            session.query(AttachmentBlob).filter_by(sha256=sha256).update({
+                AttachmentBlob.ref_count: AttachmentBlob.ref_count + 1,
+                AttachmentBlob.last_referenced_at: now
+            }, synchronize_session=False)
+
+    def release_reference(self, session, sha256: str):
+        """Count one attachment fewer using a blob, in the caller's transaction"""
+        session.query(AttachmentBlob).filter(
+            AttachmentBlob.sha256 == sha256,
+            AttachmentBlob.ref_count > 0
+        ).update({AttachmentBlob.ref_count: AttachmentBlob.ref_count - 1}, synchronize_session=False)
+
+    def collect_garbage(self, session, grace_period: int = None) -> Dict[str, Any]:
+        """
+        Delete blobs no attachment refers to anymore
+
+        Reference counts are reconciled against email_attachments first, so
+        a missed release can never delete a blob that is still in use.
+
+        Args:
+            session: Database session
+            grace_period: Keep unreferenced blobs younger than this many seconds
+
+        Returns:
+            Counters of removed blobs and reclaimed bytes
+        """
+        grace_period = grace_period if grace_period is not None else FILE_CONFIG["BLOB_STORE"]["GC_GRACE_PERIOD"]
+        cutoff = time.time() - grace_period
+        result = {'removed': 0, 'reclaimed_bytes': 0, 'orphan_files': 0}
+
+        try:
+            live_counts = dict(
+                session.query(EmailAttachment.file_hash, func.count(EmailAttachment.id))
+                .filter(EmailAttachment.file_hash.isnot(None))
+                .group_by(EmailAttachment.file_hash)
+                .all()
+            )
+
+            for blob in session.query(AttachmentBlob).all():
+                blob.ref_count = live_counts.get(blob.sha256, 0)
+                if blob.ref_count > 0:
+                    continue
+
+                path = self.blob_path(blob.sha256)
+                if path.exists() and path.stat().st_mtime > cutoff:
+                    continue
+
+                if path.exists():
+                    result['reclaimed_bytes'] += path.stat().st_size
+                    path.unlink()
+                session.delete(blob)
+                result['removed'] += 1
+
+            # Files left behind by transactions that rolled back
+            known = {sha256 for (sha256,) in session.query(AttachmentBlob.sha256).all()}
+            for path in self.root.glob("*/*/*"):
+                if path.name in known or not SHA256_RE.match(path.name):
+                    continue
+                if path.name in live_counts or path.stat().st_mtime > cutoff:
+                    continue
+                result['reclaimed_bytes'] += path.stat().st_size
+                path.unlink()
+                result['orphan_files'] += 1
+
+            session.commit()
+            self.logger.info("Blob garbage collection finished", **result)
+            return result
+
+        except Exception as e:
+            session.rollback()
+            self.logger.error("Blob garbage collection failed", error=str(e))
+            return result
+
+    def get_stats(self, session) -> Dict[str, Any]:
+        """Blob count, stored bytes and bytes saved by deduplication"""
+        blobs, stored_bytes, references = session.query(
+            func.count(AttachmentBlob.id),
+            func.coalesce(func.sum(AttachmentBlob.file_size), 0),
+            func.coalesce(func.sum(AttachmentBlob.ref_count), 0)
+        ).one()
+        saved_bytes = session.query(
+            func.coalesce(func.sum(AttachmentBlob.file_size * (AttachmentBlob.ref_count - 1)), 0)
+        ).filter(AttachmentBlob.ref_count > 1).scalar()
+
+        return {
+            'blobs': blobs,
+            'references': int(references),
+            'stored_bytes': int(stored_bytes),
+            'deduplicated_bytes': int(saved_bytes or 0),
+        }
@@ -11,13 +11,15 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.security import HTTPBearer
 from contextlib import asynccontextmanager
+from sqlalchemy import text
 import structlog
 
 # Import all components
-from database import db_manager, email_repo, patient_repo, referral_repo
+from database import db_manager
 from security import security_manager
 from api_routes import api_router, auth_router, health_router
 from main_service import GmailIntegrationService
+from readiness import readiness
 from config import SERVER_CONFIG, GMAIL_CONFIG
 
 # Configure logging
@@ -34,14 +36,10 @@ async def lifespan(app: FastAPI):
     logger.info("Starting VITAL RED Complete Server")
     
     try:
-        # Initialize database
-        logger.info("Initializing database connection")
-        if not db_manager.initialize():
-            raise Exception("Failed to initialize database")
-        
-        # Initialize security
-        logger.info("Initializing security manager")
-        security_manager.initialize()
+        # Database, keys and NLP models load in a background warm-up; the server answers
+        # /health/live right away and /health/ready once they are loaded
+        logger.info("Starting background warm-up")
+        readiness.start_background_warm_up()
         
         # Initialize Gmail service
         logger.info("Initializing Gmail Integration Service")
@@ -122,8 +120,10 @@ async def root():
 async def health_check():
     """Comprehensive health check"""
     try:
-        # Check database
-        db_status = db_manager.health_check()
+        ready = readiness.get_status()
+        
+        # Check database; not while the warm-up is still connecting
+        db_status = db_manager.health_check() if db_manager.is_initialized else None
         
         # Check Gmail service
         gmail_status = gmail_service and gmail_service.is_running
@@ -138,16 +138,21 @@ async def health_check():
         
         if db_status:
             try:
-                stats["users"] = len(db_manager.get_session().execute("SELECT id FROM users").fetchall())
-                stats["emails"] = email_repo.count_emails()
-                stats["patients"] = patient_repo.count_patients()
-                stats["referrals"] = referral_repo.count_referrals()
+                with db_manager.unit_of_work() as uow:
+                    stats["users"] = uow.session.execute(text("SELECT COUNT(*) FROM users")).scalar()
+                    stats["emails"] = uow.emails.count_emails()
+                    stats["patients"] = uow.patients.count_patients()
+                    stats["referrals"] = uow.referrals.count_referrals()
             except Exception as e:
                 logger.warning("Failed to get stats for health check", error=str(e))
         
         return {
-            "status": "healthy" if db_status and gmail_status else "degraded",
+            "status": "healthy" if ready["ready"] and db_status and gmail_status else "degraded",
+            "live": True,
+            "ready": ready["ready"],
+            "readiness": ready["components"],
             "database": "connected" if db_status else "disconnected",
+            "database_pool": db_manager.get_pool_status(),
             "gmail_service": "running" if gmail_status else "stopped",
             "security": "enabled",
             "statistics": stats,
@@ -31,6 +31,15 @@ GMAIL_CONFIG = {
     "BATCH_SIZE": 10,  # Number of emails to process in each batch
     "MAX_RESULTS": 100,  # Maximum emails to fetch per request
     "POLL_INTERVAL": 300,  # Check for new emails every 5 minutes
+    "INCREMENTAL_SYNC": config("GMAIL_INCREMENTAL_SYNC", default=True, cast=bool),  # Use history API between polls
+    "HISTORY_CHECKPOINT_FILE": CREDENTIALS_DIR / "history_checkpoint.json",
+    "HISTORY_LABEL_ID": "INBOX",  # Only track messages added to this label
+    "HISTORY_PAGE_SIZE": 500,
+    "LIST_PAGE_SIZE": 500,  # Messages per page of a full listing (API max 500)
+    "BATCH_REQUEST_SIZE": config("GMAIL_BATCH_REQUEST_SIZE", default=50, cast=int),  # Sub-requests per batch call (API max 100)
+    "ATTACHMENT_BATCH_SIZE": config("GMAIL_ATTACHMENT_BATCH_SIZE", default=10, cast=int),  # Attachments are large, keep batches small
+    "ATTACHMENT_STREAM_THRESHOLD": 1024 * 1024,  # Larger attachments are downloaded one by one straight to disk
+    "ATTACHMENT_DECODE_CHUNK": 256 * 1024,  # base64 characters decoded per chunk
 }
 
 # Email Processing Configuration
@@ -63,7 +72,13 @@ DATABASE_CONFIG = {
     "USER": config("DB_USER", default="root"),  # Default XAMPP MySQL user
     "PASSWORD": config("DB_PASSWORD", default=""),  # Default XAMPP MySQL password (empty)
     "DRIVER": config("DB_DRIVER", default="mysql+pymysql"),  # MySQL driver for XAMPP
-    "URL": f"mysql+pymysql://{config('DB_USER', default='root')}:{config('DB_PASSWORD', default='')}@{config('DB_HOST', default='localhost')}:{config('DB_PORT', default=3306, cast=int)}/{config('DB_NAME', default='vital_red')}"
+    "URL": f"mysql+pymysql://{config('DB_USER', default='root')}:{config('DB_PASSWORD', default='')}@{config('DB_HOST', default='localhost')}:{config('DB_PORT', default=3306, cast=int)}/{config('DB_NAME', default='vital_red')}",
+    # Connection pool shared by every engine created through db_pool.get_engine
+    "POOL_SIZE": config("DB_POOL_SIZE", default=10, cast=int),  # Connections kept open
+    "MAX_OVERFLOW": config("DB_MAX_OVERFLOW", default=20, cast=int),  # Extra connections under bursts, closed when returned
+    "POOL_TIMEOUT": config("DB_POOL_TIMEOUT", default=10, cast=int),  # Seconds a request waits for a free connection
+    "POOL_RECYCLE": config("DB_POOL_RECYCLE", default=3600, cast=int),  # Below MySQL wait_timeout
+    "POOL_PRE_PING": config("DB_POOL_PRE_PING", default=True, cast=bool),
 }
 
 # Redis Configuration for Caching and Queue
@@ -88,9 +103,23 @@ LOGGING_CONFIG = {
 # Processing Configuration
 PROCESSING_CONFIG = {
     "MAX_RETRIES": 3,
-    "RETRY_DELAY": 60,  # seconds
+    "RETRY_DELAY": 60,  # seconds, doubled on every retry
+    "RETRY_MAX_DELAY": config("RETRY_MAX_DELAY", default=3600, cast=int),  # seconds
+    "QUEUE_LEASE_SECONDS": config("QUEUE_LEASE_SECONDS", default=600, cast=int),  # Claimed task reclaimed after this without heartbeat
+    "QUEUE_HEARTBEAT_INTERVAL": config("QUEUE_HEARTBEAT_INTERVAL", default=120, cast=int),  # seconds
+    "QUEUE_PRIORITIES": {"alta": 1, "media": 5, "baja": 8},  # priority_level -> queue priority (1=highest)
+    "WORKER_PROCESSES": config("WORKER_PROCESSES", default=1, cast=int),  # Service processes on this host
+    "LEADER_LOCK_BACKEND": config("LEADER_LOCK_BACKEND", default="auto"),  # auto, mysql, redis, local
+    "LEADER_LOCK_TTL": config("LEADER_LOCK_TTL", default=900, cast=int),  # seconds, Redis only; renewed every cycle
     "TIMEOUT": 300,  # 5 minutes per email processing
-    "CONCURRENT_WORKERS": 4,
+    "CONCURRENT_WORKERS": config("CONCURRENT_WORKERS", default=4, cast=int),  # Workers per pipeline stage
+    "PIPELINE_QUEUE_SIZE": config("PIPELINE_QUEUE_SIZE", default=50, cast=int),  # Bounded queue between stages
+    "PERSIST_BATCH_SIZE": config("PERSIST_BATCH_SIZE", default=20, cast=int),  # Emails per EmailProcessor commit
+    "STEP_LOG_BUFFER_SIZE": config("STEP_LOG_BUFFER_SIZE", default=20000, cast=int),  # Step log rows kept in memory
+    "STEP_LOG_BATCH_SIZE": config("STEP_LOG_BATCH_SIZE", default=500, cast=int),  # Rows per background insert
+    "STEP_LOG_FLUSH_INTERVAL": config("STEP_LOG_FLUSH_INTERVAL", default=2.0, cast=float),  # seconds
+    "RAW_MESSAGE_STORE_DIR": PROCESSED_DIR / "raw_messages",  # Compressed raw Gmail payloads
+    "RAW_MESSAGE_STORE_MAX_BYTES": config("RAW_MESSAGE_STORE_MAX_BYTES", default=512 * 1024 * 1024, cast=int),
     "ENABLE_OCR": True,
     "OCR_LANGUAGE": "spa+eng",  # Spanish and English
     "BACKUP_PROCESSED_EMAILS": True,
@@ -110,6 +139,9 @@ SECURITY_CONFIG = {
         "minsalud.gov.co"
     ],
     "QUARANTINE_SUSPICIOUS": True,
+    "PRINCIPAL_CACHE_TTL": config("PRINCIPAL_CACHE_TTL", default=30, cast=int),  # seconds an authenticated user is trusted without a DB check
+    "PRINCIPAL_CACHE_SIZE": config("PRINCIPAL_CACHE_SIZE", default=2048, cast=int),  # (user, token) entries kept
+    "PRINCIPAL_CACHE_CHANNEL": config("PRINCIPAL_CACHE_CHANNEL", default="vital_red:principal_invalidate"),  # Redis pub/sub channel
 }
 
 # API Configuration
@@ -149,6 +181,50 @@ MEDICAL_PATTERNS = {
     ]
 }
 
+# Detail fields extracted alongside MEDICAL_PATTERNS; not used for referral scoring
+MEDICAL_DETAIL_PATTERNS = {
+    "REFERRING_INSTITUTION": [
+        r"(?:hospital|clinica|eps|ips)[\s:]*([^.\n]+)",
+        r"(?:institucion|entidad)[\s:]*([^.\n]+)"
+    ],
+    "REFERRING_PHYSICIAN": [
+        r"(?:dr|dra|doctor|doctora|medico)[\s.]*([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)*)",
+        r"(?:firma|atiende|solicita)[\s:]*(?:dr|dra)?[\s.]*([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)*)"
+    ],
+    "DIAGNOSIS_CODE": [
+        r"(?:cie-?10?)[\s:]*([A-Z]\d{2}\.?\d?)"
+    ],
+    "MEDICATIONS": [
+        r"(?:medicamentos?|farmacos?)[\s:]*([^.\n]+)",
+        r"(?:tratamiento)[\s:]*([^.\n]+)",
+        r"(\w+)\s+(\d+(?:\.\d+)?)\s*(mg|ml|gr|ui|mcg)"
+    ],
+    "VITAL_SIGNS": [
+        r"(?:presion arterial|pa)[\s:]*(\d{2,3}/\d{2,3})",
+        r"(?:frecuencia cardiaca|fc)[\s:]*(\d{2,3})",
+        r"(?:temperatura|temp)[\s:]*(\d{2}\.\d)",
+        r"(?:saturacion|spo2)[\s:]*(\d{2,3})%?"
+    ],
+    "PHONE": [
+        r"(?:telefono|tel|celular|movil)[\s:]*(\d{10})",
+        r"(\d{3}[-.\s]?\d{3}[-.\s]?\d{4})"
+    ],
+    "INSURANCE": [
+        r"(?:eps|ips|seguro)[\s:]*([^.\n]+)",
+        r"(?:aseguradora|entidad)[\s:]*([^.\n]+)"
+    ]
+}
+
+# Medical NLP Configuration
+NLP_CONFIG = {
+    "TERMINOLOGY_FILE": config("MEDICAL_TERMINOLOGY_FILE", default=""),  # JSON {category: [terms]}, replaces built-in categories
+    "TERMINOLOGY_CHECK_INTERVAL": config("MEDICAL_TERMINOLOGY_CHECK_INTERVAL", default=30, cast=int),  # seconds between reload checks
+    "SPACY_MODELS": ["es_core_news_sm", "en_core_web_sm"],  # First one installed is loaded
+    "SPACY_EXCLUDE": ["parser", "lemmatizer", "morphologizer", "tagger", "attribute_ruler", "senter"],  # Only doc.ents is used
+    "SPACY_BATCH_SIZE": config("SPACY_BATCH_SIZE", default=32, cast=int),  # Documents per nlp.pipe batch
+    "SPACY_N_PROCESS": config("SPACY_N_PROCESS", default=1, cast=int),  # nlp.pipe worker processes for bulk runs
+}
+
 # File Processing Configuration
 FILE_CONFIG = {
     "SUPPORTED_FORMATS": {
@@ -161,12 +237,26 @@ FILE_CONFIG = {
         "DPI": 300,
         "LANGUAGE": "spa+eng",
         "PSM": 6,  # Page segmentation mode
-        "OEM": 3   # OCR Engine Mode
+        "OEM": 3,  # OCR Engine Mode
+        "PAGE_LONG_SIDE_INCHES": 11.7  # Larger images are downscaled to this at DPI (A4 long side)
     },
     "PDF_CONFIG": {
         "EXTRACT_IMAGES": True,
         "EXTRACT_TEXT": True,
-        "MERGE_PAGES": True
+        "MERGE_PAGES": True,
+        "OCR_WORKERS": config("PDF_OCR_WORKERS", default=min(4, os.cpu_count() or 1), cast=int),
+        "OCR_PAGE_TIMEOUT": config("PDF_OCR_PAGE_TIMEOUT", default=60, cast=int),  # seconds per page
+        "OCR_MAX_PAGES": config("PDF_OCR_MAX_PAGES", default=30, cast=int)  # pages OCR'd per document
+    },
+    "BLOB_STORE": {
+        "DIR": PROCESSED_DIR / "blobs",  # One file per SHA-256
+        "GC_INTERVAL": 24 * 3600,  # seconds between garbage collection runs
+        "GC_GRACE_PERIOD": 3600,  # unreferenced blobs younger than this are kept
+    },
+    "TEMP_MAX_AGE": config("TEMP_MAX_AGE", default=7 * 24 * 3600, cast=int),  # seconds; older downloads are removed
+    "EXTRACTION_CACHE": {
+        "ENABLED": config("EXTRACTION_CACHE_ENABLED", default=True, cast=bool),
+        "DIR": PROCESSED_DIR / "extraction_cache",  # Keyed by SHA-256, extractor version and OCR config
     }
 }
 
@@ -198,7 +288,22 @@ PERFORMANCE_CONFIG = {
     "MEMORY_LIMIT_MB": config("MEMORY_LIMIT_MB", default=512, cast=int),
     "CPU_THRESHOLD": config("CPU_THRESHOLD", default=80, cast=int),
     "DISK_THRESHOLD": config("DISK_THRESHOLD", default=85, cast=int),
-    "OPTIMIZATION_INTERVAL": config("OPTIMIZATION_INTERVAL", default=300, cast=int)
+    "OPTIMIZATION_INTERVAL": config("OPTIMIZATION_INTERVAL", default=300, cast=int),
+    "PAGE_SIZE_MAX": config("PAGE_SIZE_MAX", default=200, cast=int),  # Largest limit a list endpoint accepts
+    "COUNT_CACHE_TTL": config("COUNT_CACHE_TTL", default=60, cast=int),  # seconds a background list total is reused
+    "STATS_CACHE_TTL": config("STATS_CACHE_TTL", default=5, cast=float),  # seconds dashboard/monitoring aggregates are shared
+    "LOCAL_CACHE_SIZE": config("LOCAL_CACHE_SIZE", default=1024, cast=int),  # entries kept by CacheManager's in-process tier
+    "RESPONSE_CACHE_SIZE": config("RESPONSE_CACHE_SIZE", default=1024, cast=int),  # GET responses kept in process
+    "RESPONSE_CACHE_CHANNEL": config("RESPONSE_CACHE_CHANNEL", default="vital_red:response_invalidate"),  # Redis pub/sub channel
+    "RESPONSE_CACHE_TTLS": {  # seconds a GET response is reused, per route
+        "medical_cases": config("RESPONSE_TTL_MEDICAL_CASES", default=15, cast=int),
+        "medical_case": config("RESPONSE_TTL_MEDICAL_CASE", default=60, cast=int),
+        "referrals": config("RESPONSE_TTL_REFERRALS", default=15, cast=int),
+        "referral": config("RESPONSE_TTL_REFERRAL", default=60, cast=int),
+        "statistics": config("RESPONSE_TTL_STATISTICS", default=10, cast=int),
+        "templates": config("RESPONSE_TTL_TEMPLATES", default=300, cast=int),
+        "configuration": config("RESPONSE_TTL_CONFIGURATION", default=300, cast=int),
+    },
 }
 
 # Backup Configuration
@@ -222,6 +327,8 @@ __all__ = [
     "SECURITY_CONFIG",
     "API_CONFIG",
     "MEDICAL_PATTERNS",
+    "MEDICAL_DETAIL_PATTERNS",
+    "NLP_CONFIG",
     "FILE_CONFIG",
     "MONITORING_CONFIG",
     "FRONTEND_CONFIG",
@@ -4,21 +4,32 @@ Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 """
 
 import os
+import threading
 from typing import Optional, Dict, Any, List
 from contextlib import contextmanager
 import structlog
 
-from sqlalchemy import create_engine, event
+from sqlalchemy import event, inspect
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.pool import StaticPool
 from sqlalchemy.exc import SQLAlchemyError
 import redis
 
-from models import Base, EmailMessage, EmailAttachment, ProcessingLog, PatientRecord, MedicalReferral
+from models import Base, EmailMessage, EmailAttachment, ProcessingLog, PatientRecord, MedicalReferral, ReferralDailyRollup
+from db_pool import get_engine, pool_status
+from dto import EmailDTO, AttachmentDTO, PatientDTO, ReferralDTO, to_dto
+from pagination import Page, InvalidCursor, keyset_page
+from rollups import referral_rollups  # Also registers the flush listeners that keep the rollups current
 from config import DATABASE_CONFIG, REDIS_CONFIG
 
 logger = structlog.get_logger(__name__)
 
+# create_all() only adds missing tables; columns and indexes added to existing ones ship here
+SCHEMA_UPGRADE_SCRIPT = "04-Database-Scripts/migrations/sql/upgrade_ingestion_schema.sql"
+
+class SchemaOutOfDate(RuntimeError):
+    """Existing tables lack columns the models use; the upgrade script has not been run"""
+
 class DatabaseManager:
     """
     Database connection and session management
@@ -26,42 +37,90 @@ class DatabaseManager:
     
     def __init__(self):
         self.logger = logger.bind(component="database_manager")
-        self.engine = None
-        self.SessionLocal = None
-        self.redis_client = None
+        self._engine = None
+        self._session_factory = None
+        self._redis_client = None
+        self._redis_initialized = False
+        self._lock = threading.RLock()
         
-        # Initialize database connection
-        self._initialize_database()
-        self._initialize_redis()
+        # Connections are opened on first use (or by initialize() during warm-up),
+        # so importing this module does not block on MySQL or Redis
+    
+    def initialize(self) -> bool:
+        """Connect to MySQL and Redis now instead of on first use"""
+        try:
+            self._ensure_database()
+            self._ensure_redis()
+            return True
+        except Exception as e:
+            self.logger.error("Database warm-up failed", error=str(e))
+            return False
+    
+    def ensure_ready(self):
+        """Connect now, raising when MySQL is unreachable or the schema is out of date (SchemaOutOfDate)"""
+        self._ensure_database()
+    
+    @property
+    def is_initialized(self) -> bool:
+        return self._session_factory is not None
+    
+    @property
+    def engine(self):
+        self._ensure_database()
+        return self._engine
+    
+    @property
+    def SessionLocal(self):
+        self._ensure_database()
+        return self._session_factory
+    
+    @property
+    def redis_client(self):
+        self._ensure_redis()
+        return self._redis_client
+    
+    def _ensure_database(self):
+        """Open the database connection once; a failed attempt is retried on next use"""
+        if self._session_factory is None:
+            with self._lock:
+                if self._session_factory is None:
+                    self._initialize_database()
+    
+    def _ensure_redis(self):
+        """Open the Redis connection once"""
+        if not self._redis_initialized:
+            with self._lock:
+                if not self._redis_initialized:
+                    self._initialize_redis()
+                    self._redis_initialized = True
     
     def _initialize_database(self):
         """Initialize MySQL database connection for XAMPP"""
         try:
-            # Create database engine for MySQL
-            self.engine = create_engine(
+            # Shared pooled engine for MySQL; pool sizing comes from DATABASE_CONFIG
+            engine = get_engine(
                 DATABASE_CONFIG["URL"],
-                pool_pre_ping=True,
-                pool_recycle=3600,  # Recycle connections every hour
                 echo=False,  # Set to True for SQL debugging
                 connect_args={"charset": "utf8mb4"}  # MySQL specific charset
             )
             
-            # Create session factory
-            self.SessionLocal = sessionmaker(
-                autocommit=False,
-                autoflush=False,
-                bind=self.engine
-            )
-            
             # Test connection
-            with self.engine.connect() as conn:
+            with engine.connect() as conn:
                 from sqlalchemy import text
                 conn.execute(text("SELECT 1"))
             
             self.logger.info("Database connection established successfully")
             
             # Create tables if they don't exist
-            self._create_tables()
+            self._create_tables(engine)
+            
+            # Create session factory; published last so other threads only see a working connection
+            self._engine = engine
+            self._session_factory = sessionmaker(
+                autocommit=False,
+                autoflush=False,
+                bind=engine
+            )
             
         except Exception as e:
             self.logger.error("Database initialization failed", error=str(e))
@@ -70,7 +129,7 @@ class DatabaseManager:
     def _initialize_redis(self):
         """Initialize Redis connection for caching and queuing"""
         try:
-            self.redis_client = redis.Redis(
+            self._redis_client = redis.Redis(
                 host=REDIS_CONFIG["HOST"],
                 port=REDIS_CONFIG["PORT"],
                 db=REDIS_CONFIG["DB"],
@@ -82,21 +141,59 @@ class DatabaseManager:
             )
             
             # Test Redis connection
-            self.redis_client.ping()
+            self._redis_client.ping()
             self.logger.info("Redis connection established successfully")
             
         except Exception as e:
             self.logger.warning("Redis initialization failed", error=str(e))
-            self.redis_client = None
+            self._redis_client = None
     
-    def _create_tables(self):
+    def _create_tables(self, engine):
         """Create database tables if they don't exist"""
         try:
-            Base.metadata.create_all(bind=self.engine)
+            Base.metadata.create_all(bind=engine)
             self.logger.info("Database tables created/verified successfully")
         except Exception as e:
             self.logger.error("Table creation failed", error=str(e))
             raise
+        self._verify_schema(engine)
+        self._backfill_rollups(engine)
+    
+    def _verify_schema(self, engine):
+        """Raise SchemaOutOfDate when existing tables lack model columns; warn about missing indexes"""
+        inspector = inspect(engine)
+        existing = set(inspector.get_table_names())
+        missing_columns, missing_indexes = [], []
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+            columns = {column['name'] for column in inspector.get_columns(table.name)}
+            missing_columns += [f"{table.name}.{column.name}" for column in table.columns if column.name not in columns]
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            missing_indexes += [index.name for index in table.indexes if index.name not in indexes]
+        
+        if missing_indexes:
+            self.logger.warning("Database indexes missing, affected queries will scan their tables",
+                                indexes=missing_indexes, upgrade_script=SCHEMA_UPGRADE_SCRIPT)
+        if missing_columns:
+            self.logger.error("Database schema is out of date", columns=missing_columns,
+                              upgrade_script=SCHEMA_UPGRADE_SCRIPT)
+            raise SchemaOutOfDate(
+                f"Database schema is out of date, missing columns {', '.join(missing_columns)}; "
+                f"run {SCHEMA_UPGRADE_SCRIPT}"
+            )
+    
+    def _backfill_rollups(self, engine):
+        """Fill referral_daily_rollups from existing referrals when it is still empty"""
+        try:
+            with Session(bind=engine) as session:
+                if session.query(ReferralDailyRollup.day).first() or not session.query(MedicalReferral.id).first():
+                    return
+                rows = referral_rollups.rebuild(session)
+                session.commit()
+                self.logger.info("Referral rollups backfilled", rows=rows)
+        except Exception as e:
+            self.logger.error("Referral rollup backfill failed", error=str(e))
     
     @contextmanager
     def get_session(self):
@@ -119,6 +216,12 @@ class DatabaseManager:
         finally:
             session.close()
     
+    @contextmanager
+    def unit_of_work(self):
+        """Repositories sharing one session for a request or pipeline stage; see UnitOfWork"""
+        with self.get_session() as session:
+            yield UnitOfWork(self, session)
+    
     def get_session_direct(self) -> Session:
         """Get a database session directly (remember to close it)"""
         return self.SessionLocal()
@@ -127,7 +230,8 @@ class DatabaseManager:
         """Check database and Redis health"""
         health_status = {
             'database': {'status': 'unknown', 'error': None},
-            'redis': {'status': 'unknown', 'error': None}
+            'redis': {'status': 'unknown', 'error': None},
+            'database_pool': None
         }
         
         # Check database
@@ -139,6 +243,7 @@ class DatabaseManager:
         except Exception as e:
             health_status['database']['status'] = 'unhealthy'
             health_status['database']['error'] = str(e)
+        health_status['database_pool'] = self.get_pool_status()
         
         # Check Redis
         try:
@@ -153,89 +258,158 @@ class DatabaseManager:
         
         return health_status
 
+    def get_pool_status(self) -> Optional[Dict[str, Any]]:
+        """Live connection pool metrics; None until the database is connected"""
+        if self._engine is None:
+            return None
+        return pool_status(self._engine)
+
     def get_health_status(self):
         """Get system health status"""
         return self.health_check()
 
-class EmailRepository:
+class Repository:
     """
-    Repository pattern for email-related database operations
+    Base for the repositories
+    
+    Bound to a session (see UnitOfWork), every method runs in that session
+    and leaves committing to the unit of work; unbound, each method opens
+    and commits a session of its own. Results are DTOs, never ORM objects.
     """
     
-    def __init__(self, db_manager: DatabaseManager):
+    component = "repository"
+    
+    def __init__(self, db_manager: DatabaseManager, session: Optional[Session] = None):
         self.db_manager = db_manager
-        self.logger = logger.bind(component="email_repository")
+        self.session = session
+        self.logger = logger.bind(component=self.component)
     
-    def create_email(self, email_data: Dict[str, Any]) -> Optional[EmailMessage]:
+    @contextmanager
+    def _session(self):
+        if self.session is not None:
+            yield self.session
+        else:
+            with self.db_manager.get_session() as session:
+                yield session
+
+class EmailRepository(Repository):
+    """
+    Repository pattern for email-related database operations
+    """
+    
+    component = "email_repository"
+    
+    def create_email(self, email_data: Dict[str, Any]) -> Optional[EmailDTO]:
         """Create a new email record"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 email = EmailMessage(**email_data)
                 session.add(email)
                 session.flush()
                 session.refresh(email)
-                return email
+                return EmailDTO.from_orm(email)
         except Exception as e:
             self.logger.error("Failed to create email record", error=str(e))
             return None
     
-    def get_email_by_gmail_id(self, gmail_id: str) -> Optional[EmailMessage]:
+    def get_email_by_id(self, email_id: int) -> Optional[EmailDTO]:
+        """Get email by ID"""
+        try:
+            with self._session() as session:
+                return to_dto(EmailDTO, session.get(EmailMessage, email_id))
+        except Exception as e:
+            self.logger.error("Failed to get email by ID", email_id=email_id, error=str(e))
+            return None
+    
+    def get_emails_by_ids(self, email_ids: List[int]) -> Dict[int, EmailDTO]:
+        """Emails by ID, in a single query"""
+        try:
+            if not email_ids:
+                return {}
+            with self._session() as session:
+                return {
+                    email.id: EmailDTO.from_orm(email) for email in
+                    session.query(EmailMessage).filter(EmailMessage.id.in_(set(email_ids)))
+                }
+        except Exception as e:
+            self.logger.error("Failed to get emails by ID", error=str(e))
+            return {}
+    
+    def get_email_by_gmail_id(self, gmail_id: str) -> Optional[EmailDTO]:
         """Get email by Gmail ID"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(EmailMessage).filter_by(gmail_id=gmail_id).first()
+            with self._session() as session:
+                return to_dto(EmailDTO, session.query(EmailMessage).filter_by(gmail_id=gmail_id).first())
         except Exception as e:
             self.logger.error("Failed to get email by Gmail ID", gmail_id=gmail_id, error=str(e))
             return None
     
-    def get_pending_emails(self, limit: int = 10) -> List[EmailMessage]:
+    def get_existing_gmail_ids(self, gmail_ids: List[str]) -> set:
+        """Return the subset of Gmail IDs already stored, in a single query"""
+        try:
+            if not gmail_ids:
+                return set()
+            with self._session() as session:
+                rows = session.query(EmailMessage.gmail_id).filter(
+                    EmailMessage.gmail_id.in_(gmail_ids)
+                ).all()
+                return {row[0] for row in rows}
+        except Exception as e:
+            self.logger.error("Failed to check existing Gmail IDs", error=str(e))
+            return set()
+    
+    def get_pending_emails(self, limit: int = 10) -> List[EmailDTO]:
         """Get emails with pending processing status"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(EmailMessage).filter_by(
+            with self._session() as session:
+                return [EmailDTO.from_orm(email) for email in session.query(EmailMessage).filter_by(
                     processing_status="pending"
-                ).limit(limit).all()
+                ).limit(limit)]
         except Exception as e:
             self.logger.error("Failed to get pending emails", error=str(e))
             return []
     
-    def get_medical_referrals(self, status: Optional[str] = None, limit: int = 50) -> List[EmailMessage]:
+    def get_medical_referrals(self, status: Optional[str] = None, limit: int = 50) -> List[EmailDTO]:
         """Get medical referral emails"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 query = session.query(EmailMessage).filter_by(is_medical_referral=True)
                 
                 if status:
                     query = query.filter_by(processing_status=status)
                 
-                return query.order_by(EmailMessage.date_received.desc()).limit(limit).all()
+                return [EmailDTO.from_orm(email) for email in
+                        query.order_by(EmailMessage.date_received.desc()).limit(limit)]
         except Exception as e:
             self.logger.error("Failed to get medical referrals", error=str(e))
             return []
     
-    def update_email_status(self, email_id: int, status: str, error_message: str = None) -> bool:
-        """Update email processing status"""
+    def update_email_status(self, email_id: int, status: str, error_message: str = None,
+                            processed_by: str = None) -> bool:
+        """Update email processing status, optionally recording the worker processing it"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 email = session.query(EmailMessage).filter_by(id=email_id).first()
                 if email:
                     email.processing_status = status
                     if error_message:
                         email.processing_error = error_message
+                    if processed_by:
+                        email.processed_by = processed_by
                     return True
                 return False
         except Exception as e:
             self.logger.error("Failed to update email status", email_id=email_id, error=str(e))
             return False
     
-    def get_emails_by_date_range(self, start_date, end_date) -> List[EmailMessage]:
+    def get_emails_by_date_range(self, start_date, end_date) -> List[EmailDTO]:
         """Get emails within date range"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(EmailMessage).filter(
+            with self._session() as session:
+                return [EmailDTO.from_orm(email) for email in session.query(EmailMessage).filter(
                     EmailMessage.date_received >= start_date,
                     EmailMessage.date_received <= end_date
-                ).order_by(EmailMessage.date_received.desc()).all()
+                ).order_by(EmailMessage.date_received.desc())]
         except Exception as e:
             self.logger.error("Failed to get emails by date range", error=str(e))
             return []
@@ -243,7 +417,7 @@ class EmailRepository:
     def count_emails(self, status: str = None) -> int:
         """Count emails with optional status filter"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 query = session.query(EmailMessage)
                 if status:
                     query = query.filter(EmailMessage.status == status)
@@ -252,75 +426,105 @@ class EmailRepository:
             self.logger.error("Failed to count emails", status=status, error=str(e))
             return 0
 
-    def get_emails(self, skip: int = 0, limit: int = 50, status: str = None) -> List[EmailMessage]:
-        """Get emails with pagination and optional status filter"""
+    def get_emails(self, limit: int = 50, status: str = None, cursor: str = None) -> Page:
+        """Get a page of emails, newest first, after cursor; raises InvalidCursor"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 query = session.query(EmailMessage)
                 if status:
                     query = query.filter(EmailMessage.status == status)
-                return query.order_by(EmailMessage.created_at.desc()).offset(skip).limit(limit).all()
+                emails, next_cursor = keyset_page(query, EmailMessage, cursor, limit)
+                return Page([EmailDTO.from_orm(email) for email in emails], next_cursor, limit)
+        except InvalidCursor:
+            raise
         except Exception as e:
-            self.logger.error("Failed to get emails", skip=skip, limit=limit, status=status, error=str(e))
-            return []
+            self.logger.error("Failed to get emails", limit=limit, status=status, error=str(e))
+            return Page(limit=limit)
 
-class AttachmentRepository:
+class AttachmentRepository(Repository):
     """
     Repository for attachment-related operations
     """
     
-    def __init__(self, db_manager: DatabaseManager):
-        self.db_manager = db_manager
-        self.logger = logger.bind(component="attachment_repository")
+    component = "attachment_repository"
     
-    def create_attachment(self, attachment_data: Dict[str, Any]) -> Optional[EmailAttachment]:
+    def create_attachment(self, attachment_data: Dict[str, Any]) -> Optional[AttachmentDTO]:
         """Create a new attachment record"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 attachment = EmailAttachment(**attachment_data)
                 session.add(attachment)
                 session.flush()
                 session.refresh(attachment)
-                return attachment
+                return AttachmentDTO.from_orm(attachment)
         except Exception as e:
             self.logger.error("Failed to create attachment record", error=str(e))
             return None
     
-    def get_attachments_by_email(self, email_id: int) -> List[EmailAttachment]:
+    def get_attachments_by_email(self, email_id: int) -> List[AttachmentDTO]:
         """Get all attachments for an email"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(EmailAttachment).filter_by(
-                    email_message_id=email_id
-                ).all()
+            with self._session() as session:
+                return [AttachmentDTO.from_orm(attachment) for attachment in
+                        session.query(EmailAttachment).filter_by(email_message_id=email_id)]
         except Exception as e:
             self.logger.error("Failed to get attachments", email_id=email_id, error=str(e))
             return []
     
-    def get_pending_attachments(self, limit: int = 10) -> List[EmailAttachment]:
+    def get_attachments_by_emails(self, email_ids: List[int]) -> Dict[int, List[AttachmentDTO]]:
+        """Attachments grouped by email ID, in a single query"""
+        try:
+            if not email_ids:
+                return {}
+            with self._session() as session:
+                grouped: Dict[int, List[AttachmentDTO]] = {}
+                for attachment in session.query(EmailAttachment).filter(
+                    EmailAttachment.email_message_id.in_(set(email_ids))
+                ).order_by(EmailAttachment.id):
+                    grouped.setdefault(attachment.email_message_id, []).append(
+                        AttachmentDTO.from_orm(attachment)
+                    )
+                return grouped
+        except Exception as e:
+            self.logger.error("Failed to get attachments by email", error=str(e))
+            return {}
+    
+    def get_pending_attachments(self, limit: int = 10) -> List[AttachmentDTO]:
         """Get attachments with pending processing"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(EmailAttachment).filter_by(
-                    processing_status="pending"
-                ).limit(limit).all()
+            with self._session() as session:
+                return [AttachmentDTO.from_orm(attachment) for attachment in
+                        session.query(EmailAttachment).filter_by(processing_status="pending").limit(limit)]
         except Exception as e:
             self.logger.error("Failed to get pending attachments", error=str(e))
             return []
+    
+    def update_attachment_status(self, attachment_id: int, status: str, error_message: str = None) -> bool:
+        """Update attachment processing status"""
+        try:
+            with self._session() as session:
+                attachment = session.get(EmailAttachment, attachment_id)
+                if attachment:
+                    attachment.processing_status = status
+                    if error_message:
+                        attachment.processing_error = error_message
+                    return True
+                return False
+        except Exception as e:
+            self.logger.error("Failed to update attachment status", attachment_id=attachment_id, error=str(e))
+            return False
 
-class PatientRepository:
+class PatientRepository(Repository):
     """
     Repository for patient-related operations
     """
     
-    def __init__(self, db_manager: DatabaseManager):
-        self.db_manager = db_manager
-        self.logger = logger.bind(component="patient_repository")
+    component = "patient_repository"
     
-    def create_or_update_patient(self, patient_data: Dict[str, Any]) -> Optional[PatientRecord]:
+    def create_or_update_patient(self, patient_data: Dict[str, Any]) -> Optional[PatientDTO]:
         """Create new patient or update existing one"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 document_number = patient_data.get('document_number')
                 
                 if not document_number:
@@ -343,31 +547,65 @@ class PatientRepository:
                 
                 session.flush()
                 session.refresh(patient)
-                return patient
+                return PatientDTO.from_orm(patient)
                 
         except Exception as e:
             self.logger.error("Failed to create/update patient", error=str(e))
             return None
     
-    def get_patient_by_document(self, document_number: str) -> Optional[PatientRecord]:
+    def get_patient_by_id(self, patient_id: int) -> Optional[PatientDTO]:
+        """Get patient by ID"""
+        try:
+            with self._session() as session:
+                return to_dto(PatientDTO, session.get(PatientRecord, patient_id))
+        except Exception as e:
+            self.logger.error("Failed to get patient by ID", patient_id=patient_id, error=str(e))
+            return None
+    
+    def get_patients_by_ids(self, patient_ids: List[int]) -> Dict[int, PatientDTO]:
+        """Patients by ID, in a single query"""
+        try:
+            patient_ids = {patient_id for patient_id in patient_ids if patient_id is not None}
+            if not patient_ids:
+                return {}
+            with self._session() as session:
+                return {
+                    patient.id: PatientDTO.from_orm(patient) for patient in
+                    session.query(PatientRecord).filter(PatientRecord.id.in_(patient_ids))
+                }
+        except Exception as e:
+            self.logger.error("Failed to get patients by ID", error=str(e))
+            return {}
+    
+    def get_patient_by_document(self, document_number: str) -> Optional[PatientDTO]:
         """Get patient by document number"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(PatientRecord).filter_by(
+            with self._session() as session:
+                return to_dto(PatientDTO, session.query(PatientRecord).filter_by(
                     document_number=document_number
-                ).first()
+                ).first())
         except Exception as e:
             self.logger.error("Failed to get patient", document=document_number, error=str(e))
             return None
     
-    def search_patients(self, search_term: str, limit: int = 20) -> List[PatientRecord]:
+    def get_patients(self, skip: int = 0, limit: int = 50) -> List[PatientDTO]:
+        """Get patients with pagination"""
+        try:
+            with self._session() as session:
+                return [PatientDTO.from_orm(patient) for patient in
+                        session.query(PatientRecord).order_by(PatientRecord.id.desc()).offset(skip).limit(limit)]
+        except Exception as e:
+            self.logger.error("Failed to get patients", skip=skip, limit=limit, error=str(e))
+            return []
+    
+    def search_patients(self, search_term: str, limit: int = 20) -> List[PatientDTO]:
         """Search patients by name or document"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(PatientRecord).filter(
+            with self._session() as session:
+                return [PatientDTO.from_orm(patient) for patient in session.query(PatientRecord).filter(
                     (PatientRecord.full_name.ilike(f"%{search_term}%")) |
                     (PatientRecord.document_number.ilike(f"%{search_term}%"))
-                ).limit(limit).all()
+                ).limit(limit)]
         except Exception as e:
             self.logger.error("Failed to search patients", search_term=search_term, error=str(e))
             return []
@@ -375,52 +613,60 @@ class PatientRepository:
     def count_patients(self) -> int:
         """Count total patients"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 return session.query(PatientRecord).count()
         except Exception as e:
             self.logger.error("Failed to count patients", error=str(e))
             return 0
 
-class ReferralRepository:
+class ReferralRepository(Repository):
     """
     Repository for medical referral operations
     """
     
-    def __init__(self, db_manager: DatabaseManager):
-        self.db_manager = db_manager
-        self.logger = logger.bind(component="referral_repository")
+    component = "referral_repository"
     
-    def create_referral(self, referral_data: Dict[str, Any]) -> Optional[MedicalReferral]:
+    def create_referral(self, referral_data: Dict[str, Any]) -> Optional[ReferralDTO]:
         """Create a new medical referral"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 referral = MedicalReferral(**referral_data)
                 session.add(referral)
                 session.flush()
                 session.refresh(referral)
-                return referral
+                return ReferralDTO.from_orm(referral)
         except Exception as e:
             self.logger.error("Failed to create referral", error=str(e))
             return None
     
-    def get_referrals_by_status(self, status: str, limit: int = 50) -> List[MedicalReferral]:
+    def get_referrals_by_status(self, status: str, limit: int = 50) -> List[ReferralDTO]:
         """Get referrals by status"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(MedicalReferral).filter_by(
+            with self._session() as session:
+                return [ReferralDTO.from_orm(referral) for referral in session.query(MedicalReferral).filter_by(
                     status=status
-                ).order_by(MedicalReferral.referral_date.desc()).limit(limit).all()
+                ).order_by(MedicalReferral.referral_date.desc()).limit(limit)]
         except Exception as e:
             self.logger.error("Failed to get referrals by status", status=status, error=str(e))
             return []
     
-    def get_referrals_by_specialty(self, specialty: str, limit: int = 50) -> List[MedicalReferral]:
+    def get_referrals_by_statuses(self, statuses: List[str]) -> List[ReferralDTO]:
+        """Get referrals in any of the given statuses"""
+        try:
+            with self._session() as session:
+                return [ReferralDTO.from_orm(referral) for referral in
+                        session.query(MedicalReferral).filter(MedicalReferral.status.in_(statuses))]
+        except Exception as e:
+            self.logger.error("Failed to get referrals by status", statuses=statuses, error=str(e))
+            return []
+    
+    def get_referrals_by_specialty(self, specialty: str, limit: int = 50) -> List[ReferralDTO]:
         """Get referrals by specialty"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(MedicalReferral).filter_by(
+            with self._session() as session:
+                return [ReferralDTO.from_orm(referral) for referral in session.query(MedicalReferral).filter_by(
                     specialty_requested=specialty
-                ).order_by(MedicalReferral.referral_date.desc()).limit(limit).all()
+                ).order_by(MedicalReferral.referral_date.desc()).limit(limit)]
         except Exception as e:
             self.logger.error("Failed to get referrals by specialty", specialty=specialty, error=str(e))
             return []
@@ -428,7 +674,7 @@ class ReferralRepository:
     def update_referral_status(self, referral_id: int, status: str, notes: str = None) -> bool:
         """Update referral status"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 referral = session.query(MedicalReferral).filter_by(id=referral_id).first()
                 if referral:
                     referral.status = status
@@ -440,22 +686,25 @@ class ReferralRepository:
             self.logger.error("Failed to update referral status", referral_id=referral_id, error=str(e))
             return False
 
-    def count_referrals(self, status: str = None) -> int:
-        """Count referrals with optional status filter"""
+    def count_referrals(self, status: str = None, priority: str = None) -> int:
+        """Count referrals with optional status and priority filters"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 query = session.query(MedicalReferral)
                 if status:
                     query = query.filter(MedicalReferral.status == status)
+                if priority:
+                    query = query.filter(MedicalReferral.priority_level == priority)
                 return query.count()
         except Exception as e:
             self.logger.error("Failed to count referrals", status=status, error=str(e))
             return 0
 
-    def get_referrals(self, skip: int = 0, limit: int = 50, status: str = None, priority: str = None) -> List[MedicalReferral]:
-        """Get referrals with pagination and filtering"""
+    def get_referrals(self, limit: int = 50, status: str = None, priority: str = None,
+                      cursor: str = None) -> Page:
+        """Get a page of referrals, newest first, after cursor; raises InvalidCursor"""
         try:
-            with self.db_manager.get_session() as session:
+            with self._session() as session:
                 query = session.query(MedicalReferral)
 
                 if status:
@@ -463,29 +712,64 @@ class ReferralRepository:
                 if priority:
                     query = query.filter(MedicalReferral.priority_level == priority)
 
-                return query.order_by(MedicalReferral.created_at.desc()).offset(skip).limit(limit).all()
+                referrals, next_cursor = keyset_page(query, MedicalReferral, cursor, limit)
+                return Page([ReferralDTO.from_orm(referral) for referral in referrals], next_cursor, limit)
+        except InvalidCursor:
+            raise
         except Exception as e:
-            self.logger.error("Failed to get referrals", skip=skip, limit=limit, status=status, priority=priority, error=str(e))
-            return []
+            self.logger.error("Failed to get referrals", limit=limit, status=status, priority=priority, error=str(e))
+            return Page(limit=limit)
 
-    def get_referral_by_id(self, referral_id: int) -> Optional[MedicalReferral]:
+    def get_referral_by_id(self, referral_id: int) -> Optional[ReferralDTO]:
         """Get referral by ID"""
         try:
-            with self.db_manager.get_session() as session:
-                return session.query(MedicalReferral).filter(MedicalReferral.id == referral_id).first()
+            with self._session() as session:
+                return to_dto(ReferralDTO, session.query(MedicalReferral).filter(MedicalReferral.id == referral_id).first())
         except Exception as e:
             self.logger.error("Failed to get referral by ID", referral_id=referral_id, error=str(e))
             return None
 
+class UnitOfWork:
+    """
+    One session, and one pooled connection, shared by every repository call
+    of a request or pipeline stage
+    
+    Usage:
+        with db_manager.unit_of_work() as uow:
+            referrals = uow.referrals.get_referrals_by_status("pending")
+            patients = uow.patients.get_patients_by_ids([r.patient_record_id for r in referrals])
+    
+    Commits when the block exits normally and rolls back if it raises. The
+    connection is checked out on the first query and returned on exit.
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, session: Session):
+        self.session = session
+        self.emails = EmailRepository(db_manager, session)
+        self.attachments = AttachmentRepository(db_manager, session)
+        self.patients = PatientRepository(db_manager, session)
+        self.referrals = ReferralRepository(db_manager, session)
+    
+    def flush(self):
+        """Write pending changes without committing, e.g. to get generated IDs"""
+        self.session.flush()
+
 class CacheManager:
     """
     Redis-based caching manager
     """
     
     def __init__(self, redis_client):
-        self.redis_client = redis_client
+        # A DatabaseManager may be passed instead of a client; its Redis connection opens on first use
+        self._redis_source = redis_client
         self.logger = logger.bind(component="cache_manager")
     
+    @property
+    def redis_client(self):
+        if isinstance(self._redis_source, DatabaseManager):
+            return self._redis_source.redis_client
+        return self._redis_source
+    
     def get(self, key: str) -> Optional[str]:
         """Get value from cache"""
         try:
@@ -534,4 +818,4 @@ email_repo = EmailRepository(db_manager)
 attachment_repo = AttachmentRepository(db_manager)
 patient_repo = PatientRepository(db_manager)
 referral_repo = ReferralRepository(db_manager)
-cache_manager = CacheManager(db_manager.redis_client)
+cache_manager = CacheManager(db_manager)
@@ -0,0 +1,142 @@
+"""
+Database Connection Pool for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+import structlog
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from config import DATABASE_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+class PoolMetrics:
+    """Checkout counts and the time callers waited for a connection"""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)  # Recent waits, for percentiles
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            self._recent.append(wait)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            recent = sorted(self._recent)
+            attempts = self.checkouts + self.timeouts
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / attempts * 1000, 3) if attempts else 0.0,
+                'p95_wait_ms': round(recent[min(int(len(recent) * 0.95), len(recent) - 1)] * 1000, 3) if recent else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that measures how long each checkout waits, pre-ping included"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            self.metrics.record(time.perf_counter() - started, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; keep counting across it
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+def create_pooled_engine(url: str, **kwargs) -> Engine:
+    """
+    Engine with the pool sized from DATABASE_CONFIG
+
+    Keyword arguments override the configured pool settings or are passed
+    on to create_engine (connect_args, echo, ...).
+    """
+    options = {
+        'poolclass': MeteredQueuePool,
+        'pool_size': DATABASE_CONFIG["POOL_SIZE"],
+        'max_overflow': DATABASE_CONFIG["MAX_OVERFLOW"],
+        'pool_timeout': DATABASE_CONFIG["POOL_TIMEOUT"],
+        'pool_recycle': DATABASE_CONFIG["POOL_RECYCLE"],
+        'pool_pre_ping': DATABASE_CONFIG["POOL_PRE_PING"],
+    }
+    options.update(kwargs)
+    return create_engine(url, **options)
+
+_engines: Dict[str, Engine] = {}
+_engines_lock = threading.Lock()
+
+def get_engine(url: Optional[str] = None, **kwargs) -> Engine:
+    """
+    The process-wide pooled engine for url (DATABASE_CONFIG["URL"] by default)
+
+    Every caller asking for the same URL shares one engine and pool; the
+    keyword arguments only apply when the engine is first created.
+    """
+    url = url or DATABASE_CONFIG["URL"]
+    engine = _engines.get(url)
+    if engine is None:
+        with _engines_lock:
+            engine = _engines.get(url)
+            if engine is None:
+                engine = create_pooled_engine(url, **kwargs)
+                _engines[url] = engine
+                logger.info("Database connection pool created", dialect=engine.dialect.name,
+                            pool_size=engine.pool.size())
+    return engine
+
+def pooled_connection(url: Optional[str] = None, **kwargs):
+    """
+    A DBAPI connection checked out from the shared pool
+
+    For code written against a driver's connect(); calling close() on it
+    returns the connection to the pool instead of closing it.
+    """
+    return get_engine(url, **kwargs).raw_connection()
+
+def pool_status(engine: Engine) -> Dict[str, Any]:
+    """Live pool usage: size, connections checked out, overflow and checkout waits"""
+    pool = engine.pool
+    status = {'pool_class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0),
+            'max_overflow': pool._max_overflow,
+            'timeout_seconds': pool.timeout()
+        })
+    metrics = getattr(pool, 'metrics', None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
@@ -0,0 +1,40 @@
+"""
+Data Transfer Objects for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from dataclasses import asdict, make_dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import inspect
+
+from models import EmailMessage, EmailAttachment, PatientRecord, MedicalReferral
+
+def _dto_class(name: str, model, doc: str):
+    """
+    Frozen dataclass with one field per mapped column of model
+
+    Instances hold plain values copied while the session is open, so they
+    stay readable after it closes and never trigger lazy loads.
+    """
+    columns = [attr.key for attr in inspect(model).column_attrs]
+
+    def from_orm(cls, obj):
+        return cls(**{key: getattr(obj, key) for key in columns})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    return make_dataclass(
+        name, [(key, Optional[Any], None) for key in columns], frozen=True,
+        namespace={'__doc__': doc, 'from_orm': classmethod(from_orm), 'to_dict': to_dict}
+    )
+
+EmailDTO = _dto_class("EmailDTO", EmailMessage, "Email message as returned by EmailRepository")
+AttachmentDTO = _dto_class("AttachmentDTO", EmailAttachment, "Email attachment as returned by AttachmentRepository")
+PatientDTO = _dto_class("PatientDTO", PatientRecord, "Patient record as returned by PatientRepository")
+ReferralDTO = _dto_class("ReferralDTO", MedicalReferral, "Medical referral as returned by ReferralRepository")
+
+def to_dto(dto_class, obj):
+    """DTO for an ORM object, None when there is none"""
+    return dto_class.from_orm(obj) if obj is not None else None
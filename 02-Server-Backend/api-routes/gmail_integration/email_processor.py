@@ -11,34 +11,82 @@ from datetime import datetime
 from pathlib import Path
 import structlog
 
-from models import EmailMessage, EmailAttachment, ProcessingLog, PatientRecord, MedicalReferral
-from config import EMAIL_CONFIG, MEDICAL_PATTERNS, PROCESSING_CONFIG
+from sqlalchemy import insert, inspect
+
+from models import EmailMessage, EmailAttachment, PatientRecord, MedicalReferral
+from config import EMAIL_CONFIG, PROCESSING_CONFIG
 from text_extractor import TextExtractor
 from medical_classifier import MedicalClassifier
+from medical_extraction import medical_extractor, REFERRAL_FIELDS
+from blob_store import BlobStore
+from step_log import StepLogWriter, step_log as default_step_log, step_row, timed_step
 
 logger = structlog.get_logger(__name__)
 
+class _BatchBuffer:
+    """
+    Rows kept until a batch commits
+    
+    Rows of the message being processed are kept apart until its savepoint
+    is released, so a failed message leaves nothing behind.
+    """
+    
+    def __init__(self):
+        self.log_rows: List[Dict[str, Any]] = []
+        self.attachments: List[EmailAttachment] = []
+        self.extractions: Dict[str, EmailAttachment] = {}  # file_hash -> attachment with extracted text
+        self.entity_texts: List[Tuple[EmailMessage, str]] = []  # Referral texts for one NLP pass
+        self.message_logs: List[Dict[str, Any]] = []
+        self.message_attachments: List[EmailAttachment] = []
+        self.message_entity_texts: List[Tuple[EmailMessage, str]] = []
+    
+    def begin_message(self):
+        self.message_logs = []
+        self.message_attachments = []
+        self.message_entity_texts = []
+    
+    def keep_message(self):
+        self.log_rows.extend(self.message_logs)
+        self.attachments.extend(self.message_attachments)
+        self.entity_texts.extend(self.message_entity_texts)
+        for attachment in self.message_attachments:
+            if attachment.file_hash and attachment.extracted_text is not None:
+                self.extractions.setdefault(attachment.file_hash, attachment)
+        self.begin_message()
+
 class EmailProcessor:
     """
     Main email processing engine that coordinates all processing steps
     """
     
-    def __init__(self, db_session, file_storage_path: Path):
+    def __init__(self, db_session, file_storage_path: Path,
+                 text_extractor: Optional[TextExtractor] = None,
+                 medical_classifier: Optional[MedicalClassifier] = None,
+                 blob_store: Optional[BlobStore] = None,
+                 step_log: Optional[StepLogWriter] = None):
         self.db_session = db_session
         self.file_storage_path = file_storage_path
-        self.text_extractor = TextExtractor()
-        self.medical_classifier = MedicalClassifier()
+        self.text_extractor = text_extractor or TextExtractor()
+        self.medical_classifier = medical_classifier or MedicalClassifier()
+        self.blob_store = blob_store or BlobStore(file_storage_path / "blobs")
+        self.step_log = step_log or default_step_log
         self.logger = logger.bind(component="email_processor")
+        self._batch: Optional[_BatchBuffer] = None  # Set while process_emails_batch runs
+        self._step_rows: List[Dict[str, Any]] = []  # Step rows of the email being processed
         
         # Ensure storage directory exists
         self.file_storage_path.mkdir(parents=True, exist_ok=True)
     
-    def process_email(self, parsed_message: Dict[str, Any]) -> Optional[EmailMessage]:
+    def process_email(self, parsed_message: Dict[str, Any], reprocess: bool = False) -> Optional[EmailMessage]:
         """
         Main method to process a complete email message
         
+        A stored record that is not completed yet (e.g. the pending row the
+        ingestion pipeline stores first) is processed in place.
+        
         Args:
             parsed_message: Parsed Gmail message from GmailClient
+            reprocess: Process completed records again as well
             
         Returns:
             EmailMessage instance or None if processing failed
@@ -48,41 +96,19 @@ class EmailProcessor:
         
         # Check if email already exists
         existing_email = self.db_session.query(EmailMessage).filter_by(gmail_id=gmail_id).first()
-        if existing_email:
+        if existing_email and not self._needs_processing(existing_email, reprocess):
             self.logger.info("Email already processed", gmail_id=gmail_id)
             return existing_email
         
+        self._step_rows = []
         try:
-            # Create email record
-            email_message = self._create_email_record(parsed_message)
-            self.db_session.add(email_message)
-            self.db_session.flush()  # Get the ID
-            
-            # Log processing start
-            self._log_processing_step(email_message.id, "email_creation", "completed", 
-                                    "Email record created successfully")
-            
-            # Process email content
-            self._process_email_content(email_message, parsed_message)
-            
-            # Process attachments
-            if parsed_message.get('attachments'):
-                self._process_attachments(email_message, parsed_message['attachments'])
-            
-            # Classify as medical referral
-            self._classify_medical_referral(email_message)
+            # Create email record, or reuse the stored one
+            email_message, parsed_message = self._prepare_email_record(parsed_message, existing_email)
             
-            # Extract medical data if it's a referral
-            if email_message.is_medical_referral:
-                self._extract_medical_data(email_message)
-                self._create_patient_record(email_message)
-                self._create_referral_record(email_message)
-            
-            # Update processing status
-            email_message.processing_status = "completed"
-            email_message.date_processed = datetime.now()
+            self._run_processing_steps(email_message, parsed_message)
             
             self.db_session.commit()
+            self._publish_steps()
             
             self.logger.info("Email processing completed successfully", 
                            gmail_id=gmail_id, email_id=email_message.id)
@@ -92,6 +118,7 @@ class EmailProcessor:
         except Exception as e:
             self.logger.error("Email processing failed", gmail_id=gmail_id, error=str(e))
             self.db_session.rollback()
+            self._step_rows = []
             
             # Update error status if email record exists
             if 'email_message' in locals():
@@ -99,33 +126,265 @@ class EmailProcessor:
                 email_message.processing_error = str(e)
                 self._log_processing_step(email_message.id, "processing", "error", str(e))
                 self.db_session.commit()
+                if inspect(email_message).persistent:
+                    self._publish_steps()
+                self._step_rows = []
             
             return None
     
+    def process_emails_batch(self, parsed_messages: List[Dict[str, Any]],
+                             reprocess: bool = False) -> List[Optional[EmailMessage]]:
+        """
+        Process several messages in one unit of work
+        
+        Each message runs inside a savepoint, so a failure only rolls back
+        that message, which is then stored with error status. Stored records
+        that are not completed are processed in place; completed ones are
+        returned as they are unless reprocess is set. Named entities of all
+        referrals are extracted in one pass through the NLP model.
+        Processing logs and attachments are inserted in bulk and the batch
+        commits once; step logs go to the step log writer after the commit.
+        If the batch itself cannot be written, every message is processed
+        again on its own with process_email.
+        
+        Args:
+            parsed_messages: Parsed Gmail messages from GmailClient
+            reprocess: Process completed records again as well
+            
+        Returns:
+            EmailMessage or None per message, in input order
+        """
+        if not parsed_messages:
+            return []
+        
+        gmail_ids = [message.get('gmail_id') for message in parsed_messages]
+        self.logger.info("Starting batch email processing", count=len(parsed_messages))
+        
+        try:
+            stored = {
+                email.gmail_id: email for email in self.db_session.query(EmailMessage).filter(
+                    EmailMessage.gmail_id.in_([gmail_id for gmail_id in gmail_ids if gmail_id])
+                ).all()
+            }
+            
+            self._batch = _BatchBuffer()
+            results = []
+            done = set()  # A message repeated in the batch is processed once
+            for gmail_id, parsed_message in zip(gmail_ids, parsed_messages):
+                existing = stored.get(gmail_id)
+                if existing is not None and (gmail_id in done or not self._needs_processing(existing, reprocess)):
+                    self.logger.info("Email already processed", gmail_id=gmail_id)
+                    results.append(existing)
+                    continue
+                
+                email_message = self._process_in_savepoint(parsed_message, existing)
+                if email_message is not None:
+                    stored[gmail_id] = email_message
+                done.add(gmail_id)
+                results.append(email_message)
+            
+            self._extract_batch_entities(self._batch)
+            self._write_batch(self._batch)
+            self.db_session.commit()
+            self.step_log.record_many(self._batch.log_rows)
+            
+        except Exception as e:
+            self.logger.error("Batch email processing failed, processing one by one", 
+                            count=len(parsed_messages), error=str(e))
+            self.db_session.rollback()
+            self._batch = None
+            return [self.process_email(parsed_message, reprocess=reprocess) for parsed_message in parsed_messages]
+        
+        finally:
+            self._batch = None
+        
+        self.logger.info("Batch email processing completed", count=len(parsed_messages),
+                       processed=sum(1 for result in results if result is not None))
+        return results
+    
+    def _process_in_savepoint(self, parsed_message: Dict[str, Any],
+                              existing: Optional[EmailMessage] = None) -> Optional[EmailMessage]:
+        """Process one message of a batch; on failure store it with error status"""
+        gmail_id = parsed_message.get('gmail_id')
+        self._batch.begin_message()
+        savepoint = self.db_session.begin_nested()
+        
+        try:
+            email_message, parsed_message = self._prepare_email_record(parsed_message, existing)
+            
+            self._run_processing_steps(email_message, parsed_message)
+            
+            savepoint.commit()
+            self._batch.keep_message()
+            return email_message
+            
+        except Exception as e:
+            self.logger.error("Email processing failed", gmail_id=gmail_id, error=str(e))
+            savepoint.rollback()
+            self._batch.begin_message()
+            self._store_failed_email(parsed_message, str(e), existing)
+            return None
+    
+    def _store_failed_email(self, parsed_message: Dict[str, Any], error: str,
+                            existing: Optional[EmailMessage] = None):
+        """Keep the email with error status after its savepoint was rolled back"""
+        savepoint = self.db_session.begin_nested()
+        try:
+            email_message = existing
+            if email_message is None:
+                email_message = self._create_email_record(parsed_message)
+                self.db_session.add(email_message)
+            email_message.processing_status = "error"
+            email_message.processing_error = error
+            self.db_session.flush()
+            self._log_processing_step(email_message.id, "processing", "error", error)
+            savepoint.commit()
+            self._batch.keep_message()
+        except Exception as e:
+            savepoint.rollback()
+            self._batch.begin_message()
+            self.logger.error("Failed to store email error status", 
+                            gmail_id=parsed_message.get('gmail_id'), error=str(e))
+    
+    def _extract_batch_entities(self, batch: _BatchBuffer):
+        """Named entities for every referral of the batch, piped through the NLP model at once"""
+        if not batch.entity_texts:
+            return
+        
+        try:
+            entities = self.medical_classifier.extract_medical_entities_batch(
+                [text for _, text in batch.entity_texts]
+            )
+            if len(entities) != len(batch.entity_texts):
+                raise ValueError(f"{len(entities)} entity results for {len(batch.entity_texts)} texts")
+            for (email_message, _), found in zip(batch.entity_texts, entities):
+                self._store_entities(email_message, found)
+        except Exception as e:
+            # Entities are supplementary; the referrals are kept without them
+            self.logger.error("Batch entity extraction failed", count=len(batch.entity_texts), error=str(e))
+    
+    def _store_entities(self, email_message: EmailMessage, entities: Dict[str, List[str]]):
+        # Reassigned, not mutated, so the JSON column is written
+        email_message.extracted_data = dict(email_message.extracted_data or {}, entities=entities)
+    
+    def _write_batch(self, batch: _BatchBuffer):
+        """Insert the buffered attachments in one statement"""
+        if batch.attachments:
+            # Unset columns are left out so their defaults apply
+            columns = [column.key for column in EmailAttachment.__table__.columns]
+            rows = []
+            for attachment in batch.attachments:
+                values = {key: getattr(attachment, key) for key in columns}
+                rows.append({key: value for key, value in values.items() if value is not None})
+            self.db_session.execute(insert(EmailAttachment), rows)
+    
+    def _run_processing_steps(self, email_message: EmailMessage, parsed_message: Dict[str, Any]):
+        """Content, attachments, classification and extraction for a stored email record"""
+        # Log processing start
+        self._log_processing_step(email_message.id, "email_creation", "completed", 
+                                "Email record created successfully")
+        
+        # Process email content
+        self._process_email_content(email_message, parsed_message)
+        
+        # Process attachments
+        if parsed_message.get('attachments'):
+            self._process_attachments(email_message, parsed_message['attachments'])
+        
+        # Classify as medical referral
+        self._classify_medical_referral(email_message)
+        
+        # Extract medical data if it's a referral
+        if email_message.is_medical_referral:
+            self._extract_medical_data(email_message)
+            self._create_patient_record(email_message)
+            self._create_referral_record(email_message)
+        
+        # Update processing status
+        email_message.processing_status = "completed"
+        email_message.date_processed = datetime.now()
+    
+    def _needs_processing(self, email_message: EmailMessage, reprocess: bool) -> bool:
+        return reprocess or email_message.processing_status != "completed"
+    
+    def _email_fields(self, parsed_message: Dict[str, Any]) -> Dict[str, Any]:
+        """EmailMessage column values taken from a parsed message"""
+        return {
+            'gmail_id': parsed_message['gmail_id'],
+            'thread_id': parsed_message['thread_id'],
+            'subject': parsed_message['subject'],
+            'sender_email': parsed_message['sender_email'],
+            'sender_name': parsed_message['sender_name'],
+            'recipient_email': parsed_message['recipient_email'],
+            'date_received': parsed_message['date_received'],
+            'body_text': parsed_message['body_text'],
+            'body_html': parsed_message['body_html'],
+            'snippet': parsed_message['snippet'],
+        }
+    
     def _create_email_record(self, parsed_message: Dict[str, Any]) -> EmailMessage:
         """Create EmailMessage database record"""
         email_message = EmailMessage(
-            gmail_id=parsed_message['gmail_id'],
-            thread_id=parsed_message['thread_id'],
-            subject=parsed_message['subject'],
-            sender_email=parsed_message['sender_email'],
-            sender_name=parsed_message['sender_name'],
-            recipient_email=parsed_message['recipient_email'],
-            date_received=parsed_message['date_received'],
-            body_text=parsed_message['body_text'],
-            body_html=parsed_message['body_html'],
-            snippet=parsed_message['snippet'],
+            **self._email_fields(parsed_message),
             processing_status="processing"
         )
         
         return email_message
     
+    def _prepare_email_record(self, parsed_message: Dict[str, Any],
+                              existing: Optional[EmailMessage]) -> Tuple[EmailMessage, Dict[str, Any]]:
+        """
+        Email record to process: a new one, or the stored one refreshed from the message
+        
+        Attachments of an earlier run are removed, releasing their blobs;
+        processing creates them again, finding the stored blobs through the
+        content hashes handed on to the message. Returns the record and the
+        message to process.
+        """
+        if existing is None:
+            email_message = self._create_email_record(parsed_message)
+            self.db_session.add(email_message)
+        else:
+            email_message = existing
+            for key, value in self._email_fields(parsed_message).items():
+                setattr(email_message, key, value)
+            email_message.processing_status = "processing"
+            email_message.processing_error = None
+            
+            if email_message.attachments:
+                parsed_message = self._with_stored_hashes(parsed_message, email_message.attachments)
+                for attachment in email_message.attachments:
+                    if attachment.file_hash:
+                        self.blob_store.release_reference(self.db_session, attachment.file_hash)
+                email_message.attachments.clear()  # Deleted on flush (delete-orphan)
+                self.db_session.flush()
+                # Reloaded on next access, with the attachments this run adds
+                self.db_session.expire(email_message, ['attachments'])
+        
+        self.db_session.flush()  # Get the ID
+        return email_message, parsed_message
+    
+    def _with_stored_hashes(self, parsed_message: Dict[str, Any],
+                            attachments: List[EmailAttachment]) -> Dict[str, Any]:
+        """Copy of the message whose attachments carry the content hash stored by an earlier run"""
+        stored = {}
+        for attachment in attachments:
+            if attachment.file_hash:
+                stored.setdefault(attachment.attachment_id, attachment)
+                stored.setdefault(attachment.original_filename, attachment)
+        
+        attachment_infos = []
+        for attachment_info in parsed_message.get('attachments') or []:
+            previous = stored.get(attachment_info.get('attachment_id')) or stored.get(attachment_info.get('filename'))
+            if previous and not attachment_info.get('file_hash'):
+                attachment_info = dict(attachment_info, file_hash=previous.file_hash,
+                                       size=previous.file_size or attachment_info.get('size'))
+            attachment_infos.append(attachment_info)
+        return dict(parsed_message, attachments=attachment_infos)
+    
     def _process_email_content(self, email_message: EmailMessage, parsed_message: Dict[str, Any]):
         """Process email text content for medical information"""
-        try:
-            self._log_processing_step(email_message.id, "content_processing", "started", 
-                                    "Processing email content")
-            
+        with self._step(email_message.id, "content_processing") as step:
             # Combine subject and body for analysis
             full_text = f"{email_message.subject}\n\n{email_message.body_text}"
             
@@ -136,28 +395,15 @@ class EmailProcessor:
             email_message.patient_data = extracted_data.get('patient_data', {})
             email_message.medical_data = extracted_data.get('medical_data', {})
             
-            self._log_processing_step(email_message.id, "content_processing", "completed", 
-                                    f"Extracted {len(extracted_data)} data fields")
-            
-        except Exception as e:
-            self._log_processing_step(email_message.id, "content_processing", "error", str(e))
-            raise
+            step.message = f"Extracted {len(extracted_data)} data fields"
     
     def _process_attachments(self, email_message: EmailMessage, attachments_info: List[Dict[str, Any]]):
         """Process all email attachments"""
-        try:
-            self._log_processing_step(email_message.id, "attachment_processing", "started", 
-                                    f"Processing {len(attachments_info)} attachments")
-            
+        with self._step(email_message.id, "attachment_processing") as step:
             for attachment_info in attachments_info:
                 self._process_single_attachment(email_message, attachment_info)
             
-            self._log_processing_step(email_message.id, "attachment_processing", "completed", 
-                                    "All attachments processed")
-            
-        except Exception as e:
-            self._log_processing_step(email_message.id, "attachment_processing", "error", str(e))
-            raise
+            step.message = f"{len(attachments_info)} attachments processed"
     
     def _process_single_attachment(self, email_message: EmailMessage, attachment_info: Dict[str, Any]):
         """Process a single email attachment"""
@@ -176,16 +422,48 @@ class EmailProcessor:
                 processing_status="processing"
             )
             
-            self.db_session.add(attachment)
-            self.db_session.flush()
+            if self._batch is not None:
+                # Inserted in bulk with the batch; the Gmail attachment ID names the file
+                self._batch.message_attachments.append(attachment)
+                file_key = attachment_info['attachment_id']
+            else:
+                self.db_session.add(attachment)
+                self.db_session.flush()
+                file_key = attachment.id
             
-            # Download and save file (this would be done by the Gmail client)
-            # For now, we'll simulate the file path
-            file_path = self._generate_file_path(email_message.id, attachment.id, filename)
+            # Use the file saved by the download stage when available
+            if attachment_info.get('local_file_path'):
+                file_path = Path(attachment_info['local_file_path'])
+            else:
+                file_path = self._generate_file_path(email_message.id, file_key, filename)
+            
+            # File hash for integrity, computed during download when possible
+            file_hash = attachment_info.get('file_hash') or self._generate_file_hash(file_path)
+            attachment.file_hash = file_hash
+            
+            # Keep a single physical copy per content hash; content stored by
+            # an earlier run is found by its hash once the download is gone
+            if file_hash and (file_path.exists() or self.blob_store.exists(file_hash)):
+                if file_path.exists():
+                    file_path = self.blob_store.store_file(file_path, file_hash)
+                else:
+                    file_path = self.blob_store.blob_path(file_hash)
+                self.blob_store.add_reference(self.db_session, file_hash, 
+                                              attachment_info['size'], attachment_info['mime_type'])
             attachment.file_path = str(file_path)
             
-            # Extract text from attachment
-            extracted_text = self.text_extractor.extract_text(file_path, attachment_info['mime_type'])
+            # Reuse text already extracted from identical content
+            previous = self._find_previous_extraction(file_hash, attachment.id) if file_hash else None
+            if previous:
+                self.logger.debug("Reusing extracted text from identical attachment", 
+                                filename=filename, source_attachment_id=previous.id)
+                extracted_text = previous.extracted_text
+                attachment.ocr_text = previous.ocr_text
+                attachment.extraction_method = previous.extraction_method
+                attachment.extraction_confidence = previous.extraction_confidence
+            else:
+                extracted_text = self.text_extractor.extract_text(file_path, attachment_info['mime_type'], 
+                                                                  file_hash=file_hash)
             attachment.extracted_text = extracted_text
             
             # Classify document type
@@ -196,9 +474,6 @@ class EmailProcessor:
             attachment.contains_patient_data = self._contains_patient_data(extracted_text)
             attachment.contains_medical_data = self._contains_medical_data(extracted_text)
             
-            # Generate file hash for integrity
-            attachment.file_hash = self._generate_file_hash(file_path)
-            
             attachment.processing_status = "completed"
             
         except Exception as e:
@@ -209,17 +484,9 @@ class EmailProcessor:
     
     def _classify_medical_referral(self, email_message: EmailMessage):
         """Classify if email is a medical referral"""
-        try:
-            self._log_processing_step(email_message.id, "medical_classification", "started", 
-                                    "Classifying email as medical referral")
-            
-            # Combine all text content
-            all_text = f"{email_message.subject}\n{email_message.body_text}"
-            
-            # Add attachment text
-            for attachment in email_message.attachments:
-                if attachment.extracted_text:
-                    all_text += f"\n{attachment.extracted_text}"
+        with self._step(email_message.id, "medical_classification") as step:
+            # Combine all text content, attachment text included
+            all_text = self._combined_text(email_message)
             
             # Use medical classifier
             is_referral, referral_type, priority = self.medical_classifier.classify_referral(all_text)
@@ -228,24 +495,13 @@ class EmailProcessor:
             email_message.referral_type = referral_type
             email_message.priority_level = priority
             
-            self._log_processing_step(email_message.id, "medical_classification", "completed", 
-                                    f"Classified as referral: {is_referral}")
-            
-        except Exception as e:
-            self._log_processing_step(email_message.id, "medical_classification", "error", str(e))
-            raise
+            step.message = f"Classified as referral: {is_referral}"
     
     def _extract_medical_data(self, email_message: EmailMessage):
         """Extract detailed medical information from email and attachments"""
-        try:
-            self._log_processing_step(email_message.id, "medical_extraction", "started", 
-                                    "Extracting medical data")
-            
+        with self._step(email_message.id, "medical_extraction") as step:
             # Combine all text
-            all_text = f"{email_message.subject}\n{email_message.body_text}"
-            for attachment in email_message.attachments:
-                if attachment.extracted_text:
-                    all_text += f"\n{attachment.extracted_text}"
+            all_text = self._combined_text(email_message)
             
             # Extract medical information
             medical_data = self._extract_medical_info_from_text(all_text)
@@ -265,12 +521,24 @@ class EmailProcessor:
             email_message.referring_institution = medical_data.get('referring_institution')
             email_message.referring_physician = medical_data.get('referring_physician')
             
-            self._log_processing_step(email_message.id, "medical_extraction", "completed", 
-                                    "Medical data extracted")
+            # Named entities; a batch extracts them for all its referrals at once
+            if self._batch is not None:
+                self._batch.message_entity_texts.append((email_message, all_text))
+            else:
+                self._store_entities(email_message, self.medical_classifier.extract_medical_entities(all_text))
             
-        except Exception as e:
-            self._log_processing_step(email_message.id, "medical_extraction", "error", str(e))
-            raise
+            step.message = "Medical data extracted"
+    
+    def _combined_text(self, email_message: EmailMessage) -> str:
+        """Subject, body and extracted attachment text of an email"""
+        attachments = (self._batch.message_attachments if self._batch is not None 
+                       else email_message.attachments)
+        
+        all_text = f"{email_message.subject}\n{email_message.body_text}"
+        for attachment in attachments:
+            if attachment.extracted_text:
+                all_text += f"\n{attachment.extracted_text}"
+        return all_text
     
     def _extract_medical_info_from_text(self, text: str) -> Dict[str, Any]:
         """Extract medical information using regex patterns"""
@@ -281,46 +549,26 @@ class EmailProcessor:
             'referring_physician': None
         }
         
-        text_lower = text.lower()
+        extraction = medical_extractor.extract(
+            text, fields=REFERRAL_FIELDS + ('REFERRING_INSTITUTION', 'REFERRING_PHYSICIAN')
+        )
         
         # Extract patient information
-        for field, patterns in MEDICAL_PATTERNS.items():
-            for pattern in patterns:
-                match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
-                if match:
-                    value = match.group(1).strip()
-                    
-                    if field in ['PATIENT_ID', 'AGE']:
-                        extracted_data['patient_data'][field.lower()] = value
-                    elif field == 'PATIENT_NAME':
-                        extracted_data['patient_data']['full_name'] = value
-                    else:
-                        extracted_data['medical_data'][field.lower()] = value
-                    break
-        
-        # Extract referring institution
-        institution_patterns = [
-            r"(?:hospital|clinica|eps|ips)[\s:]*([^.\n]+)",
-            r"(?:institucion|entidad)[\s:]*([^.\n]+)"
-        ]
-        
-        for pattern in institution_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                extracted_data['referring_institution'] = match.group(1).strip()
-                break
-        
-        # Extract referring physician
-        physician_patterns = [
-            r"(?:dr|dra|doctor|doctora|medico)[\s.]*([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)*)",
-            r"(?:firma|atiende|solicita)[\s:]*(?:dr|dra)?[\s.]*([A-ZÁÉÍÓÚÑ][a-záéíóúñ]+(?:\s+[A-ZÁÉÍÓÚÑ][a-záéíóúñ]+)*)"
-        ]
+        for field in REFERRAL_FIELDS:
+            value = extraction.get(field)
+            if value is None:
+                continue
+            
+            if field in ['PATIENT_ID', 'AGE']:
+                extracted_data['patient_data'][field.lower()] = value
+            elif field == 'PATIENT_NAME':
+                extracted_data['patient_data']['full_name'] = value
+            else:
+                extracted_data['medical_data'][field.lower()] = value
         
-        for pattern in physician_patterns:
-            match = re.search(pattern, text, re.IGNORECASE)
-            if match:
-                extracted_data['referring_physician'] = match.group(1).strip()
-                break
+        # Extract referring institution and physician
+        extracted_data['referring_institution'] = extraction.get('REFERRING_INSTITUTION')
+        extracted_data['referring_physician'] = extraction.get('REFERRING_PHYSICIAN')
         
         return extracted_data
     
@@ -361,27 +609,40 @@ class EmailProcessor:
             self.logger.error("Error creating patient record", error=str(e))
     
     def _create_referral_record(self, email_message: EmailMessage):
-        """Create medical referral record"""
+        """Create medical referral record, or refresh the one of an earlier run"""
         if not email_message.is_medical_referral:
             return
         
         try:
+            fields = {
+                'referral_type': email_message.referral_type or "interconsulta",
+                'specialty_requested': email_message.medical_data.get('specialty', 'medicina general'),
+                'priority_level': email_message.priority_level or "media",
+                'primary_diagnosis': email_message.medical_data.get('diagnosis'),
+                'clinical_summary': email_message.body_text[:1000],  # First 1000 chars
+                'reason_for_referral': email_message.medical_data.get('reason'),
+                'referring_hospital': email_message.referring_institution,
+                'referring_physician': email_message.referring_physician,
+                'referral_date': email_message.date_received,
+            }
+            
+            # Reprocessing keeps the referral's number and review status
+            referral = self.db_session.query(MedicalReferral).filter_by(
+                email_message_id=email_message.id
+            ).first()
+            if referral:
+                for key, value in fields.items():
+                    setattr(referral, key, value)
+                return
+            
             # Generate referral number
             referral_number = f"REF-{email_message.id}-{datetime.now().strftime('%Y%m%d')}"
             
             referral = MedicalReferral(
                 email_message_id=email_message.id,
                 referral_number=referral_number,
-                referral_type=email_message.referral_type or "interconsulta",
-                specialty_requested=email_message.medical_data.get('specialty', 'medicina general'),
-                priority_level=email_message.priority_level or "media",
-                primary_diagnosis=email_message.medical_data.get('diagnosis'),
-                clinical_summary=email_message.body_text[:1000],  # First 1000 chars
-                reason_for_referral=email_message.medical_data.get('reason'),
-                referring_hospital=email_message.referring_institution,
-                referring_physician=email_message.referring_physician,
-                referral_date=email_message.date_received,
-                status="pending"
+                status="pending",
+                **fields
             )
             
             self.db_session.add(referral)
@@ -389,23 +650,25 @@ class EmailProcessor:
         except Exception as e:
             self.logger.error("Error creating referral record", error=str(e))
     
+    def _step(self, email_id: int, step_name: str):
+        """Time a processing step; its row is kept with the email's unit of work"""
+        return timed_step(self._keep_step_row, email_id, step_name)
+    
     def _log_processing_step(self, email_id: int, step_name: str, status: str, message: str):
-        """Log a processing step"""
-        log_entry = ProcessingLog(
-            email_message_id=email_id,
-            step_name=step_name,
-            status=status,
-            message=message,
-            start_time=datetime.now()
-        )
-        
-        if status in ["completed", "error"]:
-            log_entry.end_time = datetime.now()
-            if log_entry.start_time:
-                duration = (log_entry.end_time - log_entry.start_time).total_seconds()
-                log_entry.duration_seconds = duration
-        
-        self.db_session.add(log_entry)
+        """Log a processing event that has no duration"""
+        now = datetime.now()
+        self._keep_step_row(step_row(email_id, step_name, status, message, now, now))
+    
+    def _keep_step_row(self, row: Dict[str, Any]):
+        # Rows only reach the step log writer once the email they refer to is committed
+        if self._batch is not None:
+            self._batch.message_logs.append(row)
+        else:
+            self._step_rows.append(row)
+    
+    def _publish_steps(self):
+        self.step_log.record_many(self._step_rows)
+        self._step_rows = []
     
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename for safe storage"""
@@ -418,6 +681,16 @@ class EmailProcessor:
         safe_filename = self._sanitize_filename(filename)
         return self.file_storage_path / str(email_id) / f"{attachment_id}_{safe_filename}"
     
+    def _find_previous_extraction(self, file_hash: str, exclude_id: Optional[int]) -> Optional[EmailAttachment]:
+        """Find an earlier attachment with the same content and extracted text"""
+        if self._batch is not None and file_hash in self._batch.extractions:
+            return self._batch.extractions[file_hash]
+        return self.db_session.query(EmailAttachment).filter(
+            EmailAttachment.file_hash == file_hash,
+            EmailAttachment.extracted_text.isnot(None),
+            EmailAttachment.id != exclude_id
+        ).first()
+    
     def _generate_file_hash(self, file_path: Path) -> str:
         """Generate SHA-256 hash of file"""
         if not file_path.exists():
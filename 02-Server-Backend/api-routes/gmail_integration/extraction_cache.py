@@ -0,0 +1,133 @@
+"""
+Text Extraction Cache for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional
+import structlog
+
+from config import FILE_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+class ExtractionCache:
+    """
+    Durable cache of extraction results keyed by file content
+
+    Entries are keyed by (SHA-256, MIME type) inside a generation directory
+    named after the extractor version and a fingerprint of the OCR
+    configuration, so bumping the version or changing OCR_CONFIG starts a
+    fresh generation instead of serving text produced with other settings.
+    """
+
+    SUFFIX = ".json.gz"
+
+    def __init__(self, directory: Path = None, extractor_version: str = "1",
+                 ocr_config: Dict[str, Any] = None):
+        self.directory = Path(directory or FILE_CONFIG["EXTRACTION_CACHE"]["DIR"])
+        self.extractor_version = extractor_version
+        self.ocr_config = ocr_config if ocr_config is not None else FILE_CONFIG["OCR_CONFIG"]
+        self.logger = logger.bind(component="extraction_cache")
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'errors': 0}
+
+        self.generation = f"v{extractor_version}-{self._config_fingerprint()}"
+        self.generation_dir = self.directory / self.generation
+        self.generation_dir.mkdir(parents=True, exist_ok=True)
+
+    def _config_fingerprint(self) -> str:
+        """Short stable hash of the OCR configuration"""
+        data = json.dumps(self.ocr_config, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode('utf-8')).hexdigest()[:16]
+
+    def _path(self, sha256: str, mime_type: str) -> Path:
+        if not SHA256_RE.match(sha256 or ""):
+            raise ValueError(f"Invalid SHA-256: {sha256!r}")
+        mime_key = re.sub(r'[^\w\-]', '_', mime_type or "unknown")
+        return self.generation_dir / sha256[:2] / f"{sha256}.{mime_key}{self.SUFFIX}"
+
+    def _count(self, counter: str):
+        with self._lock:
+            self.stats[counter] += 1
+
+    def get(self, sha256: str, mime_type: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached extraction result
+
+        Returns:
+            Dict with text, confidence and method, or None on a miss
+        """
+        try:
+            with open(self._path(sha256, mime_type), 'rb') as f:
+                entry = json.loads(gzip.decompress(f.read()).decode('utf-8'))
+            self._count('hits')
+            return entry
+
+        except FileNotFoundError:
+            self._count('misses')
+            return None
+        except Exception as e:
+            self._count('errors')
+            self._count('misses')
+            self.logger.warning("Failed to read extraction cache entry", sha256=sha256, error=str(e))
+            return None
+
+    def put(self, sha256: str, mime_type: str, text: str, confidence: float, method: str) -> bool:
+        """Store an extraction result"""
+        try:
+            path = self._path(sha256, mime_type)
+            entry = {
+                'text': text,
+                'confidence': confidence,
+                'method': method,
+                'extractor_version': self.extractor_version,
+                'created_at': datetime.now().isoformat(),
+            }
+            data = gzip.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'), compresslevel=6)
+
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            self._count('stores')
+            return True
+
+        except Exception as e:
+            self._count('errors')
+            self.logger.error("Failed to store extraction cache entry", sha256=sha256, error=str(e))
+            return False
+
+    def purge_stale_generations(self) -> int:
+        """Delete entries written with another extractor version or OCR configuration"""
+        removed = 0
+        for path in self.directory.iterdir():
+            if path.is_dir() and path.name != self.generation:
+                shutil.rmtree(path, ignore_errors=True)
+                removed += 1
+
+        if removed:
+            self.logger.info("Purged stale extraction cache generations", count=removed)
+        return removed
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for this process"""
+        with self._lock:
+            stats = dict(self.stats)
+
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups * 100, 2) if lookups else 0.0
+        stats['generation'] = self.generation
+        return stats
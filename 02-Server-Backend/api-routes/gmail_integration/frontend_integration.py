@@ -11,7 +11,6 @@ from datetime import datetime
 import structlog
 
 from database import db_manager, email_repo, referral_repo
-from models import EmailMessage, EmailAttachment, PatientRecord, MedicalReferral
 from config import FRONTEND_CONFIG
 
 logger = structlog.get_logger(__name__)
@@ -52,28 +51,32 @@ class VitalRedIntegration:
         try:
             self.logger.info("Syncing new referrals to frontend")
             
-            # Get pending referrals from last sync
-            pending_referrals = referral_repo.get_referrals_by_status("pending", limit=50)
+            # Pending referrals and their emails, patients and attachments, in one session
+            with db_manager.unit_of_work() as uow:
+                pending_referrals = uow.referrals.get_referrals_by_status("pending", limit=50)
+                email_ids = [referral.email_message_id for referral in pending_referrals]
+                emails = uow.emails.get_emails_by_ids(email_ids)
+                patients = uow.patients.get_patients_by_ids(
+                    [referral.patient_record_id for referral in pending_referrals]
+                )
+                attachments = uow.attachments.get_attachments_by_emails(email_ids)
             
             for referral in pending_referrals:
-                await self._send_referral_to_frontend(referral)
+                await self._send_referral_to_frontend(
+                    referral,
+                    emails.get(referral.email_message_id),
+                    patients.get(referral.patient_record_id),
+                    attachments.get(referral.email_message_id, [])
+                )
             
             self.logger.info(f"Synced {len(pending_referrals)} referrals to frontend")
             
         except Exception as e:
             self.logger.error("Failed to sync referrals", error=str(e))
     
-    async def _send_referral_to_frontend(self, referral):
-        """Send individual referral to frontend"""
+    async def _send_referral_to_frontend(self, referral, email, patient, attachments):
+        """Send individual referral, with its already loaded email, patient and attachments, to frontend"""
         try:
-            # Get related email and patient data
-            with db_manager.get_session() as session:
-                email = session.query(EmailMessage).filter_by(id=referral.email_message_id).first()
-                patient = session.query(PatientRecord).filter_by(id=referral.patient_record_id).first()
-                attachments = session.query(EmailAttachment).filter_by(
-                    email_message_id=referral.email_message_id
-                ).all()
-            
             # Prepare referral data for frontend
             referral_data = {
                 "id": referral.id,
@@ -197,10 +200,7 @@ class VitalRedIntegration:
         """Sync referral status updates from frontend"""
         try:
             # Get referrals that might have been updated in frontend
-            with db_manager.get_session() as session:
-                referrals = session.query(MedicalReferral).filter(
-                    MedicalReferral.status.in_(["pending", "in_review", "assigned"])
-                ).all()
+            referrals = referral_repo.get_referrals_by_statuses(["pending", "in_review", "assigned"])
             
             for referral in referrals:
                 await self._check_referral_updates(referral)
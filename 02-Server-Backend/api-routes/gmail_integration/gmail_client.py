@@ -4,11 +4,15 @@ Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 """
 
 import os
+import json
 import pickle
 import base64
 import email
+import hashlib
+import re
+import unicodedata
 import logging
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Union
 from datetime import datetime, timedelta
 from pathlib import Path
 
@@ -36,6 +40,7 @@ class GmailClient:
         self.credentials_file = GMAIL_CONFIG["CREDENTIALS_FILE"]
         self.token_file = GMAIL_CONFIG["TOKEN_FILE"]
         self.application_name = GMAIL_CONFIG["APPLICATION_NAME"]
+        self.history_checkpoint_file = GMAIL_CONFIG["HISTORY_CHECKPOINT_FILE"]
         
         # Initialize logging
         self.logger = logger.bind(component="gmail_client")
@@ -120,6 +125,205 @@ class GmailClient:
             self.logger.error("Error fetching messages", error=str(e))
             return []
     
+    def list_all_messages(self, query: str = "") -> List[Dict[str, Any]]:
+        """
+        Page through every message matching a query
+        
+        Errors are raised rather than returning a partial listing, which
+        could otherwise be checkpointed as complete.
+        
+        Args:
+            query: Gmail search query
+            
+        Returns:
+            List of message stubs
+        """
+        if not self.service:
+            raise Exception("Gmail service not initialized")
+        
+        messages = []
+        page_token = None
+        
+        while True:
+            request_args = {
+                'userId': 'me',
+                'q': query,
+                'maxResults': GMAIL_CONFIG["LIST_PAGE_SIZE"],
+            }
+            if page_token:
+                request_args['pageToken'] = page_token
+            
+            response = self.service.users().messages().list(**request_args).execute()
+            messages.extend(response.get('messages', []))
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        self.logger.info(f"Listed {len(messages)} messages", query=query)
+        return messages
+    
+    def get_current_history_id(self) -> Optional[str]:
+        """Get the mailbox's current historyId from the user profile"""
+        try:
+            if not self.service:
+                raise Exception("Gmail service not initialized")
+            
+            profile = self.service.users().getProfile(userId='me').execute()
+            return str(profile['historyId'])
+            
+        except Exception as e:
+            self.logger.error("Error fetching current history id", error=str(e))
+            return None
+    
+    def load_history_checkpoint(self) -> Optional[str]:
+        """Load the last persisted historyId, if any"""
+        try:
+            if not self.history_checkpoint_file.exists():
+                return None
+            
+            with open(self.history_checkpoint_file, 'r') as f:
+                checkpoint = json.load(f)
+            
+            return checkpoint.get('history_id')
+            
+        except Exception as e:
+            self.logger.warning("Invalid history checkpoint, ignoring", error=str(e))
+            return None
+    
+    def save_history_checkpoint(self, history_id: str) -> bool:
+        """
+        Persist a historyId checkpoint
+        
+        Should only be called once the messages returned up to that
+        checkpoint have been stored, so a crash never skips mail.
+        """
+        try:
+            tmp_file = self.history_checkpoint_file.with_suffix('.tmp')
+            with open(tmp_file, 'w') as f:
+                json.dump({
+                    'history_id': str(history_id),
+                    'updated_at': datetime.now().isoformat()
+                }, f)
+            os.replace(tmp_file, self.history_checkpoint_file)
+            
+            self.logger.debug("History checkpoint saved", history_id=history_id)
+            return True
+            
+        except Exception as e:
+            self.logger.error("Error saving history checkpoint", 
+                            history_id=history_id, error=str(e))
+            return False
+    
+    def get_history_changes(self, start_history_id: str) -> Tuple[List[Dict[str, Any]], str]:
+        """
+        List messages added since a historyId
+        
+        The history API cannot be searched, so the stubs are marked
+        'unfiltered': the caller checks the fetched messages with
+        matches_referral_query().
+        
+        Args:
+            start_history_id: historyId checkpoint to start from
+            
+        Returns:
+            Tuple of (added message stubs, latest historyId)
+            
+        Raises:
+            HttpError: 404 if the checkpoint is too old to be served
+        """
+        if not self.service:
+            raise Exception("Gmail service not initialized")
+        
+        messages = []
+        seen_ids = set()
+        latest_history_id = str(start_history_id)
+        page_token = None
+        
+        while True:
+            request_args = {
+                'userId': 'me',
+                'startHistoryId': start_history_id,
+                'historyTypes': ['messageAdded'],
+                'maxResults': GMAIL_CONFIG["HISTORY_PAGE_SIZE"],
+            }
+            if GMAIL_CONFIG["HISTORY_LABEL_ID"]:
+                request_args['labelId'] = GMAIL_CONFIG["HISTORY_LABEL_ID"]
+            if page_token:
+                request_args['pageToken'] = page_token
+            
+            response = self.service.users().history().list(**request_args).execute()
+            
+            for record in response.get('history', []):
+                for added in record.get('messagesAdded', []):
+                    message = added.get('message', {})
+                    message_id = message.get('id')
+                    if not message_id or message_id in seen_ids:
+                        continue
+                    
+                    labels = message.get('labelIds', [])
+                    if 'SPAM' in labels or 'TRASH' in labels or 'DRAFT' in labels:
+                        continue
+                    
+                    seen_ids.add(message_id)
+                    messages.append({'id': message_id, 'threadId': message.get('threadId'), 'unfiltered': True})
+            
+            if response.get('historyId'):
+                latest_history_id = str(response['historyId'])
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        self.logger.info(f"Found {len(messages)} messages added since checkpoint",
+                        start_history_id=start_history_id, latest_history_id=latest_history_id)
+        
+        return messages, latest_history_id
+    
+    def sync_new_messages(self, query: str = "") -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Incrementally fetch new messages using the history API
+        
+        Uses the persisted checkpoint when available and falls back to a
+        full query listing when there is no checkpoint or it has expired.
+        The fallback reads every page, since everything before the returned
+        historyId is treated as seen. The returned historyId must be
+        committed with save_history_checkpoint() once the messages have
+        been stored.
+        
+        Args:
+            query: Gmail search query used for the full listing fallback
+            
+        Returns:
+            Tuple of (message stubs, historyId to checkpoint or None)
+        """
+        checkpoint = self.load_history_checkpoint()
+        
+        if checkpoint:
+            try:
+                return self.get_history_changes(checkpoint)
+            except HttpError as e:
+                if getattr(e, 'resp', None) is not None and e.resp.status == 404:
+                    self.logger.warning("History checkpoint expired, falling back to full sync",
+                                      history_id=checkpoint)
+                else:
+                    self.logger.error("HTTP error fetching history", error=str(e))
+                    return [], None
+            except Exception as e:
+                self.logger.error("Error fetching history", error=str(e))
+                return [], None
+        
+        # Read the current historyId before listing so nothing that arrives
+        # during the listing falls between the two
+        history_id = self.get_current_history_id()
+        try:
+            messages = self.list_all_messages(query)
+        except Exception as e:
+            self.logger.error("Error listing messages for full sync", error=str(e))
+            return [], None
+        
+        return messages, history_id
+    
     def get_message_details(self, message_id: str) -> Optional[Dict[str, Any]]:
         """
         Get detailed information for a specific message
@@ -194,6 +398,249 @@ class GmailClient:
                             message_id=message_id, attachment_id=attachment_id, error=str(e))
             return None
     
+    def _execute_batch(self, requests: List[Tuple[Any, Any]], chunk_size: int) -> Tuple[Dict[Any, Any], Dict[Any, str]]:
+        """
+        Execute API requests through the Gmail batch endpoint
+        
+        Args:
+            requests: List of (key, HttpRequest) pairs
+            chunk_size: Maximum number of sub-requests per batch call
+            
+        Returns:
+            Tuple of (responses by key, error messages by key)
+        """
+        results = {}
+        errors = {}
+        chunk_size = max(1, min(chunk_size, 100))  # Gmail rejects batches over 100
+        
+        for start in range(0, len(requests), chunk_size):
+            chunk = requests[start:start + chunk_size]
+            keys = {str(index): key for index, (key, _) in enumerate(chunk)}
+            
+            def callback(request_id, response, exception):
+                key = keys[request_id]
+                if exception is not None:
+                    errors[key] = str(exception)
+                else:
+                    results[key] = response
+            
+            batch = self.service.new_batch_http_request(callback=callback)
+            for index, (_, request) in enumerate(chunk):
+                batch.add(request, request_id=str(index))
+            
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole batch call failed; report it against every item
+                self.logger.error("Batch request failed", size=len(chunk), error=str(e))
+                for key in keys.values():
+                    if key not in results:
+                        errors.setdefault(key, str(e))
+        
+        return results, errors
+    
+    def get_messages_details_batch(self, message_ids: List[str], 
+                                   chunk_size: int = None) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Get detailed information for several messages using batch requests
+        
+        Args:
+            message_ids: Gmail message IDs
+            chunk_size: Messages per batch call (defaults to BATCH_REQUEST_SIZE)
+            
+        Returns:
+            Tuple of (message details by ID, error messages by ID)
+        """
+        try:
+            if not self.service:
+                raise Exception("Gmail service not initialized")
+            
+            message_ids = list(dict.fromkeys(message_ids))
+            if not message_ids:
+                return {}, {}
+            
+            self.logger.debug("Fetching message details in batch", count=len(message_ids))
+            
+            messages_api = self.service.users().messages()
+            requests = [
+                (message_id, messages_api.get(userId='me', id=message_id, format='full'))
+                for message_id in message_ids
+            ]
+            
+            details, errors = self._execute_batch(
+                requests, chunk_size or GMAIL_CONFIG["BATCH_REQUEST_SIZE"]
+            )
+            
+            if errors:
+                self.logger.warning("Some message details could not be fetched", 
+                                  failed=len(errors), total=len(message_ids))
+            
+            return details, errors
+            
+        except Exception as e:
+            self.logger.error("Error fetching message details in batch", error=str(e))
+            return {}, {message_id: str(e) for message_id in message_ids}
+    
+    def get_attachments_batch(self, pairs: List[Tuple[str, str]], chunk_size: int = None,
+                              decode: bool = True) -> Tuple[Dict[Tuple[str, str], Union[bytes, str]], Dict[Tuple[str, str], str]]:
+        """
+        Download several attachments using batch requests
+        
+        Args:
+            pairs: List of (message_id, attachment_id) pairs
+            chunk_size: Attachments per batch call (defaults to ATTACHMENT_BATCH_SIZE)
+            decode: Return decoded bytes; when False the base64url strings are
+                returned as-is for save_attachment_data()
+            
+        Returns:
+            Tuple of (attachment data by pair, error messages by pair)
+        """
+        try:
+            if not self.service:
+                raise Exception("Gmail service not initialized")
+            
+            pairs = list(dict.fromkeys(pairs))
+            if not pairs:
+                return {}, {}
+            
+            self.logger.debug("Downloading attachments in batch", count=len(pairs))
+            
+            attachments_api = self.service.users().messages().attachments()
+            requests = [
+                ((message_id, attachment_id), 
+                 attachments_api.get(userId='me', messageId=message_id, id=attachment_id))
+                for message_id, attachment_id in pairs
+            ]
+            
+            responses, errors = self._execute_batch(
+                requests, chunk_size or GMAIL_CONFIG["ATTACHMENT_BATCH_SIZE"]
+            )
+            
+            attachments = {}
+            for pair, response in responses.items():
+                try:
+                    if decode:
+                        attachments[pair] = base64.urlsafe_b64decode(response['data'].encode('UTF-8'))
+                    else:
+                        attachments[pair] = response['data']
+                except Exception as e:
+                    errors[pair] = f"Invalid attachment payload: {e}"
+            
+            if errors:
+                self.logger.warning("Some attachments could not be downloaded", 
+                                  failed=len(errors), total=len(pairs))
+            
+            return attachments, errors
+            
+        except Exception as e:
+            self.logger.error("Error downloading attachments in batch", error=str(e))
+            return {}, {pair: str(e) for pair in pairs}
+    
+    def save_attachment_data(self, encoded_data: Union[str, bytes], dest_path: Path,
+                             max_size: int = None) -> Optional[Dict[str, Any]]:
+        """
+        Decode base64url attachment data to a file in chunks
+        
+        SHA-256 and size are computed in the same pass, and writing stops as
+        soon as max_size is exceeded. The file is written under a temporary
+        name and only renamed into place once complete.
+        
+        Args:
+            encoded_data: base64url encoded attachment data
+            dest_path: Destination file path
+            max_size: Maximum decoded size in bytes (defaults to MAX_ATTACHMENT_SIZE)
+            
+        Returns:
+            Dict with path, sha256 and size, or None if aborted or failed
+        """
+        max_size = max_size or EMAIL_CONFIG["MAX_ATTACHMENT_SIZE"]
+        part_path = dest_path.with_name(dest_path.name + ".part")
+        chunk_chars = GMAIL_CONFIG["ATTACHMENT_DECODE_CHUNK"] // 4 * 4
+        
+        try:
+            data = memoryview(encoded_data.encode('ascii') if isinstance(encoded_data, str) else encoded_data)
+            hasher = hashlib.sha256()
+            size = 0
+            
+            with open(part_path, 'wb') as f:
+                for start in range(0, len(data), chunk_chars):
+                    chunk = bytes(data[start:start + chunk_chars])
+                    if start + chunk_chars >= len(data):
+                        chunk += b'=' * (-len(chunk) % 4)  # Gmail may omit padding
+                    
+                    decoded = base64.urlsafe_b64decode(chunk)
+                    size += len(decoded)
+                    if size > max_size:
+                        raise ValueError(f"Attachment exceeds maximum size of {max_size} bytes")
+                    
+                    hasher.update(decoded)
+                    f.write(decoded)
+            
+            os.replace(part_path, dest_path)
+            
+            return {'path': dest_path, 'sha256': hasher.hexdigest(), 'size': size}
+            
+        except Exception as e:
+            part_path.unlink(missing_ok=True)
+            self.logger.error("Error saving attachment data", path=str(dest_path), error=str(e))
+            return None
+    
+    def download_attachment_to_file(self, message_id: str, attachment_id: str, dest_path: Path,
+                                    max_size: int = None) -> Optional[Dict[str, Any]]:
+        """
+        Download an attachment straight to disk
+        
+        The API response is kept as raw bytes and only the base64 payload is
+        decoded, chunk by chunk, into the file; no JSON document or full
+        decoded copy of the attachment is ever built in memory.
+        
+        Args:
+            message_id: Gmail message ID
+            attachment_id: Gmail attachment ID
+            dest_path: Destination file path
+            max_size: Maximum decoded size in bytes (defaults to MAX_ATTACHMENT_SIZE)
+            
+        Returns:
+            Dict with path, sha256 and size, or None if error
+        """
+        try:
+            if not self.service:
+                raise Exception("Gmail service not initialized")
+            
+            self.logger.debug("Downloading attachment to file", 
+                            message_id=message_id, attachment_id=attachment_id)
+            
+            request = self.service.users().messages().attachments().get(
+                userId='me',
+                messageId=message_id,
+                id=attachment_id
+            )
+            request.postproc = lambda resp, content: content  # Skip JSON decoding
+            content = request.execute()
+            
+            match = re.search(rb'"data"\s*:\s*"', content)
+            if not match:
+                raise Exception("Attachment response has no data")
+            end = content.index(b'"', match.end())
+            
+            result = self.save_attachment_data(
+                memoryview(content)[match.end():end], dest_path, max_size
+            )
+            
+            if result:
+                self.logger.debug("Attachment downloaded successfully", 
+                                size=result['size'], path=str(dest_path))
+            return result
+            
+        except HttpError as e:
+            self.logger.error("HTTP error downloading attachment", 
+                            message_id=message_id, attachment_id=attachment_id, error=str(e))
+            return None
+        except Exception as e:
+            self.logger.error("Error downloading attachment", 
+                            message_id=message_id, attachment_id=attachment_id, error=str(e))
+            return None
+    
     def parse_message(self, message: Dict[str, Any]) -> Dict[str, Any]:
         """
         Parse Gmail message into structured format
@@ -393,3 +840,25 @@ class GmailClient:
         final_query += " -in:spam -in:trash"  # Exclude spam and trash
         
         return final_query
+    
+    def matches_referral_query(self, parsed_message: Dict[str, Any]) -> bool:
+        """
+        Check a parsed message against the criteria of build_referral_query()
+        
+        For listings that cannot be searched, such as history changes. Like
+        Gmail search, keywords are matched ignoring case and accents in the
+        subject, body and attachment names.
+        """
+        attachments = parsed_message.get('attachments') or []
+        if not attachments:
+            return False
+        
+        text = " ".join([parsed_message.get('subject') or "", parsed_message.get('body_text') or "",
+                         parsed_message.get('body_html') or ""] +
+                        [attachment.get('filename') or "" for attachment in attachments])
+        text = self._fold_accents(text)
+        return any(self._fold_accents(keyword) in text for keyword in EMAIL_CONFIG["REFERRAL_KEYWORDS"])
+    
+    def _fold_accents(self, text: str) -> str:
+        decomposed = unicodedata.normalize('NFKD', text.lower())
+        return "".join(char for char in decomposed if not unicodedata.combining(char))
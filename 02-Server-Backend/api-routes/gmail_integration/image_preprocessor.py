@@ -0,0 +1,143 @@
+"""
+OCR Image Preprocessing for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Tuple
+import structlog
+from PIL import Image, ImageEnhance, ImageOps
+
+try:
+    import cv2
+    import numpy as np
+    OPENCV_AVAILABLE = True
+except ImportError:
+    OPENCV_AVAILABLE = False
+
+from config import FILE_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+class ImagePreprocessor:
+    """
+    Grayscale decode, downscale, denoise and binarize images for Tesseract
+
+    Images are decoded straight to 8-bit grayscale; no RGB/BGR copies are
+    made. Photos larger than a page at the OCR DPI are reduced while
+    decoding (JPEG DCT scaling) and then resized to the target size, so
+    the blur and threshold only run on the pixels Tesseract needs. The
+    median blur writes into a per-thread scratch buffer that is reused
+    across images and the threshold is written back into the decoded
+    array, so each image costs one full-size allocation.
+    """
+
+    def __init__(self, target_dpi: int = None, page_long_side_inches: float = None):
+        ocr_config = FILE_CONFIG["OCR_CONFIG"]
+        self.target_dpi = target_dpi or ocr_config["DPI"]
+        self.page_long_side_inches = page_long_side_inches or ocr_config["PAGE_LONG_SIDE_INCHES"]
+        self.max_side = int(self.target_dpi * self.page_long_side_inches)
+        self.logger = logger.bind(component="image_preprocessor")
+        self._local = threading.local()
+
+    def preprocess(self, file_path: Path):
+        """
+        Preprocess one image file for OCR
+
+        Returns:
+            Binarized 8-bit array (PIL image when OpenCV is unavailable),
+            or None if the file cannot be decoded
+        """
+        try:
+            if not OPENCV_AVAILABLE:
+                return self._preprocess_pil(Path(file_path))
+
+            gray = self._decode_gray(Path(file_path))
+            if gray is None:
+                return None
+
+            gray = self._downscale(gray)
+            blurred = self._scratch(gray.shape)
+            cv2.medianBlur(gray, 3, dst=blurred)
+            cv2.adaptiveThreshold(
+                blurred, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=gray
+            )
+            return gray
+
+        except Exception as e:
+            self.logger.warning("Image preprocessing failed", file_path=str(file_path), error=str(e))
+            return None
+
+    def preprocess_batch(self, file_paths: Iterable[Path]) -> Iterator[Tuple[Path, Optional[object]]]:
+        """
+        Preprocess many images through the same pipeline and buffers
+
+        Yields (path, image) pairs one at a time so only one decoded image
+        is alive at once, however many files are passed.
+        """
+        for file_path in file_paths:
+            yield file_path, self.preprocess(file_path)
+
+    def _reduction_factor(self, width: int, height: int) -> int:
+        """Largest decoder reduction (1, 2, 4 or 8) that stays above the target size"""
+        long_side = max(width, height)
+        for factor in (8, 4, 2):
+            if long_side // factor >= self.max_side:
+                return factor
+        return 1
+
+    def _decode_gray(self, file_path: Path):
+        """Decode to grayscale, letting the JPEG decoder skip pixels we would discard"""
+        with Image.open(file_path) as header:  # Reads the header only
+            width, height = header.size
+
+        flag = {
+            1: cv2.IMREAD_GRAYSCALE,
+            2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+            4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+            8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+        }[self._reduction_factor(width, height)]
+
+        buffer = np.fromfile(str(file_path), dtype=np.uint8)
+        gray = cv2.imdecode(buffer, flag)
+        if gray is not None:
+            return gray
+
+        # Formats OpenCV cannot decode (e.g. GIF) go through PIL once
+        with Image.open(file_path) as image:
+            return np.asarray(ImageOps.exif_transpose(image).convert('L')).copy()
+
+    def _downscale(self, gray):
+        """Resize so the long side matches a page at the target DPI"""
+        height, width = gray.shape
+        long_side = max(width, height)
+        if long_side <= self.max_side:
+            return gray
+
+        scale = self.max_side / long_side
+        size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        return cv2.resize(gray, size, interpolation=cv2.INTER_AREA)
+
+    def _scratch(self, shape: Tuple[int, int]):
+        """Per-thread scratch array of the given shape, grown only when needed"""
+        size = shape[0] * shape[1]
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype=np.uint8)
+            self._local.buffer = buffer
+        return buffer[:size].reshape(shape)
+
+    def _preprocess_pil(self, file_path: Path) -> Image.Image:
+        """Grayscale and contrast enhancement without OpenCV"""
+        with Image.open(file_path) as image:
+            # JPEG decoder-level reduction, same target as the OpenCV path
+            factor = self._reduction_factor(*image.size)
+            if factor > 1:
+                image.draft('L', (image.size[0] // factor, image.size[1] // factor))
+            gray = ImageOps.exif_transpose(image).convert('L')
+
+        if max(gray.size) > self.max_side:
+            gray.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        return ImageEnhance.Contrast(gray).enhance(2.0)
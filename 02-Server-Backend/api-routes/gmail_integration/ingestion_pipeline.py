@@ -0,0 +1,182 @@
+"""
+Staged Ingestion Pipeline for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import asyncio
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+@dataclass
+class StageMetrics:
+    """Counters for a single pipeline stage"""
+    name: str
+    workers: int
+    processed: int = 0
+    errors: int = 0
+    busy_seconds: float = 0.0
+    started_at: float = field(default_factory=time.monotonic)
+
+    def to_dict(self, queue_depth: int, queue_capacity: int) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self.started_at, 1e-6)
+        return {
+            'workers': self.workers,
+            'queue_depth': queue_depth,
+            'queue_capacity': queue_capacity,
+            'processed': self.processed,
+            'errors': self.errors,
+            'throughput_per_sec': round(self.processed / elapsed, 3),
+            'avg_latency_ms': round(self.busy_seconds / self.processed * 1000, 2) if self.processed else 0.0,
+        }
+
+class PipelineStage:
+    """
+    One stage of the pipeline: a bounded queue drained by a pool of workers
+
+    The handler is a blocking callable executed in the given executor. It
+    receives one item and returns the item for the next stage, or None when
+    there is nothing left to do; raising marks the item as failed. With
+    batch_size > 1 it receives a list of up to batch_size items and returns
+    a list of the same length whose entries follow the same rules, with an
+    Exception instance marking an individual failure; a list of any other
+    length fails the whole batch.
+    """
+
+    def __init__(self, name: str, handler: Callable, workers: int = 1, queue_size: int = 100,
+                 executor: Optional[Executor] = None, batch_size: int = 1):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.executor = executor
+        self.batch_size = max(1, batch_size)
+        self.queue: Optional[asyncio.Queue] = None
+        self.metrics = StageMetrics(name=name, workers=self.workers)
+
+class IngestionPipeline:
+    """
+    Chains stages through bounded asyncio queues
+
+    Backpressure comes from the queue bounds: a slow stage fills its queue
+    and blocks the workers of the stage before it instead of buffering the
+    whole mailbox in memory.
+    """
+
+    def __init__(self, stages: List[PipelineStage],
+                 on_done: Optional[Callable[[Any, str, Optional[Exception]], None]] = None):
+        self.stages = stages
+        self.stage_index = {stage.name: index for index, stage in enumerate(stages)}
+        self.on_done = on_done
+        self.logger = logger.bind(component="ingestion_pipeline")
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self):
+        """Create the queues and spawn the stage workers"""
+        if self._tasks:
+            return
+
+        for stage in self.stages:
+            stage.queue = asyncio.Queue(maxsize=stage.queue_size)
+            stage.metrics = StageMetrics(name=stage.name, workers=stage.workers)
+            for worker_id in range(stage.workers):
+                self._tasks.append(asyncio.create_task(
+                    self._worker(stage, worker_id), name=f"pipeline-{stage.name}-{worker_id}"
+                ))
+
+        self.logger.info("Ingestion pipeline started",
+                         stages={stage.name: stage.workers for stage in self.stages})
+
+    async def stop(self):
+        """Cancel all workers; queued items are discarded"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.logger.info("Ingestion pipeline stopped")
+
+    async def put(self, item: Any, stage_name: Optional[str] = None):
+        """Enqueue an item at the first stage, or at the named stage"""
+        stage = self.stages[self.stage_index[stage_name]] if stage_name else self.stages[0]
+        await stage.queue.put(item)
+
+    async def join(self, until_stage: Optional[str] = None):
+        """
+        Wait until every stage up to and including until_stage is drained
+
+        Stages are joined in order, so once this returns every item that was
+        enqueued before the call has left those stages.
+        """
+        last = self.stage_index[until_stage] if until_stage else len(self.stages) - 1
+        for stage in self.stages[:last + 1]:
+            await stage.queue.join()
+
+    def get_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage queue depth, throughput and error counters"""
+        return {
+            stage.name: stage.metrics.to_dict(
+                stage.queue.qsize() if stage.queue else 0, stage.queue_size
+            )
+            for stage in self.stages
+        }
+
+    async def _worker(self, stage: PipelineStage, worker_id: int):
+        """Pull items from the stage queue and run the handler in the executor"""
+        loop = asyncio.get_running_loop()
+        index = self.stage_index[stage.name]
+        next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+
+        while True:
+            items = [await stage.queue.get()]
+            while len(items) < stage.batch_size and not stage.queue.empty():
+                items.append(stage.queue.get_nowait())
+
+            payload = items if stage.batch_size > 1 else items[0]
+            start = time.perf_counter()
+            try:
+                result = await loop.run_in_executor(stage.executor, stage.handler, payload)
+                outputs = result if stage.batch_size > 1 else [result]
+                # Results are matched to items by position; a short list would strand the rest
+                if len(outputs) != len(items):
+                    raise ValueError(f"Stage returned {len(outputs)} results for {len(items)} items")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error("Pipeline stage failed", stage=stage.name,
+                                  worker=worker_id, items=len(items), error=str(e))
+                outputs = [e] * len(items)
+            stage.metrics.busy_seconds += time.perf_counter() - start
+
+            try:
+                for item, output in zip(items, outputs):
+                    if isinstance(output, Exception):
+                        stage.metrics.errors += 1
+                        self._done(item, stage.name, output)
+                        continue
+
+                    stage.metrics.processed += 1
+                    if output is None:
+                        self._done(item, stage.name, None)
+                    elif next_stage:
+                        await next_stage.queue.put(output)
+                    else:
+                        self._done(output, stage.name, None)
+            finally:
+                for _ in items:
+                    stage.queue.task_done()
+
+    def _done(self, item: Any, stage_name: str, error: Optional[Exception]):
+        """Notify that an item left the pipeline"""
+        if self.on_done:
+            try:
+                self.on_done(item, stage_name, error)
+            except Exception as e:
+                self.logger.error("Pipeline completion callback failed", error=str(e))
@@ -0,0 +1,216 @@
+"""
+Leader Election for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Optional
+import structlog
+
+from sqlalchemy import text
+
+from database import DatabaseManager, db_manager
+from config import PROCESSING_CONFIG, PROCESSED_DIR
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows
+    FCNTL_AVAILABLE = False
+
+logger = structlog.get_logger(__name__)
+
+class MySQLAdvisoryLock:
+    """
+    GET_LOCK() held on a dedicated connection
+
+    MySQL releases the lock when the connection closes, so a crashed
+    leader never blocks the others.
+    """
+
+    backend = "mysql"
+
+    def __init__(self, name: str, db_manager: DatabaseManager):
+        self.name = name
+        self.db_manager = db_manager
+        self._connection = None
+
+    def acquire(self) -> bool:
+        if self._connection is not None:
+            try:
+                held = self._connection.execute(
+                    text("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()"), {"name": self.name}
+                ).scalar()
+                if held:
+                    return True
+            except Exception:
+                pass  # Connection lost, and the lock with it
+            try:
+                self.release()
+            except Exception:
+                pass
+
+        connection = self.db_manager.engine.connect()
+        acquired = connection.execute(text("SELECT GET_LOCK(:name, 0)"), {"name": self.name}).scalar()
+        if acquired == 1:
+            self._connection = connection
+            return True
+        connection.close()
+        return False
+
+    def release(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            try:
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": self.name})
+            finally:
+                connection.close()
+
+class RedisLock:
+    """SET NX with a TTL, renewed by the holder; a crashed leader's key expires"""
+
+    backend = "redis"
+
+    # Only the holder may extend or delete the key
+    RENEW_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+    RELEASE_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) else return 0 end"
+
+    def __init__(self, name: str, redis_client, ttl: int):
+        self.key = f"vital_red:leader:{name}"
+        self.redis_client = redis_client
+        self.ttl_ms = int(ttl * 1000)
+        self.token = uuid.uuid4().hex
+        self._held = False
+
+    def acquire(self) -> bool:
+        if self._held and self.redis_client.eval(self.RENEW_SCRIPT, 1, self.key, self.token, self.ttl_ms):
+            return True
+        self._held = bool(self.redis_client.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        return self._held
+
+    def release(self):
+        if self._held:
+            self._held = False
+            self.redis_client.eval(self.RELEASE_SCRIPT, 1, self.key, self.token)
+
+class LocalLock:
+    """
+    Stand-in for a single host without MySQL or Redis
+
+    An exclusive flock on a file shared by the worker processes of this
+    host; where fcntl is unavailable it only coordinates threads.
+    """
+
+    backend = "local"
+
+    _thread_locks: Dict[str, threading.Lock] = {}
+
+    def __init__(self, name: str, lock_dir: Path = PROCESSED_DIR):
+        self.name = name
+        self.path = Path(lock_dir) / f"leader-{name}.lock"
+        self._file = None
+        self._thread_lock = self._thread_locks.setdefault(name, threading.Lock())
+        self._held = False
+
+    def acquire(self) -> bool:
+        if self._held:
+            return True
+        if FCNTL_AVAILABLE:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self.path, "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+            self._file = lock_file
+        elif not self._thread_lock.acquire(blocking=False):
+            return False
+        self._held = True
+        return True
+
+    def release(self):
+        if not self._held:
+            return
+        self._held = False
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+        else:
+            self._thread_lock.release()
+
+class LeaderElector:
+    """
+    Elects one process, across processes and hosts, to run a singleton job
+
+    Call acquire() on every cycle before the job: it takes the lock when it
+    is free and confirms (or renews) it while held. The backend is chosen on
+    first use: a MySQL advisory lock when the database is MySQL, a Redis key
+    when Redis is reachable, otherwise a local file lock.
+    """
+
+    def __init__(self, name: str, worker_id: str, backend: Optional[str] = None,
+                 db_manager: DatabaseManager = db_manager, ttl: Optional[int] = None):
+        self.name = name
+        self.worker_id = worker_id
+        self.backend_name = backend or PROCESSING_CONFIG["LEADER_LOCK_BACKEND"]
+        self.db_manager = db_manager
+        self.ttl = ttl or PROCESSING_CONFIG["LEADER_LOCK_TTL"]
+        self.logger = logger.bind(component="leader_election", name=name, worker_id=worker_id)
+        self._lock = None
+        self._mutex = threading.Lock()  # The cycle and the heartbeat loop renew from different threads
+        self.is_leader = False
+
+    def _create_lock(self):
+        backend = self.backend_name
+        if backend == "auto":
+            try:
+                backend = "mysql" if self.db_manager.engine.dialect.name == "mysql" else None
+            except Exception:
+                backend = None
+            backend = backend or ("redis" if self.db_manager.redis_client else "local")
+
+        if backend == "mysql":
+            return MySQLAdvisoryLock(f"vital_red_{self.name}", self.db_manager)
+        if backend == "redis":
+            return RedisLock(self.name, self.db_manager.redis_client, self.ttl)
+        return LocalLock(self.name)
+
+    def acquire(self) -> bool:
+        """Take or keep leadership; False on any backend error"""
+        with self._mutex:
+            try:
+                if self._lock is None:
+                    self._lock = self._create_lock()
+                    self.logger.info("Leader lock backend selected", backend=self._lock.backend)
+                leader = self._lock.acquire()
+            except Exception as e:
+                self.logger.error("Leader lock check failed", error=str(e))
+                leader = False
+
+            if leader != self.is_leader:
+                self.logger.info("Leadership acquired" if leader else "Leadership lost")
+            self.is_leader = leader
+            return leader
+
+    def release(self):
+        """Step down so another process can take over immediately"""
+        with self._mutex:
+            try:
+                if self._lock is not None and self.is_leader:
+                    self._lock.release()
+                    self.logger.info("Leadership released")
+            except Exception as e:
+                self.logger.error("Failed to release leader lock", error=str(e))
+            self.is_leader = False
+
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'worker_id': self.worker_id,
+            'is_leader': self.is_leader,
+            'backend': self._lock.backend if self._lock else None
+        }
@@ -3,17 +3,28 @@ Main Gmail Integration Service for VITAL RED
 Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 """
 
+import argparse
 import asyncio
+import multiprocessing
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import structlog
 
 from gmail_client import GmailClient
 from email_processor import EmailProcessor
 from database import db_manager, email_repo, attachment_repo
-from config import GMAIL_CONFIG, PROCESSING_CONFIG, TEMP_DIR, PROCESSED_DIR
+from ingestion_pipeline import IngestionPipeline, PipelineStage
+from raw_message_store import RawMessageStore
+from text_extractor import shutdown_ocr_pool
+from medical_extraction import medical_extractor
+from work_queue import work_queue, EMAIL_TASK, priority_level_for_text
+from leader_election import LeaderElector
+from step_log import step_log
+from config import GMAIL_CONFIG, EMAIL_CONFIG, FILE_CONFIG, PROCESSING_CONFIG, TEMP_DIR, PROCESSED_DIR
 # from monitoring import SystemMonitor  # Will be implemented separately
 
 logger = structlog.get_logger(__name__)
@@ -21,15 +32,19 @@ logger = structlog.get_logger(__name__)
 class GmailIntegrationService:
     """
     Main service orchestrating Gmail integration for VITAL RED
+    
+    Any number of instances may run, in one or several processes and hosts.
+    Only the elected leader lists and ingests new Gmail messages; every
+    instance claims classification tasks from the shared work queue.
     """
     
     def __init__(self):
         self.logger = logger.bind(component="gmail_service")
         self.gmail_client = GmailClient()
-        self.email_processor = EmailProcessor(
-            db_session=db_manager.get_session_direct(),
-            file_storage_path=PROCESSED_DIR
-        )
+        # Opens a database session and loads OCR/NLP models, so it is built on first use
+        self._email_processor = None
+        self._email_processor_lock = threading.Lock()
+        self.raw_store = RawMessageStore()
         # self.monitor = SystemMonitor()  # Will be implemented separately
         
         # Service state
@@ -38,6 +53,29 @@ class GmailIntegrationService:
         self.processed_count = 0
         self.error_count = 0
         
+        # Identity recorded in EmailMessage.processed_by and on claimed queue tasks
+        self.worker_id = work_queue.worker_id
+        self.leader = LeaderElector("gmail_fetcher", self.worker_id)
+        
+        # Staged pipeline. The Gmail API client (httplib2) is not thread-safe,
+        # so every Gmail call goes through a single-thread executor
+        self.gmail_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gmail")
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=PROCESSING_CONFIG["CONCURRENT_WORKERS"], thread_name_prefix="ingest"
+        )
+        self.classify_executor = ThreadPoolExecutor(
+            max_workers=PROCESSING_CONFIG["CONCURRENT_WORKERS"], thread_name_prefix="classify"
+        )
+        self.pipeline = self._build_pipeline()
+        self._in_flight = set()
+        # Queue tasks claimed by this process and not finished yet: task_id -> gmail_id
+        self._claimed: Dict[str, str] = {}
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread_state = threading.local()
+        self._thread_processors = []
+        self._stats_lock = threading.Lock()
+        self._last_blob_gc = 0.0
+        
         # Ensure directories exist
         TEMP_DIR.mkdir(exist_ok=True)
         PROCESSED_DIR.mkdir(exist_ok=True)
@@ -47,6 +85,10 @@ class GmailIntegrationService:
         try:
             self.logger.info("Starting Gmail Integration Service for VITAL RED")
             
+            # Stop here instead of idling on every poll when the database is
+            # unreachable or still needs its upgrade script
+            db_manager.ensure_ready()
+            
             # Authenticate with Gmail
             if not self.gmail_client.authenticate():
                 raise Exception("Gmail authentication failed")
@@ -68,6 +110,17 @@ class GmailIntegrationService:
             self.is_running = False
             raise
     
+    @property
+    def email_processor(self) -> EmailProcessor:
+        if self._email_processor is None:
+            with self._email_processor_lock:
+                if self._email_processor is None:
+                    self._email_processor = EmailProcessor(
+                        db_session=db_manager.get_session_direct(),
+                        file_storage_path=PROCESSED_DIR
+                    )
+        return self._email_processor
+    
     async def stop_service(self):
         """Stop the Gmail integration service"""
         self.logger.info("Stopping Gmail Integration Service")
@@ -76,20 +129,43 @@ class GmailIntegrationService:
         # Stop monitoring
         # self.monitor.stop()  # Will be implemented separately
         
-        # Close database session
-        if hasattr(self.email_processor, 'db_session'):
-            self.email_processor.db_session.close()
+        # Stop pipeline workers
+        await self.pipeline.stop()
+        
+        # Hand unfinished queue tasks and the Gmail fetcher to the other instances
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+        work_queue.release(list(self._claimed))
+        self._claimed.clear()
+        self.leader.release()
+        
+        # Stop OCR worker processes
+        shutdown_ocr_pool(wait_for_workers=False)
+        
+        # Write the buffered processing step logs
+        await asyncio.get_running_loop().run_in_executor(self.io_executor, step_log.stop)
+        
+        # Close database sessions
+        if self._email_processor is not None:
+            self._email_processor.db_session.close()
+        for processor in self._thread_processors:
+            processor.db_session.close()
         
         self.logger.info("Gmail Integration Service stopped")
     
     async def _main_processing_loop(self):
         """Main processing loop for checking and processing emails"""
+        await self.pipeline.start()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+        
         while self.is_running:
             try:
                 self.logger.debug("Starting email processing cycle")
+                loop = asyncio.get_running_loop()
                 
-                # Check for new emails
-                await self._check_new_emails()
+                # Check for new emails; only one instance fetches from Gmail
+                if await loop.run_in_executor(self.io_executor, self.leader.acquire):
+                    await self._check_new_emails()
                 
                 # Process pending emails
                 await self._process_pending_emails()
@@ -97,6 +173,9 @@ class GmailIntegrationService:
                 # Process pending attachments
                 await self._process_pending_attachments()
                 
+                # Remove attachment blobs nothing refers to anymore
+                await self._collect_blob_garbage()
+                
                 # Update last check time
                 self.last_check = datetime.now()
                 
@@ -116,10 +195,44 @@ class GmailIntegrationService:
                 # Wait before retrying
                 await asyncio.sleep(60)
     
+    async def _heartbeat_loop(self):
+        """Extend the leases of claimed tasks and of the leader lock during long cycles"""
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            await asyncio.sleep(PROCESSING_CONFIG["QUEUE_HEARTBEAT_INTERVAL"])
+            if self._claimed:
+                await loop.run_in_executor(self.io_executor, work_queue.heartbeat, list(self._claimed))
+            if self.leader.is_leader:
+                await loop.run_in_executor(self.io_executor, self.leader.acquire)
+    
+    def _build_pipeline(self) -> IngestionPipeline:
+        """Build the fetch -> parse -> download -> persist -> classify pipeline
+        
+        New emails stop at persist, which enqueues them; classify is fed from
+        the work queue by _process_pending_emails.
+        """
+        workers = PROCESSING_CONFIG["CONCURRENT_WORKERS"]
+        queue_size = PROCESSING_CONFIG["PIPELINE_QUEUE_SIZE"]
+        
+        return IngestionPipeline([
+            PipelineStage("fetch", self._fetch_stage, workers=1, queue_size=queue_size,
+                          executor=self.gmail_executor, batch_size=GMAIL_CONFIG["BATCH_REQUEST_SIZE"]),
+            PipelineStage("parse", self._parse_stage, workers=workers, queue_size=queue_size,
+                          executor=self.io_executor),
+            PipelineStage("download", self._download_stage, workers=1, queue_size=queue_size,
+                          executor=self.gmail_executor),
+            PipelineStage("persist", self._persist_stage, workers=workers, queue_size=queue_size,
+                          executor=self.io_executor),
+            PipelineStage("classify", self._classify_stage, workers=workers, queue_size=queue_size,
+                          executor=self.classify_executor, batch_size=PROCESSING_CONFIG["PERSIST_BATCH_SIZE"]),
+        ], on_done=self._on_pipeline_done)
+    
     async def _check_new_emails(self):
-        """Check for new medical referral emails"""
+        """Check for new medical referral emails and feed them to the pipeline"""
         try:
             self.logger.debug("Checking for new emails")
+            loop = asyncio.get_running_loop()
+            await self.pipeline.start()
             
             # Build query for medical referral emails
             query = self.gmail_client.build_referral_query()
@@ -130,77 +243,161 @@ class GmailIntegrationService:
                 after_date = (self.last_check - timedelta(hours=1)).strftime("%Y/%m/%d")
                 query += f" after:{after_date}"
             
-            # Fetch messages
-            messages = self.gmail_client.get_messages(
-                query=query,
-                max_results=GMAIL_CONFIG["BATCH_SIZE"]
+            messages, history_id = await loop.run_in_executor(
+                self.gmail_executor, self._list_new_messages, query
             )
             
+            # Discard already stored messages with a single query
+            existing_ids = await loop.run_in_executor(
+                self.io_executor, email_repo.get_existing_gmail_ids, [m['id'] for m in messages]
+            )
+            messages = [m for m in messages 
+                        if m['id'] not in existing_ids and m['id'] not in self._in_flight]
+            
             self.logger.info(f"Found {len(messages)} new messages")
             
-            # Process each message
+            cycle = {'failed': False}
             for message in messages:
-                await self._process_new_message(message)
+                self._in_flight.add(message['id'])
+                await self.pipeline.put({'gmail_id': message['id'], 'message': message, 'cycle': cycle})
+            
+            # Wait until every message of this cycle is stored; classification
+            # carries on in the background
+            await self.pipeline.join("persist")
+            
+            # Advance the checkpoint only once every message was stored, so
+            # failed ones are picked up again on the next cycle
+            if history_id and not cycle['failed']:
+                await loop.run_in_executor(
+                    self.gmail_executor, self.gmail_client.save_history_checkpoint, history_id
+                )
             
         except Exception as e:
             self.logger.error("Error checking new emails", error=str(e))
             raise
     
-    async def _process_new_message(self, message: Dict[str, Any]):
-        """Process a single new Gmail message"""
-        try:
-            gmail_id = message['id']
-            self.logger.debug("Processing new message", gmail_id=gmail_id)
-            
-            # Check if already processed
-            existing_email = email_repo.get_email_by_gmail_id(gmail_id)
-            if existing_email:
-                self.logger.debug("Message already processed", gmail_id=gmail_id)
-                return
-            
-            # Get detailed message information
-            detailed_message = self.gmail_client.get_message_details(gmail_id)
-            if not detailed_message:
-                self.logger.error("Failed to get message details", gmail_id=gmail_id)
-                return
-            
-            # Parse message
-            parsed_message = self.gmail_client.parse_message(detailed_message)
-            if not parsed_message:
-                self.logger.error("Failed to parse message", gmail_id=gmail_id)
-                return
-            
-            # Download attachments
-            await self._download_attachments(parsed_message)
-            
-            # Create email record in database
-            email_record = email_repo.create_email({
-                'gmail_id': parsed_message['gmail_id'],
-                'thread_id': parsed_message['thread_id'],
-                'subject': parsed_message['subject'],
-                'sender_email': parsed_message['sender_email'],
-                'sender_name': parsed_message['sender_name'],
-                'recipient_email': parsed_message['recipient_email'],
-                'date_received': parsed_message['date_received'],
-                'body_text': parsed_message['body_text'],
-                'body_html': parsed_message['body_html'],
-                'snippet': parsed_message['snippet'],
-                'processing_status': 'pending'
-            })
-            
-            if email_record:
-                self.logger.info("New email record created", 
-                               gmail_id=gmail_id, email_id=email_record.id)
-                
-                # Mark email as processed in Gmail
-                self.gmail_client.add_label(gmail_id, "VITAL_RED_PROCESSED")
-            
-        except Exception as e:
-            self.logger.error("Error processing new message", 
-                            gmail_id=message.get('id', 'unknown'), error=str(e))
+    def _list_new_messages(self, query: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """List message stubs to ingest, with the history checkpoint to commit"""
+        if GMAIL_CONFIG["INCREMENTAL_SYNC"]:
+            # Only messages added since the last checkpoint; the query is
+            # used when no valid checkpoint exists
+            return self.gmail_client.sync_new_messages(query=query)
+        
+        messages = self.gmail_client.get_messages(
+            query=query,
+            max_results=GMAIL_CONFIG["BATCH_SIZE"]
+        )
+        return messages, None
     
-    async def _download_attachments(self, parsed_message: Dict[str, Any]):
-        """Download and save email attachments"""
+    def _fetch_stage(self, items: List[Dict[str, Any]]) -> List[Any]:
+        """Pipeline stage: fetch full message details in one batch call"""
+        details, errors = self.gmail_client.get_messages_details_batch(
+            [item['gmail_id'] for item in items]
+        )
+        
+        results = []
+        for item in items:
+            detailed_message = details.get(item['gmail_id'])
+            if detailed_message:
+                item['detailed'] = detailed_message
+                results.append(item)
+            else:
+                results.append(Exception(errors.get(item['gmail_id'], "Failed to get message details")))
+        return results
+    
+    def _parse_stage(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Pipeline stage: parse the Gmail message and keep it raw if it is a referral"""
+        detailed_message = item.pop('detailed')
+        parsed_message = self.gmail_client.parse_message(detailed_message)
+        
+        # History changes are every message added to the inbox
+        if (parsed_message and item.get('message', {}).get('unfiltered') and
+                not self.gmail_client.matches_referral_query(parsed_message)):
+            self.logger.debug("Message is not a referral, skipping", gmail_id=item['gmail_id'])
+            return None
+        
+        self.raw_store.put(item['gmail_id'], detailed_message)
+        if not parsed_message:
+            raise Exception("Failed to parse message")
+        
+        item['parsed'] = parsed_message
+        return item
+    
+    def _download_stage(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Pipeline stage: download the message attachments"""
+        self._download_attachments(item['parsed'])
+        return item
+    
+    def _persist_stage(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Pipeline stage: store the pending email record"""
+        parsed_message = item['parsed']
+        
+        email_record = email_repo.create_email({
+            'gmail_id': parsed_message['gmail_id'],
+            'thread_id': parsed_message['thread_id'],
+            'subject': parsed_message['subject'],
+            'sender_email': parsed_message['sender_email'],
+            'sender_name': parsed_message['sender_name'],
+            'recipient_email': parsed_message['recipient_email'],
+            'date_received': parsed_message['date_received'],
+            'body_text': parsed_message['body_text'],
+            'body_html': parsed_message['body_html'],
+            'snippet': parsed_message['snippet'],
+            'processing_status': 'pending'
+        })
+        
+        if not email_record:
+            raise Exception("Failed to create email record")
+        
+        self.logger.info("New email record created", 
+                       gmail_id=item['gmail_id'], email_id=email_record.id)
+        
+        # Urgent referrals are claimed ahead of the backlog; if this fails the
+        # pending email is enqueued again by _process_pending_emails. The
+        # downloaded files travel with the task, since classification parses
+        # the message again from the raw store
+        task_data = {'gmail_id': item['gmail_id']}
+        downloads = self._downloaded_attachments(parsed_message)
+        if downloads:
+            task_data['attachments'] = downloads
+        work_queue.enqueue(
+            EMAIL_TASK, email_message_id=email_record.id, task_data=task_data,
+            priority_level=priority_level_for_text(
+                f"{parsed_message['subject'] or ''} {parsed_message['body_text'] or ''}"
+            )
+        )
+        
+        # Mark email as processed in Gmail; the API client is confined to
+        # the Gmail executor
+        self.gmail_executor.submit(self.gmail_client.add_label, item['gmail_id'], "VITAL_RED_PROCESSED")
+        
+        return None
+    
+    def _classify_stage(self, items: List[Dict[str, Any]]) -> List[Any]:
+        """Pipeline stage: run the full EmailProcessor on a batch of stored emails"""
+        return [None if processed else Exception("Email processing failed")
+                for processed in self._process_email_batch(items)]
+    
+    def _on_pipeline_done(self, item: Dict[str, Any], stage_name: str, error: Optional[Exception]):
+        """Track items leaving the pipeline"""
+        self._in_flight.discard(item['gmail_id'])
+        
+        task_id = item.get('task_id')
+        if task_id:
+            self._claimed.pop(task_id, None)
+            if error is None:
+                self.io_executor.submit(work_queue.complete, task_id)
+            else:
+                self.io_executor.submit(work_queue.fail, task_id, str(error))
+        
+        if error is not None and stage_name != "classify":
+            self.logger.error("Failed to ingest message", gmail_id=item['gmail_id'],
+                            stage=stage_name, error=str(error))
+            if item.get('cycle'):
+                item['cycle']['failed'] = True
+    
+    def _download_attachments(self, parsed_message: Dict[str, Any]):
+        """Download email attachments straight to the temp directory"""
         try:
             gmail_id = parsed_message['gmail_id']
             attachments = parsed_message.get('attachments', [])
@@ -210,103 +407,279 @@ class GmailIntegrationService:
             
             self.logger.debug(f"Downloading {len(attachments)} attachments", gmail_id=gmail_id)
             
+            small, large = [], []
             for attachment_info in attachments:
-                await self._download_single_attachment(gmail_id, attachment_info)
+                if attachment_info.get('size', 0) > EMAIL_CONFIG["MAX_ATTACHMENT_SIZE"]:
+                    # Size is known from the message payload; don't download at all
+                    self.logger.warning("Attachment exceeds maximum size, skipping", gmail_id=gmail_id,
+                                      filename=attachment_info['filename'], size=attachment_info['size'])
+                    continue
+                if attachment_info.get('size', 0) > GMAIL_CONFIG["ATTACHMENT_STREAM_THRESHOLD"]:
+                    large.append(attachment_info)
+                else:
+                    small.append(attachment_info)
+            
+            # Small attachments in batch calls, decoded to disk without a full
+            # in-memory copy
+            encoded, errors = self.gmail_client.get_attachments_batch(
+                [(gmail_id, info['attachment_id']) for info in small], decode=False
+            )
+            for attachment_info in small:
+                key = (gmail_id, attachment_info['attachment_id'])
+                if key in errors:
+                    self.logger.error("Failed to download attachment", gmail_id=gmail_id,
+                                    filename=attachment_info['filename'], error=errors[key])
+                    continue
+                result = self.gmail_client.save_attachment_data(
+                    encoded.pop(key), self._attachment_temp_path(gmail_id, attachment_info)
+                )
+                self._record_downloaded_attachment(gmail_id, attachment_info, result)
+            
+            # Large attachments one request each, straight to disk
+            for attachment_info in large:
+                result = self.gmail_client.download_attachment_to_file(
+                    gmail_id, attachment_info['attachment_id'],
+                    self._attachment_temp_path(gmail_id, attachment_info)
+                )
+                self._record_downloaded_attachment(gmail_id, attachment_info, result)
                 
         except Exception as e:
             self.logger.error("Error downloading attachments", error=str(e))
     
-    async def _download_single_attachment(self, gmail_id: str, attachment_info: Dict[str, Any]):
-        """Download a single attachment"""
-        try:
-            attachment_id = attachment_info['attachment_id']
-            filename = attachment_info['filename']
-            
-            self.logger.debug("Downloading attachment", 
-                            gmail_id=gmail_id, filename=filename)
-            
-            # Download attachment data
-            attachment_data = self.gmail_client.get_attachment(gmail_id, attachment_id)
-            if not attachment_data:
-                self.logger.error("Failed to download attachment", 
-                                gmail_id=gmail_id, filename=filename)
-                return
-            
-            # Create safe filename
-            safe_filename = self._sanitize_filename(filename)
-            file_path = TEMP_DIR / f"{gmail_id}_{attachment_id}_{safe_filename}"
-            
-            # Save attachment to disk
-            with open(file_path, 'wb') as f:
-                f.write(attachment_data)
-            
-            # Update attachment info with file path
-            attachment_info['local_file_path'] = str(file_path)
-            
-            self.logger.debug("Attachment downloaded successfully", 
-                            gmail_id=gmail_id, filename=filename, path=str(file_path))
-            
-        except Exception as e:
-            self.logger.error("Error downloading single attachment", 
-                            gmail_id=gmail_id, filename=attachment_info.get('filename', 'unknown'), 
-                            error=str(e))
+    def _downloaded_attachments(self, parsed_message: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """Saved file path, hash and size of each downloaded attachment, by Gmail attachment ID"""
+        return {
+            info['attachment_id']: {
+                'local_file_path': info['local_file_path'],
+                'file_hash': info['file_hash'],
+                'size': info['size']
+            }
+            for info in parsed_message.get('attachments', []) if info.get('local_file_path')
+        }
+    
+    def _attach_downloads(self, parsed_message: Dict[str, Any], downloads: Dict[str, Dict[str, Any]]):
+        """Point the attachments of a re-parsed message at the files the download stage saved"""
+        for attachment_info in parsed_message.get('attachments', []):
+            if attachment_info.get('local_file_path'):
+                continue
+            download = downloads.get(attachment_info['attachment_id'])
+            if download:
+                attachment_info.update(download)
+                continue
+            # Tasks enqueued for older pending rows carry no download record
+            temp_path = self._attachment_temp_path(parsed_message['gmail_id'], attachment_info)
+            if temp_path.exists():
+                attachment_info['local_file_path'] = str(temp_path)
+    
+    def _attachment_temp_path(self, gmail_id: str, attachment_info: Dict[str, Any]) -> Path:
+        """Temp file path for a downloaded attachment"""
+        safe_filename = self._sanitize_filename(attachment_info['filename'])
+        return TEMP_DIR / f"{gmail_id}_{attachment_info['attachment_id']}_{safe_filename}"
+    
+    def _record_downloaded_attachment(self, gmail_id: str, attachment_info: Dict[str, Any],
+                                      result: Optional[Dict[str, Any]]):
+        """Hand the saved file path, hash and size on to the attachment record"""
+        if not result:
+            self.logger.error("Failed to download attachment", 
+                            gmail_id=gmail_id, filename=attachment_info['filename'])
+            return
+        
+        attachment_info['local_file_path'] = str(result['path'])
+        attachment_info['file_hash'] = result['sha256']
+        attachment_info['size'] = result['size']
+        
+        self.logger.debug("Attachment downloaded successfully", 
+                        gmail_id=gmail_id, filename=attachment_info['filename'], 
+                        path=str(result['path']))
     
     async def _process_pending_emails(self):
-        """Process emails with pending status"""
+        """Claim due email tasks from the work queue and feed them to classification"""
         try:
-            pending_emails = email_repo.get_pending_emails(limit=GMAIL_CONFIG["BATCH_SIZE"])
+            loop = asyncio.get_running_loop()
+            await self.pipeline.start()
             
-            if not pending_emails:
-                return
+            # Pending emails without a task (older rows, failed enqueue)
+            await loop.run_in_executor(
+                self.io_executor, work_queue.enqueue_pending_emails, GMAIL_CONFIG["BATCH_SIZE"]
+            )
             
-            self.logger.info(f"Processing {len(pending_emails)} pending emails")
+            # Highest priority first; rows claimed by other pollers are skipped
+            tasks = await loop.run_in_executor(
+                self.io_executor, work_queue.claim, GMAIL_CONFIG["BATCH_SIZE"], EMAIL_TASK
+            )
+            
+            if not tasks:
+                return
             
-            for email in pending_emails:
-                await self._process_single_email(email)
+            self.logger.info(f"Processing {len(tasks)} queued emails")
+            
+            for task in tasks:
+                gmail_id = task.task_data.get('gmail_id')
+                self._claimed[task.task_id] = gmail_id
+                self._in_flight.add(gmail_id)
+                await self.pipeline.put(
+                    {'gmail_id': gmail_id, 'email_id': task.email_message_id, 'task_id': task.task_id,
+                     'downloads': task.task_data.get('attachments') or {}},
+                    "classify"
+                )
                 
         except Exception as e:
             self.logger.error("Error processing pending emails", error=str(e))
     
-    async def _process_single_email(self, email_record):
-        """Process a single email record"""
+    def _get_thread_processor(self) -> EmailProcessor:
+        """EmailProcessor with its own session for the current worker thread"""
+        processor = getattr(self._thread_state, 'email_processor', None)
+        if processor is None:
+            # Sessions are not thread-safe; extractor and classifier models are shared
+            processor = EmailProcessor(
+                db_session=db_manager.get_session_direct(),
+                file_storage_path=PROCESSED_DIR,
+                text_extractor=self.email_processor.text_extractor,
+                medical_classifier=self.email_processor.medical_classifier,
+                blob_store=self.email_processor.blob_store
+            )
+            self._thread_state.email_processor = processor
+            self._thread_processors.append(processor)
+        return processor
+    
+    def _process_email_batch(self, items: List[Dict[str, Any]]) -> List[bool]:
+        """Process stored email records in one EmailProcessor unit of work"""
+        results = [False] * len(items)
+        batch = []
+        failed = []
+        
+        for index, item in enumerate(items):
+            email_id, gmail_id = item['email_id'], item['gmail_id']
+            try:
+                self.logger.debug("Processing email", email_id=email_id)
+                
+                parsed_message = item.get('parsed') or self._load_parsed_message(gmail_id)
+                if not parsed_message:
+                    failed.append((email_id, "Failed to get message details"))
+                    continue
+                self._attach_downloads(parsed_message, item.get('downloads') or {})
+                batch.append((index, parsed_message))
+                
+            except Exception as e:
+                self.logger.error("Error processing single email", 
+                                email_id=email_id, error=str(e))
+                failed.append((email_id, str(e)))
+        
+        # Update status to processing, or error, for the whole batch in one session
+        self._update_email_statuses(
+            [(items[index]['email_id'], "processing", None) for index, _ in batch] +
+            [(email_id, "error", error) for email_id, error in failed]
+        )
+        
+        if not batch:
+            return results
+        
         try:
-            self.logger.debug("Processing email", email_id=email_record.id)
-            
-            # Update status to processing
-            email_repo.update_email_status(email_record.id, "processing")
-            
-            # Get detailed message for processing
-            detailed_message = self.gmail_client.get_message_details(email_record.gmail_id)
+            processed_emails = self._get_thread_processor().process_emails_batch(
+                [parsed_message for _, parsed_message in batch]
+            )
+        except Exception as e:
+            self.logger.error("Error processing email batch", count=len(batch), error=str(e))
+            processed_emails = [None] * len(batch)
+        
+        failed = []
+        for (index, _), processed_email in zip(batch, processed_emails):
+            email_id, gmail_id = items[index]['email_id'], items[index]['gmail_id']
+            # The task is only done once the email has actually been processed
+            if processed_email and processed_email.processing_status == "completed":
+                with self._stats_lock:
+                    self.processed_count += 1
+                self.logger.info("Email processed successfully", 
+                               email_id=email_id, gmail_id=gmail_id)
+                results[index] = True
+            else:
+                failed.append((email_id, "error", "Email processing failed"))
+        self._update_email_statuses(failed)
+        
+        return results
+    
+    def _update_email_statuses(self, updates: List[Tuple[int, str, Optional[str]]]):
+        """Apply (email_id, status, error) updates in one unit of work"""
+        if not updates:
+            return
+        try:
+            with db_manager.unit_of_work() as uow:
+                for email_id, status, error in updates:
+                    uow.emails.update_email_status(email_id, status, error,
+                                                   processed_by=self.worker_id if status == "processing" else None)
+        except Exception as e:
+            self.logger.error("Failed to update email statuses", count=len(updates), error=str(e))
+    
+    def _load_parsed_message(self, gmail_id: str) -> Optional[Dict[str, Any]]:
+        """Parse a message from the raw store, fetching from Gmail only if it was evicted"""
+        detailed_message = self.raw_store.get(gmail_id)
+        
+        if detailed_message is None:
+            self.logger.debug("Raw message not stored, fetching from Gmail", gmail_id=gmail_id)
+            detailed_message = self.gmail_executor.submit(
+                self.gmail_client.get_message_details, gmail_id
+            ).result()
             if not detailed_message:
-                email_repo.update_email_status(email_record.id, "error", 
-                                             "Failed to get message details")
-                return
+                return None
+            self.raw_store.put(gmail_id, detailed_message)
+        
+        return self.gmail_client.parse_message(detailed_message) or None
+    
+    def replay_stored_messages(self, gmail_ids: Optional[List[str]] = None) -> Dict[str, int]:
+        """
+        Re-run processing offline from stored raw payloads
+        
+        No Gmail API calls are made; messages missing from the store are
+        skipped. Stored emails are processed again, completed ones included,
+        keeping their referral's number and review status.
+        
+        Args:
+            gmail_ids: Messages to replay, defaults to every stored message
+            
+        Returns:
+            Counters of processed, failed and missing messages
+        """
+        result = {'processed': 0, 'failed': 0, 'missing': 0}
+        batch_size = PROCESSING_CONFIG["PERSIST_BATCH_SIZE"]
+        batch = []
+        
+        def flush():
+            for processed_email in self._get_thread_processor().process_emails_batch(batch, reprocess=True):
+                result['processed' if processed_email else 'failed'] += 1
+            batch.clear()
+        
+        for gmail_id in gmail_ids or self.raw_store.list_ids():
+            detailed_message = self.raw_store.get(gmail_id)
+            if detailed_message is None:
+                result['missing'] += 1
+                continue
             
-            # Parse message
             parsed_message = self.gmail_client.parse_message(detailed_message)
+            if not parsed_message:
+                result['failed'] += 1
+                continue
             
-            # Process with email processor
-            processed_email = self.email_processor.process_email(parsed_message)
-            
-            if processed_email:
-                self.processed_count += 1
-                self.logger.info("Email processed successfully", 
-                               email_id=email_record.id, gmail_id=email_record.gmail_id)
-            else:
-                email_repo.update_email_status(email_record.id, "error", 
-                                             "Email processing failed")
-                
-        except Exception as e:
-            self.logger.error("Error processing single email", 
-                            email_id=email_record.id, error=str(e))
-            email_repo.update_email_status(email_record.id, "error", str(e))
+            batch.append(parsed_message)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+        
+        self.logger.info("Offline replay finished", **result)
+        return result
     
     async def _process_pending_attachments(self):
         """Process attachments with pending status"""
         try:
-            pending_attachments = attachment_repo.get_pending_attachments(
-                limit=GMAIL_CONFIG["BATCH_SIZE"]
-            )
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(self.io_executor, self._process_pending_attachment_batch)
+                
+        except Exception as e:
+            self.logger.error("Error processing pending attachments", error=str(e))
+    
+    def _process_pending_attachment_batch(self):
+        """Load and process pending attachments in one unit of work"""
+        with db_manager.unit_of_work() as uow:
+            pending_attachments = uow.attachments.get_pending_attachments(GMAIL_CONFIG["BATCH_SIZE"])
             
             if not pending_attachments:
                 return
@@ -314,12 +687,9 @@ class GmailIntegrationService:
             self.logger.info(f"Processing {len(pending_attachments)} pending attachments")
             
             for attachment in pending_attachments:
-                await self._process_single_attachment(attachment)
-                
-        except Exception as e:
-            self.logger.error("Error processing pending attachments", error=str(e))
+                self._process_single_attachment(attachment, uow.attachments)
     
-    async def _process_single_attachment(self, attachment_record):
+    def _process_single_attachment(self, attachment_record, repository=attachment_repo):
         """Process a single attachment record"""
         try:
             self.logger.debug("Processing attachment", attachment_id=attachment_record.id)
@@ -329,17 +699,50 @@ class GmailIntegrationService:
             # The actual processing is handled by EmailProcessor
             
             # Update status
-            with db_manager.get_session() as session:
-                attachment = session.query(EmailAttachment).filter_by(
-                    id=attachment_record.id
-                ).first()
-                if attachment:
-                    attachment.processing_status = "completed"
+            repository.update_attachment_status(attachment_record.id, "completed")
             
         except Exception as e:
             self.logger.error("Error processing single attachment", 
                             attachment_id=attachment_record.id, error=str(e))
     
+    async def _collect_blob_garbage(self):
+        """Run blob store garbage collection and file cleanup at most once per GC_INTERVAL"""
+        if time.monotonic() - self._last_blob_gc < FILE_CONFIG["BLOB_STORE"]["GC_INTERVAL"]:
+            return
+        self._last_blob_gc = time.monotonic()
+        
+        def collect():
+            session = db_manager.get_session_direct()
+            try:
+                self.email_processor.blob_store.collect_garbage(session)
+            finally:
+                session.close()
+            
+            # Entries from an older extractor version or OCR configuration are never read again
+            if self.email_processor.text_extractor.cache:
+                self.email_processor.text_extractor.cache.purge_stale_generations()
+            
+            self._sweep_temp_dir()
+        
+        try:
+            await asyncio.get_running_loop().run_in_executor(self.io_executor, collect)
+        except Exception as e:
+            self.logger.error("Blob garbage collection failed", error=str(e))
+    
+    def _sweep_temp_dir(self):
+        """Remove downloads that never reached the blob store, e.g. of dead-lettered emails"""
+        cutoff = time.time() - FILE_CONFIG["TEMP_MAX_AGE"]
+        removed = 0
+        for path in TEMP_DIR.iterdir():
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except OSError as e:
+                self.logger.warning("Failed to remove temp file", path=str(path), error=str(e))
+        if removed:
+            self.logger.info("Removed stale temp files", count=removed)
+    
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename for safe storage"""
         import re
@@ -351,11 +754,20 @@ class GmailIntegrationService:
         """Get current service status"""
         return {
             'is_running': self.is_running,
+            'worker_id': self.worker_id,
+            'leader': self.leader.get_status(),
             'last_check': self.last_check.isoformat() if self.last_check else None,
             'processed_count': self.processed_count,
             'error_count': self.error_count,
             'uptime': (datetime.now() - self.last_check).total_seconds() if self.last_check else 0,
-            'database_health': db_manager.health_check()
+            'database_health': db_manager.health_check(),
+            'pipeline': self.pipeline.get_metrics(),
+            'raw_message_store': self.raw_store.get_stats(),
+            'extraction_cache': (self._email_processor.text_extractor.get_cache_stats()
+                                 if self._email_processor else None),
+            'medical_extraction': medical_extractor.get_stats(),
+            'work_queue': work_queue.get_stats(),
+            'step_log': step_log.get_stats()
         }
     
     async def manual_sync(self) -> Dict[str, Any]:
@@ -403,10 +815,47 @@ async def main():
         logger.error("Service failed", error=str(e))
         await gmail_service.stop_service()
 
-if __name__ == "__main__":
-    # Configure logging
+def _run_worker_process():
+    """Entry point of one worker process"""
     import logging
     logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
+
+def run_workers(processes: int):
+    """
+    Run the service in several processes on this host
+    
+    Each process is a full instance with its own identity: one of them is
+    elected to fetch from Gmail and all of them classify queued emails, so
+    classification throughput scales with cores.
+    """
+    if processes <= 1:
+        _run_worker_process()
+        return
+    
+    # Spawned, not forked: each process imports the modules afresh and gets
+    # its own worker identity, database pool and models
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=_run_worker_process, name=f"vital-red-worker-{n}")
+        for n in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+    logger.info("Worker processes started", processes=processes)
+    
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VITAL RED Gmail integration service")
+    parser.add_argument("--workers", type=int, default=PROCESSING_CONFIG["WORKER_PROCESSES"],
+                        help="worker processes on this host")
+    args = parser.parse_args()
     
     # Run the service
-    asyncio.run(main())
+    run_workers(args.workers)
@@ -10,12 +10,6 @@ from datetime import datetime
 import structlog
 
 # NLP imports
-try:
-    import spacy
-    SPACY_AVAILABLE = True
-except ImportError:
-    SPACY_AVAILABLE = False
-
 try:
     import nltk
     from nltk.corpus import stopwords
@@ -24,7 +18,10 @@ try:
 except ImportError:
     NLTK_AVAILABLE = False
 
-from config import EMAIL_CONFIG, MEDICAL_PATTERNS
+from config import EMAIL_CONFIG
+from keyword_scanner import KeywordScanner, KeywordScan
+from medical_extraction import medical_extractor, REFERRAL_FIELDS
+from nlp_service import get_nlp_service
 
 logger = structlog.get_logger(__name__)
 
@@ -90,57 +87,93 @@ class MedicalClassifier:
                 'control', 'seguimiento', 'revision'
             ]
         }
+        
+        # Referral type indicators
+        self.referral_type_indicators = {
+            'urgente': [
+                'urgente', 'emergencia', 'critico', 'inmediato',
+                'stat', 'codigo', 'trauma'
+            ],
+            'interconsulta': [
+                'interconsulta', 'consulta', 'valoracion',
+                'evaluacion', 'concepto', 'opinion'
+            ],
+            'traslado': [
+                'traslado', 'remision', 'transferencia',
+                'envio', 'derivacion'
+            ],
+            'programado': [
+                'programado', 'electivo', 'cita', 'control',
+                'seguimiento', 'revision'
+            ]
+        }
+        
+        # Bonus terms for the referral score
+        self.medical_terms = [
+            'paciente', 'diagnostico', 'tratamiento', 'sintomas',
+            'examen', 'historia clinica', 'epicrisis', 'laboratorio'
+        ]
+        
+        # One scanner over every keyword list, so a text is walked once per classification
+        keyword_sets = {
+            'referral': self.referral_keywords,
+            'specialty': self.medical_specialties,
+            'medical_terms': self.medical_terms,
+        }
+        keyword_sets.update({f'type:{name}': kws for name, kws in self.referral_type_indicators.items()})
+        keyword_sets.update({f'urgency:{name}': kws for name, kws in self.urgency_indicators.items()})
+        keyword_sets.update({f'doc:{name}': kws for name, kws in self.document_types.items()})
+        self.scanner = KeywordScanner(keyword_sets)
+    
+    def scan(self, text: str) -> KeywordScan:
+        """Scan lower-cased text once for every classification keyword"""
+        return self.scanner.scan(text.lower())
     
     def _initialize_nlp(self):
-        """Initialize NLP libraries"""
+        """Initialize NLP libraries; models and NLTK data are loaded on first use"""
+        # SpaCy model shared with every other classifier and AdvancedMedicalNLP in this process
+        self.nlp_service = get_nlp_service()
+        self._nltk_available = None
+    
+    @property
+    def spacy_available(self) -> bool:
+        service = getattr(self, 'nlp_service', None)
+        return bool(service and service.available)
+    
+    @property
+    def nltk_available(self) -> bool:
+        """Whether NLTK data is present, downloading it the first time it is needed"""
+        if getattr(self, '_nltk_available', None) is None:
+            self._nltk_available = self._load_nltk_data()
+        return self._nltk_available
+    
+    def _load_nltk_data(self) -> bool:
+        """Find or download the NLTK tokenizer and stopwords"""
+        if not NLTK_AVAILABLE:
+            return False
+        
         try:
-            if SPACY_AVAILABLE:
-                # Try to load Spanish model
-                try:
-                    self.nlp = spacy.load("es_core_news_sm")
-                    self.spacy_available = True
-                    self.logger.info("SpaCy Spanish model loaded successfully")
-                except OSError:
-                    try:
-                        # Fallback to English model
-                        self.nlp = spacy.load("en_core_web_sm")
-                        self.spacy_available = True
-                        self.logger.info("SpaCy English model loaded (Spanish not available)")
-                    except OSError:
-                        self.spacy_available = False
-                        self.logger.warning("No SpaCy models available")
-            else:
-                self.spacy_available = False
-            
-            if NLTK_AVAILABLE:
-                # Download required NLTK data
-                try:
-                    nltk.data.find('tokenizers/punkt')
-                    nltk.data.find('corpora/stopwords')
-                    self.nltk_available = True
-                    self.logger.info("NLTK resources available")
-                except LookupError:
-                    self.logger.warning("NLTK resources not found, downloading...")
-                    try:
-                        nltk.download('punkt', quiet=True)
-                        nltk.download('stopwords', quiet=True)
-                        self.nltk_available = True
-                    except:
-                        self.nltk_available = False
-            else:
-                self.nltk_available = False
-                
-        except Exception as e:
-            self.logger.error("NLP initialization failed", error=str(e))
-            self.spacy_available = False
-            self.nltk_available = False
+            nltk.data.find('tokenizers/punkt')
+            nltk.data.find('corpora/stopwords')
+            self.logger.info("NLTK resources available")
+            return True
+        except LookupError:
+            self.logger.warning("NLTK resources not found, downloading...")
+            try:
+                nltk.download('punkt', quiet=True)
+                nltk.download('stopwords', quiet=True)
+                return True
+            except Exception as e:
+                self.logger.error("NLTK download failed", error=str(e))
+                return False
     
-    def classify_referral(self, text: str) -> Tuple[bool, Optional[str], Optional[str]]:
+    def classify_referral(self, text: str, scan: Optional[KeywordScan] = None) -> Tuple[bool, Optional[str], Optional[str]]:
         """
         Classify if text represents a medical referral
         
         Args:
             text: Text content to classify
+            scan: Result of scan(text), reused when the caller already has it
             
         Returns:
             Tuple of (is_referral, referral_type, priority_level)
@@ -149,19 +182,20 @@ class MedicalClassifier:
             self.logger.debug("Classifying medical referral")
             
             text_lower = text.lower()
+            scan = scan or self.scanner.scan(text_lower)
             
             # Check for referral keywords
-            referral_score = self._calculate_referral_score(text_lower)
+            referral_score = self._calculate_referral_score(text_lower, scan)
             is_referral = referral_score > 0.3  # Threshold for classification
             
             if not is_referral:
                 return False, None, None
             
             # Determine referral type
-            referral_type = self._classify_referral_type(text_lower)
+            referral_type = self._classify_referral_type(text_lower, scan)
             
             # Determine priority level
-            priority_level = self._classify_priority(text_lower)
+            priority_level = self._classify_priority(text_lower, scan)
             
             self.logger.info("Referral classification completed", 
                            is_referral=is_referral, 
@@ -175,74 +209,42 @@ class MedicalClassifier:
             self.logger.error("Referral classification failed", error=str(e))
             return False, None, None
     
-    def _calculate_referral_score(self, text: str) -> float:
+    def _calculate_referral_score(self, text: str, scan: Optional[KeywordScan] = None) -> float:
         """Calculate referral probability score"""
         score = 0.0
-        total_words = len(text.split())
+        scan = scan or self.scanner.scan(text)
+        total_words = scan.word_count
         
         if total_words == 0:
             return 0.0
         
         # Check for referral keywords
-        referral_matches = 0
-        for keyword in self.referral_keywords:
-            if keyword in text:
-                referral_matches += text.count(keyword)
+        referral_matches = scan.occurrences('referral')
         
         # Check for medical specialties
-        specialty_matches = 0
-        for specialty in self.medical_specialties:
-            if specialty in text:
-                specialty_matches += 1
+        specialty_matches = scan.distinct('specialty')
         
         # Check for medical patterns
-        pattern_matches = 0
-        for pattern_list in MEDICAL_PATTERNS.values():
-            for pattern in pattern_list:
-                if re.search(pattern, text, re.IGNORECASE):
-                    pattern_matches += 1
-                    break
+        pattern_matches = len(medical_extractor.extract(text, fields=REFERRAL_FIELDS).fields)
         
         # Calculate weighted score
         score += (referral_matches / total_words) * 10  # Weight: 10
         score += (specialty_matches / len(self.medical_specialties)) * 5  # Weight: 5
-        score += (pattern_matches / len(MEDICAL_PATTERNS)) * 3  # Weight: 3
+        score += (pattern_matches / len(REFERRAL_FIELDS)) * 3  # Weight: 3
         
         # Bonus for specific medical terms
-        medical_terms = [
-            'paciente', 'diagnostico', 'tratamiento', 'sintomas',
-            'examen', 'historia clinica', 'epicrisis', 'laboratorio'
-        ]
-        
-        medical_term_matches = sum(1 for term in medical_terms if term in text)
-        score += (medical_term_matches / len(medical_terms)) * 2  # Weight: 2
+        medical_term_matches = scan.distinct('medical_terms')
+        score += (medical_term_matches / len(self.medical_terms)) * 2  # Weight: 2
         
         return min(1.0, score)  # Cap at 1.0
     
-    def _classify_referral_type(self, text: str) -> str:
+    def _classify_referral_type(self, text: str, scan: Optional[KeywordScan] = None) -> str:
         """Classify the type of medical referral"""
-        type_indicators = {
-            'urgente': [
-                'urgente', 'emergencia', 'critico', 'inmediato',
-                'stat', 'codigo', 'trauma'
-            ],
-            'interconsulta': [
-                'interconsulta', 'consulta', 'valoracion',
-                'evaluacion', 'concepto', 'opinion'
-            ],
-            'traslado': [
-                'traslado', 'remision', 'transferencia',
-                'envio', 'derivacion'
-            ],
-            'programado': [
-                'programado', 'electivo', 'cita', 'control',
-                'seguimiento', 'revision'
-            ]
-        }
+        scan = scan or self.scanner.scan(text)
         
         type_scores = {}
-        for ref_type, indicators in type_indicators.items():
-            score = sum(1 for indicator in indicators if indicator in text)
+        for ref_type in self.referral_type_indicators:
+            score = scan.distinct(f'type:{ref_type}')
             if score > 0:
                 type_scores[ref_type] = score
         
@@ -251,12 +253,13 @@ class MedicalClassifier:
         else:
             return 'interconsulta'  # Default type
     
-    def _classify_priority(self, text: str) -> str:
+    def _classify_priority(self, text: str, scan: Optional[KeywordScan] = None) -> str:
         """Classify priority level of referral"""
+        scan = scan or self.scanner.scan(text)
         priority_scores = {}
         
-        for priority, keywords in self.urgency_indicators.items():
-            score = sum(1 for keyword in keywords if keyword in text)
+        for priority in self.urgency_indicators:
+            score = scan.distinct(f'urgency:{priority}')
             if score > 0:
                 priority_scores[priority] = score
         
@@ -279,23 +282,15 @@ class MedicalClassifier:
         try:
             self.logger.debug("Classifying document type", filename=filename)
             
-            text_lower = text.lower()
-            filename_lower = filename.lower()
-            
-            # Combine text and filename for analysis
-            combined_text = f"{text_lower} {filename_lower}"
+            text_scan = self.scanner.scan(text.lower())
+            filename_scan = self.scanner.scan(filename.lower())
             
             type_scores = {}
             
-            # Score each document type
-            for doc_type, keywords in self.document_types.items():
-                score = 0
-                for keyword in keywords:
-                    # Higher weight for filename matches
-                    if keyword in filename_lower:
-                        score += 3
-                    if keyword in text_lower:
-                        score += 1
+            # Score each document type; filename matches weigh more
+            for doc_type in self.document_types:
+                set_name = f'doc:{doc_type}'
+                score = filename_scan.distinct(set_name) * 3 + text_scan.distinct(set_name)
                 
                 if score > 0:
                     type_scores[doc_type] = score
@@ -314,12 +309,33 @@ class MedicalClassifier:
             self.logger.error("Document classification failed", error=str(e))
             return 'documento_general'
     
-    def extract_medical_entities(self, text: str) -> Dict[str, List[str]]:
+    def extract_medical_entities_batch(self, texts: List[str]) -> List[Dict[str, List[str]]]:
+        """
+        Extract medical entities from many texts, batching them through the NLP service
+        
+        Args:
+            texts: Texts to analyze
+            
+        Returns:
+            One dictionary of entities per text, in order
+        """
+        if not self.spacy_available:
+            return [self.extract_medical_entities(text) for text in texts]
+        
+        try:
+            docs = self.nlp_service.pipe(texts)
+            return [self.extract_medical_entities(text, doc) for text, doc in zip(texts, docs)]
+        except Exception as e:
+            self.logger.error("Batch entity extraction failed", error=str(e))
+            return [self.extract_medical_entities(text) for text in texts]
+    
+    def extract_medical_entities(self, text: str, doc=None) -> Dict[str, List[str]]:
         """
         Extract medical entities from text using NLP
         
         Args:
             text: Text to analyze
+            doc: SpaCy doc of text, when the caller already parsed it in a batch
             
         Returns:
             Dictionary of extracted entities by category
@@ -334,9 +350,10 @@ class MedicalClassifier:
         }
         
         try:
-            if self.spacy_available:
-                doc = self.nlp(text)
-                
+            if doc is None and self.spacy_available:
+                doc = self.nlp_service.parse(text)
+            
+            if doc is not None:
                 # Extract named entities
                 for ent in doc.ents:
                     if ent.label_ in ['PERSON', 'PER']:
@@ -372,28 +389,28 @@ class MedicalClassifier:
         
         return entities
     
-    def classify_urgency_level(self, text: str) -> Tuple[str, float]:
+    def classify_urgency_level(self, text: str, scan: Optional[KeywordScan] = None) -> Tuple[str, float]:
         """
         Classify urgency level with confidence score
         
         Args:
             text: Text to analyze
+            scan: Result of scan(text), reused when the caller already has it
             
         Returns:
             Tuple of (urgency_level, confidence_score)
         """
         try:
-            text_lower = text.lower()
+            scan = scan or self.scan(text)
             urgency_scores = {}
             
             for level, indicators in self.urgency_indicators.items():
                 score = 0
                 for indicator in indicators:
                     # Count occurrences with position weighting
-                    matches = list(re.finditer(re.escape(indicator), text_lower))
-                    for match in matches:
+                    for start in scan.positions(indicator):
                         # Higher weight for matches at the beginning
-                        position_weight = 1.0 - (match.start() / len(text_lower)) * 0.5
+                        position_weight = 1.0 - (start / scan.length) * 0.5
                         score += position_weight
                 
                 if score > 0:
@@ -3,7 +3,7 @@ Database Models for Gmail Integration - VITAL RED
 Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, JSON, ForeignKey, LargeBinary, Float, Enum
+from sqlalchemy import Column, Integer, String, Date, DateTime, Text, Boolean, JSON, ForeignKey, LargeBinary, Float, Enum, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -70,6 +70,12 @@ class EmailMessage(Base):
     attachments = relationship("EmailAttachment", back_populates="email_message", cascade="all, delete-orphan")
     processing_logs = relationship("ProcessingLog", back_populates="email_message", cascade="all, delete-orphan")
     
+    __table_args__ = (
+        # Keyset pagination: newest first, optionally within one status
+        Index('ix_email_messages_created', 'created_at', 'id'),
+        Index('ix_email_messages_status_created', 'status', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f"<EmailMessage(id={self.id}, gmail_id='{self.gmail_id}', subject='{self.subject[:50]}...')>"
 
@@ -91,7 +97,7 @@ class EmailAttachment(Base):
     
     # File storage
     file_path = Column(String(500))  # Path to stored file
-    file_hash = Column(String(64))   # SHA-256 hash for integrity
+    file_hash = Column(String(64), index=True)   # SHA-256 hash for integrity and blob store key
     is_encrypted = Column(Boolean, default=False)
     
     # Content extraction
@@ -119,6 +125,25 @@ class EmailAttachment(Base):
     def __repr__(self):
         return f"<EmailAttachment(id={self.id}, filename='{self.filename}', type='{self.document_type}')>"
 
+class AttachmentBlob(Base):
+    """
+    Content-addressed attachment files shared by identical attachments
+    """
+    __tablename__ = "attachment_blobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), unique=True, nullable=False, index=True)
+    file_size = Column(Integer, nullable=False)
+    mime_type = Column(String(100))
+    ref_count = Column(Integer, default=0, nullable=False)  # EmailAttachment rows using this blob
+    
+    # System metadata
+    created_at = Column(DateTime, default=func.now())
+    last_referenced_at = Column(DateTime, default=func.now())
+    
+    def __repr__(self):
+        return f"<AttachmentBlob(sha256='{self.sha256[:12]}', refs={self.ref_count})>"
+
 class ProcessingLog(Base):
     """
     Detailed logging table for tracking email processing steps
@@ -237,9 +262,38 @@ class MedicalReferral(Base):
     email_message = relationship("EmailMessage")
     patient_record = relationship("PatientRecord")
     
+    __table_args__ = (
+        # Keyset pagination: newest first, optionally within one status
+        Index('ix_medical_referrals_created', 'created_at', 'id'),
+        Index('ix_medical_referrals_status_created', 'status', 'created_at', 'id'),
+    )
+    
     def __repr__(self):
         return f"<MedicalReferral(id={self.id}, number='{self.referral_number}', specialty='{self.specialty_requested}')>"
 
+class ReferralDailyRollup(Base):
+    """
+    Referral counts and response times per creation day, status, priority and specialty
+
+    Maintained incrementally by rollups.py whenever referrals are created or
+    change status, so analytics over long ranges read days, not referrals.
+    """
+    __tablename__ = "referral_daily_rollups"
+    
+    day = Column(Date, primary_key=True)  # Day the referrals were created
+    status = Column(String(50), primary_key=True)
+    priority_level = Column(String(20), primary_key=True)
+    specialty = Column(String(100), primary_key=True)
+    
+    referral_count = Column(Integer, nullable=False, default=0)  # Referrals of the day currently in this status
+    response_seconds_sum = Column(Float, nullable=False, default=0.0)  # Creation to first decision
+    response_count = Column(Integer, nullable=False, default=0)
+    
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
+    
+    def __repr__(self):
+        return f"<ReferralDailyRollup(day={self.day}, status='{self.status}', count={self.referral_count})>"
+
 class SystemConfiguration(Base):
     """
     System configuration and settings
@@ -272,10 +326,10 @@ class ProcessingQueue(Base):
     # Task details
     task_type = Column(String(50), nullable=False)  # process_email, extract_attachment, etc.
     priority = Column(Integer, default=5, index=True)  # 1=highest, 10=lowest
-    status = Column(String(20), default="pending", index=True)  # pending, processing, completed, failed
+    status = Column(String(20), default="pending", index=True)  # pending, processing, completed, dead
     
     # Task data
-    email_message_id = Column(Integer, ForeignKey("email_messages.id"))
+    email_message_id = Column(Integer, ForeignKey("email_messages.id"), index=True)
     task_data = Column(JSON)  # Additional task-specific data
     
     # Scheduling
@@ -283,6 +337,10 @@ class ProcessingQueue(Base):
     started_at = Column(DateTime)
     completed_at = Column(DateTime)
     
+    # Lease held by the worker processing the task; expired leases are reclaimed
+    locked_by = Column(String(100))
+    lease_expires_at = Column(DateTime)
+    
     # Error handling
     error_message = Column(Text)
     retry_count = Column(Integer, default=0)
@@ -292,6 +350,11 @@ class ProcessingQueue(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
+    __table_args__ = (
+        # Claim query: claimable rows in priority then schedule order
+        Index('ix_processing_queue_claim', 'status', 'priority', 'scheduled_at'),
+    )
+    
     def __repr__(self):
         return f"<ProcessingQueue(id={self.id}, task_type='{self.task_type}', status='{self.status}')>"
 
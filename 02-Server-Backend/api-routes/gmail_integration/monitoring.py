@@ -17,7 +17,7 @@ from pathlib import Path
 import structlog
 
 from database import db_manager, email_repo, referral_repo
-from models import EmailMessage, MedicalReferral, ProcessingLog
+from aggregates import statistics_aggregator
 from config import MONITORING_CONFIG, LOGGING_CONFIG
 
 logger = structlog.get_logger(__name__)
@@ -115,48 +115,22 @@ class MetricsCollector:
     def collect_database_metrics(self) -> DatabaseMetrics:
         """Collect database-related metrics"""
         try:
-            with db_manager.get_session() as session:
-                # Email counts
-                total_emails = session.query(EmailMessage).count()
-                pending_emails = session.query(EmailMessage).filter_by(processing_status="pending").count()
-                processed_emails = session.query(EmailMessage).filter_by(processing_status="completed").count()
-                error_emails = session.query(EmailMessage).filter_by(processing_status="error").count()
-                
-                # Referral counts
-                total_referrals = session.query(MedicalReferral).count()
-                pending_referrals = session.query(MedicalReferral).filter_by(status="pending").count()
-                
-                # Processing rate (emails processed in last hour)
-                one_hour_ago = datetime.now() - timedelta(hours=1)
-                recent_processed = session.query(EmailMessage).filter(
-                    EmailMessage.date_processed >= one_hour_ago,
-                    EmailMessage.processing_status == "completed"
-                ).count()
-                processing_rate = recent_processed  # per hour
-                
-                # Average processing time
-                recent_logs = session.query(ProcessingLog).filter(
-                    ProcessingLog.start_time >= one_hour_ago,
-                    ProcessingLog.duration_seconds.isnot(None)
-                ).all()
-                
-                if recent_logs:
-                    avg_processing_time = sum(log.duration_seconds for log in recent_logs) / len(recent_logs)
-                else:
-                    avg_processing_time = 0.0
-                
-                return DatabaseMetrics(
-                    timestamp=datetime.now(),
-                    total_emails=total_emails,
-                    pending_emails=pending_emails,
-                    processed_emails=processed_emails,
-                    error_emails=error_emails,
-                    total_referrals=total_referrals,
-                    pending_referrals=pending_referrals,
-                    processing_rate=processing_rate,
-                    avg_processing_time=avg_processing_time
-                )
-                
+            # Email and referral counts plus the last hour's processing, one query per table
+            snapshot = statistics_aggregator.get_snapshot(("emails", "referrals", "processing"))
+            emails, referrals = snapshot["emails"], snapshot["referrals"]
+            
+            return DatabaseMetrics(
+                timestamp=datetime.now(),
+                total_emails=emails["total"],
+                pending_emails=emails["pending"],
+                processed_emails=emails["completed"],
+                error_emails=emails["error"],
+                total_referrals=referrals["total"],
+                pending_referrals=referrals["pending"],
+                processing_rate=emails["completed_last_hour"],  # per hour
+                avg_processing_time=snapshot["processing"]["avg_step_seconds"]
+            )
+            
         except Exception as e:
             self.logger.error("Failed to collect database metrics", error=str(e))
             return None
@@ -0,0 +1,126 @@
+"""
+Shared spaCy Service for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import time
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import structlog
+
+try:
+    import spacy
+    SPACY_AVAILABLE = True
+except ImportError:
+    SPACY_AVAILABLE = False
+
+from config import NLP_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+class NLPService:
+    """
+    One spaCy pipeline per process, loaded on first use
+
+    Callers only read doc.ents, so the components listed in
+    NLP_CONFIG["SPACY_EXCLUDE"] are not loaded at all. Bulk callers should
+    use pipe(), which batches documents through nlp.pipe.
+    """
+
+    def __init__(self, model_names: Optional[List[str]] = None, exclude: Optional[List[str]] = None,
+                 batch_size: Optional[int] = None, n_process: Optional[int] = None):
+        self.logger = logger.bind(component="nlp_service")
+        self.model_names = model_names or NLP_CONFIG["SPACY_MODELS"]
+        self.exclude = NLP_CONFIG["SPACY_EXCLUDE"] if exclude is None else exclude
+        self.batch_size = batch_size or NLP_CONFIG["SPACY_BATCH_SIZE"]
+        self.n_process = n_process or NLP_CONFIG["SPACY_N_PROCESS"]
+
+        self.nlp = None
+        self.model_name: Optional[str] = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self.stats = {'documents': 0, 'batches': 0, 'load_seconds': 0.0}
+
+    def load(self) -> bool:
+        """Load the first installed model; later calls return the cached result"""
+        if self._loaded:
+            return self.nlp is not None
+
+        with self._lock:
+            if self._loaded:
+                return self.nlp is not None
+
+            started = time.perf_counter()
+            if SPACY_AVAILABLE:
+                for name in self.model_names:
+                    try:
+                        self.nlp = spacy.load(name, exclude=self.exclude)
+                        self.model_name = name
+                        break
+                    except OSError:
+                        self.logger.warning("SpaCy model not found", model=name)
+                    except Exception as e:
+                        self.logger.error("Failed to load SpaCy model", model=name, error=str(e))
+
+            self.stats['load_seconds'] = round(time.perf_counter() - started, 3)
+            self._loaded = True
+
+            if self.nlp is not None:
+                self.logger.info("SpaCy model loaded", model=self.model_name,
+                                 components=self.nlp.pipe_names, seconds=self.stats['load_seconds'])
+            else:
+                self.logger.warning("No SpaCy models available")
+
+        return self.nlp is not None
+
+    @property
+    def available(self) -> bool:
+        return self.load()
+
+    def parse(self, text: str):
+        """Doc for one text, or None without a model"""
+        if not self.load():
+            return None
+        self.stats['documents'] += 1
+        return self.nlp(text)
+
+    def pipe(self, texts: Iterable[str], batch_size: Optional[int] = None,
+             n_process: Optional[int] = None) -> Iterator[Any]:
+        """
+        Docs for many texts, in order, batched through nlp.pipe
+
+        Yields None for every text when no model is available, so callers
+        can zip the results with their inputs either way.
+        """
+        if not self.load():
+            for _ in texts:
+                yield None
+            return
+
+        batch_size = batch_size or self.batch_size
+        n_process = n_process or self.n_process
+        count = 0
+        for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+            count += 1
+            yield doc
+
+        self.stats['documents'] += count
+        self.stats['batches'] += -(-count // batch_size)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Loaded model and documents processed by this process"""
+        stats = dict(self.stats)
+        stats['model'] = self.model_name
+        stats['components'] = list(self.nlp.pipe_names) if self.nlp is not None else []
+        return stats
+
+_nlp_service: Optional[NLPService] = None
+_nlp_service_lock = threading.Lock()
+
+def get_nlp_service() -> NLPService:
+    """Return the process-wide NLP service, creating it on first use"""
+    global _nlp_service
+    with _nlp_service_lock:
+        if _nlp_service is None:
+            _nlp_service = NLPService()
+        return _nlp_service
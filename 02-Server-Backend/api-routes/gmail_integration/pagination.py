@@ -0,0 +1,129 @@
+"""
+Keyset Pagination for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+import structlog
+
+from sqlalchemy import or_
+
+from config import PERFORMANCE_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+class InvalidCursor(ValueError):
+    """A cursor that was not produced by encode_cursor"""
+
+@dataclass(frozen=True)
+class Page:
+    """One page of a list, newest first, and the cursor of the next page"""
+    items: List[Any] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+    limit: int = 0
+
+def clamp_limit(limit: int) -> int:
+    return max(1, min(int(limit), PERFORMANCE_CONFIG["PAGE_SIZE_MAX"]))
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    """Opaque cursor for the row a page ended on"""
+    data = json.dumps([created_at.isoformat(), row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(data).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(created_at, id) of a cursor; raises InvalidCursor when it is malformed"""
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, row_id = json.loads(data)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+def keyset_page(query, model, cursor: Optional[str], limit: int) -> Tuple[list, Optional[str]]:
+    """
+    Rows of query after cursor, ordered by (created_at, id) descending
+
+    Seeks on the (created_at, id) index instead of skipping rows, so a deep
+    page costs the same as the first. Returns the rows and the next cursor,
+    None on the last page.
+    """
+    limit = clamp_limit(limit)
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        # The leading <= bound is redundant but gives the planner an index range to seek
+        query = query.filter(
+            model.created_at <= created_at,
+            or_(model.created_at < created_at, model.id < row_id)
+        )
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+class CountCache:
+    """
+    List totals computed in the background and reused for a TTL
+
+    get() never runs the COUNT on the request path: it returns the last
+    value for the key, or None while the first count is still running, and
+    schedules a recount once the value is older than the TTL.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: int = 256,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl if ttl is not None else PERFORMANCE_CONFIG["COUNT_CACHE_TTL"]
+        self.max_entries = max_entries
+        self.clock = clock
+        self.logger = logger.bind(component="count_cache")
+        self._lock = threading.Lock()
+        self._values: "OrderedDict[Hashable, Tuple[int, float, datetime]]" = OrderedDict()
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="count-cache")
+
+    def get(self, key: Hashable, count_fn: Callable[[], int]) -> Optional[Dict[str, Any]]:
+        """
+        Cached total for key
+
+        Returns:
+            Dict with value, as_of and stale, or None until the first count finishes
+        """
+        with self._lock:
+            entry = self._values.get(key)
+            stale = entry is None or self.clock() - entry[1] >= self.ttl
+            if stale and key not in self._pending:
+                self._pending.add(key)
+                self._executor.submit(self._refresh, key, count_fn)
+        if entry is None:
+            return None
+        value, _, as_of = entry
+        return {'value': value, 'as_of': as_of.isoformat(), 'stale': stale}
+
+    def _refresh(self, key: Hashable, count_fn: Callable[[], int]):
+        try:
+            value = count_fn()
+            with self._lock:
+                self._values[key] = (value, self.clock(), datetime.utcnow())
+                self._values.move_to_end(key)
+                while len(self._values) > self.max_entries:
+                    self._values.popitem(last=False)
+        except Exception as e:
+            self.logger.error("Background count failed", key=str(key), error=str(e))
+        finally:
+            with self._lock:
+                self._pending.discard(key)
+
+    def wait(self):
+        """Block until the counts already scheduled have finished"""
+        self._executor.submit(lambda: None).result()
+
+# Global count cache instance
+count_cache = CountCache()
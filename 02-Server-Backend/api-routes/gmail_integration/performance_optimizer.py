@@ -7,6 +7,10 @@ import asyncio
 import time
 import json
 import hashlib
+import fnmatch
+import mimetypes
+from pathlib import Path
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Callable, Union
 from functools import wraps, lru_cache
@@ -22,6 +26,25 @@ from config import PERFORMANCE_CONFIG, REDIS_CONFIG
 
 logger = structlog.get_logger(__name__)
 
+# One TextExtractor per worker process, created by the pool initializer
+_worker_extractor = None
+
+def _init_extraction_worker():
+    """Process pool initializer: build the extractor once per worker process"""
+    global _worker_extractor
+    from text_extractor import TextExtractor
+    _worker_extractor = TextExtractor()
+
+def _extract_text_worker(file_path: str, mime_type: str, file_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Worker function for text extraction"""
+    try:
+        if _worker_extractor is None:
+            _init_extraction_worker()
+        return _worker_extractor.extract_text_with_details(Path(file_path), mime_type, file_hash)
+    except Exception as e:
+        logger.error("Text extraction worker error", file_path=file_path, error=str(e))
+        return None
+
 @dataclass
 class PerformanceMetrics:
     operation: str
@@ -89,17 +112,23 @@ class PerformanceMonitor:
 class CacheManager:
     """
     Advanced caching system with Redis backend
+
+    The local tier is an LRU bounded by PERFORMANCE_CONFIG["LOCAL_CACHE_SIZE"].
     """
     
-    def __init__(self):
+    SCAN_BATCH = 500
+    
+    def __init__(self, max_local_entries: Optional[int] = None):
         self.logger = logger.bind(component="cache_manager")
         self.redis_client = self._initialize_redis()
-        self.local_cache = {}
+        self.local_cache = OrderedDict()
+        self.max_local_entries = max_local_entries or PERFORMANCE_CONFIG["LOCAL_CACHE_SIZE"]
         self.cache_stats = {
             'hits': 0,
             'misses': 0,
             'sets': 0,
-            'deletes': 0
+            'deletes': 0,
+            'evictions': 0
         }
     
     def _initialize_redis(self) -> Optional[redis.Redis]:
@@ -147,6 +176,7 @@ class CacheManager:
             if key in self.local_cache:
                 entry = self.local_cache[key]
                 if entry['expires'] > time.time():
+                    self.local_cache.move_to_end(key)
                     self.cache_stats['hits'] += 1
                     return entry['value']
                 else:
@@ -169,11 +199,15 @@ class CacheManager:
             if self.redis_client:
                 self.redis_client.setex(key, expire, serialized_value)
             
-            # Set in local cache
+            # Set in local cache, evicting the least recently used entries
             self.local_cache[key] = {
                 'value': value,
                 'expires': time.time() + expire
             }
+            self.local_cache.move_to_end(key)
+            while len(self.local_cache) > self.max_local_entries:
+                self.local_cache.popitem(last=False)
+                self.cache_stats['evictions'] += 1
             
             self.cache_stats['sets'] += 1
             
@@ -195,15 +229,26 @@ class CacheManager:
             self.logger.error("Cache delete error", key=key, error=str(e))
     
     def clear_pattern(self, pattern: str):
-        """Clear all keys matching pattern"""
+        """
+        Clear all keys matching a glob pattern
+
+        Redis is walked with SCAN in batches rather than KEYS, which blocks
+        the server for the whole keyspace. Prefer tagged invalidation
+        (response_cache) on request paths.
+        """
         try:
             if self.redis_client:
-                keys = self.redis_client.keys(pattern)
-                if keys:
-                    self.redis_client.delete(*keys)
+                batch = []
+                for key in self.redis_client.scan_iter(match=pattern, count=self.SCAN_BATCH):
+                    batch.append(key)
+                    if len(batch) >= self.SCAN_BATCH:
+                        self.redis_client.unlink(*batch)
+                        batch = []
+                if batch:
+                    self.redis_client.unlink(*batch)
             
             # Clear from local cache
-            keys_to_delete = [k for k in self.local_cache.keys() if pattern in k]
+            keys_to_delete = [k for k in self.local_cache.keys() if fnmatch.fnmatchcase(k, pattern)]
             for key in keys_to_delete:
                 del self.local_cache[key]
                 
@@ -219,6 +264,7 @@ class CacheManager:
             **self.cache_stats,
             'hit_rate': hit_rate,
             'local_cache_size': len(self.local_cache),
+            'local_cache_max': self.max_local_entries,
             'redis_available': self.redis_client is not None
         }
 
@@ -294,7 +340,8 @@ class ProcessingOptimizer:
     def __init__(self):
         self.logger = logger.bind(component="processing_optimizer")
         self.thread_pool = ThreadPoolExecutor(max_workers=PERFORMANCE_CONFIG["MAX_WORKERS"])
-        self.process_pool = ProcessPoolExecutor(max_workers=min(4, mp.cpu_count()))
+        self.process_pool = ProcessPoolExecutor(max_workers=min(4, mp.cpu_count()),
+                                                initializer=_init_extraction_worker)
         self.processing_queue = asyncio.Queue(maxsize=PERFORMANCE_CONFIG["QUEUE_SIZE"])
         self.performance_monitor = PerformanceMonitor()
     
@@ -368,19 +415,24 @@ class ProcessingOptimizer:
         
         return results
     
-    async def optimize_text_extraction(self, file_path: str) -> Optional[str]:
+    async def optimize_text_extraction(self, file_path: str, mime_type: Optional[str] = None,
+                                       file_hash: Optional[str] = None) -> Optional[str]:
         """Optimize text extraction using parallel processing"""
         start_time = time.time()
         
         try:
+            mime_type = mime_type or mimetypes.guess_type(str(file_path))[0] or "application/octet-stream"
+            
             # Use process pool for CPU-intensive text extraction
             loop = asyncio.get_event_loop()
             
-            # Run text extraction in separate process
+            # Run text extraction in a worker process; each worker reuses its extractor and cache
             result = await loop.run_in_executor(
                 self.process_pool,
-                self._extract_text_worker,
-                file_path
+                _extract_text_worker,
+                str(file_path),
+                mime_type,
+                file_hash
             )
             
             duration = time.time() - start_time
@@ -392,27 +444,17 @@ class ProcessingOptimizer:
                 end_time=time.time(),
                 duration=duration,
                 memory_usage=0,
-                cpu_usage=0
+                cpu_usage=0,
+                cache_hit=bool(result and result.get('cached'))
             )
             self.performance_monitor.record_metric(metric)
             
-            return result
+            return result['text'] if result else None
             
         except Exception as e:
             self.logger.error("Text extraction optimization failed", 
                             file_path=file_path, error=str(e))
             return None
-    
-    def _extract_text_worker(self, file_path: str) -> Optional[str]:
-        """Worker function for text extraction"""
-        from text_extractor import TextExtractor
-        
-        try:
-            extractor = TextExtractor()
-            return extractor.extract_text(file_path)
-        except Exception as e:
-            logger.error("Text extraction worker error", file_path=file_path, error=str(e))
-            return None
 
 class MemoryOptimizer:
     """
@@ -460,37 +502,33 @@ class MemoryOptimizer:
 
 class ConnectionPoolManager:
     """
-    Database connection pool optimization
+    Database connection pool monitoring
+    
+    Pool sizing is configured in DATABASE_CONFIG and applied by db_pool; this
+    reads the live pool metrics and warns when the pool runs near capacity.
     """
     
     def __init__(self):
         self.logger = logger.bind(component="connection_pool")
-        self.pool_stats = {
-            'active_connections': 0,
-            'total_connections': 0,
-            'connection_errors': 0
-        }
+        self.pool_stats: Dict[str, Any] = {}
+        self._last_timeouts = 0
     
     def optimize_connection_pool(self):
-        """Optimize database connection pool"""
+        """Refresh pool_stats from the live pool and warn on saturation"""
         try:
-            # Monitor connection pool health
-            engine = db_manager.engine
-            pool = engine.pool
-            
-            self.pool_stats.update({
-                'active_connections': pool.checkedout(),
-                'total_connections': pool.size(),
-                'connection_errors': 0  # Would implement actual error tracking
-            })
-            
-            # Log pool statistics
-            if self.pool_stats['active_connections'] > pool.size() * 0.8:
+            self.pool_stats = db_manager.get_pool_status() or {}
+            
+            capacity = self.pool_stats.get('size', 0) + self.pool_stats.get('max_overflow', 0)
+            if capacity and self.pool_stats['checked_out'] >= capacity * 0.8:
                 self.logger.warning("High connection pool usage", stats=self.pool_stats)
+            timeouts = self.pool_stats.get('timeouts', 0)
+            if timeouts > self._last_timeouts:
+                self.logger.warning("Connection pool checkouts timed out", 
+                                  new_timeouts=timeouts - self._last_timeouts, stats=self.pool_stats)
+            self._last_timeouts = timeouts
             
         except Exception as e:
-            self.logger.error("Connection pool optimization error", error=str(e))
-            self.pool_stats['connection_errors'] += 1
+            self.logger.error("Connection pool monitoring error", error=str(e))
 
 # Performance decorators
 def performance_monitor(operation_name: str):
@@ -0,0 +1,208 @@
+"""
+Authenticated Principal Cache for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import structlog
+
+from config import SECURITY_CONFIG
+from database import db_manager, DatabaseManager
+
+logger = structlog.get_logger(__name__)
+
+class LocalInvalidationBus:
+    """
+    Stand-in when Redis is unavailable
+
+    Delivers invalidations to the caches of this process only; other
+    processes see the change once their entries expire (the cache TTL).
+    """
+
+    backend = "local"
+
+    def __init__(self):
+        self._handlers = []
+
+    def subscribe(self, handler: Callable[[Any], None]):
+        self._handlers.append(handler)
+
+    def publish(self, message: Any):
+        for handler in self._handlers:
+            handler(message)
+
+class RedisInvalidationBus:
+    """
+    Invalidations broadcast to every process over a Redis pub/sub channel
+
+    Messages are published as strings; decode turns them back into what
+    the handler expects (a user id by default).
+    """
+
+    backend = "redis"
+
+    def __init__(self, redis_client, channel: str, decode: Callable[[str], Any] = int):
+        self.redis_client = redis_client
+        self.channel = channel
+        self.decode = decode
+        self._pubsub = None
+        self._thread = None
+
+    def subscribe(self, handler: Callable[[Any], None]):
+        def on_message(message):
+            try:
+                handler(self.decode(message['data']))
+            except (TypeError, ValueError):
+                logger.warning("Ignoring malformed invalidation", channel=self.channel, data=message.get('data'))
+
+        self._pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(**{self.channel: on_message})
+        self._thread = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def publish(self, message: Any):
+        self.redis_client.publish(self.channel, message)
+
+class PrincipalCache:
+    """
+    Short-lived LRU cache of authenticated users, keyed by (user id, token id)
+
+    get_or_load() only runs the database lookup on a miss. Entries expire
+    after the TTL so deactivations made elsewhere are picked up, and
+    invalidate() drops every token of a user at once and tells the other
+    processes through the invalidation bus (Redis pub/sub when reachable).
+    A per-user generation counter keeps a lookup that raced with an
+    invalidation from storing the stale principal.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, max_entries: Optional[int] = None,
+                 db_manager: DatabaseManager = db_manager, bus=None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl if ttl is not None else SECURITY_CONFIG["PRINCIPAL_CACHE_TTL"]
+        self.max_entries = max_entries or SECURITY_CONFIG["PRINCIPAL_CACHE_SIZE"]
+        self.db_manager = db_manager
+        self.clock = clock
+        self.logger = logger.bind(component="principal_cache")
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[int, str], Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._generations: Dict[int, int] = {}
+        self._bus = bus
+        self._bus_lock = threading.Lock()
+        if bus is not None:
+            bus.subscribe(self._drop)
+
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0,
+                      'invalidations': 0, 'load_seconds': 0.0}
+
+    @property
+    def bus(self):
+        """Invalidation bus, chosen on first use: Redis when reachable, else local"""
+        if self._bus is None:
+            with self._bus_lock:
+                if self._bus is None:
+                    bus = None
+                    try:
+                        if self.db_manager.redis_client:
+                            bus = RedisInvalidationBus(self.db_manager.redis_client,
+                                                       SECURITY_CONFIG["PRINCIPAL_CACHE_CHANNEL"])
+                            bus.subscribe(self._drop)
+                    except Exception as e:
+                        self.logger.warning("Redis invalidation unavailable, using local bus", error=str(e))
+                        bus = None
+                    if bus is None:
+                        bus = LocalInvalidationBus()
+                        bus.subscribe(self._drop)
+                    self._bus = bus
+                    self.logger.info("Principal invalidation bus selected", backend=bus.backend)
+        return self._bus
+
+    def get(self, user_id: int, token_id: str) -> Optional[Dict[str, Any]]:
+        """Cached principal for this token, None on a miss or once expired"""
+        key = (user_id, token_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            principal, expires_at = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.stats['expired'] += 1
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return principal
+
+    def get_or_load(self, user_id: int, token_id: str,
+                    loader: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Cached principal, or the result of loader() which is then cached
+
+        A None from the loader (unknown or inactive user) is not cached.
+        """
+        principal = self.get(user_id, token_id)
+        if principal is not None:
+            return principal
+
+        self.bus  # Subscribe before trusting anything we cache
+        with self._lock:
+            generation = self._generations.get(user_id, 0)
+        started = time.perf_counter()
+        principal = loader()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.stats['load_seconds'] += elapsed
+            if principal is not None and self._generations.get(user_id, 0) == generation:
+                self._entries[(user_id, token_id)] = (principal, self.clock() + self.ttl)
+                self._entries.move_to_end((user_id, token_id))
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.stats['evicted'] += 1
+        return principal
+
+    def _drop(self, user_id: int):
+        with self._lock:
+            self._generations[user_id] = self._generations.get(user_id, 0) + 1
+            for key in [key for key in self._entries if key[0] == user_id]:
+                del self._entries[key]
+
+    def invalidate(self, user_id: int):
+        """Forget every cached token of user_id here and in the other processes"""
+        self._drop(user_id)
+        with self._lock:
+            self.stats['invalidations'] += 1
+        try:
+            self.bus.publish(user_id)
+        except Exception as e:
+            self.logger.error("Failed to broadcast principal invalidation", user_id=user_id, error=str(e))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rate and the database time the hits saved"""
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+        lookups = stats['hits'] + stats['misses']
+        loads = stats['misses']
+        avg_load = stats.pop('load_seconds') / loads if loads else 0.0
+        stats.update({
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttl_seconds': self.ttl,
+            'backend': self._bus.backend if self._bus is not None else None,
+            'hit_rate': round(stats['hits'] / lookups, 4) if lookups else 0.0,
+            'avg_load_ms': round(avg_load * 1000, 3),
+            'saved_ms': round(stats['hits'] * avg_load * 1000, 1)
+        })
+        return stats
+
+# Global principal cache instance
+principal_cache = PrincipalCache()
@@ -0,0 +1,156 @@
+"""
+Raw Message Store for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import gzip
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import structlog
+
+from config import PROCESSING_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+class RawMessageStore:
+    """
+    Compressed on-disk store of raw Gmail API messages keyed by gmail_id
+
+    Keeps the full format='full' payload so processing can run from disk
+    instead of fetching the message from Gmail a second time, and so it can
+    be replayed offline. Total size is capped; the least recently used
+    messages are evicted first (reads refresh the file mtime).
+    """
+
+    SUFFIX = ".json.gz"
+
+    def __init__(self, directory: Path = None, max_bytes: int = None):
+        self.directory = Path(directory or PROCESSING_CONFIG["RAW_MESSAGE_STORE_DIR"])
+        self.max_bytes = max_bytes if max_bytes is not None else PROCESSING_CONFIG["RAW_MESSAGE_STORE_MAX_BYTES"]
+        self.logger = logger.bind(component="raw_message_store")
+        self._lock = threading.Lock()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._sizes = {
+            path.name[:-len(self.SUFFIX)]: path.stat().st_size
+            for path in self.directory.glob(f"*{self.SUFFIX}")
+        }
+        self._total_bytes = sum(self._sizes.values())
+
+    def _key(self, gmail_id: str) -> str:
+        """Filesystem-safe key; Gmail IDs are hex but never trust input"""
+        return re.sub(r'[^\w\-]', '_', gmail_id)
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}{self.SUFFIX}"
+
+    def put(self, gmail_id: str, message: Dict[str, Any]) -> bool:
+        """
+        Store a raw Gmail message
+
+        Args:
+            gmail_id: Gmail message ID
+            message: Raw message as returned by the Gmail API
+
+        Returns:
+            True if stored, False on error
+        """
+        try:
+            key = self._key(gmail_id)
+            path = self._path(key)
+            data = gzip.compress(json.dumps(message, separators=(',', ':')).encode('utf-8'), compresslevel=6)
+
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+            with self._lock:
+                self._total_bytes += len(data) - self._sizes.get(key, 0)
+                self._sizes[key] = len(data)
+                self._evict_if_needed(keep=key)
+
+            return True
+
+        except Exception as e:
+            self.logger.error("Failed to store raw message", gmail_id=gmail_id, error=str(e))
+            return False
+
+    def get(self, gmail_id: str) -> Optional[Dict[str, Any]]:
+        """Load a raw Gmail message, or None if it is not stored"""
+        path = self._path(self._key(gmail_id))
+        try:
+            with open(path, 'rb') as f:
+                message = json.loads(gzip.decompress(f.read()).decode('utf-8'))
+            os.utime(path)  # Mark as recently used
+            return message
+
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            self.logger.error("Failed to load raw message", gmail_id=gmail_id, error=str(e))
+            return None
+
+    def contains(self, gmail_id: str) -> bool:
+        """Check if a message is stored"""
+        return self._path(self._key(gmail_id)).exists()
+
+    def delete(self, gmail_id: str) -> bool:
+        """Remove a stored message"""
+        with self._lock:
+            return self._remove(self._key(gmail_id))
+
+    def list_ids(self) -> List[str]:
+        """Stored message IDs, oldest first"""
+        paths = sorted(self.directory.glob(f"*{self.SUFFIX}"), key=lambda p: p.stat().st_mtime)
+        return [path.name[:-len(self.SUFFIX)] for path in paths]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Store size statistics"""
+        with self._lock:
+            return {
+                'messages': len(self._sizes),
+                'total_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes,
+            }
+
+    def _remove(self, key: str) -> bool:
+        """Delete a stored file and update the size accounting (lock held)"""
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            self.logger.warning("Failed to remove raw message", gmail_id=key, error=str(e))
+            return False
+
+        self._total_bytes -= self._sizes.pop(key, 0)
+        return True
+
+    def _evict_if_needed(self, keep: str = None):
+        """Evict least recently used messages until under the size cap (lock held)"""
+        if self._total_bytes <= self.max_bytes:
+            return
+
+        candidates = []
+        for key in self._sizes:
+            if key == keep:
+                continue
+            try:
+                candidates.append((self._path(key).stat().st_mtime, key))
+            except FileNotFoundError:
+                candidates.append((0, key))
+
+        evicted = 0
+        for _, key in sorted(candidates):
+            if self._total_bytes <= self.max_bytes:
+                break
+            if self._remove(key):
+                evicted += 1
+
+        if evicted:
+            self.logger.info("Evicted raw messages", count=evicted, total_bytes=self._total_bytes)
@@ -0,0 +1,121 @@
+"""
+Startup Readiness for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+class ReadinessRegistry:
+    """
+    Tracks heavy resources that load after the process starts serving
+
+    Liveness only says the process answers. Readiness says every required
+    component (database, keys, ...) has loaded; optional components such as
+    NLP models are reported but do not block it. Components load on first
+    use anyway, so warm_up() only moves that cost off the first request.
+    """
+
+    def __init__(self):
+        self.logger = logger.bind(component="readiness")
+        self.started_at = time.time()
+        self._components: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._warm_up_thread: Optional[threading.Thread] = None
+
+    def register(self, name: str, loader: Callable[[], Any], required: bool = True):
+        """Register a component; loader returns a falsy value or raises when it fails"""
+        with self._lock:
+            if name not in self._components:
+                self._components[name] = {
+                    'loader': loader, 'required': required,
+                    'status': 'pending', 'error': None, 'seconds': None
+                }
+
+    def warm_up(self, names: Optional[List[str]] = None) -> bool:
+        """Load components in this thread; returns True when all required ones are ready"""
+        for name in names or list(self._components):
+            component = self._components[name]
+            if component['status'] == 'ready':
+                continue
+
+            component['status'] = 'loading'
+            started = time.perf_counter()
+            try:
+                ok = component['loader']() is not False
+                component['error'] = None if ok else 'unavailable'
+            except Exception as e:
+                ok = False
+                component['error'] = str(e)
+            component['seconds'] = round(time.perf_counter() - started, 3)
+            component['status'] = 'ready' if ok else 'failed'
+
+            log = self.logger.info if ok or not component['required'] else self.logger.error
+            log("Component warm-up finished", name=name, status=component['status'],
+                seconds=component['seconds'], error=component['error'])
+
+        return self.is_ready()
+
+    def start_background_warm_up(self) -> threading.Thread:
+        """Warm up in a daemon thread so the server starts answering immediately"""
+        with self._lock:
+            if self._warm_up_thread is None or not self._warm_up_thread.is_alive():
+                self._warm_up_thread = threading.Thread(
+                    target=self.warm_up, name="warm-up", daemon=True
+                )
+                self._warm_up_thread.start()
+            return self._warm_up_thread
+
+    def is_ready(self) -> bool:
+        return all(c['status'] == 'ready' for c in self._components.values() if c['required'])
+
+    def get_status(self) -> Dict[str, Any]:
+        """Readiness and per-component status"""
+        components = {
+            name: {key: value for key, value in c.items() if key != 'loader'}
+            for name, c in list(self._components.items())
+        }
+        return {
+            'ready': self.is_ready(),
+            'components': components,
+            'timestamp': datetime.now().isoformat()
+        }
+
+    def liveness(self) -> Dict[str, Any]:
+        """Liveness: no dependency is touched"""
+        return {
+            'status': 'alive',
+            'uptime': round(time.time() - self.started_at, 3),
+            'timestamp': datetime.now().isoformat()
+        }
+
+def _load_database():
+    from database import db_manager
+    return db_manager.initialize()
+
+def _load_security():
+    from security import security_manager
+    return security_manager.initialize()
+
+def _load_nlp():
+    from nlp_service import get_nlp_service
+    return get_nlp_service().load()
+
+def _load_tesseract():
+    from text_extractor import tesseract_version_available
+    return tesseract_version_available()
+
+def register_default_components(registry: "ReadinessRegistry"):
+    """Resources shared by the API servers and the poller"""
+    registry.register("database", _load_database)
+    registry.register("security", _load_security)
+    registry.register("nlp", _load_nlp, required=False)
+    registry.register("tesseract", _load_tesseract, required=False)
+
+readiness = ReadinessRegistry()
+register_default_components(readiness)
@@ -0,0 +1,262 @@
+"""
+API Response Cache for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import structlog
+
+from config import PERFORMANCE_CONFIG
+from database import db_manager, DatabaseManager
+from principal_cache import LocalInvalidationBus, RedisInvalidationBus
+
+logger = structlog.get_logger(__name__)
+
+KEY_PREFIX = "vital_red:response:"
+TAG_PREFIX = "vital_red:response_tag:"
+TAG_VERSION_TTL = 86400  # seconds; refreshed on every invalidation, far longer than any route TTL
+
+def _encode(value: Any) -> Any:
+    """json.dumps fallback for the values route handlers return"""
+    if hasattr(value, 'to_dict'):
+        return value.to_dict()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return str(value)
+
+@dataclass
+class _Entry:
+    value: Any
+    expires_at: float
+    generations: Tuple[int, ...]
+
+class ResponseCache:
+    """
+    Two-tier cache for GET route responses, invalidated by tag
+
+    Responses are kept in a bounded in-process LRU and in Redis, keyed by
+    route and parameters, for the route's TTL. Each response carries the
+    tags of the data it was built from ("referrals", "templates", ...).
+    Write routes call invalidate() with the tags they touch, which bumps
+    a version per tag instead of finding and deleting keys: Redis entries
+    remember the tag versions they were built with and are ignored once
+    those move on, and other processes drop their local copies when the
+    invalidation reaches them over pub/sub. Nothing scans the keyspace.
+
+    Values are stored in their JSON form, so a local hit, a Redis hit and
+    a fresh load all return the same thing.
+    """
+
+    def __init__(self, db_manager: DatabaseManager = db_manager, ttls: Optional[Dict[str, int]] = None,
+                 max_entries: Optional[int] = None, bus=None, redis_client=None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.db_manager = db_manager
+        self.ttls = ttls if ttls is not None else PERFORMANCE_CONFIG["RESPONSE_CACHE_TTLS"]
+        self.max_entries = max_entries or PERFORMANCE_CONFIG["RESPONSE_CACHE_SIZE"]
+        self.clock = clock
+        self.logger = logger.bind(component="response_cache")
+
+        self._redis_client = redis_client
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._bus = bus
+        self._bus_lock = threading.Lock()
+        if bus is not None:
+            bus.subscribe(self._on_invalidation)
+
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0, 'expired': 0, 'evicted': 0,
+                      'invalidations': 0, 'redis_errors': 0, 'load_seconds': 0.0}
+
+    @property
+    def redis_client(self):
+        if self._redis_client is not None:
+            return self._redis_client
+        return self.db_manager.redis_client
+
+    @property
+    def bus(self):
+        """Invalidation bus, chosen on first use: Redis when reachable, else local"""
+        if self._bus is None:
+            with self._bus_lock:
+                if self._bus is None:
+                    bus = None
+                    try:
+                        if self.redis_client:
+                            bus = RedisInvalidationBus(self.redis_client, PERFORMANCE_CONFIG["RESPONSE_CACHE_CHANNEL"],
+                                                       decode=str)
+                            bus.subscribe(self._on_invalidation)
+                    except Exception as e:
+                        self.logger.warning("Redis invalidation unavailable, using local bus", error=str(e))
+                        bus = None
+                    if bus is None:
+                        bus = LocalInvalidationBus()
+                        bus.subscribe(self._on_invalidation)
+                    self._bus = bus
+                    self.logger.info("Response cache invalidation bus selected", backend=bus.backend)
+        return self._bus
+
+    def make_key(self, route: str, params: Optional[Dict[str, Any]] = None) -> str:
+        digest = hashlib.sha1(json.dumps(params or {}, sort_keys=True, default=str).encode()).hexdigest()
+        return f"{KEY_PREFIX}{route}:{digest}"
+
+    def _local_generations(self, tags: Tuple[str, ...]) -> Tuple[int, ...]:
+        return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def _get_local(self, key: str, generations: Tuple[int, ...]) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            if entry.expires_at <= self.clock() or entry.generations != generations:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.stats['local_hits'] += 1
+            return True, entry.value
+
+    def _store_local(self, key: str, value: Any, ttl: float, generations: Tuple[int, ...], tags: Tuple[str, ...]):
+        with self._lock:
+            # An invalidation that ran while the value was being built makes it stale already
+            if ttl <= 0 or self._local_generations(tags) != generations:
+                return
+            self._entries[key] = _Entry(value, self.clock() + ttl, generations)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evicted'] += 1
+
+    def _get_redis(self, client, key: str, tags: Tuple[str, ...]) -> Tuple[Optional[dict], list]:
+        """Stored payload (or None) and the current tag versions, in one round trip"""
+        pipeline = client.pipeline(transaction=False)
+        pipeline.get(key)
+        if tags:
+            pipeline.mget([TAG_PREFIX + tag for tag in tags])
+        results = pipeline.execute()
+        versions = [int(version or 0) for version in results[1]] if tags else []
+        payload = json.loads(results[0]) if results[0] else None
+        return payload, versions
+
+    def get_or_load(self, route: str, params: Optional[Dict[str, Any]], loader: Callable[[], Any],
+                    tags: Iterable[str] = (), ttl: Optional[float] = None) -> Any:
+        """
+        Cached response for route and params, or the result of loader() which is then cached
+
+        A None from the loader (e.g. not found) is returned but not cached.
+        """
+        ttl = ttl if ttl is not None else self.ttls.get(route, PERFORMANCE_CONFIG["CACHE_TTL"])
+        tags = tuple(sorted(set(tags)))
+        key = self.make_key(route, params)
+
+        self.bus  # Subscribe before trusting anything we cache
+        with self._lock:
+            generations = self._local_generations(tags)
+        found, value = self._get_local(key, generations)
+        if found:
+            return value
+
+        client, versions = None, []
+        try:
+            client = self.redis_client
+            if client:
+                payload, versions = self._get_redis(client, key, tags)
+                if payload is not None and payload['versions'] == versions:
+                    with self._lock:
+                        self.stats['redis_hits'] += 1
+                    age = max(time.time() - payload['stored_at'], 0.0)
+                    self._store_local(key, payload['value'], min(ttl, payload['ttl']) - age, generations, tags)
+                    return payload['value']
+        except Exception as e:
+            self.logger.warning("Redis response cache unavailable for this request", route=route, error=str(e))
+            with self._lock:
+                self.stats['redis_errors'] += 1
+            client = None
+
+        started = time.perf_counter()
+        value = loader()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.stats['misses'] += 1
+            self.stats['load_seconds'] += elapsed
+        if value is None:
+            return None
+
+        encoded = json.dumps(value, default=_encode)
+        value = json.loads(encoded)
+        self._store_local(key, value, ttl, generations, tags)
+        if client:
+            try:
+                client.setex(key, int(ttl), json.dumps({
+                    'versions': versions, 'stored_at': time.time(), 'ttl': ttl, 'value': value
+                }))
+            except Exception as e:
+                self.logger.warning("Failed to store response in Redis", route=route, error=str(e))
+        return value
+
+    def _on_invalidation(self, message: str):
+        self._bump([tag for tag in message.split(",") if tag])
+
+    def _bump(self, tags: Iterable[str]):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def invalidate(self, *tags: str):
+        """Make every response built from these tags stale, here and in the other processes"""
+        tags = tuple(sorted(set(tags)))
+        if not tags:
+            return
+        self._bump(tags)
+        with self._lock:
+            self.stats['invalidations'] += 1
+        try:
+            client = self.redis_client
+            if client:
+                pipeline = client.pipeline(transaction=False)
+                for tag in tags:
+                    pipeline.incr(TAG_PREFIX + tag)
+                    pipeline.expire(TAG_PREFIX + tag, TAG_VERSION_TTL)
+                pipeline.execute()
+        except Exception as e:
+            self.logger.error("Failed to bump response cache tags", tags=tags, error=str(e))
+        try:
+            self.bus.publish(",".join(tags))
+        except Exception as e:
+            self.logger.error("Failed to broadcast response cache invalidation", tags=tags, error=str(e))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Hit rates per tier and the load time the hits saved"""
+        with self._lock:
+            stats = dict(self.stats)
+            size = len(self._entries)
+        hits = stats['local_hits'] + stats['redis_hits']
+        lookups = hits + stats['misses']
+        avg_load = stats.pop('load_seconds') / stats['misses'] if stats['misses'] else 0.0
+        stats.update({
+            'size': size,
+            'max_entries': self.max_entries,
+            'ttls': dict(self.ttls),
+            'backend': self._bus.backend if self._bus is not None else None,
+            'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+            'avg_load_ms': round(avg_load * 1000, 3),
+            'saved_ms': round(hits * avg_load * 1000, 1)
+        })
+        return stats
+
+# Global response cache instance
+response_cache = ResponseCache()
@@ -0,0 +1,215 @@
+"""
+Referral Analytics Rollups for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from collections import defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+import structlog
+
+from sqlalchemy import and_, delete, event, extract, func, insert, inspect, update
+from sqlalchemy.orm import Session
+
+from models import MedicalReferral, ReferralDailyRollup
+
+logger = structlog.get_logger(__name__)
+
+ROLLUP = ReferralDailyRollup.__table__
+KEY_COLUMNS = ('day', 'status', 'priority_level', 'specialty')
+SUM_COLUMNS = ('referral_count', 'response_seconds_sum', 'response_count')
+TRACKED = ('status', 'priority_level', 'specialty_requested')
+PENDING = "pending"
+
+def _key(created_at: datetime, status: Optional[str], priority: Optional[str], specialty: Optional[str]) -> tuple:
+    # Key columns are part of the primary key, so missing values are stored as ''
+    return (created_at.date(), status or "", priority or "", specialty or "")
+
+class ReferralRollups:
+    """
+    Daily referral rollups, kept current on every flush that touches a referral
+
+    A referral counts in the row of its creation day and current status,
+    priority and specialty; a change moves it from one row to the other.
+    The time from creation to its first decision (leaving "pending") is
+    added to the row of that decision. Analytics then read one row per
+    day and combination instead of scanning medical_referrals.
+    """
+
+    def __init__(self):
+        self.logger = logger.bind(component="referral_rollups")
+
+    def collect_changes(self, session: Session) -> Dict[tuple, list]:
+        """Rollup deltas for the referrals a flush inserts, changes or deletes"""
+        deltas = defaultdict(lambda: [0, 0.0, 0])
+        now = datetime.now()
+
+        for referral in session.new:
+            if isinstance(referral, MedicalReferral) and referral.created_at is not None:
+                deltas[_key(referral.created_at, referral.status or PENDING, referral.priority_level,
+                            referral.specialty_requested)][0] += 1
+
+        for referral in session.dirty:
+            if not isinstance(referral, MedicalReferral) or referral.created_at is None:
+                continue
+            state = inspect(referral)
+            new = {attr: getattr(referral, attr) for attr in TRACKED}
+            old = dict(new)
+            for attr in TRACKED:
+                history = state.attrs[attr].history
+                if history.deleted:
+                    old[attr] = history.deleted[0]
+                elif history.added:
+                    self.logger.warning("Previous referral value not loaded; rollup not moved",
+                                        referral_id=referral.id, attribute=attr)
+                    break
+            else:
+                if old == new:
+                    continue
+                deltas[_key(referral.created_at, *old.values())][0] -= 1
+                new_key = _key(referral.created_at, *new.values())
+                deltas[new_key][0] += 1
+                if old['status'] == PENDING and new['status'] != PENDING:
+                    deltas[new_key][1] += max((now - referral.created_at).total_seconds(), 0.0)
+                    deltas[new_key][2] += 1
+
+        for referral in session.deleted:
+            if isinstance(referral, MedicalReferral) and referral.created_at is not None:
+                deltas[_key(referral.created_at, referral.status, referral.priority_level,
+                            referral.specialty_requested)][0] -= 1
+
+        return {key: delta for key, delta in deltas.items() if any(delta)}
+
+    def apply(self, connection, deltas: Dict[tuple, list]):
+        """Add deltas to their rollup rows, creating missing rows, in the caller's transaction"""
+        rows = [dict(zip(KEY_COLUMNS + SUM_COLUMNS, key + tuple(delta))) for key, delta in deltas.items()]
+        dialect = connection.dialect.name
+
+        if dialect == "mysql":
+            from sqlalchemy.dialects.mysql import insert as mysql_insert
+            statement = mysql_insert(ROLLUP)
+            statement = statement.on_duplicate_key_update(
+                updated_at=func.now(),
+                **{column: ROLLUP.c[column] + statement.inserted[column] for column in SUM_COLUMNS}
+            )
+            connection.execute(statement, rows)
+        elif dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            statement = dialect_insert(ROLLUP)
+            statement = statement.on_conflict_do_update(
+                index_elements=[ROLLUP.c[column] for column in KEY_COLUMNS],
+                set_=dict(updated_at=func.now(),
+                          **{column: ROLLUP.c[column] + statement.excluded[column] for column in SUM_COLUMNS})
+            )
+            connection.execute(statement, rows)
+        else:
+            for row in rows:
+                result = connection.execute(
+                    update(ROLLUP)
+                    .where(and_(*[ROLLUP.c[column] == row[column] for column in KEY_COLUMNS]))
+                    .values(updated_at=func.now(), **{column: ROLLUP.c[column] + row[column] for column in SUM_COLUMNS})
+                )
+                if result.rowcount == 0:
+                    connection.execute(insert(ROLLUP).values(**row))
+
+    def rebuild(self, session: Session) -> int:
+        """
+        Recompute every rollup row from medical_referrals
+
+        For existing data, or after changes made outside the ORM. Historical
+        decisions are timed from creation to the referral's last update,
+        the closest record available. Returns the number of rows written.
+        """
+        deltas = defaultdict(lambda: [0, 0.0, 0])
+        referrals = session.query(
+            MedicalReferral.created_at, MedicalReferral.updated_at, MedicalReferral.status,
+            MedicalReferral.priority_level, MedicalReferral.specialty_requested
+        ).filter(MedicalReferral.created_at.isnot(None)).yield_per(5000)
+
+        for created_at, updated_at, status, priority, specialty in referrals:
+            delta = deltas[_key(created_at, status, priority, specialty)]
+            delta[0] += 1
+            if status != PENDING and updated_at is not None:
+                delta[1] += max((updated_at - created_at).total_seconds(), 0.0)
+                delta[2] += 1
+
+        session.execute(delete(ROLLUP))
+        if deltas:
+            self.apply(session.connection(), deltas)
+        self.logger.info("Referral rollups rebuilt", rows=len(deltas))
+        return len(deltas)
+
+    def _range(self, query, start_day: Optional[date], end_day: Optional[date]):
+        if start_day:
+            query = query.filter(ROLLUP.c.day >= start_day)
+        if end_day:
+            query = query.filter(ROLLUP.c.day <= end_day)
+        return query
+
+    def analytics(self, session: Session, start_day: Optional[date] = None,
+                  end_day: Optional[date] = None) -> Dict[str, Any]:
+        """Status, priority, specialty and monthly distributions for referrals created in the range"""
+        year, month = extract('year', ROLLUP.c.day), extract('month', ROLLUP.c.day)
+        rows = self._range(session.query(
+            year, month, ROLLUP.c.status, ROLLUP.c.priority_level, ROLLUP.c.specialty,
+            func.sum(ROLLUP.c.referral_count), func.sum(ROLLUP.c.response_seconds_sum),
+            func.sum(ROLLUP.c.response_count)
+        ), start_day, end_day).group_by(
+            year, month, ROLLUP.c.status, ROLLUP.c.priority_level, ROLLUP.c.specialty
+        ).all()
+
+        by_status, by_priority, by_specialty, by_month = (defaultdict(int) for _ in range(4))
+        total, response_seconds, responses = 0, 0.0, 0
+        for row_year, row_month, status, priority, specialty, count, seconds, decided in rows:
+            count = int(count or 0)
+            by_status[status] += count
+            by_priority[priority] += count
+            by_specialty[specialty] += count
+            by_month[(int(row_year), int(row_month))] += count
+            total += count
+            response_seconds += float(seconds or 0.0)
+            responses += int(decided or 0)
+
+        return {
+            'status': {key: count for key, count in by_status.items() if count},
+            'priority': {key: count for key, count in by_priority.items() if count},
+            'specialty': sorted(((key, count) for key, count in by_specialty.items() if count),
+                                key=lambda item: item[1], reverse=True)[:10],
+            'monthly': sorted((year_month, count) for year_month, count in by_month.items() if count),
+            'total': total,
+            'avg_response_hours': response_seconds / responses / 3600 if responses else None
+        }
+
+    def average_response_hours(self, session: Session, start_day: Optional[date] = None,
+                               end_day: Optional[date] = None) -> Optional[float]:
+        """Average hours from creation to first decision, for referrals created in the range"""
+        seconds, responses = self._range(session.query(
+            func.sum(ROLLUP.c.response_seconds_sum), func.sum(ROLLUP.c.response_count)
+        ), start_day, end_day).one()
+        return float(seconds) / int(responses) / 3600 if responses else None
+
+# Global referral rollups instance
+referral_rollups = ReferralRollups()
+
+@event.listens_for(Session, "before_flush")
+def _stamp_new_referrals(session, flush_context, instances):
+    # created_at is a server default; set it here so the rollup day is known without a reload
+    for referral in session.new:
+        if isinstance(referral, MedicalReferral) and referral.created_at is None:
+            referral.created_at = datetime.now()
+
+@event.listens_for(Session, "after_flush")
+def _roll_up_referral_changes(session, flush_context):
+    # new/dirty/deleted and attribute history still describe this flush here
+    deltas = referral_rollups.collect_changes(session)
+    if deltas:
+        referral_rollups.apply(session.connection(), deltas)
+
+if __name__ == "__main__":
+    from database import db_manager
+
+    with db_manager.get_session() as session:
+        print(f"Rebuilt {referral_rollups.rebuild(session)} referral rollup rows")
@@ -21,6 +21,7 @@ from api import app
 from websocket_server import start_websocket_server
 from monitoring import SystemMonitor
 from config import API_CONFIG, LOGGING_CONFIG
+from readiness import readiness
 
 # Configure logging
 structlog.configure(
@@ -62,6 +63,9 @@ class VitalRedGmailService:
         self.logger.info("Starting VITAL RED Gmail Integration Services")
         
         try:
+            # Database, keys and models load in the background; see /health/ready
+            readiness.start_background_warm_up()
+            
             # Start Gmail Integration Service
             self.gmail_service = GmailIntegrationService()
             gmail_task = asyncio.create_task(self.gmail_service.start_service())
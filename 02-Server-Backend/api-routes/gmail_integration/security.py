@@ -10,6 +10,7 @@ import hmac
 import secrets
 import base64
 import json
+import threading
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional, Union
 from pathlib import Path
@@ -36,8 +37,26 @@ class EncryptionManager:
         self.encryption_key = self._get_or_create_encryption_key()
         self.fernet = Fernet(self.encryption_key)
         
-        # Initialize RSA keys for asymmetric encryption
-        self.private_key, self.public_key = self._get_or_create_rsa_keys()
+        # RSA keys for asymmetric encryption are loaded (or generated) on first use
+        self._rsa_keys = None
+        self._rsa_lock = threading.Lock()
+    
+    @property
+    def rsa_keys(self) -> tuple:
+        """(private_key, public_key), loaded once"""
+        if self._rsa_keys is None:
+            with self._rsa_lock:
+                if self._rsa_keys is None:
+                    self._rsa_keys = self._get_or_create_rsa_keys()
+        return self._rsa_keys
+    
+    @property
+    def private_key(self):
+        return self.rsa_keys[0]
+    
+    @property
+    def public_key(self):
+        return self.rsa_keys[1]
     
     def _get_or_create_encryption_key(self) -> bytes:
         """Get or create encryption key for symmetric encryption"""
@@ -590,6 +609,15 @@ class SecurityManager:
         self.security_validator = SecurityValidator()
         self.compliance_manager = ComplianceManager()
         self.logger = logger.bind(component="security_manager")
+    
+    def initialize(self) -> bool:
+        """Load the RSA keys now instead of on first use (startup warm-up)"""
+        try:
+            self.encryption_manager.rsa_keys
+            return True
+        except Exception as e:
+            self.logger.error("Security warm-up failed", error=str(e))
+            return False
 
     def encrypt_data(self, data: str) -> str:
         """Encrypt sensitive data"""
@@ -198,6 +198,11 @@ CREATE INDEX IF NOT EXISTS idx_medical_referrals_priority ON medical_referrals(p
 CREATE INDEX IF NOT EXISTS idx_medical_referrals_date ON medical_referrals(referral_date DESC);
 CREATE INDEX IF NOT EXISTS idx_medical_referrals_patient ON medical_referrals(patient_record_id);
 
+-- Keyset pagination: newest first, optionally within one status
+CREATE INDEX IF NOT EXISTS ix_email_messages_created ON email_messages(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_medical_referrals_created ON medical_referrals(created_at, id);
+CREATE INDEX IF NOT EXISTS ix_medical_referrals_status_created ON medical_referrals(status, created_at, id);
+
 CREATE INDEX IF NOT EXISTS idx_processing_logs_email_id ON processing_logs(email_message_id);
 CREATE INDEX IF NOT EXISTS idx_processing_logs_step ON processing_logs(step_name);
 CREATE INDEX IF NOT EXISTS idx_processing_logs_timestamp ON processing_logs(start_time DESC);
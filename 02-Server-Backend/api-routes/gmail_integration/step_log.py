@@ -0,0 +1,243 @@
+"""
+Processing Step Log Writer for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import structlog
+
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+
+from database import DatabaseManager, db_manager
+from models import ProcessingLog
+from config import PROCESSING_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+def step_row(email_id: int, step_name: str, status: str, message: Optional[str],
+             start_time: datetime, end_time: Optional[datetime] = None,
+             duration_seconds: Optional[float] = None) -> Dict[str, Any]:
+    """A processing_logs row; every row has the same keys so batches insert as one statement"""
+    return {
+        'email_message_id': email_id,
+        'step_name': step_name,
+        'status': status,
+        'message': message,
+        'start_time': start_time,
+        'end_time': end_time,
+        'duration_seconds': duration_seconds
+    }
+
+class StepTimer:
+    """Handle yielded by timed_step; set message to describe the outcome"""
+
+    __slots__ = ('message',)
+
+    def __init__(self, message: Optional[str] = None):
+        self.message = message
+
+@contextmanager
+def timed_step(sink: Callable[[Dict[str, Any]], None], email_id: int, step_name: str,
+               message: Optional[str] = None):
+    """
+    Time a processing step and hand one row to sink when it ends
+
+    The row is 'completed' with the handle's message, or 'error' with the
+    exception text when the block raises; the exception propagates.
+    """
+    step = StepTimer(message)
+    start_time = datetime.now()
+    started = time.perf_counter()
+    try:
+        yield step
+    except Exception as e:
+        sink(step_row(email_id, step_name, "error", str(e), start_time, datetime.now(),
+                      time.perf_counter() - started))
+        raise
+    sink(step_row(email_id, step_name, "completed", step.message, start_time, datetime.now(),
+                  time.perf_counter() - started))
+
+class StepLogWriter:
+    """
+    Writes processing step rows off the critical path
+
+    record() only appends to a bounded in-memory ring buffer and updates
+    per-step aggregates; a daemon thread inserts the rows in batches. When
+    the database is down the buffer keeps the newest rows and drops the
+    oldest, which are counted.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, capacity: Optional[int] = None,
+                 batch_size: Optional[int] = None, flush_interval: Optional[float] = None):
+        self.db_manager = db_manager
+        self.capacity = capacity or PROCESSING_CONFIG["STEP_LOG_BUFFER_SIZE"]
+        self.batch_size = batch_size or PROCESSING_CONFIG["STEP_LOG_BATCH_SIZE"]
+        self.flush_interval = flush_interval or PROCESSING_CONFIG["STEP_LOG_FLUSH_INTERVAL"]
+        self.logger = logger.bind(component="step_log_writer")
+
+        self._buffer: deque = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._steps: Dict[str, Dict[str, float]] = {}
+        self._counters = {'recorded': 0, 'written': 0, 'dropped': 0, 'rejected': 0, 'flush_errors': 0}
+
+    def record(self, row: Dict[str, Any]):
+        """Buffer one row; never touches the database"""
+        self.record_many([row])
+
+    def record_many(self, rows: Iterable[Dict[str, Any]]):
+        """Buffer rows and update the per-step aggregates"""
+        with self._lock:
+            for row in rows:
+                if len(self._buffer) >= self.capacity:
+                    self._buffer.popleft()
+                    self._counters['dropped'] += 1
+                self._buffer.append(row)
+                self._counters['recorded'] += 1
+                self._aggregate(row)
+            pending = len(self._buffer)
+
+        self._ensure_started()
+        if pending >= self.batch_size:
+            self._wake.set()
+
+    def _aggregate(self, row: Dict[str, Any]):
+        step = self._steps.setdefault(row['step_name'], {
+            'count': 0, 'errors': 0, 'timed': 0, 'total_seconds': 0.0, 'max_seconds': 0.0
+        })
+        step['count'] += 1
+        if row['status'] == "error":
+            step['errors'] += 1
+        duration = row.get('duration_seconds')
+        if duration is not None:
+            step['timed'] += 1
+            step['total_seconds'] += duration
+            step['max_seconds'] = max(step['max_seconds'], duration)
+
+    def timed_step(self, email_id: int, step_name: str, message: Optional[str] = None):
+        """Context manager timing a step and recording it here"""
+        return timed_step(self.record, email_id, step_name, message)
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._start_lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopping.clear()
+                    self._thread = threading.Thread(target=self._run, name="step-log-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def _drain(self, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            count = min(limit, len(self._buffer))
+            return [self._buffer.popleft() for _ in range(count)]
+
+    def _requeue(self, rows: List[Dict[str, Any]]):
+        """Put rows back in front after a failed insert, as far as the buffer has room"""
+        with self._lock:
+            room = max(self.capacity - len(self._buffer), 0)
+            kept = rows[len(rows) - room:] if room < len(rows) else rows
+            self._counters['dropped'] += len(rows) - len(kept)
+            self._buffer.extendleft(reversed(kept))
+
+    def flush(self) -> int:
+        """Insert buffered rows now, in batches; returns the number written"""
+        written = 0
+        with self._flush_lock:
+            while True:
+                rows = self._drain(self.batch_size)
+                if not rows:
+                    break
+                try:
+                    written += self._insert_batch(rows)
+                except Exception as e:
+                    with self._lock:
+                        self._counters['flush_errors'] += 1
+                    self.logger.error("Failed to write processing step logs", rows=len(rows), error=str(e))
+                    break
+
+        if written:
+            with self._lock:
+                self._counters['written'] += written
+        return written
+
+    def _insert_batch(self, rows: List[Dict[str, Any]]) -> int:
+        """
+        Insert rows in one statement; when that violates a constraint (a row
+        refers to an email that is gone), insert them one by one and discard
+        the offending rows. Rows not written are put back in the buffer.
+        """
+        try:
+            self._insert(rows)
+            return len(rows)
+        except IntegrityError:
+            pass
+        except Exception:
+            self._requeue(rows)
+            raise
+
+        written = 0
+        for index, row in enumerate(rows):
+            try:
+                self._insert([row])
+                written += 1
+            except IntegrityError as e:
+                with self._lock:
+                    self._counters['rejected'] += 1
+                self.logger.warning("Discarded processing step log", email_id=row['email_message_id'],
+                                    step_name=row['step_name'], error=str(e))
+            except Exception:
+                self._requeue(rows[index:])
+                with self._lock:
+                    self._counters['written'] += written
+                raise
+        return written
+
+    def _insert(self, rows: List[Dict[str, Any]]):
+        with self.db_manager.get_session() as session:
+            # NULLs rendered so every row has the same columns and the insert stays one statement
+            session.execute(insert(ProcessingLog).execution_options(render_nulls=True), rows)
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the flusher thread after writing what is buffered"""
+        self._stopping.set()
+        self._wake.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffer counters and per-step count, errors and durations since start"""
+        with self._lock:
+            steps = {
+                name: {
+                    'count': step['count'],
+                    'errors': step['errors'],
+                    'avg_seconds': round(step['total_seconds'] / step['timed'], 4) if step['timed'] else 0.0,
+                    'max_seconds': round(step['max_seconds'], 4)
+                }
+                for name, step in self._steps.items()
+            }
+            return {**self._counters, 'buffered': len(self._buffer), 'steps': steps}
+
+# Global writer shared by every EmailProcessor of this process
+step_log = StepLogWriter(db_manager)
+atexit.register(step_log.stop)
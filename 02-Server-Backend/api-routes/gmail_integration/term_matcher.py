@@ -0,0 +1,129 @@
+"""
+Medical Terminology Matcher for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import hashlib
+import json
+import re
+import threading
+import unicodedata
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+_WORD = re.compile(r"\w+")
+_TERMS = "$"  # Trie key holding the (category, term) pairs that end at a node
+
+@dataclass(frozen=True)
+class TermMatch:
+    text: str
+    category: str
+    term: str
+    start: int
+    end: int
+
+def fold(text: str) -> str:
+    """Lower-case and drop accents: 'Cirugía' -> 'cirugia', 'riñones' -> 'rinones'"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+class TermMatcher:
+    """
+    Finds the terms of several categories in one pass over a text
+
+    Terms are folded (see fold) and split into words, and stored in a trie
+    keyed by word. The text is tokenized once with \\w+ and each token is
+    folded and looked up, so a term only matches whole words, like the
+    \\b...\\b regexes it replaces, and the words of a multi-word term may be
+    separated by any whitespace. A term listed in several categories yields
+    one match per category.
+    """
+
+    MAX_FOLDED_TOKENS = 50000
+
+    def __init__(self, terminology: Dict[str, Iterable[str]]):
+        self.root: Dict[str, dict] = {}
+        self.term_count = 0
+        for category, terms in terminology.items():
+            for term in dict.fromkeys(terms):
+                words = fold(term).split()
+                if not words:
+                    continue
+                node = self.root
+                for word in words:
+                    node = node.setdefault(word, {})
+                entries = node.setdefault(_TERMS, [])
+                if (category, term) not in entries:
+                    entries.append((category, term))
+                    self.term_count += 1
+
+        self._folded: Dict[str, str] = {}
+
+    def _fold_token(self, token: str) -> str:
+        folded = self._folded.get(token)
+        if folded is None:
+            folded = fold(token)
+            if len(self._folded) >= self.MAX_FOLDED_TOKENS:
+                self._folded.clear()
+            self._folded[token] = folded
+        return folded
+
+    def find(self, text: str) -> List[TermMatch]:
+        """All term occurrences, in text order"""
+        matches: List[TermMatch] = []
+        if not text:
+            return matches
+
+        tokens: List[Tuple[str, int, int]] = [
+            (self._fold_token(m.group()), m.start(), m.end()) for m in _WORD.finditer(text)
+        ]
+        root = self.root
+
+        for i, (word, start, end) in enumerate(tokens):
+            node = root.get(word)
+            j = i
+            while node is not None:
+                for category, term in node.get(_TERMS, ()):
+                    matches.append(TermMatch(text[start:end], category, term, start, end))
+                j += 1
+                has_longer_terms = len(node) > (1 if _TERMS in node else 0)
+                if j == len(tokens) or not has_longer_terms:
+                    break
+                # Words of a term are separated by whitespace only
+                if not text[end:tokens[j][1]].isspace():
+                    break
+                word, _, end = tokens[j]
+                node = node.get(word)
+
+        return matches
+
+# Matchers are built once per process per terminology version
+MAX_CACHED_MATCHERS = 4
+_matchers: Dict[str, TermMatcher] = {}
+_matchers_lock = threading.Lock()
+
+def terminology_fingerprint(terminology: Dict[str, Iterable[str]]) -> str:
+    """Stable hash of a terminology, used to detect dictionary changes"""
+    payload = json.dumps({category: list(terms) for category, terms in terminology.items()}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def get_term_matcher(terminology: Dict[str, Iterable[str]]) -> TermMatcher:
+    """Shared matcher for a terminology; changed dictionaries get a new matcher"""
+    fingerprint = terminology_fingerprint(terminology)
+    matcher = _matchers.get(fingerprint)
+    if matcher is None:
+        with _matchers_lock:
+            matcher = _matchers.get(fingerprint)
+            if matcher is None:
+                matcher = TermMatcher(terminology)
+                # Reloaded dictionaries replace older versions; keep only the latest few
+                while len(_matchers) >= MAX_CACHED_MATCHERS:
+                    _matchers.pop(next(iter(_matchers)))
+                _matchers[fingerprint] = matcher
+                logger.info("Medical term matcher built", terms=matcher.term_count, fingerprint=fingerprint[:12])
+    return matcher
@@ -10,7 +10,7 @@ import shutil
 from pathlib import Path
 from datetime import datetime, timedelta
 from unittest.mock import Mock, MagicMock
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 # Import application modules
@@ -54,6 +54,42 @@ def db_session(test_database):
     session.rollback()
     session.close()
 
+@pytest.fixture
+def make_db_manager(tmp_path):
+    """
+    Factory for a DatabaseManager over a SQLite file, for code that opens its own sessions
+    
+    The returned function takes:
+        seed: Called with a session to insert rows, committed before the manager is returned
+        count_statements: Record executed SQL on manager.statements and pool
+            checkouts on manager.checkouts, both starting after the seeding
+    """
+    def make(seed=None, count_statements=False):
+        engine = create_engine(f"sqlite:///{tmp_path / 'vital_red.db'}")
+        Base.metadata.create_all(engine)
+        manager = DatabaseManager()
+        manager._engine = engine
+        manager._session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        
+        if seed:
+            with manager.get_session() as session:
+                seed(session)
+        
+        if count_statements:
+            manager.statements, manager.checkouts = [], 0
+            
+            def record_statement(conn, cursor, statement, *args):
+                manager.statements.append(statement)
+            
+            def count_checkout(*args):
+                manager.checkouts += 1
+            
+            event.listen(engine, "before_cursor_execute", record_statement)
+            event.listen(engine, "checkout", count_checkout)
+        return manager
+    
+    return make
+
 @pytest.fixture
 def temp_directory():
     """Create a temporary directory for test files"""
@@ -0,0 +1,126 @@
+"""
+Aggregated Statistics Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from aggregates import StatisticsAggregator
+from models import EmailMessage, MedicalReferral, PatientRecord, User
+
+def add_statistics_data(session):
+    """Emails, referrals over the last days, users and a patient"""
+    now = datetime.now()
+    for n, (processing, medical, age) in enumerate([
+        ("pending", True, 0), ("completed", True, 1), ("completed", False, 40), ("error", False, 2)
+    ], start=1):
+        session.add(EmailMessage(id=n, gmail_id=f"g{n}", subject="Remision", sender_email="a@eps.com.co",
+                                 recipient_email="vitalred@hospital.com", date_received=now,
+                                 processing_status=processing, is_medical_referral=medical,
+                                 status="processed" if processing == "completed" else "pending",
+                                 date_processed=now - timedelta(minutes=10 if n == 2 else 600),
+                                 created_at=now - timedelta(days=age)))
+    for n, (status, age) in enumerate([("pending", 0), ("pending", 0), ("approved", 1), ("rejected", 6),
+                                       ("approved", 45)], start=1):
+        session.add(MedicalReferral(id=n, email_message_id=1, referral_type="interconsulta",
+                                    specialty_requested="cardiologia", priority_level="alta", status=status,
+                                    referral_date=now, created_at=now - timedelta(days=age)))
+    session.add_all([
+        User(email="admin@hospital.com", name="Admin", password_hash="x", role="administrator"),
+        User(email="eval@hospital.com", name="Eval", password_hash="x", role="medical_evaluator"),
+        User(email="old@hospital.com", name="Old", password_hash="x", role="medical_evaluator", is_active=False),
+    ])
+    session.add(PatientRecord(document_number="1020304050", full_name="Maria Gomez"))
+
+@pytest.fixture
+def manager(make_db_manager):
+    """DatabaseManager over an empty SQLite file"""
+    return make_db_manager()
+
+@pytest.fixture
+def seeded(make_db_manager):
+    """DatabaseManager over the statistics data above, recording statements"""
+    return make_db_manager(seed=add_statistics_data, count_statements=True)
+
+def selects(manager):
+    """SELECT statements the manager ran since seeding"""
+    return [statement for statement in manager.statements if statement.startswith("SELECT")]
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestSections:
+    """Test each section against the data, one query per table"""
+
+    def test_dashboard_counts(self, seeded):
+        """Test the values the admin dashboard shows"""
+        snapshot = StatisticsAggregator(seeded).get_snapshot(("users", "emails", "referrals"))
+
+        assert snapshot["users"] == {'total': 3, 'active': 2, 'administrators': 1, 'evaluators': 2}
+        assert snapshot["emails"]["last_30_days"] == 3
+        assert snapshot["referrals"]["last_30_days"] == 4
+        assert [day["referrals"] for day in snapshot["referrals"]["daily"]] == [2, 1, 0, 0, 0, 0, 1]
+        assert len(selects(seeded)) == 3
+
+    def test_email_and_referral_counts(self, seeded):
+        """Test status breakdowns used by the WebSocket and monitoring consumers"""
+        snapshot = StatisticsAggregator(seeded).get_snapshot(("emails", "referrals", "patients"))
+
+        emails = snapshot["emails"]
+        assert (emails["total"], emails["pending"], emails["completed"], emails["error"]) == (4, 1, 2, 1)
+        assert (emails["status_processed"], emails["status_pending"], emails["medical_referrals"]) == (2, 2, 2)
+        assert emails["completed_last_hour"] == 1
+        assert (snapshot["referrals"]["pending"], snapshot["referrals"]["approved"]) == (2, 2)
+        assert snapshot["patients"] == {'total': 1}
+
+    def test_empty_tables(self, manager):
+        """Test zeros rather than NULL sums"""
+        snapshot = StatisticsAggregator(manager).get_snapshot(("emails", "users", "processing"))
+
+        assert snapshot["emails"]["pending"] == 0
+        assert snapshot["users"]["active"] == 0
+        assert snapshot["processing"] == {'avg_step_seconds': 0.0}
+
+class TestSharing:
+    """Test the short-lived cache shared between consumers"""
+
+    def test_consumers_share_cached_sections(self, seeded):
+        """Test a second consumer within the TTL runs no queries"""
+        aggregator = StatisticsAggregator(seeded, ttl=5, clock=Clock())
+        aggregator.get_snapshot(("users", "emails", "referrals"))   # admin dashboard
+        aggregator.get_snapshot(("emails", "referrals"))            # WebSocket statistics
+
+        assert len(selects(seeded)) == 3
+        assert aggregator.get_stats()['hits'] == 2
+
+    def test_only_missing_sections_are_queried(self, seeded):
+        """Test monitoring adds its own section without recomputing the shared ones"""
+        aggregator = StatisticsAggregator(seeded, ttl=5, clock=Clock())
+        aggregator.get_snapshot(("emails", "referrals"))
+        seeded.statements.clear()
+
+        aggregator.get_snapshot(("emails", "referrals", "processing"))
+
+        assert len(selects(seeded)) == 1 and "processing_logs" in selects(seeded)[0]
+
+    def test_sections_expire(self, seeded):
+        """Test new data is seen after the TTL or an invalidation"""
+        clock = Clock()
+        aggregator = StatisticsAggregator(seeded, ttl=5, clock=clock)
+        assert aggregator.get_snapshot(("patients",))["patients"]["total"] == 1
+        with seeded.get_session() as session:
+            session.add(PatientRecord(document_number="99", full_name="Juan Perez"))
+
+        assert aggregator.get_snapshot(("patients",))["patients"]["total"] == 1
+        clock.now = 6
+        assert aggregator.get_snapshot(("patients",))["patients"]["total"] == 2
+        with seeded.get_session() as session:
+            session.add(PatientRecord(document_number="100", full_name="Ana Ruiz"))
+        aggregator.invalidate("patients")
+        assert aggregator.get_snapshot(("patients",))["patients"]["total"] == 3
@@ -0,0 +1,106 @@
+"""
+Blob Store Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import hashlib
+import os
+import time
+import pytest
+from datetime import datetime
+
+from blob_store import BlobStore
+from models import AttachmentBlob, EmailAttachment, EmailMessage
+
+def _write(path, content):
+    path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest()
+
+def _attachment(db_session, file_hash):
+    """Persist an email with one attachment referencing a hash"""
+    email = EmailMessage(
+        gmail_id=f"blob_test_{time.time_ns()}",
+        subject="Epicrisis",
+        sender_email="doctor@hospital.com",
+        recipient_email="referencias@hospital.com",
+        date_received=datetime.now(),
+    )
+    db_session.add(email)
+    db_session.flush()
+    attachment = EmailAttachment(
+        email_message_id=email.id,
+        filename="epicrisis.pdf",
+        original_filename="epicrisis.pdf",
+        mime_type="application/pdf",
+        file_size=10,
+        file_hash=file_hash,
+    )
+    db_session.add(attachment)
+    db_session.flush()
+    return attachment
+
+class TestBlobStore:
+    """Test content-addressed attachment storage"""
+
+    def test_duplicate_content_is_stored_once(self, temp_directory):
+        """Test that identical files share one blob"""
+        store = BlobStore(temp_directory / "blobs")
+        first = temp_directory / "msg1_att1_epicrisis.pdf"
+        second = temp_directory / "msg2_att7_epicrisis.pdf"
+        sha = _write(first, b"%PDF epicrisis")
+        _write(second, b"%PDF epicrisis")
+
+        path_one = store.store_file(first, sha)
+        path_two = store.store_file(second, sha)
+
+        assert path_one == path_two
+        assert path_one.read_bytes() == b"%PDF epicrisis"
+        assert not first.exists() and not second.exists()
+        assert len(list((temp_directory / "blobs").rglob("*"))) == 3  # two directories and one blob
+
+    def test_invalid_hash_is_rejected(self, temp_directory):
+        """Test that only SHA-256 hex digests are accepted as keys"""
+        store = BlobStore(temp_directory / "blobs")
+
+        with pytest.raises(ValueError):
+            store.blob_path("../../etc/passwd")
+
+    def test_reference_counting(self, db_session, temp_directory):
+        """Test that references are counted per hash"""
+        store = BlobStore(temp_directory / "blobs")
+        sha = hashlib.sha256(b"refcount").hexdigest()
+
+        store.add_reference(db_session, sha, 8, "application/pdf")
+        store.add_reference(db_session, sha, 8, "application/pdf")
+        store.release_reference(db_session, sha)
+
+        blob = db_session.query(AttachmentBlob).filter_by(sha256=sha).one()
+        assert blob.ref_count == 1
+
+    def test_garbage_collection_keeps_referenced_blobs(self, db_session, temp_directory):
+        """Test that GC removes only blobs no attachment uses"""
+        store = BlobStore(temp_directory / "blobs")
+        used = store.store_file(temp_directory / "used.pdf", _write(temp_directory / "used.pdf", b"used"))
+        unused = store.store_file(temp_directory / "unused.pdf", _write(temp_directory / "unused.pdf", b"unused"))
+
+        _attachment(db_session, used.name)
+        store.add_reference(db_session, used.name, 4)
+        # Stale count: the attachment row is gone but the release was missed
+        store.add_reference(db_session, unused.name, 6)
+        db_session.flush()
+
+        result = store.collect_garbage(db_session, grace_period=0)
+
+        assert used.exists()
+        assert not unused.exists()
+        assert result["removed"] == 1
+        assert result["reclaimed_bytes"] == 6
+
+    def test_garbage_collection_respects_grace_period(self, db_session, temp_directory):
+        """Test that recently written blobs survive GC"""
+        store = BlobStore(temp_directory / "blobs")
+        fresh = store.store_file(temp_directory / "fresh.pdf", _write(temp_directory / "fresh.pdf", b"fresh"))
+
+        store.collect_garbage(db_session, grace_period=3600)
+
+        assert fresh.exists()
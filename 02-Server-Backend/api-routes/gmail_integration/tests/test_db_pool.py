@@ -0,0 +1,86 @@
+"""
+Database Connection Pool Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+import db_pool
+from database import DatabaseManager
+from db_pool import MeteredQueuePool, create_pooled_engine, get_engine, pool_status
+
+@pytest.fixture
+def url(tmp_path):
+    return f"sqlite:///{tmp_path / 'vital_red.db'}"
+
+class TestPooledEngine:
+    """Test the engine factory and the shared engine per URL"""
+
+    def test_pool_settings_come_from_config(self, url):
+        """Test the configured pool class, size and timeout"""
+        engine = create_pooled_engine(url)
+
+        assert isinstance(engine.pool, MeteredQueuePool)
+        assert engine.pool.size() == db_pool.DATABASE_CONFIG["POOL_SIZE"]
+        assert engine.pool.timeout() == db_pool.DATABASE_CONFIG["POOL_TIMEOUT"]
+
+    def test_one_engine_per_url(self, url, monkeypatch):
+        """Test callers asking for the same URL share one pool"""
+        monkeypatch.setattr(db_pool, "_engines", {})
+
+        assert get_engine(url) is get_engine(url, pool_size=1)
+        assert get_engine(url).pool.size() == db_pool.DATABASE_CONFIG["POOL_SIZE"]
+
+    def test_raw_connection_returns_to_pool(self, url, monkeypatch):
+        """Test closing a pooled DBAPI connection checks it back in"""
+        monkeypatch.setattr(db_pool, "_engines", {})
+        connection = db_pool.pooled_connection(url)
+        assert pool_status(get_engine(url))['checked_out'] == 1
+
+        connection.close()
+
+        assert pool_status(get_engine(url))['checked_out'] == 0
+
+class TestPoolMetrics:
+    """Test the live pool usage reported on the health endpoints"""
+
+    def test_checkouts_and_usage(self, url):
+        """Test checked-out connections, overflow and checkout counts"""
+        engine = create_pooled_engine(url, pool_size=1, max_overflow=2)
+        first, second = engine.connect(), engine.connect()
+
+        status = pool_status(engine)
+        assert (status['checked_out'], status['overflow'], status['max_overflow']) == (2, 1, 2)
+        assert status['checkouts'] == 2
+        first.close()
+        second.close()
+        assert pool_status(engine)['checked_out'] == 0
+
+    def test_exhausted_pool_counts_timeout(self, url):
+        """Test a checkout that gives up waiting is counted with its wait"""
+        engine = create_pooled_engine(url, pool_size=1, max_overflow=0, pool_timeout=0.05)
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+
+        status = pool_status(engine)
+        assert (status['checkouts'], status['timeouts']) == (1, 1)
+        assert status['max_wait_ms'] >= 50
+
+    def test_metrics_survive_dispose(self, url):
+        """Test that recreating the pool keeps counting"""
+        engine = create_pooled_engine(url)
+        engine.connect().close()
+        engine.dispose()
+        engine.connect().close()
+
+        assert pool_status(engine)['checkouts'] == 2
+
+    def test_manager_without_engine(self):
+        """Test no pool status before the database is connected"""
+        manager = DatabaseManager()
+
+        assert manager.get_pool_status() is None
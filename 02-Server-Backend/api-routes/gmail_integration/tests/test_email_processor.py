@@ -252,6 +252,7 @@ class TestEmailProcessor:
         """Test processing step logging"""
         # Create email record
         email = create_test_email(db_session)
+        email_processor.step_log = Mock()
         
         # Log a processing step
         email_processor._log_processing_step(
@@ -261,12 +262,28 @@ class TestEmailProcessor:
             "Test message"
         )
         
-        # Verify log was created
-        from models import ProcessingLog
-        log = db_session.query(ProcessingLog).filter_by(email_message_id=email.id).first()
-        assert log is not None
-        assert log.step_name == "test_step"
-        assert log.status == "completed"
+        # Kept with the unit of work until it commits
+        email_processor.step_log.record_many.assert_not_called()
+        email_processor._publish_steps()
+        
+        # Verify log was handed to the step log writer
+        [log] = email_processor.step_log.record_many.call_args[0][0]
+        assert log["email_message_id"] == email.id
+        assert log["step_name"] == "test_step"
+        assert log["status"] == "completed"
+    
+    def test_steps_are_timed(self, email_processor, sample_email_data):
+        """Test that each processing step is recorded once, with its duration"""
+        email_processor.step_log = Mock()
+        
+        result = email_processor.process_email(dict(sample_email_data, gmail_id="timed_steps"))
+        
+        rows = email_processor.step_log.record_many.call_args[0][0]
+        assert {row["email_message_id"] for row in rows} == {result.id}
+        timed = {row["step_name"]: row for row in rows if row["duration_seconds"] is not None}
+        assert {"content_processing", "medical_classification"} <= set(timed)
+        assert all(row["status"] == "completed" and row["end_time"] >= row["start_time"]
+                   for row in timed.values())
 
 class TestEmailProcessorIntegration:
     """Integration tests for EmailProcessor"""
@@ -371,3 +388,197 @@ class TestEmailProcessorIntegration:
         # Verify all emails were processed
         successful_results = [r for r in results if isinstance(r, EmailMessage)]
         assert len(successful_results) == 5
+
+class TestEmailProcessorBatch:
+    """Test the batch unit of work: savepoints, bulk inserts, one commit"""
+    
+    @pytest.fixture
+    def batch_session(self):
+        """Fresh database so earlier tests' rows do not interfere"""
+        from sqlalchemy import create_engine, event
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from models import Base
+        
+        # One shared connection, so the step log writer sees the same database
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        statements = []
+        event.listen(engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: statements.append(statement))
+        session = sessionmaker(bind=engine)()
+        session.statements = statements
+        yield session
+        session.close()
+    
+    @pytest.fixture
+    def step_writer(self, batch_session):
+        from step_log import StepLogWriter
+        from test_step_log import SessionManager
+        
+        writer = StepLogWriter(SessionManager(batch_session.bind), flush_interval=3600)
+        yield writer
+        writer.stop()
+    
+    @pytest.fixture
+    def batch_processor(self, batch_session, step_writer, temp_directory, mock_text_extractor,
+                        mock_medical_classifier):
+        processor = EmailProcessor(batch_session, temp_directory, step_log=step_writer)
+        processor.text_extractor = mock_text_extractor
+        processor.medical_classifier = mock_medical_classifier
+        return processor
+    
+    def make_message(self, sample_email_data, n, attachments=0):
+        message = dict(sample_email_data, gmail_id=f"batch_{n}", thread_id=f"thread_{n}")
+        message["attachments"] = [
+            {"filename": f"lab_{n}_{a}.pdf", "mime_type": "application/pdf", "size": 1024,
+             "attachment_id": f"att_{n}_{a}"}
+            for a in range(attachments)
+        ]
+        return message
+    
+    def test_failure_is_isolated_per_message(self, batch_processor, batch_session, step_writer,
+                                             sample_email_data):
+        """Test that one failing message is stored as error while the rest commit"""
+        from models import ProcessingLog
+        
+        batch_processor.medical_classifier.classify_referral.side_effect = [
+            (True, "interconsulta", "alta"), RuntimeError("classifier crashed"), (False, None, "media")
+        ]
+        messages = [self.make_message(sample_email_data, n) for n in range(3)]
+        
+        with patch.object(batch_session, "commit", wraps=batch_session.commit) as commit:
+            results = batch_processor.process_emails_batch(messages)
+        
+        assert [result is not None for result in results] == [True, False, True]
+        assert commit.call_count == 1
+        
+        statuses = {email.gmail_id: email.processing_status for email in batch_session.query(EmailMessage)}
+        assert statuses == {"batch_0": "completed", "batch_1": "error", "batch_2": "completed"}
+        assert batch_session.query(MedicalReferral).count() == 1
+        
+        failed = batch_session.query(EmailMessage).filter_by(gmail_id="batch_1").one()
+        assert failed.processing_error == "classifier crashed"
+        step_writer.flush()
+        assert [(log.step_name, log.status) for log in 
+                batch_session.query(ProcessingLog).filter_by(email_message_id=failed.id)] == [("processing", "error")]
+    
+    def test_logs_and_attachments_inserted_in_bulk(self, batch_processor, batch_session, step_writer,
+                                                   sample_email_data):
+        """Test one INSERT statement for all attachments, and logs written after the commit"""
+        from models import ProcessingLog
+        
+        messages = [self.make_message(sample_email_data, n, attachments=2) for n in range(3)]
+        
+        results = batch_processor.process_emails_batch(messages)
+        
+        assert all(results)
+        assert batch_session.query(EmailAttachment).count() == 6
+        inserts = [s for s in batch_session.statements if s.startswith("INSERT INTO")]
+        assert sum(s.startswith("INSERT INTO email_attachments") for s in inserts) == 1
+        assert not any(s.startswith("INSERT INTO processing_logs") for s in inserts)
+        
+        step_writer.flush()
+        assert batch_session.query(ProcessingLog).count() > 6
+        inserts = [s for s in batch_session.statements if s.startswith("INSERT INTO processing_logs")]
+        assert len(inserts) == 1
+        assert {a.document_type for a in results[0].attachments} == {"epicrisis"}
+    
+    def test_existing_emails_returned_as_is(self, batch_processor, batch_session, sample_email_data):
+        """Test that stored and repeated messages are not processed twice"""
+        first = batch_processor.process_emails_batch([self.make_message(sample_email_data, 0)])[0]
+        
+        results = batch_processor.process_emails_batch(
+            [self.make_message(sample_email_data, 0), self.make_message(sample_email_data, 1),
+             self.make_message(sample_email_data, 1)]
+        )
+        
+        assert results[0].id == first.id
+        assert results[1] is results[2]
+        assert batch_session.query(EmailMessage).count() == 2
+    
+    def test_pending_rows_are_processed(self, batch_processor, batch_session, sample_email_data):
+        """Test that the pending row stored by the ingestion pipeline is processed in place"""
+        message = self.make_message(sample_email_data, 0, attachments=1)
+        pending = EmailMessage(processing_status="pending", **{
+            key: message[key] for key in ("gmail_id", "thread_id", "subject", "sender_email", "sender_name",
+                                          "recipient_email", "date_received", "body_text", "body_html", "snippet")
+        })
+        batch_session.add(pending)
+        batch_session.commit()
+        
+        result = batch_processor.process_emails_batch([message])[0]
+        
+        assert result.id == pending.id
+        assert batch_session.query(EmailMessage).count() == 1
+        assert result.processing_status == "completed"
+        assert result.is_medical_referral and result.priority_level == "alta"
+        assert len(result.attachments) == 1
+        assert batch_session.query(MedicalReferral).filter_by(email_message_id=pending.id).count() == 1
+    
+    def test_reprocess_reruns_completed_emails(self, batch_processor, batch_session, sample_email_data):
+        """Test that reprocessing replaces attachments and keeps the referral's review"""
+        message = self.make_message(sample_email_data, 0, attachments=2)
+        first = batch_processor.process_emails_batch([message])[0]
+        referral = batch_session.query(MedicalReferral).filter_by(email_message_id=first.id).one()
+        referral.status = "approved"
+        batch_session.commit()
+        
+        batch_processor.medical_classifier.classify_referral.return_value = (True, "interconsulta", "media")
+        result = batch_processor.process_emails_batch([message], reprocess=True)[0]
+        
+        assert result.id == first.id
+        assert result.processing_status == "completed"
+        assert result.priority_level == "media"
+        assert batch_session.query(EmailAttachment).count() == 2
+        referral = batch_session.query(MedicalReferral).filter_by(email_message_id=first.id).one()
+        assert (referral.status, referral.priority_level) == ("approved", "media")
+        
+        # Without the flag completed emails are left alone
+        batch_processor.medical_classifier.classify_referral.return_value = (True, "interconsulta", "alta")
+        assert batch_processor.process_emails_batch([message])[0].priority_level == "media"
+    
+    def test_reprocess_finds_stored_blobs(self, batch_processor, batch_session, sample_email_data,
+                                          temp_directory):
+        """Test that a replayed attachment resolves to its blob and its reference is moved over"""
+        import hashlib
+        from blob_store import BlobStore
+        from models import AttachmentBlob
+        
+        batch_processor.blob_store = BlobStore(temp_directory / "blobs")
+        download = temp_directory / "download.pdf"
+        download.write_bytes(b"%PDF-1.4 epicrisis")
+        file_hash = hashlib.sha256(download.read_bytes()).hexdigest()
+        message = self.make_message(sample_email_data, 0, attachments=1)
+        downloaded = dict(message, attachments=[
+            dict(message["attachments"][0], local_file_path=str(download), file_hash=file_hash, size=18)
+        ])
+        batch_processor.process_emails_batch([downloaded])
+        
+        # Replay parses the raw message again: no download, Gmail may issue a new attachment ID
+        replayed = dict(message, attachments=[dict(message["attachments"][0], attachment_id="att_new")])
+        result = batch_processor.process_emails_batch([replayed], reprocess=True)[0]
+        
+        blob_path = batch_processor.blob_store.blob_path(file_hash)
+        assert [(a.file_hash, a.file_path) for a in result.attachments] == [(file_hash, str(blob_path))]
+        assert batch_processor.text_extractor.extract_text.call_args.args[0] == blob_path
+        assert batch_session.query(AttachmentBlob).filter_by(sha256=file_hash).one().ref_count == 1
+    
+    def test_entities_extracted_in_one_nlp_pass(self, batch_processor, batch_session, sample_email_data):
+        """Test that the referrals of a batch go through the NLP model together"""
+        classifier = batch_processor.medical_classifier
+        classifier.classify_referral.side_effect = [
+            (True, "interconsulta", "alta"), (False, None, "media"), (True, "remision", "media")
+        ]
+        classifier.extract_medical_entities_batch.side_effect = lambda texts: [
+            {"persons": [f"Paciente {n}"]} for n in range(len(texts))
+        ]
+        
+        results = batch_processor.process_emails_batch([self.make_message(sample_email_data, n) for n in range(3)])
+        
+        classifier.extract_medical_entities_batch.assert_called_once()
+        assert len(classifier.extract_medical_entities_batch.call_args.args[0]) == 2
+        classifier.extract_medical_entities.assert_not_called()
+        assert [(r.extracted_data or {}).get("entities") for r in results] == [
+            {"persons": ["Paciente 0"]}, None, {"persons": ["Paciente 1"]}
+        ]
@@ -0,0 +1,130 @@
+"""
+Extraction Cache Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import hashlib
+import pytest
+from unittest.mock import patch
+
+import PyPDF2
+
+from extraction_cache import ExtractionCache
+from text_extractor import TextExtractor
+
+OCR_CONFIG = {"DPI": 300, "LANGUAGE": "spa+eng", "PSM": 6, "OEM": 3}
+SHA = hashlib.sha256(b"epicrisis").hexdigest()
+
+class TestExtractionCache:
+    """Test the persistent extraction cache"""
+
+    def test_put_and_get(self, temp_directory):
+        """Test that stored results are served with hit/miss counters"""
+        cache = ExtractionCache(temp_directory, "1", OCR_CONFIG)
+
+        assert cache.get(SHA, "application/pdf") is None
+        assert cache.put(SHA, "application/pdf", "Diagnóstico: HTA", 0.9, "pdf") is True
+
+        entry = cache.get(SHA, "application/pdf")
+        assert entry["text"] == "Diagnóstico: HTA"
+        assert entry["confidence"] == 0.9
+        assert entry["method"] == "pdf"
+        assert cache.get(SHA, "image/png") is None
+
+        stats = cache.get_stats()
+        assert (stats["hits"], stats["misses"], stats["stores"]) == (1, 2, 1)
+
+    def test_ocr_config_change_invalidates(self, temp_directory):
+        """Test that another OCR configuration or extractor version misses"""
+        ExtractionCache(temp_directory, "1", OCR_CONFIG).put(SHA, "image/png", "texto", 0.7, "ocr")
+
+        assert ExtractionCache(temp_directory, "1", OCR_CONFIG).get(SHA, "image/png") is not None
+        assert ExtractionCache(temp_directory, "1", {**OCR_CONFIG, "DPI": 200}).get(SHA, "image/png") is None
+        assert ExtractionCache(temp_directory, "2", OCR_CONFIG).get(SHA, "image/png") is None
+
+    def test_purge_stale_generations(self, temp_directory):
+        """Test that only the current generation survives a purge"""
+        ExtractionCache(temp_directory, "1", {**OCR_CONFIG, "PSM": 3}).put(SHA, "image/png", "old", 0.7, "ocr")
+        cache = ExtractionCache(temp_directory, "1", OCR_CONFIG)
+        cache.put(SHA, "image/png", "new", 0.7, "ocr")
+
+        assert cache.purge_stale_generations() == 1
+        assert [p.name for p in temp_directory.iterdir()] == [cache.generation]
+
+    def test_invalid_hash_is_rejected(self, temp_directory):
+        """Test that keys must be SHA-256 hex digests"""
+        cache = ExtractionCache(temp_directory, "1", OCR_CONFIG)
+
+        assert cache.put("../../etc/passwd", "text/plain", "x", 0.5, "generic") is False
+
+class TestCachedTextExtractor:
+    """Test that TextExtractor skips extraction on cache hits"""
+
+    def test_second_extraction_is_served_from_cache(self, temp_directory):
+        """Test that identical content is only extracted once"""
+        file_path = temp_directory / "remision.txt"
+        file_path.write_text("Paciente remitido a cardiología")
+        cache = ExtractionCache(temp_directory / "cache", TextExtractor.EXTRACTOR_VERSION, OCR_CONFIG)
+        extractor = TextExtractor(cache=cache)
+
+        with patch.object(extractor, "_extract_uncached", wraps=extractor._extract_uncached) as uncached:
+            first = extractor.extract_text_with_details(file_path, "text/plain")
+            second = extractor.extract_text(file_path, "text/plain")
+
+        assert uncached.call_count == 1
+        assert first["cached"] is False
+        assert second == first["text"]
+        assert extractor.get_cache_stats()["hits"] == 1
+
+    def test_failed_extraction_is_not_cached(self, temp_directory):
+        """Test that a failure is retried instead of cached"""
+        file_path = temp_directory / "scan.png"
+        file_path.write_bytes(b"not an image")
+        cache = ExtractionCache(temp_directory / "cache", TextExtractor.EXTRACTOR_VERSION, OCR_CONFIG)
+        extractor = TextExtractor(cache=cache)
+
+        with patch.object(extractor, "_extract_uncached", return_value=(None, "ocr", True)) as uncached:
+            assert extractor.extract_text(file_path, "image/png") is None
+            assert extractor.extract_text(file_path, "image/png") is None
+
+        assert uncached.call_count == 2
+        assert cache.get_stats()["stores"] == 0
+
+    def test_scan_without_ocr_is_not_cached(self, temp_directory):
+        """Test that a scanned PDF read while OCR is unavailable is extracted again later"""
+        file_path = temp_directory / "scan.pdf"
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        with open(file_path, 'wb') as f:
+            writer.write(f)
+        cache = ExtractionCache(temp_directory / "cache", TextExtractor.EXTRACTOR_VERSION, OCR_CONFIG)
+        extractor = TextExtractor(cache=cache)
+        extractor.tesseract_available = False
+
+        with patch.object(extractor, "_extract_uncached", wraps=extractor._extract_uncached) as uncached:
+            assert extractor.extract_text(file_path, "application/pdf") == ""
+            assert extractor.extract_text(file_path, "application/pdf") == ""
+
+        assert uncached.call_count == 2
+        assert cache.get_stats()["stores"] == 0
+
+    def test_incomplete_ocr_is_not_cached(self, temp_directory):
+        """Test that a PDF with a page OCR could not read is extracted again later"""
+        file_path = temp_directory / "scan.pdf"
+        writer = PyPDF2.PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.add_blank_page(width=612, height=792)
+        with open(file_path, 'wb') as f:
+            writer.write(f)
+        cache = ExtractionCache(temp_directory / "cache", TextExtractor.EXTRACTOR_VERSION, OCR_CONFIG)
+        extractor = TextExtractor(cache=cache)
+        extractor.tesseract_available = True
+        partial = ({0: "Epicrisis: paciente con HTA"}, False)
+
+        with patch("text_extractor.PDF2IMAGE_AVAILABLE", True), \
+             patch.object(extractor, "_ocr_pdf_pages", return_value=partial) as ocr:
+            assert "Epicrisis" in extractor.extract_text(file_path, "application/pdf")
+            assert "Epicrisis" in extractor.extract_text(file_path, "application/pdf")
+
+        assert ocr.call_count >= 2
+        assert cache.get_stats()["stores"] == 0
@@ -0,0 +1,267 @@
+"""
+Gmail Client Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import pytest
+from unittest.mock import Mock, MagicMock, patch
+
+from googleapiclient.errors import HttpError
+
+from gmail_client import GmailClient
+
+def _http_error(status):
+    """Build an HttpError with the given status code"""
+    resp = Mock()
+    resp.status = status
+    resp.reason = "error"
+    return HttpError(resp, b"{}")
+
+@pytest.fixture
+def gmail_client(temp_directory):
+    """Gmail client with a mocked service and a temporary checkpoint file"""
+    client = GmailClient()
+    client.service = MagicMock()
+    client.history_checkpoint_file = temp_directory / "history_checkpoint.json"
+    return client
+
+class TestHistorySync:
+    """Test incremental sync through the Gmail history API"""
+
+    def test_checkpoint_roundtrip(self, gmail_client):
+        """Test saving and loading the history checkpoint"""
+        assert gmail_client.load_history_checkpoint() is None
+
+        assert gmail_client.save_history_checkpoint("12345") is True
+        assert gmail_client.load_history_checkpoint() == "12345"
+
+    def test_first_sync_uses_full_listing(self, gmail_client):
+        """Test that without a checkpoint the query listing is used"""
+        users = gmail_client.service.users.return_value
+        users.getProfile.return_value.execute.return_value = {"historyId": "500"}
+        users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "msg_1", "threadId": "t1"}]
+        }
+
+        messages, history_id = gmail_client.sync_new_messages(query="has:attachment")
+
+        assert [m["id"] for m in messages] == ["msg_1"]
+        assert history_id == "500"
+        users.history.return_value.list.assert_not_called()
+
+    def test_incremental_sync_returns_added_messages(self, gmail_client):
+        """Test that only messages added since the checkpoint are returned"""
+        gmail_client.save_history_checkpoint("100")
+        history_list = gmail_client.service.users.return_value.history.return_value.list
+        history_list.return_value.execute.side_effect = [
+            {
+                "history": [
+                    {"messagesAdded": [{"message": {"id": "msg_1", "threadId": "t1", "labelIds": ["INBOX"]}}]},
+                    {"messagesAdded": [{"message": {"id": "msg_1", "threadId": "t1", "labelIds": ["INBOX"]}}]},
+                ],
+                "nextPageToken": "page_2",
+                "historyId": "150",
+            },
+            {
+                "history": [
+                    {"messagesAdded": [{"message": {"id": "spam_1", "threadId": "t2", "labelIds": ["SPAM"]}}]},
+                    {"messagesAdded": [{"message": {"id": "msg_2", "threadId": "t3", "labelIds": ["INBOX"]}}]},
+                ],
+                "historyId": "160",
+            },
+        ]
+
+        messages, history_id = gmail_client.sync_new_messages(query="has:attachment")
+
+        assert [m["id"] for m in messages] == ["msg_1", "msg_2"]
+        assert history_id == "160"
+        gmail_client.service.users.return_value.messages.return_value.list.assert_not_called()
+
+    def test_expired_checkpoint_falls_back_to_full_listing(self, gmail_client):
+        """Test fallback to a full listing when the checkpoint has expired"""
+        gmail_client.save_history_checkpoint("1")
+        users = gmail_client.service.users.return_value
+        users.history.return_value.list.return_value.execute.side_effect = _http_error(404)
+        users.getProfile.return_value.execute.return_value = {"historyId": "900"}
+        users.messages.return_value.list.return_value.execute.return_value = {
+            "messages": [{"id": "msg_9", "threadId": "t9"}]
+        }
+
+        messages, history_id = gmail_client.sync_new_messages(query="has:attachment")
+
+        assert [m["id"] for m in messages] == ["msg_9"]
+        assert history_id == "900"
+
+    def test_other_http_errors_do_not_fall_back(self, gmail_client):
+        """Test that transient history errors keep the checkpoint untouched"""
+        gmail_client.save_history_checkpoint("100")
+        users = gmail_client.service.users.return_value
+        users.history.return_value.list.return_value.execute.side_effect = _http_error(500)
+
+        messages, history_id = gmail_client.sync_new_messages(query="has:attachment")
+
+        assert messages == []
+        assert history_id is None
+        assert gmail_client.load_history_checkpoint() == "100"
+        users.messages.return_value.list.assert_not_called()
+
+    def test_full_listing_reads_every_page(self, gmail_client):
+        """Test that the fallback listing is not cut short at one page"""
+        users = gmail_client.service.users.return_value
+        users.getProfile.return_value.execute.return_value = {"historyId": "500"}
+        users.messages.return_value.list.return_value.execute.side_effect = [
+            {"messages": [{"id": "msg_1", "threadId": "t1"}], "nextPageToken": "page_2"},
+            {"messages": [{"id": "msg_2", "threadId": "t2"}]},
+        ]
+
+        messages, history_id = gmail_client.sync_new_messages(query="has:attachment")
+
+        assert [m["id"] for m in messages] == ["msg_1", "msg_2"]
+        assert history_id == "500"
+        assert users.messages.return_value.list.call_args.kwargs["pageToken"] == "page_2"
+
+    def test_interrupted_listing_returns_no_checkpoint(self, gmail_client):
+        """Test that a partial listing is never checkpointed as complete"""
+        users = gmail_client.service.users.return_value
+        users.getProfile.return_value.execute.return_value = {"historyId": "500"}
+        users.messages.return_value.list.return_value.execute.side_effect = [
+            {"messages": [{"id": "msg_1", "threadId": "t1"}], "nextPageToken": "page_2"},
+            _http_error(500),
+        ]
+
+        messages, history_id = gmail_client.sync_new_messages(query="has:attachment")
+
+        assert messages == []
+        assert history_id is None
+
+    def test_history_messages_are_checked_against_the_query(self, gmail_client):
+        """Test the referral criteria applied to history changes"""
+        referral = {"subject": "Remisión paciente", "body_text": "", "body_html": "",
+                    "attachments": [{"filename": "epicrisis.pdf"}]}
+
+        assert gmail_client.matches_referral_query(referral) is True
+        assert gmail_client.matches_referral_query(dict(referral, attachments=[])) is False
+        assert gmail_client.matches_referral_query(dict(referral, subject="Factura")) is False
+        assert gmail_client.matches_referral_query(
+            dict(referral, subject="Factura", attachments=[{"filename": "interconsulta.pdf"}])
+        ) is True
+
+class _FakeBatch:
+    """Stand-in for BatchHttpRequest that answers through the callback"""
+
+    def __init__(self, callback, responder, executed):
+        self.callback = callback
+        self.responder = responder
+        self.executed = executed
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.executed.append(len(self.requests))
+        for request_id, request in self.requests:
+            response, exception = self.responder(request)
+            self.callback(request_id, response, exception)
+
+class TestBatchFetch:
+    """Test batched message and attachment fetches"""
+
+    def _install_batch(self, gmail_client, responder):
+        executed = []
+        gmail_client.service.new_batch_http_request.side_effect = (
+            lambda callback: _FakeBatch(callback, responder, executed)
+        )
+        return executed
+
+    def test_message_details_are_chunked(self, gmail_client):
+        """Test that message details are fetched in chunks of the configured size"""
+        messages_api = gmail_client.service.users.return_value.messages.return_value
+        messages_api.get.side_effect = lambda userId, id, format: {"id": id}
+        executed = self._install_batch(gmail_client, lambda request: (request, None))
+
+        ids = [f"msg_{i}" for i in range(7)]
+        details, errors = gmail_client.get_messages_details_batch(ids, chunk_size=3)
+
+        assert executed == [3, 3, 1]
+        assert set(details) == set(ids)
+        assert errors == {}
+
+    def test_per_item_errors_are_reported(self, gmail_client):
+        """Test that a failing sub-request does not affect the others"""
+        messages_api = gmail_client.service.users.return_value.messages.return_value
+        messages_api.get.side_effect = lambda userId, id, format: {"id": id}
+
+        def responder(request):
+            if request["id"] == "msg_bad":
+                return None, _http_error(404)
+            return request, None
+
+        self._install_batch(gmail_client, responder)
+
+        details, errors = gmail_client.get_messages_details_batch(["msg_ok", "msg_bad"])
+
+        assert list(details) == ["msg_ok"]
+        assert list(errors) == ["msg_bad"]
+
+    def test_attachments_are_decoded(self, gmail_client):
+        """Test that batched attachments are base64 decoded per pair"""
+        import base64
+
+        attachments_api = gmail_client.service.users.return_value.messages.return_value.attachments.return_value
+        attachments_api.get.side_effect = lambda userId, messageId, id: {
+            "data": base64.urlsafe_b64encode(f"{messageId}:{id}".encode()).decode()
+        }
+        self._install_batch(gmail_client, lambda request: (request, None))
+
+        attachments, errors = gmail_client.get_attachments_batch([("m1", "a1"), ("m1", "a2")])
+
+        assert attachments == {("m1", "a1"): b"m1:a1", ("m1", "a2"): b"m1:a2"}
+        assert errors == {}
+
+class TestStreamingAttachments:
+    """Test chunked attachment decoding straight to disk"""
+
+    def test_save_attachment_data_hashes_in_one_pass(self, gmail_client, temp_directory):
+        """Test that data is decoded to disk with hash and size"""
+        import base64
+        import hashlib
+
+        payload = bytes(range(256)) * 4000
+        encoded = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+        dest = temp_directory / "epicrisis.pdf"
+
+        with patch.dict("gmail_client.GMAIL_CONFIG", {"ATTACHMENT_DECODE_CHUNK": 1000}):
+            result = gmail_client.save_attachment_data(encoded, dest)
+
+        assert result["size"] == len(payload)
+        assert result["sha256"] == hashlib.sha256(payload).hexdigest()
+        assert dest.read_bytes() == payload
+
+    def test_oversized_attachment_is_aborted(self, gmail_client, temp_directory):
+        """Test that decoding stops once the maximum size is exceeded"""
+        import base64
+
+        encoded = base64.urlsafe_b64encode(b"x" * 10000).decode()
+        dest = temp_directory / "large.pdf"
+
+        result = gmail_client.save_attachment_data(encoded, dest, max_size=5000)
+
+        assert result is None
+        assert not dest.exists()
+        assert list(temp_directory.iterdir()) == []
+
+    def test_download_attachment_to_file_uses_raw_response(self, gmail_client, temp_directory):
+        """Test that the raw API response is decoded without JSON parsing"""
+        import base64
+
+        request = gmail_client.service.users.return_value.messages.return_value.attachments.return_value.get.return_value
+        data = base64.urlsafe_b64encode(b"%PDF-1.4 contenido").decode()
+        request.execute.return_value = ('{\n  "size": 18,\n  "data": "%s"\n}' % data).encode()
+        dest = temp_directory / "remision.pdf"
+
+        result = gmail_client.download_attachment_to_file("msg_1", "att_1", dest)
+
+        assert result["size"] == 18
+        assert dest.read_bytes() == b"%PDF-1.4 contenido"
+        assert request.postproc(None, b"raw") == b"raw"
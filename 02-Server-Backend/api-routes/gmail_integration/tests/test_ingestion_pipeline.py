@@ -0,0 +1,155 @@
+"""
+Ingestion Pipeline Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import asyncio
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+
+from ingestion_pipeline import IngestionPipeline, PipelineStage
+
+class TestIngestionPipeline:
+    """Test the staged asyncio pipeline"""
+
+    @pytest.mark.asyncio
+    async def test_items_flow_through_all_stages(self):
+        """Test that items pass through every stage in order"""
+        done = []
+        pipeline = IngestionPipeline([
+            PipelineStage("double", lambda x: x * 2, workers=2),
+            PipelineStage("increment", lambda x: x + 1, workers=2),
+        ], on_done=lambda item, stage, error: done.append((item, stage, error)))
+
+        await pipeline.start()
+        for value in range(5):
+            await pipeline.put(value)
+        await pipeline.join()
+        await pipeline.stop()
+
+        assert sorted(item for item, _, _ in done) == [1, 3, 5, 7, 9]
+        assert all(stage == "increment" and error is None for _, stage, error in done)
+
+    @pytest.mark.asyncio
+    async def test_failures_are_reported_per_item(self):
+        """Test that a failing item leaves the pipeline without blocking others"""
+        done = []
+
+        def check(value):
+            if value == 3:
+                raise ValueError("bad item")
+            return value
+
+        pipeline = IngestionPipeline([
+            PipelineStage("check", check),
+            PipelineStage("sink", lambda x: None),
+        ], on_done=lambda item, stage, error: done.append((item, stage, error)))
+
+        await pipeline.start()
+        for value in range(5):
+            await pipeline.put(value)
+        await pipeline.join()
+        metrics = pipeline.get_metrics()
+        await pipeline.stop()
+
+        failed = [(item, stage) for item, stage, error in done if error is not None]
+        assert failed == [(3, "check")]
+        assert metrics["check"]["errors"] == 1
+        assert metrics["sink"]["processed"] == 4
+
+    @pytest.mark.asyncio
+    async def test_batch_stage_receives_lists(self):
+        """Test that batch stages get several items per handler call"""
+        calls = []
+
+        def fetch(items):
+            calls.append(len(items))
+            return [item if item % 2 else Exception("missing") for item in items]
+
+        done = []
+        pipeline = IngestionPipeline([
+            PipelineStage("fetch", fetch, batch_size=10),
+        ], on_done=lambda item, stage, error: done.append((item, error)))
+
+        await pipeline.start()
+        for value in range(6):
+            pipeline.stages[0].queue.put_nowait(value)
+        await pipeline.join()
+        await pipeline.stop()
+
+        assert sum(calls) == 6
+        assert sorted(item for item, error in done if error is None) == [1, 3, 5]
+
+    @pytest.mark.asyncio
+    async def test_batch_result_length_mismatch_fails_the_batch(self):
+        """Test that a short result list fails every item instead of dropping some"""
+        done = []
+        pipeline = IngestionPipeline([
+            PipelineStage("fetch", lambda items: items[:-1], batch_size=10),
+        ], on_done=lambda item, stage, error: done.append((item, error)))
+
+        await pipeline.start()
+        for value in range(3):
+            pipeline.stages[0].queue.put_nowait(value)
+        await pipeline.join()
+        await pipeline.stop()
+
+        assert sorted(item for item, _ in done) == [0, 1, 2]
+        assert all(isinstance(error, ValueError) for _, error in done)
+        assert pipeline.get_metrics()["fetch"]["errors"] == 3
+
+    @pytest.mark.asyncio
+    async def test_blocking_handlers_run_concurrently(self):
+        """Test that slow handlers run in parallel in the executor"""
+        executor = ThreadPoolExecutor(max_workers=4)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow(value):
+            with lock:
+                active.append(value)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(value)
+            return None
+
+        pipeline = IngestionPipeline([PipelineStage("slow", slow, workers=4, executor=executor)])
+
+        await pipeline.start()
+        start = time.perf_counter()
+        for value in range(8):
+            await pipeline.put(value)
+        await pipeline.join()
+        elapsed = time.perf_counter() - start
+        await pipeline.stop()
+        executor.shutdown()
+
+        assert max(peak) > 1
+        assert elapsed < 8 * 0.05
+
+    @pytest.mark.asyncio
+    async def test_bounded_queue_applies_backpressure(self):
+        """Test that a full stage queue blocks the producer"""
+        release = threading.Event()
+        pipeline = IngestionPipeline([
+            PipelineStage("blocked", lambda x: release.wait(), queue_size=2),
+        ])
+
+        await pipeline.start()
+        await pipeline.put(1)  # Taken by the worker
+        await asyncio.sleep(0.01)
+        await pipeline.put(2)
+        await pipeline.put(3)
+
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(pipeline.put(4), timeout=0.05)
+
+        assert pipeline.get_metrics()["blocked"]["queue_depth"] == 2
+
+        release.set()
+        await pipeline.join()
+        await pipeline.stop()
@@ -0,0 +1,89 @@
+"""
+Leader Election Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from unittest.mock import MagicMock
+
+from leader_election import LeaderElector, LocalLock, RedisLock
+
+class FakeRedis:
+    """Just enough of redis-py for RedisLock: SET NX and the two scripts"""
+
+    def __init__(self):
+        self.values = {}
+
+    def set(self, key, value, nx=False, px=None):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value
+        return True
+
+    def eval(self, script, numkeys, key, token, *args):
+        if self.values.get(key) != token:
+            return 0
+        if script == RedisLock.RELEASE_SCRIPT:
+            del self.values[key]
+        return 1
+
+    def expire_all(self):
+        self.values.clear()
+
+class TestLeaderElection:
+    """Test that exactly one instance leads and that leadership fails over"""
+
+    def test_local_lock_single_leader(self, temp_directory):
+        """Test that a second instance cannot take a held local lock"""
+        first = LocalLock("fetcher", lock_dir=temp_directory)
+        second = LocalLock("fetcher", lock_dir=temp_directory)
+
+        assert first.acquire() is True
+        assert first.acquire() is True
+        assert second.acquire() is False
+
+        first.release()
+        assert second.acquire() is True
+        second.release()
+
+    def test_redis_lock_renew_and_failover(self):
+        """Test renewal by the holder and takeover once the key expires"""
+        redis_client = FakeRedis()
+        first = RedisLock("fetcher", redis_client, ttl=60)
+        second = RedisLock("fetcher", redis_client, ttl=60)
+
+        assert first.acquire() is True
+        assert second.acquire() is False
+        assert first.acquire() is True
+
+        redis_client.expire_all()
+        assert second.acquire() is True
+        assert first.acquire() is False
+
+        # A stale holder must not delete the new leader's key
+        first.release()
+        assert second.acquire() is True
+
+    def test_elector_reports_transitions(self):
+        """Test leader status and that release lets another instance lead"""
+        redis_client = FakeRedis()
+        manager = MagicMock(redis_client=redis_client)
+        first = LeaderElector("fetcher", "host:1", backend="redis", db_manager=manager)
+        second = LeaderElector("fetcher", "host:2", backend="redis", db_manager=manager)
+
+        assert first.acquire() is True
+        assert second.acquire() is False
+        assert first.get_status() == {'name': 'fetcher', 'worker_id': 'host:1',
+                                      'is_leader': True, 'backend': 'redis'}
+
+        first.release()
+        assert first.is_leader is False
+        assert second.acquire() is True
+
+    def test_backend_error_is_not_leadership(self):
+        """Test that a failing lock backend means not leading"""
+        manager = MagicMock()
+        manager.redis_client.set.side_effect = ConnectionError("redis down")
+        elector = LeaderElector("fetcher", "host:1", backend="redis", db_manager=manager)
+
+        assert elector.acquire() is False
+        assert elector.is_leader is False
@@ -0,0 +1,89 @@
+"""
+Medical Classifier Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import pytest
+from unittest.mock import patch
+
+from keyword_scanner import KeywordScanner
+from medical_classifier import MedicalClassifier
+
+@pytest.fixture
+def classifier():
+    """Classifier without loading spaCy/NLTK models"""
+    with patch.object(MedicalClassifier, "_initialize_nlp"):
+        return MedicalClassifier()
+
+class TestKeywordScanner:
+    """Test the single-pass keyword scanner"""
+
+    def test_counts_match_substring_semantics(self):
+        """Test that counts equal text.count for every keyword, including nested ones"""
+        keyword_sets = {
+            "tipo": ["interconsulta", "consulta", "control"],
+            "examenes": ["lab", "laboratorio", "historia clinica"],
+        }
+        scanner = KeywordScanner(keyword_sets)
+        text = "interconsulta: consulta de control.\nlaboratorio y lab; historia  clinica, historia clinica"
+
+        scan = scanner.scan(text)
+
+        for keywords in keyword_sets.values():
+            for keyword in keywords:
+                assert scan.count(keyword) == text.count(keyword), keyword
+        assert scan.distinct("tipo") == 3
+        assert scan.occurrences("tipo") == 1 + 2 + 1
+        assert scan.matched("examenes") == ["lab", "laboratorio", "historia clinica"]
+        assert scan.word_count == len(text.split())
+
+    def test_positions(self):
+        """Test keyword offsets used for position weighting"""
+        scan = KeywordScanner({"alta": ["urgente"]}).scan("urgente, muy urgente")
+
+        assert scan.positions("urgente") == [0, 13]
+        assert scan.positions("stat") == []
+
+    def test_empty_text(self):
+        """Test scanning empty or missing text"""
+        scan = KeywordScanner({"a": ["x"]}).scan(None)
+
+        assert scan.counts == {}
+        assert scan.word_count == 0
+
+class TestMedicalClassifier:
+    """Test classification rules on top of the shared scan"""
+
+    def test_classify_referral(self, classifier):
+        """Test a referral with type and priority"""
+        text = ("Remision urgente de paciente a cardiologia. Cedula: 12345678. "
+                "Diagnostico: dolor toracico. Se solicita valoracion inmediata por emergencia.")
+
+        is_referral, referral_type, priority = classifier.classify_referral(text)
+
+        assert is_referral is True
+        assert referral_type == "urgente"
+        assert priority == "alta"
+
+    def test_non_referral(self, classifier):
+        """Test that unrelated text is not a referral"""
+        assert classifier.classify_referral("Reunion de equipo el viernes a las 3pm") == (False, None, None)
+
+    def test_scan_is_reused(self, classifier):
+        """Test that a precomputed scan gives the same result without rescanning"""
+        text = "Control programado de seguimiento, paciente estable. Remision a neurologia."
+        scan = classifier.scan(text)
+
+        with patch.object(classifier.scanner, "scan", wraps=classifier.scanner.scan) as scanner:
+            referral = classifier.classify_referral(text, scan)
+            urgency = classifier.classify_urgency_level(text, scan)
+
+        scanner.assert_not_called()
+        assert referral == classifier.classify_referral(text)
+        assert urgency[0] == "baja"
+
+    def test_document_type_prefers_filename(self, classifier):
+        """Test that filename keywords weigh more than text keywords"""
+        assert classifier.classify_document_type("resultado de hemograma", "epicrisis_alta.pdf") == "epicrisis"
+        assert classifier.classify_document_type("hemograma y cultivo", "scan001.pdf") == "laboratorio"
+        assert classifier.classify_document_type("", "") == "documento_general"
@@ -0,0 +1,94 @@
+"""
+Medical Extraction Engine Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import re
+
+import pytest
+
+from config import MEDICAL_PATTERNS, MEDICAL_DETAIL_PATTERNS
+from medical_extraction import MedicalPatternEngine, REFERRAL_FIELDS, medical_extractor
+
+SAMPLE_TEXT = """Asunto: REMISION URGENTE
+Paciente: Maria Gonzalez
+Cedula: 12345678
+Edad: 45 años
+Diagnostico: Hipertension arterial no controlada. CIE-10: I10
+Especialidad: Cardiologia
+Prioridad: alta
+Medicamentos: enalapril. Tratamiento: losartan 50 mg y metformina 850 mg
+PA: 160/100, FC: 98
+Hospital San Rafael
+Dr. Carlos Rodriguez
+"""
+
+class TestMedicalPatternEngine:
+    """Test the shared field extraction engine"""
+
+    @pytest.mark.parametrize("text", [SAMPLE_TEXT, SAMPLE_TEXT.upper(), SAMPLE_TEXT.replace("\n", " "), ""])
+    def test_same_matches_as_re_search(self, text):
+        """Test that each field matches exactly what re.search over its patterns returned"""
+        extraction = medical_extractor.extract(text)
+
+        for name, patterns in {**MEDICAL_PATTERNS, **MEDICAL_DETAIL_PATTERNS}.items():
+            expected = None
+            for pattern in patterns:
+                expected = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+                if expected:
+                    break
+            if expected is None:
+                assert name not in extraction, name
+            else:
+                match = extraction.fields[name]
+                assert (match.start, match.end, match.groups) == (expected.start(), expected.end(), expected.groups())
+
+    def test_fields(self):
+        """Test typed values for the referral fields"""
+        extraction = medical_extractor.extract(SAMPLE_TEXT, fields=REFERRAL_FIELDS)
+
+        assert extraction.get("PATIENT_ID") == "12345678"
+        assert extraction.get("AGE") == "45"
+        assert extraction.get("SPECIALTY") == "Cardiologia"
+        assert extraction.fields["AGE"].pattern_index == 0
+        assert "REFERRING_PHYSICIAN" not in extraction
+        assert extraction.get("REFERRING_PHYSICIAN", "n/a") == "n/a"
+
+    def test_find_all_matches_findall(self):
+        """Test that find_all returns the non-overlapping matches of every pattern"""
+        extraction = medical_extractor.extract(SAMPLE_TEXT, fields=["MEDICATIONS", "VITAL_SIGNS"],
+                                               find_all=["MEDICATIONS", "VITAL_SIGNS"])
+
+        for name in ("MEDICATIONS", "VITAL_SIGNS"):
+            expected = [
+                match.span()
+                for pattern in MEDICAL_DETAIL_PATTERNS[name]
+                for match in re.finditer(pattern, SAMPLE_TEXT, re.IGNORECASE)
+            ]
+            assert [(m.start, m.end) for m in extraction.all(name)] == expected
+        assert ("losartan", "50", "mg") in [m.groups for m in extraction.all("MEDICATIONS")]
+
+    def test_pattern_without_keyword_prefix(self):
+        """Test patterns that do not start with a keyword group"""
+        engine = MedicalPatternEngine({"AGE": [r"(\d{1,3})\s*años?"]})
+
+        assert engine.patterns["AGE"][0].keywords == ()
+        assert engine.extract("tiene 7 años y 3 meses").get("AGE") == "7"
+
+    def test_text_changing_length_when_lowercased(self):
+        """Test that offsets stay correct when lower() changes the text length"""
+        text = "İİ Cedula: 98765432"
+
+        assert medical_extractor.extract(text, fields=["PATIENT_ID"]).fields["PATIENT_ID"].start == 3
+
+    def test_stats(self):
+        """Test throughput counters"""
+        engine = MedicalPatternEngine({"EDAD": [r"(?:edad)[\s:]*(\d{1,3})"]})
+        engine.extract("Edad: 30")
+        engine.extract("sin datos")
+
+        stats = engine.get_stats()
+        assert stats["documents"] == 2
+        assert stats["characters"] == len("Edad: 30") + len("sin datos")
+        assert stats["fields_found"] == 1
+        assert stats["errors"] == 0
@@ -0,0 +1,106 @@
+"""
+Shared NLP Service Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import nlp_service
+from nlp_service import NLPService, get_nlp_service
+
+class FakeModel:
+    """Minimal spaCy Language: one PER entity per text"""
+
+    pipe_names = ["tok2vec", "ner"]
+
+    def __init__(self):
+        self.pipe_calls = []
+
+    def __call__(self, text):
+        return SimpleNamespace(ents=[SimpleNamespace(text=text, label_="PER", start_char=0, end_char=len(text))])
+
+    def pipe(self, texts, batch_size, n_process):
+        texts = list(texts)
+        self.pipe_calls.append((len(texts), batch_size, n_process))
+        return (self(text) for text in texts)
+
+@pytest.fixture
+def fake_spacy():
+    """spacy module whose load() returns a FakeModel"""
+    spacy = MagicMock()
+    spacy.load.side_effect = lambda name, exclude: FakeModel()
+    with patch.object(nlp_service, "spacy", spacy, create=True), \
+         patch.object(nlp_service, "SPACY_AVAILABLE", True):
+        yield spacy
+
+class TestNLPService:
+    """Test model sharing and batching"""
+
+    def test_loads_once_without_unused_components(self, fake_spacy):
+        """Test that the model is loaded once, excluding unused components"""
+        service = NLPService(model_names=["es_core_news_sm"], exclude=["parser", "lemmatizer"])
+
+        assert service.available
+        service.parse("Juan Perez")
+        service.parse("Maria Lopez")
+
+        fake_spacy.load.assert_called_once_with("es_core_news_sm", exclude=["parser", "lemmatizer"])
+        assert service.get_stats()["documents"] == 2
+
+    def test_falls_back_to_next_model(self, fake_spacy):
+        """Test the English fallback when the Spanish model is not installed"""
+        def load(name, exclude):
+            if name == "es_core_news_sm":
+                raise OSError("not installed")
+            return FakeModel()
+        fake_spacy.load.side_effect = load
+
+        service = NLPService(model_names=["es_core_news_sm", "en_core_web_sm"])
+
+        assert service.available
+        assert service.model_name == "en_core_web_sm"
+
+    def test_pipe_batches(self, fake_spacy):
+        """Test that pipe uses nlp.pipe with the configured batch size and processes"""
+        service = NLPService(model_names=["es_core_news_sm"], batch_size=2, n_process=3)
+
+        docs = list(service.pipe(["a", "b", "c"]))
+
+        assert [doc.ents[0].text for doc in docs] == ["a", "b", "c"]
+        assert service.nlp.pipe_calls == [(3, 2, 3)]
+        assert service.get_stats()["batches"] == 2
+
+    def test_without_model(self):
+        """Test that callers get one None per text when SpaCy is not installed"""
+        with patch.object(nlp_service, "SPACY_AVAILABLE", False):
+            service = NLPService()
+
+            assert not service.available
+            assert service.parse("texto") is None
+            assert list(service.pipe(["a", "b"])) == [None, None]
+
+    def test_shared_instance(self):
+        """Test one service per process"""
+        assert get_nlp_service() is get_nlp_service()
+
+class TestMedicalClassifierBatch:
+    """Test batched entity extraction in MedicalClassifier"""
+
+    def test_batch_matches_single(self, fake_spacy):
+        """Test that the batch path gives the same entities as one text at a time"""
+        from medical_classifier import MedicalClassifier
+
+        service = NLPService(model_names=["es_core_news_sm"])
+        with patch("medical_classifier.get_nlp_service", return_value=service):
+            classifier = MedicalClassifier()
+        texts = ["Ana Ruiz enalapril 10 mg", "Luis Mora biopsia"]
+
+        batch = classifier.extract_medical_entities_batch(texts)
+
+        assert batch == [classifier.extract_medical_entities(text) for text in texts]
+        assert batch[1]["persons"] == ["Luis Mora biopsia"]
+        assert batch[1]["procedures"] == ["biopsia"]
+        assert len(service.nlp.pipe_calls) == 1
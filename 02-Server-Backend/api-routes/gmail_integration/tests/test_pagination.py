@@ -0,0 +1,125 @@
+"""
+Keyset Pagination Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from database import EmailRepository, ReferralRepository
+from models import EmailMessage, MedicalReferral
+from pagination import CountCache, InvalidCursor, decode_cursor, encode_cursor
+
+def add_emails_and_referrals(session):
+    """25 emails, three per created_at second, each with a referral"""
+    start = datetime(2025, 3, 1, 8, 0)
+    for n in range(1, 26):
+        session.add(EmailMessage(id=n, gmail_id=f"g{n}", subject=f"Remision {n}",
+                                 sender_email="remisiones@eps.com.co", recipient_email="vitalred@hospital.com",
+                                 date_received=start, status="pending" if n % 2 else "processed",
+                                 created_at=start + timedelta(seconds=n // 3)))
+        session.add(MedicalReferral(id=n, email_message_id=n, referral_type="interconsulta",
+                                    specialty_requested="cardiologia", priority_level="alta" if n < 5 else "media",
+                                    referral_date=start, created_at=start + timedelta(seconds=n)))
+
+@pytest.fixture
+def manager(make_db_manager):
+    """DatabaseManager over a SQLite file with 25 emails and referrals"""
+    return make_db_manager(seed=add_emails_and_referrals)
+
+def walk(fetch):
+    """Follow next_cursor until the last page; returns the pages"""
+    pages, cursor = [], None
+    while True:
+        page = fetch(cursor)
+        pages.append(page)
+        cursor = page.next_cursor
+        if cursor is None:
+            return pages
+
+class TestCursor:
+    """Test the opaque cursor encoding"""
+
+    def test_round_trip(self):
+        """Test a cursor decodes to the row it was made from"""
+        created_at = datetime(2025, 3, 1, 8, 0, 5, 123456)
+
+        assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+
+    @pytest.mark.parametrize("cursor", ["", "not-a-cursor", "WzEsMl0"])
+    def test_malformed_cursor(self, cursor):
+        """Test garbage is rejected with InvalidCursor"""
+        with pytest.raises(InvalidCursor):
+            decode_cursor(cursor)
+
+class TestKeysetPages:
+    """Test paging through repositories with cursors"""
+
+    def test_every_row_once_in_order(self, manager):
+        """Test pages cover all rows, newest first, across created_at ties"""
+        repo = EmailRepository(manager)
+
+        pages = walk(lambda cursor: repo.get_emails(limit=4, cursor=cursor))
+
+        ids = [email.id for page in pages for email in page.items]
+        assert ids == list(range(25, 0, -1))
+        assert [len(page.items) for page in pages] == [4] * 6 + [1]
+
+    def test_filters_apply_on_every_page(self, manager):
+        """Test the status and priority filters hold across pages"""
+        emails = walk(lambda cursor: EmailRepository(manager).get_emails(limit=5, status="pending", cursor=cursor))
+        referrals = walk(lambda cursor: ReferralRepository(manager).get_referrals(limit=3, priority="alta",
+                                                                                   cursor=cursor))
+
+        assert [e.id for page in emails for e in page.items] == list(range(25, 0, -2))
+        assert [r.id for page in referrals for r in page.items] == [4, 3, 2, 1]
+
+    def test_exact_last_page_has_no_cursor(self, manager):
+        """Test no empty trailing page when the rows divide evenly"""
+        page = EmailRepository(manager).get_emails(limit=25)
+
+        assert len(page.items) == 25 and page.next_cursor is None
+
+    def test_invalid_cursor_reaches_the_caller(self, manager):
+        """Test the repository raises instead of returning an empty page"""
+        with pytest.raises(InvalidCursor):
+            EmailRepository(manager).get_emails(cursor="bogus")
+
+class TestCountCache:
+    """Test totals counted off the request path"""
+
+    def test_first_call_schedules_the_count(self):
+        """Test None until the background count finishes, then the cached value"""
+        cache = CountCache(ttl=60)
+        release = threading.Event()
+        calls = []
+
+        def count():
+            release.wait(5)
+            calls.append(1)
+            return 25
+
+        assert cache.get("emails", count) is None
+        assert cache.get("emails", count) is None
+        release.set()
+        cache.wait()
+
+        total = cache.get("emails", count)
+        assert (total['value'], total['stale']) == (25, False)
+        assert len(calls) == 1
+
+    def test_stale_value_is_served_while_recounting(self):
+        """Test an expired total is returned and refreshed in the background"""
+        now = [0.0]
+        cache = CountCache(ttl=60, clock=lambda: now[0])
+        totals = iter([10, 11])
+        cache.get("emails", lambda: next(totals))
+        cache.wait()
+        now[0] = 61
+
+        assert cache.get("emails", lambda: next(totals))['value'] == 10
+        cache.wait()
+        total = cache.get("emails", lambda: 0)
+        assert (total['value'], total['stale']) == (11, False)
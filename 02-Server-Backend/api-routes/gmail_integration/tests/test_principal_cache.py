@@ -0,0 +1,137 @@
+"""
+Principal Cache Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import pytest
+
+from principal_cache import PrincipalCache, LocalInvalidationBus
+
+class Clock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class Users:
+    """Loader counting database lookups"""
+
+    def __init__(self):
+        self.roles = {1: "medico", 2: "administrator"}
+        self.lookups = 0
+
+    def loader(self, user_id):
+        def load():
+            self.lookups += 1
+            role = self.roles.get(user_id)
+            return {"id": user_id, "role": role} if role else None
+        return load
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+@pytest.fixture
+def users():
+    return Users()
+
+def make_cache(clock, **kwargs):
+    kwargs.setdefault("bus", LocalInvalidationBus())
+    return PrincipalCache(ttl=30, max_entries=kwargs.pop("max_entries", 100), clock=clock, **kwargs)
+
+class TestPrincipalCache:
+    """Test hits, expiry and eviction"""
+
+    def test_repeat_requests_hit_the_cache(self, clock, users):
+        """Test one database lookup for many requests with the same token"""
+        cache = make_cache(clock)
+        for _ in range(5):
+            assert cache.get_or_load(1, "jti-a", users.loader(1)) == {"id": 1, "role": "medico"}
+
+        stats = cache.get_stats()
+        assert users.lookups == 1
+        assert (stats['hits'], stats['misses'], stats['hit_rate']) == (4, 1, 0.8)
+        assert stats['saved_ms'] == pytest.approx(stats['avg_load_ms'] * 4, abs=0.1)
+
+    def test_tokens_are_cached_separately(self, clock, users):
+        """Test the key includes the token id"""
+        cache = make_cache(clock)
+        cache.get_or_load(1, "jti-a", users.loader(1))
+        cache.get_or_load(1, "jti-b", users.loader(1))
+
+        assert users.lookups == 2
+
+    def test_entries_expire(self, clock, users):
+        """Test the user is looked up again after the TTL"""
+        cache = make_cache(clock)
+        cache.get_or_load(1, "jti-a", users.loader(1))
+        clock.now += 31
+
+        cache.get_or_load(1, "jti-a", users.loader(1))
+
+        assert users.lookups == 2
+        assert cache.get_stats()['expired'] == 1
+
+    def test_inactive_users_are_not_cached(self, clock, users):
+        """Test a missing or inactive user is checked on every request"""
+        cache = make_cache(clock)
+        assert cache.get_or_load(9, "jti-a", users.loader(9)) is None
+        assert cache.get_or_load(9, "jti-a", users.loader(9)) is None
+
+        assert users.lookups == 2
+
+    def test_least_recently_used_is_evicted(self, clock, users):
+        """Test the cache stays bounded and keeps recently used tokens"""
+        cache = make_cache(clock, max_entries=2)
+        cache.get_or_load(1, "a", users.loader(1))
+        cache.get_or_load(1, "b", users.loader(1))
+        cache.get_or_load(1, "a", users.loader(1))
+        cache.get_or_load(2, "c", users.loader(2))
+
+        assert cache.get(1, "a") is not None
+        assert cache.get(1, "b") is None
+        assert cache.get_stats()['evicted'] == 1
+
+class TestInvalidation:
+    """Test explicit invalidation, locally and across processes"""
+
+    def test_invalidate_drops_all_tokens_of_the_user(self, clock, users):
+        """Test a role change is seen on the next request of every token"""
+        cache = make_cache(clock)
+        cache.get_or_load(1, "a", users.loader(1))
+        cache.get_or_load(1, "b", users.loader(1))
+        cache.get_or_load(2, "c", users.loader(2))
+        users.roles[1] = "administrator"
+
+        cache.invalidate(1)
+
+        assert cache.get_or_load(1, "a", users.loader(1))["role"] == "administrator"
+        assert cache.get(2, "c") is not None
+
+    def test_other_processes_are_told(self, clock, users):
+        """Test an invalidation reaches every cache on the bus"""
+        bus = LocalInvalidationBus()
+        here, there = make_cache(clock, bus=bus), make_cache(clock, bus=bus)
+        there.get_or_load(1, "a", users.loader(1))
+        users.roles.pop(1)
+
+        here.invalidate(1)
+
+        assert there.get_or_load(1, "a", users.loader(1)) is None
+
+    def test_lookup_racing_an_invalidation_is_not_stored(self, clock, users):
+        """Test a principal loaded before the invalidation is not cached"""
+        cache = make_cache(clock)
+        load = users.loader(1)
+
+        def load_then_deactivate():
+            principal = load()
+            cache.invalidate(1)  # update_user commits while this lookup is in flight
+            return principal
+
+        cache.get_or_load(1, "a", load_then_deactivate)
+
+        assert cache.get(1, "a") is None
@@ -0,0 +1,80 @@
+"""
+Raw Message Store Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import os
+import time
+import pytest
+
+from raw_message_store import RawMessageStore
+
+def _raw_message(gmail_id, body_size=2000):
+    """Raw Gmail API message with an incompressible-ish body"""
+    return {
+        "id": gmail_id,
+        "threadId": f"thread_{gmail_id}",
+        "snippet": "Remision paciente",
+        "payload": {"body": {"data": os.urandom(body_size).hex()}},
+    }
+
+class TestRawMessageStore:
+    """Test the compressed raw message store"""
+
+    def test_put_and_get(self, temp_directory):
+        """Test storing and loading a raw message"""
+        store = RawMessageStore(temp_directory, max_bytes=10 * 1024 * 1024)
+        message = _raw_message("abc123")
+
+        assert store.put("abc123", message) is True
+        assert store.contains("abc123")
+        assert store.get("abc123") == message
+        assert store.get("missing") is None
+
+    def test_messages_are_compressed(self, temp_directory):
+        """Test that payloads are stored gzip compressed"""
+        store = RawMessageStore(temp_directory, max_bytes=10 * 1024 * 1024)
+        message = {"id": "m1", "payload": {"body": {"data": "A" * 50000}}}
+
+        store.put("m1", message)
+
+        assert store.get_stats()["total_bytes"] < 5000
+
+    def test_size_cap_evicts_least_recently_used(self, temp_directory):
+        """Test LRU eviction once the size cap is exceeded"""
+        store = RawMessageStore(temp_directory, max_bytes=10 * 1024 * 1024)
+        store.put("m1", _raw_message("m1"))
+        size = store.get_stats()["total_bytes"]
+        store.max_bytes = int(size * 2.5)
+
+        store.put("m2", _raw_message("m2"))
+        os.utime(store._path("m1"), (time.time() - 100, time.time() - 100))
+        os.utime(store._path("m2"), (time.time() - 50, time.time() - 50))
+        store.get("m1")  # m1 becomes the most recently used
+
+        store.put("m3", _raw_message("m3"))
+
+        assert store.contains("m1")
+        assert not store.contains("m2")
+        assert store.contains("m3")
+        assert store.get_stats()["total_bytes"] <= store.max_bytes
+
+    def test_sizes_are_restored_on_restart(self, temp_directory):
+        """Test that an existing store directory is accounted for"""
+        store = RawMessageStore(temp_directory, max_bytes=10 * 1024 * 1024)
+        store.put("m1", _raw_message("m1"))
+        store.put("m2", _raw_message("m2"))
+
+        reopened = RawMessageStore(temp_directory, max_bytes=10 * 1024 * 1024)
+
+        assert reopened.get_stats() == store.get_stats()
+        assert sorted(reopened.list_ids()) == ["m1", "m2"]
+
+    def test_delete(self, temp_directory):
+        """Test removing a stored message"""
+        store = RawMessageStore(temp_directory, max_bytes=10 * 1024 * 1024)
+        store.put("m1", _raw_message("m1"))
+
+        assert store.delete("m1") is True
+        assert store.get("m1") is None
+        assert store.get_stats()["messages"] == 0
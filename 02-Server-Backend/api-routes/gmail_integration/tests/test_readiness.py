@@ -0,0 +1,59 @@
+"""
+Startup Readiness Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+
+from readiness import ReadinessRegistry
+
+class TestReadinessRegistry:
+    """Test liveness vs readiness during warm-up"""
+
+    def test_not_ready_until_required_components_load(self):
+        """Test that only required components gate readiness"""
+        registry = ReadinessRegistry()
+        registry.register("database", lambda: True)
+        registry.register("nlp", lambda: False, required=False)
+
+        assert registry.is_ready() is False
+        assert registry.get_status()["components"]["database"]["status"] == "pending"
+
+        assert registry.warm_up() is True
+        components = registry.get_status()["components"]
+        assert components["database"]["status"] == "ready"
+        assert components["nlp"]["status"] == "failed"
+        assert components["nlp"]["error"] == "unavailable"
+
+    def test_failed_component_is_retried(self):
+        """Test that a failed loader is retried and a ready one is not called again"""
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) == 1:
+                raise ConnectionError("mysql down")
+            return True
+
+        registry = ReadinessRegistry()
+        registry.register("database", flaky)
+
+        assert registry.warm_up() is False
+        assert registry.get_status()["components"]["database"]["error"] == "mysql down"
+        assert registry.warm_up() is True
+        assert registry.warm_up() is True
+        assert len(calls) == 2
+
+    def test_background_warm_up_keeps_liveness(self):
+        """Test that liveness answers while a component is still loading"""
+        release = threading.Event()
+        registry = ReadinessRegistry()
+        registry.register("models", lambda: release.wait(5))
+
+        thread = registry.start_background_warm_up()
+        assert registry.liveness()["status"] == "alive"
+        assert registry.is_ready() is False
+
+        release.set()
+        thread.join(5)
+        assert registry.is_ready() is True
@@ -0,0 +1,100 @@
+"""
+Repository and Unit of Work Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import dataclasses
+from datetime import datetime
+
+import pytest
+
+from database import EmailRepository, ReferralRepository
+from dto import EmailDTO, ReferralDTO
+from models import EmailMessage, EmailAttachment, PatientRecord, MedicalReferral
+
+def add_referrals(session):
+    """Two pending referrals with their emails, one patient and attachments"""
+    session.add(PatientRecord(id=1, document_number="1020304050", full_name="Maria Gomez"))
+    for n in (1, 2):
+        session.add(EmailMessage(id=n, gmail_id=f"g{n}", subject=f"Remision {n}",
+                                 sender_email="remisiones@eps.com.co",
+                                 recipient_email="vitalred@hospital.com", date_received=datetime.now()))
+        session.add(MedicalReferral(id=n, email_message_id=n, patient_record_id=1 if n == 1 else None,
+                                    referral_type="interconsulta", specialty_requested="cardiologia",
+                                    priority_level="alta", referral_date=datetime.now(), status="pending"))
+    session.add_all([
+        EmailAttachment(email_message_id=1, filename=name, original_filename=name,
+                        mime_type="application/pdf", file_size=10)
+        for name in ("epicrisis.pdf", "laboratorio.pdf")
+    ])
+
+@pytest.fixture
+def referrals(make_db_manager):
+    """DatabaseManager over the referrals above, counting pool checkouts"""
+    return make_db_manager(seed=add_referrals, count_statements=True)
+
+class TestRepositoryResults:
+    """Test that repositories return plain DTOs"""
+
+    def test_results_are_usable_after_the_session_closes(self, referrals):
+        """Test DTO attributes are loaded values, not lazy ORM attributes"""
+        repo = ReferralRepository(referrals)
+
+        [first, second] = sorted(repo.get_referrals_by_status("pending"), key=lambda r: r.id)
+        email = EmailRepository(referrals).get_email_by_gmail_id("g1")
+
+        assert isinstance(first, ReferralDTO) and isinstance(email, EmailDTO)
+        assert (first.email_message_id, first.patient_record_id, second.patient_record_id) == (1, 1, None)
+        assert email.subject == "Remision 1"
+        assert email.to_dict()["gmail_id"] == "g1"
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            email.subject = "changed"
+
+    def test_missing_rows_are_none(self, referrals):
+        """Test single-row lookups return None when nothing matches"""
+        assert EmailRepository(referrals).get_email_by_id(99) is None
+        assert ReferralRepository(referrals).get_referral_by_id(99) is None
+
+class TestUnitOfWork:
+    """Test that a unit of work shares one session and connection"""
+
+    def test_one_connection_for_all_calls(self, referrals):
+        """Test a request's repository calls check out the pool once"""
+        with referrals.unit_of_work() as uow:
+            pending = uow.referrals.get_referrals_by_status("pending")
+            email_ids = [referral.email_message_id for referral in pending]
+            emails = uow.emails.get_emails_by_ids(email_ids)
+            patients = uow.patients.get_patients_by_ids([r.patient_record_id for r in pending])
+            attachments = uow.attachments.get_attachments_by_emails(email_ids)
+
+        assert referrals.checkouts == 1
+        assert set(emails) == {1, 2}
+        assert list(patients) == [1]
+        assert [a.filename for a in attachments[1]] == ["epicrisis.pdf", "laboratorio.pdf"]
+        assert 2 not in attachments
+
+    def test_separate_calls_check_out_per_call(self, referrals):
+        """Test the session-per-call behaviour outside a unit of work, for comparison"""
+        repo = EmailRepository(referrals)
+        repo.get_email_by_id(1)
+        repo.count_emails()
+
+        assert referrals.checkouts == 2
+
+    def test_changes_commit_once_on_exit(self, referrals):
+        """Test writes are visible after the block and share its transaction"""
+        with referrals.unit_of_work() as uow:
+            assert uow.emails.update_email_status(1, "processing", processed_by="host:1")
+            assert uow.referrals.update_referral_status(1, "aceptada", "Cupo asignado")
+
+        assert EmailRepository(referrals).get_email_by_id(1).processed_by == "host:1"
+        assert ReferralRepository(referrals).get_referral_by_id(1).status == "aceptada"
+
+    def test_exception_rolls_back(self, referrals):
+        """Test nothing is written when the block raises"""
+        with pytest.raises(RuntimeError):
+            with referrals.unit_of_work() as uow:
+                uow.referrals.update_referral_status(1, "rechazada")
+                raise RuntimeError("frontend unavailable")
+
+        assert ReferralRepository(referrals).get_referral_by_id(1).status == "pending"
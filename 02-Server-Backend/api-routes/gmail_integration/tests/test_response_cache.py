@@ -0,0 +1,254 @@
+"""
+Response Cache Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from datetime import datetime
+
+import pytest
+
+from dto import ReferralDTO
+from performance_optimizer import CacheManager
+from principal_cache import LocalInvalidationBus
+from response_cache import ResponseCache
+
+class Clock:
+    """Manually advanced monotonic clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    """The commands the response cache uses, in memory; fails on KEYS"""
+
+    def __init__(self, clock=None):
+        self.clock = clock or (lambda: 0.0)
+        self.data = {}
+        self.expires = {}
+        self.commands = []
+
+    def _live(self, key):
+        if key in self.expires and self.expires[key] <= self.clock():
+            self.data.pop(key, None)
+            del self.expires[key]
+        return self.data.get(key)
+
+    def get(self, key):
+        self.commands.append("GET")
+        return self._live(key)
+
+    def mget(self, keys):
+        self.commands.append("MGET")
+        return [self._live(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        self.commands.append("SETEX")
+        self.data[key] = value
+        self.expires[key] = self.clock() + ttl
+
+    def incr(self, key):
+        self.commands.append("INCR")
+        self.data[key] = str(int(self.data.get(key, 0)) + 1)
+
+    def expire(self, key, ttl):
+        self.commands.append("EXPIRE")
+
+    def keys(self, pattern):
+        raise AssertionError("KEYS must not be used")
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.redis, name)(*args) for name, args in self.calls]
+
+class Loader:
+    """Route body counting how often it runs"""
+
+    def __init__(self, value):
+        self.value = value
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.value
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+def make_cache(clock, redis=None, bus=None, **kwargs):
+    return ResponseCache(ttls={"referrals": 15, "templates": 300}, max_entries=kwargs.pop("max_entries", 100),
+                         bus=bus or LocalInvalidationBus(), redis_client=redis or FakeRedis(), clock=clock, **kwargs)
+
+class TestResponseCache:
+    """Test hits, TTLs and the LRU bound"""
+
+    def test_repeat_requests_hit_the_local_tier(self, clock):
+        """Test one load, then local hits without Redis round trips"""
+        redis = FakeRedis()
+        cache = make_cache(clock, redis)
+        load = Loader({"referrals": [1, 2]})
+
+        for _ in range(3):
+            assert cache.get_or_load("referrals", {"limit": 50}, load, tags=("referrals",)) == {"referrals": [1, 2]}
+
+        stats = cache.get_stats()
+        assert load.calls == 1
+        assert (stats['local_hits'], stats['misses']) == (2, 1)
+        assert redis.commands.count("GET") == 1
+
+    def test_params_are_part_of_the_key(self, clock):
+        """Test different filters are cached separately"""
+        cache = make_cache(clock)
+
+        assert cache.get_or_load("referrals", {"status": "pending"}, lambda: ["p"]) == ["p"]
+        assert cache.get_or_load("referrals", {"status": "approved"}, lambda: ["a"]) == ["a"]
+
+    def test_per_route_ttl(self, clock):
+        """Test entries expire after their route's TTL"""
+        cache = make_cache(clock, FakeRedis(clock))
+        referrals, templates = Loader([1]), Loader([2])
+        cache.get_or_load("referrals", None, referrals)
+        cache.get_or_load("templates", None, templates)
+
+        clock.now += 20
+        cache.get_or_load("referrals", None, referrals)
+        cache.get_or_load("templates", None, templates)
+
+        assert (referrals.calls, templates.calls) == (2, 1)
+
+    def test_none_is_not_cached(self, clock):
+        """Test a not-found response is loaded again next time"""
+        cache = make_cache(clock)
+        load = Loader(None)
+
+        assert cache.get_or_load("referral", {"id": 9}, load) is None
+        assert cache.get_or_load("referral", {"id": 9}, load) is None
+        assert load.calls == 2
+
+    def test_local_tier_is_bounded(self, clock):
+        """Test least recently used responses are evicted"""
+        cache = make_cache(clock, max_entries=2)
+        for n in range(3):
+            cache.get_or_load("referrals", {"page": n}, lambda: [n])
+
+        stats = cache.get_stats()
+        assert (stats['size'], stats['evicted']) == (2, 1)
+
+    def test_values_are_returned_in_json_form(self, clock):
+        """Test DTOs and datetimes come back as they would be served"""
+        cache = make_cache(clock)
+        referral = ReferralDTO(id=1, status="pending", created_at=datetime(2025, 3, 1, 8, 30))
+
+        value = cache.get_or_load("referrals", None, lambda: {"referrals": [referral]})
+
+        assert value["referrals"][0]["created_at"] == "2025-03-01T08:30:00"
+        assert value["referrals"][0]["status"] == "pending"
+
+class TestTagInvalidation:
+    """Test write routes make cached responses stale without scanning keys"""
+
+    def test_invalidation_drops_tagged_responses_only(self, clock):
+        """Test referrals are reloaded after a write, templates are not"""
+        cache = make_cache(clock)
+        referrals, templates = Loader([1]), Loader([2])
+        cache.get_or_load("referrals", None, referrals, tags=("referrals",))
+        cache.get_or_load("templates", None, templates, tags=("templates",))
+
+        cache.invalidate("referrals", "referral:1")
+        cache.get_or_load("referrals", None, referrals, tags=("referrals",))
+        cache.get_or_load("templates", None, templates, tags=("templates",))
+
+        assert (referrals.calls, templates.calls) == (2, 1)
+
+    def test_other_processes_see_the_invalidation(self, clock):
+        """Test a write in one process is honoured by another sharing Redis"""
+        redis, bus = FakeRedis(), LocalInvalidationBus()
+        first, second = make_cache(clock, redis, bus), make_cache(clock, redis, bus)
+        load = Loader({"status": "pending"})
+        first.get_or_load("medical_case", {"id": 1}, load, tags=("referral:1",))
+
+        assert second.get_or_load("medical_case", {"id": 1}, load, tags=("referral:1",)) == {"status": "pending"}
+        assert second.get_stats()['redis_hits'] == 1
+
+        load.value = {"status": "aceptada"}
+        first.invalidate("referral:1")
+
+        assert second.get_or_load("medical_case", {"id": 1}, load, tags=("referral:1",)) == {"status": "aceptada"}
+        assert load.calls == 2
+        assert "INCR" in redis.commands
+
+    def test_stale_redis_entry_is_ignored(self, clock):
+        """Test a Redis entry built before a tag bump is not served"""
+        redis = FakeRedis()
+        writer, reader = make_cache(clock, redis), make_cache(clock, redis)
+        load = Loader(["old"])
+        writer.get_or_load("referrals", None, load, tags=("referrals",))
+
+        writer.invalidate("referrals")   # the reader's bus is separate: only Redis versions tell it
+        load.value = ["new"]
+
+        assert reader.get_or_load("referrals", None, load, tags=("referrals",)) == ["new"]
+
+    def test_load_racing_an_invalidation_is_not_kept(self, clock):
+        """Test a response built while its tag was invalidated is served once, not cached"""
+        cache = make_cache(clock)
+
+        def load():
+            cache.invalidate("referrals")
+            return ["during write"]
+
+        cache.get_or_load("referrals", None, load, tags=("referrals",))
+        follow_up = Loader(["after write"])
+
+        assert cache.get_or_load("referrals", None, follow_up, tags=("referrals",)) == ["after write"]
+
+class TestCacheManager:
+    """Test the optimizer's general-purpose cache"""
+
+    def test_local_cache_is_bounded(self):
+        """Test the local dict no longer grows without limit"""
+        cache = CacheManager(max_local_entries=3)
+        cache.redis_client = None
+        for n in range(5):
+            cache.set(f"email_count:{n}", n)
+
+        assert list(cache.local_cache) == ["email_count:2", "email_count:3", "email_count:4"]
+        assert cache.get_stats()['evictions'] == 2
+
+    def test_clear_pattern_uses_scan(self):
+        """Test Redis keys are found with SCAN and local keys by glob"""
+        class ScanRedis(FakeRedis):
+            def scan_iter(self, match=None, count=None):
+                self.commands.append("SCAN")
+                return iter([key for key in list(self.data) if key.startswith("email_count")])
+
+            def unlink(self, *keys):
+                for key in keys:
+                    self.data.pop(key, None)
+
+            def delete(self, key):
+                self.data.pop(key, None)
+
+        cache = CacheManager(max_local_entries=10)
+        cache.redis_client = ScanRedis()
+        cache.set("email_count:pending", 1)
+        cache.set("recent_emails:10", [])
+
+        cache.clear_pattern("email_count:*")
+
+        assert list(cache.local_cache) == ["recent_emails:10"]
+        assert "email_count:pending" not in cache.redis_client.data
+        assert "SCAN" in cache.redis_client.commands
@@ -0,0 +1,137 @@
+"""
+Referral Rollup Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from models import MedicalReferral, ReferralDailyRollup
+from rollups import referral_rollups
+
+@pytest.fixture
+def manager(make_db_manager):
+    """DatabaseManager over an empty SQLite file"""
+    return make_db_manager()
+
+def add_referral(session, n, created_at, status="pending", priority="alta", specialty="cardiologia"):
+    session.add(MedicalReferral(id=n, email_message_id=n, referral_type="interconsulta",
+                                specialty_requested=specialty, priority_level=priority, status=status,
+                                referral_date=created_at, created_at=created_at))
+
+def rollup_rows(manager):
+    """Non-empty rollup rows as {(day, status, priority, specialty): count}"""
+    with manager.get_session() as session:
+        return {(r.day, r.status, r.priority_level, r.specialty): r.referral_count
+                for r in session.query(ReferralDailyRollup) if r.referral_count}
+
+class TestIncrementalRollups:
+    """Test rollups follow inserts, status changes and deletes"""
+
+    def test_new_referrals_are_counted(self, manager):
+        """Test each creation day and combination gets its own row"""
+        with manager.get_session() as session:
+            add_referral(session, 1, datetime(2025, 3, 1, 9))
+            add_referral(session, 2, datetime(2025, 3, 1, 15))
+            add_referral(session, 3, datetime(2025, 3, 2, 9), priority="media")
+
+        assert rollup_rows(manager) == {
+            (date(2025, 3, 1), "pending", "alta", "cardiologia"): 2,
+            (date(2025, 3, 2), "pending", "media", "cardiologia"): 1,
+        }
+
+    def test_decision_moves_the_count_and_times_the_response(self, manager):
+        """Test approving a referral moves it to the approved row with its response time"""
+        created_at = datetime.now() - timedelta(hours=6)
+        with manager.get_session() as session:
+            add_referral(session, 1, created_at)
+        with manager.get_session() as session:
+            session.get(MedicalReferral, 1).status = "approved"
+
+        assert rollup_rows(manager) == {(created_at.date(), "approved", "alta", "cardiologia"): 1}
+        with manager.get_session() as session:
+            assert referral_rollups.average_response_hours(session) == pytest.approx(6, abs=0.01)
+
+    def test_later_changes_do_not_retime(self, manager):
+        """Test only the first decision counts toward response time"""
+        created_at = datetime.now() - timedelta(hours=2)
+        with manager.get_session() as session:
+            add_referral(session, 1, created_at)
+        with manager.get_session() as session:
+            session.get(MedicalReferral, 1).status = "approved"
+        with manager.get_session() as session:
+            referral = session.get(MedicalReferral, 1)
+            referral.status = "rejected"
+            referral.priority_level = "baja"
+
+        assert rollup_rows(manager) == {(created_at.date(), "rejected", "baja", "cardiologia"): 1}
+        with manager.get_session() as session:
+            row = session.query(ReferralDailyRollup).filter_by(status="approved").one()
+            assert row.response_count == 1
+            assert session.query(ReferralDailyRollup).filter_by(status="rejected").one().response_count == 0
+
+    def test_delete_removes_the_count(self, manager):
+        """Test a deleted referral leaves its row at zero"""
+        with manager.get_session() as session:
+            add_referral(session, 1, datetime(2025, 3, 1, 9))
+        with manager.get_session() as session:
+            session.delete(session.get(MedicalReferral, 1))
+
+        assert rollup_rows(manager) == {}
+
+    def test_rebuild_matches_incremental_counts(self, manager):
+        """Test recomputing from medical_referrals gives the same counts"""
+        with manager.get_session() as session:
+            for n in range(1, 7):
+                add_referral(session, n, datetime(2025, 3, n % 3 + 1, 9),
+                             priority="alta" if n % 2 else "media", specialty="neurologia" if n > 4 else "cardiologia")
+        with manager.get_session() as session:
+            session.get(MedicalReferral, 2).status = "approved"
+        incremental = rollup_rows(manager)
+
+        with manager.get_session() as session:
+            referral_rollups.rebuild(session)
+
+        assert rollup_rows(manager) == incremental
+
+class TestAnalytics:
+    """Test analytics read from the rollups"""
+
+    @pytest.fixture
+    def seeded(self, manager):
+        with manager.get_session() as session:
+            add_referral(session, 1, datetime(2025, 1, 10), status="approved")
+            add_referral(session, 2, datetime(2025, 2, 5), priority="media")
+            add_referral(session, 3, datetime(2025, 2, 20), specialty="neurologia")
+            add_referral(session, 4, datetime(2025, 3, 1), status="rejected", specialty="neurologia")
+            session.flush()
+            for n, hours in ((1, 4), (4, 10)):
+                referral = session.get(MedicalReferral, n)
+                referral.updated_at = referral.created_at + timedelta(hours=hours)
+        with manager.get_session() as session:
+            referral_rollups.rebuild(session)
+        return manager
+
+    def test_distributions_honour_the_date_range(self, seeded):
+        """Test every distribution, not only the total, is limited to the range"""
+        with seeded.get_session() as session:
+            analytics = referral_rollups.analytics(session, date(2025, 2, 1), date(2025, 2, 28))
+
+        assert analytics["total"] == 2
+        assert analytics["status"] == {"pending": 2}
+        assert analytics["priority"] == {"alta": 1, "media": 1}
+        assert sorted(analytics["specialty"]) == [("cardiologia", 1), ("neurologia", 1)]
+        assert analytics["monthly"] == [((2025, 2), 2)]
+        assert analytics["avg_response_hours"] is None
+
+    def test_whole_history(self, seeded):
+        """Test monthly trends and the average response time without a range"""
+        with seeded.get_session() as session:
+            analytics = referral_rollups.analytics(session)
+            average = referral_rollups.average_response_hours(session)
+
+        assert analytics["monthly"] == [((2025, 1), 1), ((2025, 2), 2), ((2025, 3), 1)]
+        assert analytics["specialty"][0] == ("cardiologia", 2)
+        assert analytics["avg_response_hours"] == pytest.approx(7)
+        assert average == pytest.approx(7)
@@ -0,0 +1,164 @@
+"""
+Processing Step Log Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Base, EmailMessage, ProcessingLog
+from step_log import StepLogWriter, step_row, timed_step
+
+class SessionManager:
+    """DatabaseManager stand-in over an existing engine"""
+
+    def __init__(self, engine):
+        self.SessionLocal = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_session(self):
+        session = self.SessionLocal()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+class BrokenManager:
+    """A database that is down"""
+
+    @contextmanager
+    def get_session(self):
+        raise ConnectionError("database unavailable")
+        yield
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    engine.statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: engine.statements.append(statement))
+    return engine
+
+def make_writer(manager, **kwargs):
+    kwargs.setdefault("flush_interval", 3600)
+    return StepLogWriter(manager, **kwargs)
+
+def row(email_id, step_name="content_processing", status="completed", duration=0.5):
+    now = datetime.now()
+    return step_row(email_id, step_name, status, None, now, now, duration)
+
+def stored_rows(engine):
+    with SessionManager(engine).get_session() as session:
+        return [(log.email_message_id, log.step_name, log.status) for log in
+                session.query(ProcessingLog).order_by(ProcessingLog.id)]
+
+class TestTimedStep:
+    """Test that steps record real start, end and duration"""
+
+    def test_completed_step_is_timed(self):
+        """Test the duration covers the work done inside the block"""
+        rows = []
+        with timed_step(rows.append, 7, "medical_extraction") as step:
+            time.sleep(0.02)
+            step.message = "Medical data extracted"
+
+        [recorded] = rows
+        assert (recorded['email_message_id'], recorded['status'], recorded['message']) == \
+            (7, "completed", "Medical data extracted")
+        assert recorded['duration_seconds'] >= 0.02
+        assert (recorded['end_time'] - recorded['start_time']).total_seconds() >= 0.02
+
+    def test_failed_step_records_error_and_raises(self):
+        """Test an error row with the exception text and the exception propagating"""
+        rows = []
+        with pytest.raises(ValueError):
+            with timed_step(rows.append, 7, "medical_classification"):
+                raise ValueError("classifier crashed")
+
+        assert [(r['status'], r['message']) for r in rows] == [("error", "classifier crashed")]
+        assert rows[0]['duration_seconds'] is not None
+
+class TestStepLogWriter:
+    """Test buffering, batched writes and failure handling"""
+
+    def test_rows_are_written_in_batches(self, engine):
+        """Test one INSERT statement per batch"""
+        writer = make_writer(SessionManager(engine), batch_size=2)
+        writer.record_many([row(n) for n in range(5)])
+
+        writer.stop()
+
+        assert [email_id for email_id, _, _ in stored_rows(engine)] == [0, 1, 2, 3, 4]
+        assert sum(s.startswith("INSERT INTO processing_logs") for s in engine.statements) == 3
+        assert writer.get_stats()['written'] == 5
+
+    def test_record_does_not_touch_the_database(self, engine):
+        """Test that recording only buffers"""
+        writer = make_writer(SessionManager(engine))
+        writer.record(row(1))
+
+        assert engine.statements == []
+        assert writer.get_stats()['buffered'] == 1
+        writer.stop()
+
+    def test_full_buffer_drops_oldest(self, engine):
+        """Test the ring buffer keeps the newest rows"""
+        writer = make_writer(SessionManager(engine), capacity=3)
+        writer.record_many([row(n) for n in range(5)])
+
+        assert writer.get_stats()['dropped'] == 2
+        writer.flush()
+        assert [email_id for email_id, _, _ in stored_rows(engine)] == [2, 3, 4]
+        writer.stop()
+
+    def test_failed_flush_keeps_rows(self, engine):
+        """Test rows stay buffered while the database is down"""
+        writer = make_writer(BrokenManager())
+        writer.record_many([row(n) for n in range(3)])
+
+        assert writer.flush() == 0
+        stats = writer.get_stats()
+        assert (stats['buffered'], stats['flush_errors']) == (3, 1)
+
+        writer.db_manager = SessionManager(engine)
+        assert writer.flush() == 3
+        writer.stop()
+
+    def test_orphan_rows_are_rejected(self, engine):
+        """Test that a row for a missing email does not block the others"""
+        with engine.connect() as connection:
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+        with SessionManager(engine).get_session() as session:
+            session.add(EmailMessage(id=1, gmail_id="g1", subject="", sender_email="a@b.co",
+                                     recipient_email="c@d.co", date_received=datetime.now()))
+        writer = make_writer(SessionManager(engine))
+        writer.record_many([row(1), row(99), row(1, "medical_classification")])
+
+        assert writer.flush() == 2
+        assert writer.get_stats()['rejected'] == 1
+        assert [step for _, step, _ in stored_rows(engine)] == ["content_processing", "medical_classification"]
+        writer.stop()
+
+    def test_step_aggregates(self, engine):
+        """Test per-step counts, errors and durations kept in memory"""
+        writer = make_writer(SessionManager(engine))
+        writer.record_many([
+            row(1, duration=1.0), row(2, duration=3.0), row(3, status="error", duration=2.0),
+            step_row(4, "email_creation", "completed", None, datetime.now(), datetime.now())
+        ])
+
+        steps = writer.get_stats()['steps']
+        assert steps['content_processing'] == {'count': 3, 'errors': 1, 'avg_seconds': 2.0, 'max_seconds': 3.0}
+        assert steps['email_creation'] == {'count': 1, 'errors': 0, 'avg_seconds': 0.0, 'max_seconds': 0.0}
+        writer.stop()
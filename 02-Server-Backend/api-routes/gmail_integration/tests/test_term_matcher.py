@@ -0,0 +1,64 @@
+"""
+Medical Term Matcher Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+from term_matcher import TermMatcher, fold, get_term_matcher
+
+TERMINOLOGY = {
+    "symptoms": ["dolor", "vision borrosa", "fiebre"],
+    "body_parts": ["riñones", "torax"],
+    "procedures": ["cirugia", "cirugia cardiaca"],
+    "specialties": ["cirugia", "cardiologia"],
+}
+
+class TestTermMatcher:
+    """Test the single-pass terminology matcher"""
+
+    def test_fold(self):
+        """Test case and accent folding"""
+        assert fold("Cirugía") == "cirugia"
+        assert fold("RIÑONES") == "rinones"
+        assert fold("torax") == "torax"
+
+    def test_accent_insensitive_spans(self):
+        """Test that accented text matches unaccented terms with original offsets"""
+        text = "Dolor en TÓRAX y riñones; Visión  borrosa."
+        matches = TermMatcher(TERMINOLOGY).find(text)
+
+        found = [(m.text, m.category, m.term) for m in matches]
+        assert found == [
+            ("Dolor", "symptoms", "dolor"),
+            ("TÓRAX", "body_parts", "torax"),
+            ("riñones", "body_parts", "riñones"),
+            ("Visión  borrosa", "symptoms", "vision borrosa"),
+        ]
+        assert all(text[m.start:m.end] == m.text for m in matches)
+
+    def test_whole_words_only(self):
+        """Test word boundaries like the previous \\b regexes"""
+        matcher = TermMatcher(TERMINOLOGY)
+
+        assert matcher.find("dolores fiebre_alta cardiologia2") == []
+        assert [m.term for m in matcher.find("vision, borrosa")] == []
+
+    def test_overlapping_terms_and_categories(self):
+        """Test nested multi-word terms and terms listed in several categories"""
+        matches = TermMatcher(TERMINOLOGY).find("cirugia cardiaca")
+
+        assert [(m.category, m.term, m.end) for m in matches] == [
+            ("procedures", "cirugia", 7),
+            ("specialties", "cirugia", 7),
+            ("procedures", "cirugia cardiaca", 16),
+        ]
+
+    def test_shared_matcher_rebuilt_on_change(self):
+        """Test one matcher per terminology version"""
+        first = get_term_matcher(TERMINOLOGY)
+        assert get_term_matcher({k: list(v) for k, v in TERMINOLOGY.items()}) is first
+
+        changed = dict(TERMINOLOGY, symptoms=TERMINOLOGY["symptoms"] + ["disnea"])
+        reloaded = get_term_matcher(changed)
+
+        assert reloaded is not first
+        assert [m.term for m in reloaded.find("disnea")] == ["disnea"]
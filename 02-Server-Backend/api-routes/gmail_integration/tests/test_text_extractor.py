@@ -0,0 +1,188 @@
+"""
+Text Extractor Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import PyPDF2
+from PIL import Image, ImageDraw
+
+import text_extractor
+from text_extractor import TextExtractor
+from image_preprocessor import ImagePreprocessor
+from config import FILE_CONFIG
+
+def _blank_pdf(path, pages):
+    """Write a PDF whose pages have no text layer, like a scanned referral"""
+    writer = PyPDF2.PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(width=612, height=792)
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return path
+
+@pytest.fixture
+def extractor():
+    """Text extractor with OCR enabled and no cache"""
+    with patch.dict(FILE_CONFIG["EXTRACTION_CACHE"], {"ENABLED": False}):
+        extractor = TextExtractor()
+    extractor.tesseract_available = True
+    extractor.pdf_config = {"OCR_WORKERS": 2, "OCR_PAGE_TIMEOUT": 5, "OCR_MAX_PAGES": 30}
+    return extractor
+
+@pytest.fixture
+def ocr_pool():
+    """Run OCR jobs in threads so the page worker can be patched"""
+    pool = ThreadPoolExecutor(max_workers=2)
+    with patch.object(text_extractor, "get_ocr_pool", return_value=pool), \
+         patch.object(text_extractor, "PDF2IMAGE_AVAILABLE", True):
+        yield pool
+    pool.shutdown(wait=False)
+
+class TestPdfOcr:
+    """Test page-level OCR of scanned PDFs"""
+
+    def test_scanned_pages_are_ocrd_in_order(self, extractor, ocr_pool, temp_directory):
+        """Test that every page without text is OCR'd and reassembled in page order"""
+        pdf_path = _blank_pdf(temp_directory / "remision.pdf", 4)
+
+        def worker(file_path, page_num, dpi, language, config, timeout):
+            time.sleep(0.05 * (4 - page_num))  # Later pages finish first
+            return f"Página {page_num + 1} diagnóstico hipertensión arterial crónica " * 2
+
+        with patch.object(text_extractor, "_ocr_pdf_page_worker", side_effect=worker) as page_worker:
+            text = extractor.extract_text(pdf_path, "application/pdf")
+
+        assert page_worker.call_count == 4
+        assert [call.args[2] for call in page_worker.call_args_list] == [extractor.ocr_config["DPI"]] * 4
+        positions = [text.index(f"Página {n}") for n in range(1, 5)]
+        assert positions == sorted(positions)
+
+    def test_page_cap(self, extractor, ocr_pool, temp_directory):
+        """Test that no more than OCR_MAX_PAGES pages are OCR'd"""
+        pdf_path = _blank_pdf(temp_directory / "historia.pdf", 5)
+        extractor.pdf_config["OCR_MAX_PAGES"] = 2
+
+        with patch.object(text_extractor, "_ocr_pdf_page_worker", return_value="texto") as page_worker:
+            results, complete = extractor._ocr_pdf_pages(pdf_path, list(range(5)))
+
+        assert sorted(results) == [0, 1]
+        assert complete is True
+        assert page_worker.call_count == 2
+
+    def test_page_cap_covers_the_full_ocr_pass(self, extractor, ocr_pool, temp_directory):
+        """Test that the limited-text second pass shares the page cap with the first"""
+        pdf_path = _blank_pdf(temp_directory / "historia.pdf", 6)
+        extractor.pdf_config["OCR_MAX_PAGES"] = 4
+        # Pages 0-2 are scans, pages 3-5 have a few characters of text layer
+        layer = ["", "", "", "p4", "p5", "p6"]
+
+        with patch.object(PyPDF2._page.PageObject, "extract_text",
+                          side_effect=lambda *args, **kwargs: layer.pop(0)), \
+             patch.object(text_extractor, "_ocr_pdf_page_worker", return_value="texto") as page_worker:
+            extractor.extract_text(pdf_path, "application/pdf")
+
+        assert page_worker.call_count == 4
+        assert sorted(call.args[1] for call in page_worker.call_args_list) == [0, 1, 2, 3]
+
+    def test_hung_page_is_dropped(self, extractor, ocr_pool, temp_directory):
+        """Test that a page exceeding the deadline does not block the others"""
+        pdf_path = _blank_pdf(temp_directory / "escaneo.pdf", 2)
+        extractor.pdf_config.update({"OCR_PAGE_TIMEOUT": 0.2, "OCR_WORKERS": 2})
+
+        def worker(file_path, page_num, dpi, language, config, timeout):
+            if page_num == 1:
+                time.sleep(1.5)
+            return f"page {page_num}"
+
+        with patch.object(text_extractor, "_ocr_pdf_page_worker", side_effect=worker):
+            results, complete = extractor._ocr_pdf_pages(pdf_path, [0, 1])
+
+        assert results == {0: "page 0"}
+        assert complete is False
+
+    def test_failed_page_does_not_fail_document(self, extractor, ocr_pool, temp_directory):
+        """Test that a page raising an error is skipped"""
+        pdf_path = _blank_pdf(temp_directory / "orden.pdf", 2)
+
+        def worker(file_path, page_num, dpi, language, config, timeout):
+            if page_num == 0:
+                raise ValueError("corrupt page")
+            return "page 1"
+
+        with patch.object(text_extractor, "_ocr_pdf_page_worker", side_effect=worker):
+            assert extractor._ocr_pdf_pages(pdf_path, [0, 1]) == ({1: "page 1"}, False)
+
+    def test_without_tesseract_nothing_is_submitted(self, extractor, ocr_pool, temp_directory):
+        """Test that OCR is skipped when Tesseract is unavailable"""
+        extractor.tesseract_available = False
+
+        with patch.object(text_extractor, "_ocr_pdf_page_worker") as page_worker:
+            assert extractor._ocr_pdf_pages(temp_directory / "x.pdf", [0]) == ({}, False)
+
+        page_worker.assert_not_called()
+
+class TestImagePreprocessor:
+    """Test grayscale decode, downscaling and binarization for OCR"""
+
+    def _photo(self, path, size):
+        image = Image.new('RGB', size, (230, 225, 220))
+        ImageDraw.Draw(image).rectangle([size[0] // 4, size[1] // 4, size[0] // 2, size[1] // 3], fill=(20, 20, 20))
+        image.save(path, quality=90)
+        return path
+
+    def test_oversized_photo_is_downscaled_to_target_dpi(self, temp_directory):
+        """Test that a phone photo is reduced to a page at the target DPI"""
+        preprocessor = ImagePreprocessor(target_dpi=100, page_long_side_inches=10)
+        photo = self._photo(temp_directory / "foto.jpg", (4000, 3000))
+
+        result = preprocessor.preprocess(photo)
+
+        assert result.shape == (750, 1000)
+        assert result.dtype.name == "uint8"
+        assert set(result.ravel().tolist()) <= {0, 255}
+
+    def test_small_scan_keeps_its_size(self, temp_directory):
+        """Test that images already below the target are not resized"""
+        preprocessor = ImagePreprocessor(target_dpi=300, page_long_side_inches=11.7)
+        scan = self._photo(temp_directory / "scan.png", (900, 600))
+
+        assert preprocessor.preprocess(scan).shape == (600, 900)
+
+    def test_batch_reuses_scratch_buffer(self, temp_directory):
+        """Test that a batch of images shares one scratch buffer"""
+        preprocessor = ImagePreprocessor()
+        paths = [self._photo(temp_directory / f"scan_{i}.png", (800 - i * 100, 500)) for i in range(3)]
+
+        results = list(preprocessor.preprocess_batch(paths))
+        buffer = preprocessor._local.buffer
+
+        assert [path for path, _ in results] == paths
+        assert [image.shape for _, image in results] == [(500, 800), (500, 700), (500, 600)]
+        assert buffer.size == 800 * 500
+
+    def test_undecodable_file_returns_none(self, temp_directory):
+        """Test that a corrupt image yields None instead of raising"""
+        path = temp_directory / "corrupto.jpg"
+        path.write_bytes(b"not an image")
+
+        assert ImagePreprocessor().preprocess(path) is None
+
+class TestLazyTesseract:
+    """Test that Tesseract is probed on first use, not at construction"""
+
+    def test_probe_deferred_and_cached(self):
+        """Test that the version probe runs once per process, when first needed"""
+        with patch.object(text_extractor, "_tesseract_available", None), \
+             patch.object(text_extractor.pytesseract, "get_tesseract_version") as probe, \
+             patch.dict(FILE_CONFIG["EXTRACTION_CACHE"], {"ENABLED": False}):
+            first, second = TextExtractor(), TextExtractor()
+            probe.assert_not_called()
+
+            assert first.tesseract_available is True
+            assert second.tesseract_available is True
+            probe.assert_called_once()
@@ -0,0 +1,295 @@
+"""
+Work Queue Tests for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Base, EmailMessage, ProcessingQueue
+from work_queue import WorkQueue, EMAIL_TASK, priority_level_for_text
+
+class SQLiteManager:
+    """DatabaseManager stand-in over an in-memory SQLite database"""
+
+    def __init__(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(engine)
+        self.SessionLocal = sessionmaker(bind=engine)
+
+    @contextmanager
+    def get_session(self):
+        session = self.SessionLocal()
+        try:
+            yield session
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+class RowLockingSQLiteManager(SQLiteManager):
+    """SQLiteManager that honours SELECT ... FOR UPDATE on email rows, as MySQL does"""
+
+    def __init__(self):
+        super().__init__()
+        self.email_lock = threading.Lock()
+        event.listen(self.SessionLocal, "do_orm_execute", self._lock_email_rows)
+
+    def _lock_email_rows(self, state):
+        for_update = getattr(state.statement, "_for_update_arg", None)
+        if (state.is_select and for_update is not None and not for_update.skip_locked
+                and any(mapper.class_ is EmailMessage for mapper in state.all_mappers)
+                and not state.session.info.get("email_lock")):
+            self.email_lock.acquire()
+            state.session.info["email_lock"] = True
+
+    @contextmanager
+    def get_session(self):
+        with super().get_session() as session:
+            try:
+                yield session
+                session.commit()
+            finally:
+                if session.info.pop("email_lock", False):
+                    self.email_lock.release()
+
+@pytest.fixture
+def manager():
+    return SQLiteManager()
+
+def make_queue(manager, worker_id="worker-a", **kwargs):
+    kwargs.setdefault("retry_jitter", 0)
+    return WorkQueue(manager, worker_id=worker_id, lease_seconds=60, retry_delay=10,
+                     retry_max_delay=35, **kwargs)
+
+def email(id, gmail_id, status="pending", subject=""):
+    return EmailMessage(id=id, gmail_id=gmail_id, processing_status=status, subject=subject,
+                        sender_email="remisiones@eps-sanitas.com.co",
+                        recipient_email="vitalred@hospital.com", date_received=datetime.now())
+
+def task_row(manager, task_id):
+    with manager.get_session() as session:
+        row = session.query(ProcessingQueue).filter_by(task_id=task_id).one()
+        session.expunge(row)
+        return row
+
+class TestWorkQueue:
+    """Test claiming, leases, retries and dead-lettering"""
+
+    def test_urgent_tasks_are_claimed_first(self, manager):
+        """Test ordering by priority, then scheduled_at"""
+        queue = make_queue(manager)
+        first = queue.enqueue(EMAIL_TASK, task_data={"gmail_id": "a"}, priority_level="baja")
+        second = queue.enqueue(EMAIL_TASK, task_data={"gmail_id": "b"})
+        urgent = queue.enqueue(EMAIL_TASK, task_data={"gmail_id": "c"}, priority_level="alta")
+
+        claimed = queue.claim(10)
+
+        assert [task.task_id for task in claimed] == [urgent, second, first]
+        assert claimed[0].task_data == {"gmail_id": "c"}
+        assert queue.claim(10) == []
+
+    def test_claims_do_not_overlap(self, manager):
+        """Test that two workers never receive the same task"""
+        for n in range(5):
+            make_queue(manager).enqueue(EMAIL_TASK, task_data={"n": n})
+
+        a = make_queue(manager, "worker-a").claim(3)
+        b = make_queue(manager, "worker-b").claim(3)
+
+        assert len(a) == 3 and len(b) == 2
+        assert not {t.task_id for t in a} & {t.task_id for t in b}
+
+    def test_future_tasks_are_not_due(self, manager):
+        """Test that delayed tasks wait for their scheduled time"""
+        queue = make_queue(manager)
+        queue.enqueue(EMAIL_TASK, delay=300)
+
+        assert queue.claim(10) == []
+
+    def test_one_open_task_per_email(self, manager):
+        """Test that enqueuing the same email twice returns the open task"""
+        queue = make_queue(manager)
+        with manager.get_session() as session:
+            session.add(email(1, "g1"))
+
+        assert queue.enqueue(EMAIL_TASK, email_message_id=1) == queue.enqueue(EMAIL_TASK, email_message_id=1)
+
+    def test_concurrent_enqueues_create_one_task(self, monkeypatch):
+        """Test two enqueuers racing on the same email end up sharing one task"""
+        manager = RowLockingSQLiteManager()
+        with manager.get_session() as session:
+            session.add(email(1, "g1"))
+
+        new_task = WorkQueue._new_task
+        def slow_new_task(self, *args):
+            time.sleep(0.2)  # Widen the window between the duplicate check and the insert
+            return new_task(self, *args)
+        monkeypatch.setattr(WorkQueue, "_new_task", slow_new_task)
+
+        task_ids = []
+        enqueuers = [
+            threading.Thread(target=lambda worker=worker: task_ids.append(
+                make_queue(manager, worker_id=worker).enqueue(EMAIL_TASK, email_message_id=1)
+            ))
+            for worker in ("worker-a", "worker-b")
+        ]
+        for enqueuer in enqueuers:
+            enqueuer.start()
+        for enqueuer in enqueuers:
+            enqueuer.join()
+
+        with manager.get_session() as session:
+            assert session.query(ProcessingQueue).filter_by(email_message_id=1).count() == 1
+        assert task_ids[0] is not None and task_ids[0] == task_ids[1]
+
+    def test_failure_backs_off_exponentially_then_dead_letters(self, manager):
+        """Test retry scheduling and dead-lettering after max_retries"""
+        queue = make_queue(manager)
+        task_id = queue.enqueue(EMAIL_TASK, max_retries=2)
+        delays = []
+
+        for attempt in range(3):
+            with manager.get_session() as session:
+                session.query(ProcessingQueue).filter_by(task_id=task_id).update({"scheduled_at": datetime.now()})
+            [task] = queue.claim(1)
+            before = datetime.now()
+            assert queue.fail(task.task_id, "ocr failed")
+            row = task_row(manager, task_id)
+            delays.append((row.scheduled_at - before).total_seconds())
+
+        assert row.status == "dead"
+        assert row.retry_count == 3
+        assert row.error_message == "ocr failed"
+        assert [round(d) for d in delays[:2]] == [10, 20]
+        assert queue.get_stats()["dead_lettered"] == 1
+
+        assert queue.requeue_dead() == 1
+        assert task_row(manager, task_id).status == "pending"
+
+    def test_backoff_is_capped(self, manager):
+        """Test the maximum retry delay"""
+        queue = make_queue(manager)
+
+        assert [queue.retry_backoff(n) for n in (1, 2, 3, 4)] == [10, 20, 35, 35]
+
+    def test_expired_lease_is_reclaimed(self, manager):
+        """Test that another worker takes over a task whose worker stopped heartbeating"""
+        a, b = make_queue(manager, "worker-a"), make_queue(manager, "worker-b")
+        task_id = a.enqueue(EMAIL_TASK)
+        a.claim(1)
+
+        with manager.get_session() as session:
+            session.query(ProcessingQueue).filter_by(task_id=task_id).update({
+                "lease_expires_at": datetime.now() - timedelta(seconds=1),
+                "scheduled_at": datetime.now() - timedelta(days=1)
+            })
+        b.retry_backoff = lambda retry_count: 0
+
+        [task] = b.claim(1)
+
+        assert task.task_id == task_id
+        assert task.retry_count == 1
+        assert task_row(manager, task_id).locked_by == "worker-b"
+        assert a.complete(task_id) is False
+        assert b.complete(task_id) is True
+
+    def test_heartbeat_extends_lease(self, manager):
+        """Test that heartbeat keeps a claimed task leased"""
+        queue = make_queue(manager)
+        task_id = queue.enqueue(EMAIL_TASK)
+        queue.claim(1)
+        with manager.get_session() as session:
+            session.query(ProcessingQueue).filter_by(task_id=task_id).update(
+                {"lease_expires_at": datetime.now() + timedelta(seconds=1)}
+            )
+
+        assert queue.heartbeat([task_id]) == 1
+        assert task_row(manager, task_id).lease_expires_at > datetime.now() + timedelta(seconds=30)
+
+    def test_release_returns_task_without_penalty(self, manager):
+        """Test that released tasks are claimable again with no retry counted"""
+        queue = make_queue(manager)
+        task_id = queue.enqueue(EMAIL_TASK)
+        queue.claim(1)
+
+        assert queue.release([task_id]) == 1
+        [task] = queue.claim(1)
+        assert task.retry_count == 0
+
+    def test_enqueue_pending_emails(self, manager):
+        """Test backfill of pending emails that have no task"""
+        queue = make_queue(manager)
+        with manager.get_session() as session:
+            session.add_all([
+                email(1, "g1", subject="Remision"),
+                email(2, "g2", subject="URGENTE trauma"),
+                email(3, "g3", status="completed"),
+            ])
+
+        assert queue.enqueue_pending_emails() == 2
+        assert queue.enqueue_pending_emails() == 0
+        claimed = queue.claim(10)
+        assert [task.task_data["gmail_id"] for task in claimed] == ["g2", "g1"]
+
+    def test_priority_level_for_text(self):
+        """Test the keyword priority used at enqueue time"""
+        assert priority_level_for_text("Remisión URGENTE paciente") == "alta"
+        assert priority_level_for_text("Control de rutina") == "baja"
+        assert priority_level_for_text("Remisión a cardiología") == "media"
+
+class TestProcessedBy:
+    """Test that the processing worker is recorded on the email"""
+
+    def test_update_email_status_records_worker(self, manager):
+        """Test EmailMessage.processed_by is set when a worker takes the email"""
+        from database import EmailRepository
+
+        with manager.get_session() as session:
+            session.add(email(1, "g1"))
+
+        assert EmailRepository(manager).update_email_status(1, "processing", processed_by="host-a:4242")
+
+        with manager.get_session() as session:
+            stored = session.query(EmailMessage).filter_by(id=1).one()
+            assert (stored.processing_status, stored.processed_by) == ("processing", "host-a:4242")
+
+class TestSchemaCheck:
+    """Test startup refuses a processing_queue table created before the leases"""
+
+    def test_missing_lease_columns_fail_startup(self, tmp_path):
+        """Test an un-upgraded table raises instead of leaving claim() to return nothing"""
+        from sqlalchemy import text
+        from database import DatabaseManager, SchemaOutOfDate
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'vital_red.db'}")
+        Base.metadata.create_all(engine)
+        with engine.begin() as conn:
+            conn.execute(text("DROP TABLE processing_queue"))
+            conn.execute(text(
+                "CREATE TABLE processing_queue (id INTEGER PRIMARY KEY, task_id VARCHAR(36), "
+                "task_type VARCHAR(50), priority INTEGER, status VARCHAR(20), email_message_id INTEGER, "
+                "task_data JSON, scheduled_at DATETIME, started_at DATETIME, completed_at DATETIME, "
+                "error_message TEXT, retry_count INTEGER, max_retries INTEGER, "
+                "created_at DATETIME, updated_at DATETIME)"
+            ))
+
+        with pytest.raises(SchemaOutOfDate, match="processing_queue.locked_by, processing_queue.lease_expires_at"):
+            DatabaseManager()._create_tables(engine)
+
+    def test_current_schema_passes(self, tmp_path):
+        """Test a database created from the models starts normally"""
+        from database import DatabaseManager
+
+        engine = create_engine(f"sqlite:///{tmp_path / 'vital_red.db'}")
+        DatabaseManager()._create_tables(engine)
+        DatabaseManager()._create_tables(engine)
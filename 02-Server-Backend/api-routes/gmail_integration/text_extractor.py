@@ -5,9 +5,15 @@ Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
 
 import os
 import io
+import time
+import hashlib
 import tempfile
+import threading
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import structlog
 
 # Document processing imports
@@ -24,84 +30,237 @@ except ImportError:
     TEXTRACT_AVAILABLE = False
 
 try:
-    import cv2
-    import numpy as np
-    OPENCV_AVAILABLE = True
+    from pdf2image import convert_from_path
+    PDF2IMAGE_AVAILABLE = True
 except ImportError:
-    OPENCV_AVAILABLE = False
+    PDF2IMAGE_AVAILABLE = False
 
 from config import FILE_CONFIG, PROCESSING_CONFIG
+from extraction_cache import ExtractionCache
+from image_preprocessor import ImagePreprocessor
 
 logger = structlog.get_logger(__name__)
 
+# Persistent pool of OCR worker processes shared by every TextExtractor in the process
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+_tesseract_available: Optional[bool] = None
+
+def tesseract_version_available() -> bool:
+    """Whether the Tesseract binary runs; probed once per process"""
+    global _tesseract_available
+    if _tesseract_available is None:
+        try:
+            pytesseract.get_tesseract_version()
+            _tesseract_available = True
+            logger.info("Tesseract OCR configured successfully")
+        except Exception as e:
+            _tesseract_available = False
+            logger.warning("Tesseract OCR not available", error=str(e))
+    return _tesseract_available
+
+def _init_ocr_worker():
+    """Process pool initializer: start Tesseract once so later pages skip the warm-up"""
+    # Parallelism comes from the pool; OpenMP threads inside each Tesseract only oversubscribe
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    try:
+        pytesseract.get_tesseract_version()
+    except Exception:
+        pass
+
+def _ocr_pdf_page_worker(file_path: str, page_num: int, dpi: int, language: str,
+                         tesseract_config: str, timeout: int) -> Optional[str]:
+    """Rasterize one PDF page (0-based) and OCR it; runs in an OCR worker process"""
+    images = convert_from_path(
+        file_path, dpi=dpi, first_page=page_num + 1, last_page=page_num + 1,
+        grayscale=True, timeout=timeout
+    )
+    if not images:
+        return None
+    
+    try:
+        return pytesseract.image_to_string(images[0], lang=language, config=tesseract_config, timeout=timeout)
+    except RuntimeError:
+        # pytesseract kills Tesseract and raises RuntimeError when the timeout expires
+        logger.warning("OCR timed out for PDF page", file_path=file_path, page=page_num + 1, timeout=timeout)
+        return None
+    finally:
+        for image in images:
+            image.close()
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """Return the shared OCR process pool, creating it on first use"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            # spawn: forking a process that already runs threads can deadlock the child
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=max(1, FILE_CONFIG["PDF_CONFIG"]["OCR_WORKERS"]),
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_ocr_worker
+            )
+        return _ocr_pool
+
+def shutdown_ocr_pool(wait_for_workers: bool = True):
+    """Stop the shared OCR process pool"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        pool, _ocr_pool = _ocr_pool, None
+    if pool:
+        pool.shutdown(wait=wait_for_workers, cancel_futures=True)
+
+def _discard_broken_ocr_pool(pool: ProcessPoolExecutor):
+    """Drop a pool whose worker died so the next document gets a fresh one"""
+    global _ocr_pool
+    with _ocr_pool_lock:
+        if _ocr_pool is pool:
+            _ocr_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
 class TextExtractor:
     """
     Comprehensive text extraction from various document formats
     """
     
-    def __init__(self):
+    # Bump whenever a change to the extraction code alters its output,
+    # so results cached by earlier versions are no longer served
+    EXTRACTOR_VERSION = "4"
+    
+    def __init__(self, cache: Optional[ExtractionCache] = None):
         self.logger = logger.bind(component="text_extractor")
         self.ocr_config = FILE_CONFIG["OCR_CONFIG"]
+        self.pdf_config = FILE_CONFIG["PDF_CONFIG"]
+        self.image_preprocessor = ImagePreprocessor()
         
         # Configure Tesseract if available
         self._configure_tesseract()
+        
+        # Results are cached by content hash so identical files are never parsed or OCR'd twice
+        if cache is None and FILE_CONFIG["EXTRACTION_CACHE"]["ENABLED"]:
+            cache = ExtractionCache(extractor_version=self.EXTRACTOR_VERSION, ocr_config=self.ocr_config)
+        self.cache = cache
     
     def _configure_tesseract(self):
-        """Configure Tesseract OCR settings"""
-        try:
-            # Set Tesseract configuration
-            self.tesseract_config = f'--oem {self.ocr_config["OEM"]} --psm {self.ocr_config["PSM"]}'
-            
-            # Test if Tesseract is available
-            pytesseract.get_tesseract_version()
-            self.tesseract_available = True
-            self.logger.info("Tesseract OCR configured successfully")
-            
-        except Exception as e:
-            self.tesseract_available = False
-            self.logger.warning("Tesseract OCR not available", error=str(e))
+        """Configure Tesseract OCR settings; the binary is probed on first OCR, not here"""
+        self.tesseract_config = f'--oem {self.ocr_config["OEM"]} --psm {self.ocr_config["PSM"]}'
+        self._tesseract_available = None
+    
+    @property
+    def tesseract_available(self) -> bool:
+        if self._tesseract_available is None:
+            return tesseract_version_available()
+        return self._tesseract_available
+    
+    @tesseract_available.setter
+    def tesseract_available(self, available: bool):
+        self._tesseract_available = available
     
-    def extract_text(self, file_path: Path, mime_type: str) -> Optional[str]:
+    @property
+    def pdf_ocr_available(self) -> bool:
+        return PDF2IMAGE_AVAILABLE and self.tesseract_available
+    
+    def extract_text(self, file_path: Path, mime_type: str, file_hash: Optional[str] = None) -> Optional[str]:
         """
         Main method to extract text from various file formats
         
         Args:
             file_path: Path to the file
             mime_type: MIME type of the file
+            file_hash: SHA-256 of the file, computed here when not given
             
         Returns:
             Extracted text or None if extraction failed
         """
+        result = self.extract_text_with_details(file_path, mime_type, file_hash)
+        return result['text'] if result else None
+    
+    def extract_text_with_details(self, file_path: Path, mime_type: str,
+                                  file_hash: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Extract text, serving it from the extraction cache when possible
+        
+        Returns:
+            Dict with text, confidence, method and cached flag, or None if extraction failed
+        """
         try:
-            self.logger.info("Extracting text from file", 
-                           file_path=str(file_path), mime_type=mime_type)
-            
+            file_path = Path(file_path)
             if not file_path.exists():
                 self.logger.error("File not found", file_path=str(file_path))
                 return None
             
-            # Route to appropriate extraction method based on MIME type
-            if mime_type == "application/pdf":
-                return self._extract_from_pdf(file_path)
-            elif mime_type == "application/msword":
-                return self._extract_from_doc(file_path)
-            elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
-                return self._extract_from_docx(file_path)
-            elif mime_type.startswith("image/"):
-                return self._extract_from_image(file_path)
-            else:
-                # Try generic text extraction
-                return self._extract_generic(file_path)
-                
+            if self.cache:
+                file_hash = file_hash or self._file_sha256(file_path)
+                cached = self.cache.get(file_hash, mime_type)
+                if cached:
+                    self.logger.debug("Extraction cache hit", file_path=str(file_path), sha256=file_hash)
+                    return {**cached, 'cached': True}
+            
+            text, method, complete = self._extract_uncached(file_path, mime_type)
+            if text is None:
+                return None
+            
+            confidence = self.get_extraction_confidence(file_path, mime_type)
+            # Text missing pages that could not be OCR'd (OCR unavailable, a page
+            # failed or timed out, the pool crashed) is returned but not cached,
+            # so the next attempt OCRs those pages again
+            if self.cache and complete:
+                self.cache.put(file_hash, mime_type, text, confidence, method)
+            
+            return {'text': text, 'confidence': confidence, 'method': method, 'cached': False}
+            
         except Exception as e:
             self.logger.error("Text extraction failed", 
                             file_path=str(file_path), error=str(e))
             return None
     
-    def _extract_from_pdf(self, file_path: Path) -> Optional[str]:
-        """Extract text from PDF files"""
+    def _extract_uncached(self, file_path: Path, mime_type: str) -> Tuple[Optional[str], str, bool]:
+        """
+        Route to the extraction method for the MIME type
+        
+        Returns:
+            (text, method, complete); complete is False when PDF pages that
+            needed OCR could not be read
+        """
+        self.logger.info("Extracting text from file", 
+                       file_path=str(file_path), mime_type=mime_type)
+        
+        if mime_type == "application/pdf":
+            text, complete = self._extract_from_pdf(file_path)
+            return text, "pdf", complete
+        elif mime_type == "application/msword":
+            return self._extract_from_doc(file_path), "textract", True
+        elif mime_type == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+            return self._extract_from_docx(file_path), "docx", True
+        elif mime_type.startswith("image/"):
+            return self._extract_from_image(file_path), "ocr", True
+        else:
+            # Try generic text extraction
+            return self._extract_generic(file_path), "generic", True
+    
+    def _file_sha256(self, file_path: Path) -> str:
+        """SHA-256 of a file, read in chunks"""
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Extraction cache hit/miss counters"""
+        if not self.cache:
+            return {'enabled': False}
+        return {'enabled': True, **self.cache.get_stats()}
+    
+    def _extract_from_pdf(self, file_path: Path) -> Tuple[Optional[str], bool]:
+        """
+        Extract text from PDF files, OCR'ing pages that have no text layer
+        
+        Returns:
+            (text, complete); complete is False when a page sent to OCR was not read
+        """
         try:
-            text_content = []
+            page_texts = []
             
             with open(file_path, 'rb') as file:
                 pdf_reader = PyPDF2.PdfReader(file)
@@ -110,36 +269,46 @@ class TextExtractor:
                 
                 for page_num, page in enumerate(pdf_reader.pages):
                     try:
-                        page_text = page.extract_text()
-                        if page_text.strip():
-                            text_content.append(page_text)
-                        else:
-                            # If no text extracted, try OCR on the page
-                            self.logger.debug(f"No text found on page {page_num + 1}, attempting OCR")
-                            ocr_text = self._ocr_pdf_page(file_path, page_num)
-                            if ocr_text:
-                                text_content.append(ocr_text)
-                                
+                        page_texts.append(page.extract_text() or "")
                     except Exception as e:
                         self.logger.warning(f"Error extracting text from page {page_num + 1}", 
                                           error=str(e))
-                        continue
+                        page_texts.append("")
+            
+            # Pages without a text layer are scans; OCR them in parallel
+            ocr_pages = [page_num for page_num, text in enumerate(page_texts) if not text.strip()]
+            if ocr_pages:
+                self.logger.debug("No text found on pages, attempting OCR", pages=len(ocr_pages))
+            ocr_results, complete = self._ocr_pdf_pages(file_path, ocr_pages)
+            for page_num, ocr_text in ocr_results.items():
+                page_texts[page_num] = ocr_text
             
-            extracted_text = "\n\n".join(text_content)
+            extracted_text = "\n\n".join(text for text in page_texts if text.strip())
             
-            # If very little text was extracted, try OCR on the entire document
+            # If very little text was extracted, try OCR on the entire document,
+            # within what is left of the document's OCR_MAX_PAGES budget
             if len(extracted_text.strip()) < 100:
                 self.logger.info("Limited text extracted, attempting full OCR")
-                ocr_text = self._ocr_entire_pdf(file_path)
+                budget = max(0, self.pdf_config["OCR_MAX_PAGES"] - len(ocr_pages))
+                remaining = [page_num for page_num in range(len(page_texts)) if page_num not in ocr_pages]
+                if len(remaining) > budget:
+                    self.logger.warning("PDF exceeds OCR page cap, remaining pages skipped",
+                                      file_path=str(file_path), pages=len(remaining), max_pages=budget)
+                full_results, full_complete = self._ocr_pdf_pages(file_path, remaining[:budget])
+                ocr_results.update(full_results)
+                complete = complete and full_complete
+                ocr_text = "\n\n".join(
+                    ocr_results[page_num] for page_num in sorted(ocr_results) if ocr_results[page_num].strip()
+                )
                 if ocr_text and len(ocr_text) > len(extracted_text):
                     extracted_text = ocr_text
             
             self.logger.info(f"Extracted {len(extracted_text)} characters from PDF")
-            return extracted_text
+            return extracted_text, complete
             
         except Exception as e:
             self.logger.error("PDF text extraction failed", error=str(e))
-            return None
+            return None, False
     
     def _extract_from_docx(self, file_path: Path) -> Optional[str]:
         """Extract text from DOCX files"""
@@ -194,6 +363,9 @@ class TextExtractor:
             
             # Preprocess image for better OCR
             processed_image = self._preprocess_image(file_path)
+            if processed_image is None:
+                self.logger.error("Image could not be decoded", file_path=str(file_path))
+                return None
             
             # Perform OCR
             text = pytesseract.image_to_string(
@@ -227,79 +399,108 @@ class TextExtractor:
             self.logger.error("Generic text extraction failed", error=str(e))
             return None
     
-    def _preprocess_image(self, file_path: Path) -> Image.Image:
-        """Preprocess image for better OCR results"""
-        try:
-            # Open image
-            image = Image.open(file_path)
-            
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-            
-            # If OpenCV is available, use advanced preprocessing
-            if OPENCV_AVAILABLE:
-                # Convert PIL to OpenCV format
-                opencv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-                
-                # Convert to grayscale
-                gray = cv2.cvtColor(opencv_image, cv2.COLOR_BGR2GRAY)
-                
-                # Apply noise reduction
-                denoised = cv2.medianBlur(gray, 3)
-                
-                # Apply adaptive thresholding
-                thresh = cv2.adaptiveThreshold(
-                    denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-                )
-                
-                # Convert back to PIL
-                processed_image = Image.fromarray(thresh)
-            else:
-                # Basic preprocessing without OpenCV
-                # Convert to grayscale
-                processed_image = image.convert('L')
-                
-                # Enhance contrast
-                from PIL import ImageEnhance
-                enhancer = ImageEnhance.Contrast(processed_image)
-                processed_image = enhancer.enhance(2.0)
-            
-            return processed_image
-            
-        except Exception as e:
-            self.logger.warning("Image preprocessing failed, using original", error=str(e))
-            return Image.open(file_path)
+    def _preprocess_image(self, file_path: Path):
+        """Preprocess image for better OCR results; None if it cannot be decoded"""
+        return self.image_preprocessor.preprocess(file_path)
     
     def _ocr_pdf_page(self, file_path: Path, page_num: int) -> Optional[str]:
-        """Perform OCR on a specific PDF page"""
-        try:
-            if not self.tesseract_available:
-                return None
-            
-            # This would require converting PDF page to image first
-            # For now, we'll return None and rely on the full PDF OCR
-            return None
-            
-        except Exception as e:
-            self.logger.error(f"OCR failed for PDF page {page_num}", error=str(e))
-            return None
+        """Perform OCR on a specific PDF page (0-based)"""
+        return self._ocr_pdf_pages(file_path, [page_num])[0].get(page_num)
     
     def _ocr_entire_pdf(self, file_path: Path) -> Optional[str]:
         """Perform OCR on entire PDF by converting to images"""
         try:
-            if not self.tesseract_available:
-                return None
+            with open(file_path, 'rb') as file:
+                page_count = len(PyPDF2.PdfReader(file).pages)
             
-            # This would require pdf2image library
-            # For now, we'll return None
-            self.logger.info("Full PDF OCR not implemented yet")
-            return None
+            results, _ = self._ocr_pdf_pages(file_path, list(range(page_count)))
+            text = "\n\n".join(results[page_num] for page_num in sorted(results) if results[page_num].strip())
+            return text or None
             
         except Exception as e:
             self.logger.error("Full PDF OCR failed", error=str(e))
             return None
     
+    def _ocr_pdf_pages(self, file_path: Path, page_numbers: List[int]) -> Tuple[Dict[int, str], bool]:
+        """
+        OCR PDF pages in the shared process pool
+        
+        Pages beyond OCR_MAX_PAGES are skipped. Each page is rasterized at
+        OCR_CONFIG["DPI"] in a worker; a page that exceeds OCR_PAGE_TIMEOUT
+        is dropped instead of holding up the rest of the document.
+        
+        Args:
+            file_path: Path to the PDF
+            page_numbers: 0-based pages to OCR
+            
+        Returns:
+            Mapping of page number to OCR text for the pages that succeeded,
+            and whether every page within the cap was read (blank pages count
+            as read; OCR being unavailable, failures, timeouts and a crashed
+            pool do not)
+        """
+        if not page_numbers:
+            return {}, True
+        if not self.tesseract_available:
+            return {}, False
+        if not PDF2IMAGE_AVAILABLE:
+            self.logger.warning("pdf2image not available for PDF OCR")
+            return {}, False
+        
+        max_pages = self.pdf_config["OCR_MAX_PAGES"]
+        if len(page_numbers) > max_pages:
+            self.logger.warning("PDF exceeds OCR page cap, remaining pages skipped", 
+                              file_path=str(file_path), pages=len(page_numbers), max_pages=max_pages)
+            page_numbers = page_numbers[:max_pages]
+        
+        page_timeout = self.pdf_config["OCR_PAGE_TIMEOUT"]
+        pool = get_ocr_pool()
+        results = {}
+        complete = True
+        start = time.perf_counter()
+        
+        try:
+            futures = {
+                pool.submit(
+                    _ocr_pdf_page_worker, str(file_path), page_num, self.ocr_config["DPI"],
+                    self.ocr_config["LANGUAGE"], self.tesseract_config, page_timeout
+                ): page_num
+                for page_num in page_numbers
+            }
+            
+            # Workers enforce the per-page timeout; this deadline only guards against a hung worker
+            waves = -(-len(futures) // max(1, self.pdf_config["OCR_WORKERS"]))
+            done, not_done = wait(futures, timeout=page_timeout * (waves + 1))
+            
+            for future in not_done:
+                future.cancel()
+                complete = False
+                self.logger.warning("OCR did not finish for PDF page", page=futures[future] + 1)
+            
+            for future in done:
+                page_num = futures[future]
+                try:
+                    text = future.result()
+                    if text is None:
+                        # The worker could not rasterize the page or Tesseract timed out
+                        complete = False
+                    elif text:
+                        results[page_num] = text
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    complete = False
+                    self.logger.warning(f"OCR failed for PDF page {page_num + 1}", error=str(e))
+        
+        except BrokenProcessPool as e:
+            complete = False
+            self.logger.error("OCR worker pool crashed", error=str(e))
+            _discard_broken_ocr_pool(pool)
+        
+        self.logger.info("PDF pages OCR'd", file_path=str(file_path), requested=len(page_numbers),
+                       succeeded=len(results), complete=complete, duration=round(time.perf_counter() - start, 2))
+        return results, complete
+    
     def get_extraction_confidence(self, file_path: Path, mime_type: str) -> float:
         """
         Get confidence score for text extraction
@@ -12,6 +12,7 @@ from websockets.server import WebSocketServerProtocol
 import structlog
 
 from database import db_manager, email_repo, referral_repo
+from aggregates import statistics_aggregator
 from models import EmailMessage, MedicalReferral
 from security import audit_logger, access_controller
 
@@ -359,26 +360,20 @@ async def send_recent_referrals(websocket: WebSocketServerProtocol, limit: int):
 async def send_statistics(websocket: WebSocketServerProtocol):
     """Send system statistics to client"""
     try:
-        with db_manager.get_session() as session:
-            total_emails = session.query(EmailMessage).count()
-            pending_emails = session.query(EmailMessage).filter_by(processing_status="pending").count()
-            medical_referrals = session.query(EmailMessage).filter_by(is_medical_referral=True).count()
-            
-            total_referrals = session.query(MedicalReferral).count()
-            pending_referrals = session.query(MedicalReferral).filter_by(status="pending").count()
-            
-            stats = {
-                "emails": {
-                    "total": total_emails,
-                    "pending": pending_emails,
-                    "medical_referrals": medical_referrals
-                },
-                "referrals": {
-                    "total": total_referrals,
-                    "pending": pending_referrals
-                },
-                "timestamp": datetime.now().isoformat()
-            }
+        # Shared, briefly cached aggregates: every connected client asking at once costs two queries
+        snapshot = statistics_aggregator.get_snapshot(("emails", "referrals"))
+        stats = {
+            "emails": {
+                "total": snapshot["emails"]["total"],
+                "pending": snapshot["emails"]["pending"],
+                "medical_referrals": snapshot["emails"]["medical_referrals"]
+            },
+            "referrals": {
+                "total": snapshot["referrals"]["total"],
+                "pending": snapshot["referrals"]["pending"]
+            },
+            "timestamp": snapshot["as_of"]
+        }
         
         await websocket_manager.send_to_connection(websocket, {
             "type": "statistics",
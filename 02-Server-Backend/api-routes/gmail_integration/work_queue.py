@@ -0,0 +1,396 @@
+"""
+Durable Work Queue for VITAL RED Gmail Integration
+Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+"""
+
+import os
+import random
+import socket
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+import structlog
+
+from sqlalchemy import func
+
+from database import DatabaseManager, db_manager
+from models import EmailMessage, ProcessingQueue
+from keyword_scanner import KeywordScanner
+from config import EMAIL_CONFIG, PROCESSING_CONFIG
+
+logger = structlog.get_logger(__name__)
+
+EMAIL_TASK = "process_email"
+
+_priority_scanner = KeywordScanner(EMAIL_CONFIG["PRIORITY_KEYWORDS"])
+
+def priority_level_for_text(text: str) -> str:
+    """Cheap priority level ('alta', 'media', 'baja') from the configured priority keywords"""
+    scan = _priority_scanner.scan((text or "").lower())
+    scores = {level: scan.distinct(level) for level in EMAIL_CONFIG["PRIORITY_KEYWORDS"]}
+    scores = {level: score for level, score in scores.items() if score > 0}
+    return max(scores, key=scores.get) if scores else 'media'
+
+@dataclass(frozen=True)
+class QueueTask:
+    """Snapshot of a claimed task, usable after its session is closed"""
+    id: int
+    task_id: str
+    task_type: str
+    priority: int
+    email_message_id: Optional[int]
+    task_data: Dict[str, Any]
+    retry_count: int
+    max_retries: int
+
+    @classmethod
+    def from_row(cls, row: ProcessingQueue) -> "QueueTask":
+        return cls(
+            id=row.id, task_id=row.task_id, task_type=row.task_type, priority=row.priority,
+            email_message_id=row.email_message_id, task_data=dict(row.task_data or {}),
+            retry_count=row.retry_count or 0, max_retries=row.max_retries
+        )
+
+class WorkQueue:
+    """
+    Priority work queue stored in the processing_queue table
+
+    Several poller processes can share it: claim() selects due tasks with
+    SELECT ... FOR UPDATE SKIP LOCKED ordered by priority then scheduled_at,
+    so concurrent claims never return the same row and never wait on each
+    other. A claimed task carries a lease that the owner extends with
+    heartbeat(); when a worker dies its lease expires and the task is
+    claimed again. Failures are retried with exponential backoff and
+    dead-lettered (status 'dead') once max_retries is exceeded.
+
+    SQLite ignores FOR UPDATE, which is fine for a single process.
+    """
+
+    def __init__(self, db_manager: DatabaseManager, worker_id: Optional[str] = None,
+                 lease_seconds: Optional[int] = None, retry_delay: Optional[int] = None,
+                 retry_max_delay: Optional[int] = None, retry_jitter: float = 0.1):
+        self.db_manager = db_manager
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = lease_seconds or PROCESSING_CONFIG["QUEUE_LEASE_SECONDS"]
+        self.retry_delay = retry_delay or PROCESSING_CONFIG["RETRY_DELAY"]
+        self.retry_max_delay = retry_max_delay or PROCESSING_CONFIG["RETRY_MAX_DELAY"]
+        self.retry_jitter = retry_jitter
+        self.priorities = PROCESSING_CONFIG["QUEUE_PRIORITIES"]
+        self.logger = logger.bind(component="work_queue", worker_id=self.worker_id)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'claimed': 0, 'completed': 0, 'retried': 0,
+                       'dead_lettered': 0, 'reclaimed': 0, 'lost_leases': 0}
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._stats[name] += amount
+
+    def priority_for_level(self, priority_level: Optional[str]) -> int:
+        """Queue priority for a referral priority level; unknown levels get 'media'"""
+        return self.priorities.get(priority_level, self.priorities['media'])
+
+    def retry_backoff(self, retry_count: int) -> float:
+        """Seconds before retry number retry_count: doubles each time, capped, with jitter"""
+        delay = min(self.retry_delay * 2 ** max(retry_count - 1, 0), self.retry_max_delay)
+        return delay * (1 + random.uniform(0, self.retry_jitter))
+
+    def _new_task(self, task_type: str, email_message_id: Optional[int], task_data: Optional[Dict[str, Any]],
+                  priority: int, delay: float, max_retries: Optional[int]) -> ProcessingQueue:
+        return ProcessingQueue(
+            task_type=task_type,
+            email_message_id=email_message_id,
+            task_data=task_data or {},
+            priority=priority,
+            status="pending",
+            scheduled_at=datetime.now() + timedelta(seconds=delay),
+            retry_count=0,
+            max_retries=PROCESSING_CONFIG["MAX_RETRIES"] if max_retries is None else max_retries
+        )
+
+    def enqueue(self, task_type: str, email_message_id: Optional[int] = None,
+                task_data: Optional[Dict[str, Any]] = None, priority: Optional[int] = None,
+                priority_level: Optional[str] = None, delay: float = 0,
+                max_retries: Optional[int] = None) -> Optional[str]:
+        """
+        Add a task to the queue
+
+        Args:
+            task_type: Kind of task, e.g. EMAIL_TASK
+            email_message_id: Email the task refers to; an open task of the
+                same type for the same email is returned instead of a new one.
+                The email row is locked while checking, so concurrent
+                enqueuers never create two tasks for one email
+            task_data: JSON payload for the worker
+            priority: Queue priority, 1=highest
+            priority_level: Referral priority ('alta', 'media', 'baja'),
+                used when priority is not given
+            delay: Seconds before the task becomes due
+            max_retries: Retries before dead-lettering
+
+        Returns:
+            task_id of the queued task, or None on failure
+        """
+        try:
+            if priority is None:
+                priority = self.priority_for_level(priority_level)
+
+            with self.db_manager.get_session() as session:
+                if email_message_id is not None:
+                    # Same row lock as enqueue_pending_emails, so the check and the
+                    # insert below cannot interleave with another enqueuer's
+                    session.query(EmailMessage.id).filter(
+                        EmailMessage.id == email_message_id
+                    ).with_for_update().first()
+                    existing = session.query(ProcessingQueue.task_id).filter(
+                        ProcessingQueue.task_type == task_type,
+                        ProcessingQueue.email_message_id == email_message_id,
+                        ProcessingQueue.status.in_(("pending", "processing"))
+                    ).first()
+                    if existing:
+                        return existing[0]
+
+                task = self._new_task(task_type, email_message_id, task_data, priority, delay, max_retries)
+                session.add(task)
+                session.flush()
+                task_id = task.task_id
+
+            self._count('enqueued')
+            self.logger.debug("Task enqueued", task_id=task_id, task_type=task_type, priority=priority)
+            return task_id
+        except Exception as e:
+            self.logger.error("Failed to enqueue task", task_type=task_type, error=str(e))
+            return None
+
+    def enqueue_pending_emails(self, limit: int = 50) -> int:
+        """
+        Enqueue pending emails that have no processing task yet
+
+        Covers emails stored before the queue existed, or whose enqueue
+        failed after the email was stored. The email rows are locked with
+        SKIP LOCKED so two pollers never enqueue the same email.
+        """
+        try:
+            with self.db_manager.get_session() as session:
+                has_task = session.query(ProcessingQueue.id).filter(
+                    ProcessingQueue.email_message_id == EmailMessage.id,
+                    ProcessingQueue.task_type == EMAIL_TASK
+                ).exists()
+                emails = session.query(EmailMessage).filter(
+                    EmailMessage.processing_status == "pending", ~has_task
+                ).order_by(EmailMessage.id).limit(limit).with_for_update(skip_locked=True).all()
+
+                for email in emails:
+                    level = email.priority_level or priority_level_for_text(
+                        f"{email.subject or ''} {email.body_text or ''}"
+                    )
+                    session.add(self._new_task(EMAIL_TASK, email.id, {'gmail_id': email.gmail_id},
+                                               self.priority_for_level(level), 0, None))
+                count = len(emails)
+
+            if count:
+                self._count('enqueued', count)
+                self.logger.info("Pending emails enqueued", count=count)
+            return count
+        except Exception as e:
+            self.logger.error("Failed to enqueue pending emails", error=str(e))
+            return 0
+
+    def claim(self, limit: int, task_type: Optional[str] = None) -> List[QueueTask]:
+        """
+        Claim up to limit due tasks for this worker, highest priority first
+
+        Tasks whose lease expired are first returned to the queue as a
+        failed attempt, so a task that keeps killing its worker ends up
+        dead-lettered instead of looping forever.
+        """
+        try:
+            self._reclaim_expired()
+            now = datetime.now()
+
+            with self.db_manager.get_session() as session:
+                query = session.query(ProcessingQueue).filter(
+                    ProcessingQueue.status == "pending",
+                    ProcessingQueue.scheduled_at <= now
+                )
+                if task_type:
+                    query = query.filter(ProcessingQueue.task_type == task_type)
+                rows = query.order_by(
+                    ProcessingQueue.priority, ProcessingQueue.scheduled_at, ProcessingQueue.id
+                ).limit(limit).with_for_update(skip_locked=True).all()
+
+                for row in rows:
+                    row.status = "processing"
+                    row.locked_by = self.worker_id
+                    row.started_at = now
+                    row.lease_expires_at = now + timedelta(seconds=self.lease_seconds)
+                tasks = [QueueTask.from_row(row) for row in rows]
+
+            if tasks:
+                self._count('claimed', len(tasks))
+                self.logger.debug("Tasks claimed", count=len(tasks))
+            return tasks
+        except Exception as e:
+            self.logger.error("Failed to claim tasks", error=str(e))
+            return []
+
+    def _reclaim_expired(self):
+        """Return tasks with an expired lease to the queue, counting the lost attempt"""
+        now = datetime.now()
+        with self.db_manager.get_session() as session:
+            rows = session.query(ProcessingQueue).filter(
+                ProcessingQueue.status == "processing",
+                ProcessingQueue.lease_expires_at < now
+            ).with_for_update(skip_locked=True).all()
+
+            for row in rows:
+                self.logger.warning("Task lease expired", task_id=row.task_id, locked_by=row.locked_by)
+                self._schedule_retry(row, f"Lease expired (worker {row.locked_by})", now)
+
+        if rows:
+            self._count('reclaimed', len(rows))
+
+    def _schedule_retry(self, row: ProcessingQueue, error: str, now: datetime):
+        """Reschedule a failed task with backoff, or dead-letter it"""
+        row.retry_count = (row.retry_count or 0) + 1
+        row.error_message = error
+        row.locked_by = None
+        row.lease_expires_at = None
+
+        if row.retry_count > row.max_retries:
+            row.status = "dead"
+            row.completed_at = now
+            self._count('dead_lettered')
+            self.logger.error("Task dead-lettered", task_id=row.task_id,
+                              retry_count=row.retry_count, error=error)
+        else:
+            row.status = "pending"
+            row.scheduled_at = now + timedelta(seconds=self.retry_backoff(row.retry_count))
+            self._count('retried')
+
+    def _owned(self, session, task_id: str):
+        """Query for a task still leased by this worker"""
+        return session.query(ProcessingQueue).filter(
+            ProcessingQueue.task_id == task_id,
+            ProcessingQueue.status == "processing",
+            ProcessingQueue.locked_by == self.worker_id
+        )
+
+    def complete(self, task_id: str) -> bool:
+        """Mark a claimed task as completed; False if the lease was lost meanwhile"""
+        try:
+            with self.db_manager.get_session() as session:
+                updated = self._owned(session, task_id).update({
+                    'status': "completed",
+                    'completed_at': datetime.now(),
+                    'locked_by': None,
+                    'lease_expires_at': None,
+                    'error_message': None
+                }, synchronize_session=False)
+
+            if not updated:
+                self._count('lost_leases')
+                self.logger.warning("Completed task was no longer leased", task_id=task_id)
+                return False
+            self._count('completed')
+            return True
+        except Exception as e:
+            self.logger.error("Failed to complete task", task_id=task_id, error=str(e))
+            return False
+
+    def fail(self, task_id: str, error: str, retry: bool = True) -> bool:
+        """Record a failed attempt: retry later with backoff, or dead-letter"""
+        try:
+            with self.db_manager.get_session() as session:
+                row = self._owned(session, task_id).with_for_update().first()
+                if row is None:
+                    self._count('lost_leases')
+                    self.logger.warning("Failed task was no longer leased", task_id=task_id)
+                    return False
+                if not retry:
+                    row.retry_count = row.max_retries
+                self._schedule_retry(row, error, datetime.now())
+            return True
+        except Exception as e:
+            self.logger.error("Failed to record task failure", task_id=task_id, error=str(e))
+            return False
+
+    def heartbeat(self, task_ids: Iterable[str]) -> int:
+        """Extend the lease of tasks this worker still holds; returns how many were extended"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return 0
+        try:
+            with self.db_manager.get_session() as session:
+                return session.query(ProcessingQueue).filter(
+                    ProcessingQueue.task_id.in_(task_ids),
+                    ProcessingQueue.status == "processing",
+                    ProcessingQueue.locked_by == self.worker_id
+                ).update({
+                    'lease_expires_at': datetime.now() + timedelta(seconds=self.lease_seconds)
+                }, synchronize_session=False)
+        except Exception as e:
+            self.logger.error("Failed to extend task leases", error=str(e))
+            return 0
+
+    def release(self, task_ids: Iterable[str]) -> int:
+        """Give claimed tasks back without counting an attempt, e.g. on shutdown"""
+        task_ids = list(task_ids)
+        if not task_ids:
+            return 0
+        try:
+            with self.db_manager.get_session() as session:
+                return session.query(ProcessingQueue).filter(
+                    ProcessingQueue.task_id.in_(task_ids),
+                    ProcessingQueue.status == "processing",
+                    ProcessingQueue.locked_by == self.worker_id
+                ).update({
+                    'status': "pending",
+                    'locked_by': None,
+                    'lease_expires_at': None
+                }, synchronize_session=False)
+        except Exception as e:
+            self.logger.error("Failed to release tasks", error=str(e))
+            return 0
+
+    def requeue_dead(self, task_ids: Optional[Iterable[str]] = None) -> int:
+        """Put dead-lettered tasks back in the queue with a fresh retry budget"""
+        try:
+            with self.db_manager.get_session() as session:
+                query = session.query(ProcessingQueue).filter(ProcessingQueue.status == "dead")
+                if task_ids is not None:
+                    query = query.filter(ProcessingQueue.task_id.in_(list(task_ids)))
+                return query.update({
+                    'status': "pending",
+                    'retry_count': 0,
+                    'scheduled_at': datetime.now(),
+                    'completed_at': None
+                }, synchronize_session=False)
+        except Exception as e:
+            self.logger.error("Failed to requeue dead tasks", error=str(e))
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Tasks per status in the table plus this worker's counters"""
+        with self._stats_lock:
+            stats = {'worker_id': self.worker_id, **self._stats}
+        try:
+            with self.db_manager.get_session() as session:
+                rows = session.query(ProcessingQueue.status, func.count(ProcessingQueue.id)).group_by(
+                    ProcessingQueue.status
+                ).all()
+                oldest_due = session.query(func.min(ProcessingQueue.scheduled_at)).filter(
+                    ProcessingQueue.status == "pending",
+                    ProcessingQueue.scheduled_at <= datetime.now()
+                ).scalar()
+            stats['by_status'] = {status: count for status, count in rows}
+            stats['oldest_due_seconds'] = (
+                round((datetime.now() - oldest_due).total_seconds(), 1) if oldest_due else 0.0
+            )
+        except Exception as e:
+            self.logger.error("Failed to get queue stats", error=str(e))
+        return stats
+
+# Global queue shared by the poller loops of this process
+work_queue = WorkQueue(db_manager)
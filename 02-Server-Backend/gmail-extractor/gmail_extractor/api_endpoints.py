@@ -12,7 +12,7 @@ import asyncio
 import logging
 
 from .batch_processor import BatchProcessor, create_batch_processor
-from .core_extractor import DEFAULT_CONFIG
+from .core_extractor import DEFAULT_CONFIG, get_db_connection
 
 # Router para endpoints de extracción
 extraction_router = APIRouter(prefix="/api/gmail-extractor", tags=["Gmail Extractor"])
@@ -207,17 +207,8 @@ async def stop_extraction(processor: BatchProcessor = Depends(get_processor)):
 async def search_extracted_emails(request: EmailSearchRequest = Depends()):
     """Buscar correos extraídos"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-        
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
         
         cursor = connection.cursor(dictionary=True)
         
@@ -291,17 +282,8 @@ async def search_extracted_emails(request: EmailSearchRequest = Depends()):
 async def get_email_detail(email_id: str):
     """Obtener detalle completo de un correo"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-        
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
         
         cursor = connection.cursor(dictionary=True)
         
@@ -353,17 +335,8 @@ async def get_email_detail(email_id: str):
 async def get_extraction_stats():
     """Obtener estadísticas generales de extracción"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-        
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
         
         cursor = connection.cursor(dictionary=True)
         
@@ -412,17 +385,8 @@ async def get_extraction_stats():
 async def delete_extracted_email(email_id: str):
     """Eliminar correo extraído"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-        
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
         
         cursor = connection.cursor()
         
@@ -517,17 +481,8 @@ async def test_gemini_connection(request: dict):
 async def download_attachment(attachment_id: int):
     """Descargar archivo adjunto"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
 
         cursor = connection.cursor()
 
@@ -577,20 +532,11 @@ async def export_emails(
 ):
     """Exportar correos extraídos"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
         import csv
         import json
         import io
-
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
 
         cursor = connection.cursor(dictionary=True)
 
@@ -677,17 +623,8 @@ async def export_emails(
 async def get_extraction_logs(session_id: Optional[str] = None):
     """Obtener logs de extracción"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
 
         cursor = connection.cursor(dictionary=True)
 
@@ -719,21 +656,13 @@ async def get_extraction_logs(session_id: Optional[str] = None):
 async def cleanup_old_data(request: dict):
     """Limpiar datos antiguos"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
         from datetime import timedelta
 
         days_old = request.get('days_old', 30)
         cutoff_date = datetime.now() - timedelta(days=days_old)
 
-        # Conectar a base de datos
-        connection = mysql.connector.connect(
-            host=DEFAULT_CONFIG['db_host'],
-            port=DEFAULT_CONFIG['db_port'],
-            user=DEFAULT_CONFIG['db_user'],
-            password=DEFAULT_CONFIG['db_password'],
-            database=DEFAULT_CONFIG['db_name']
-        )
+        # Conectar a base de datos (pool compartido; close() devuelve la conexión al pool)
+        connection = get_db_connection()
 
         cursor = connection.cursor()
 
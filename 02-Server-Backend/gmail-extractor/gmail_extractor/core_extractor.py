@@ -34,9 +34,40 @@ import pytesseract
 # AI Processing
 import google.generativeai as genai
 
-# Database
-import mysql.connector
-from mysql.connector import Error
+# Database: connections come from the pooled engine factory of the Gmail integration service
+import sys
+from pathlib import Path
+from sqlalchemy.engine import URL
+
+try:
+    from db_pool import pooled_connection
+except ImportError:
+    _here = Path(__file__).resolve().parent
+    for _service_dir in (_here.parent / "gmail_integration", _here.parents[1] / "api-routes" / "gmail_integration"):
+        if (_service_dir / "db_pool.py").exists():
+            sys.path.append(str(_service_dir))
+            break
+    from db_pool import pooled_connection
+
+def database_url(config: Dict[str, Any]) -> str:
+    """mysql-connector URL for the db_* settings of an extractor configuration"""
+    return URL.create(
+        "mysql+mysqlconnector",
+        username=config.get('db_user', 'root'),
+        password=config.get('db_password', ''),
+        host=config.get('db_host', 'localhost'),
+        port=config.get('db_port', 3306),
+        database=config.get('db_name', 'vital_red')
+    ).render_as_string(hide_password=False)
+
+def get_db_connection(config: Optional[Dict[str, Any]] = None):
+    """
+    Connection from the shared pool, used like mysql.connector.connect()
+
+    close() hands it back to the pool. Pool size and timeouts come from the
+    Gmail integration DATABASE_CONFIG.
+    """
+    return pooled_connection(database_url(config or DEFAULT_CONFIG))
 
 @dataclass
 class EmailData:
@@ -62,7 +93,6 @@ class GmailExtractor:
         self.logger = self._setup_logger()
         self.driver = None
         self.gemini_client = None
-        self.db_connection = None
         
         # Configurar Gemini AI
         if config.get('gemini_api_key'):
@@ -88,23 +118,20 @@ class GmailExtractor:
         return logger
     
     def _setup_database(self):
-        """Configurar conexión a base de datos"""
+        """Verificar la base de datos y crear las tablas"""
         try:
-            self.db_connection = mysql.connector.connect(
-                host=self.config.get('db_host', 'localhost'),
-                port=self.config.get('db_port', 3306),
-                user=self.config.get('db_user', 'root'),
-                password=self.config.get('db_password', ''),
-                database=self.config.get('db_name', 'vital_red')
-            )
-            self._create_tables()
+            connection = get_db_connection(self.config)
+            try:
+                self._create_tables(connection)
+            finally:
+                connection.close()
             self.logger.info("Base de datos configurada correctamente")
-        except Error as e:
+        except Exception as e:
             self.logger.error(f"Error configurando base de datos: {e}")
     
-    def _create_tables(self):
+    def _create_tables(self, connection):
         """Crear tablas necesarias para almacenar correos"""
-        cursor = self.db_connection.cursor()
+        cursor = connection.cursor()
         
         # Tabla principal de correos extraídos
         create_emails_table = """
@@ -160,7 +187,7 @@ class GmailExtractor:
         cursor.execute(create_emails_table)
         cursor.execute(create_attachments_table)
         cursor.execute(create_extraction_logs)
-        self.db_connection.commit()
+        connection.commit()
         cursor.close()
     
     def _setup_driver(self) -> webdriver.Chrome:
@@ -537,8 +564,10 @@ class GmailExtractor:
     
     def _save_email_to_db(self, email_data: EmailData):
         """Guardar correo en base de datos"""
+        connection = None
         try:
-            cursor = self.db_connection.cursor()
+            connection = get_db_connection(self.config)
+            cursor = connection.cursor()
             
             # Insertar correo principal
             insert_email_query = """
@@ -586,20 +615,21 @@ class GmailExtractor:
                         attachment.get('extracted_text', '')
                     ))
             
-            self.db_connection.commit()
+            connection.commit()
             cursor.close()
             
         except Exception as e:
             self.logger.error(f"Error guardando correo en BD: {e}")
+        
+        finally:
+            if connection is not None:
+                connection.close()  # Back to the pool
     
     def cleanup(self):
         """Limpiar recursos"""
         if self.driver:
             self.driver.quit()
         
-        if self.db_connection:
-            self.db_connection.close()
-        
         self.logger.info("Recursos limpiados")
 
 # Importar configuración
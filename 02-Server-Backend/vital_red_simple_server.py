@@ -4,14 +4,30 @@ VITAL RED Simple Server - Garantizado Funcional
 Hospital Universitaria ESE
 """
 
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 import json
-import mysql.connector
+import sys
 from datetime import datetime
+from pathlib import Path
 import urllib.parse
 import threading
 import time
 
+from sqlalchemy.engine import URL
+
+# Pool de conexiones compartido con la integración Gmail
+sys.path.insert(0, str(Path(__file__).resolve().parent / "api-routes" / "gmail_integration"))
+from db_pool import get_engine, pool_status
+
+DATABASE_URL = URL.create(
+    "mysql+mysqlconnector",
+    username="root",
+    password="",
+    host="localhost",
+    port=3306,
+    database="vital_red"
+).render_as_string(hide_password=False)
+
 class VitalRedHandler(BaseHTTPRequestHandler):
     def do_GET(self):
         """Manejar peticiones GET"""
@@ -104,15 +120,9 @@ class VitalRedHandler(BaseHTTPRequestHandler):
         self.wfile.write(json_data.encode('utf-8'))
     
     def get_db_connection(self):
-        """Obtener conexión a base de datos"""
+        """Obtener conexión del pool (close() la devuelve al pool)"""
         try:
-            return mysql.connector.connect(
-                host="localhost",
-                port=3306,
-                user="root",
-                password="",
-                database="vital_red"
-            )
+            return get_engine(DATABASE_URL).raw_connection()
         except Exception as e:
             print(f"Error de BD: {e}")
             return None
@@ -125,6 +135,7 @@ class VitalRedHandler(BaseHTTPRequestHandler):
                 return {
                     "status": "unhealthy",
                     "database": "disconnected",
+                    "database_pool": pool_status(get_engine(DATABASE_URL)),
                     "timestamp": datetime.now().isoformat()
                 }
             
@@ -149,6 +160,7 @@ class VitalRedHandler(BaseHTTPRequestHandler):
                 "status": "healthy",
                 "database": "connected",
                 "tables": tables_status,
+                "database_pool": pool_status(get_engine(DATABASE_URL)),
                 "gmail_extractor": {
                     "configured_email": "kevinrlinze@gmail.com",
                     "status": "ready"
@@ -291,7 +303,8 @@ class VitalRedHandler(BaseHTTPRequestHandler):
 def run_server():
     """Ejecutar servidor"""
     server_address = ('', 8003)
-    httpd = HTTPServer(server_address, VitalRedHandler)
+    # Un hilo por petición: los usuarios concurrentes no esperan en cola
+    httpd = ThreadingHTTPServer(server_address, VitalRedHandler)
     
     print("=" * 80)
     print("🏥 VITAL RED Simple Server")
@@ -82,7 +82,6 @@ const EmailMonitor: React.FC = () => {
   const loadEmailData = async () => {
     try {
       const response = await apiService.getEmails({
-        skip: 0,
         limit: 50,
         status: statusFilter !== 'all' ? statusFilter : undefined
       });
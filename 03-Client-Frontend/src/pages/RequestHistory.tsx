@@ -77,7 +77,6 @@ export default function RequestHistory() {
     try {
       // Real API call to get request history
       const params = {
-        skip: 0,
         limit: 100,
         start_date: dateRange.start,
         end_date: dateRange.end,
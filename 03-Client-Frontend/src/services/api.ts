@@ -49,6 +49,22 @@ interface EmailData {
   attachments: number;
 }
 
+// List totals are counted in the background: null until the first count
+// finishes (or when include_total is not set), then the last count taken
+interface ListTotal {
+  value: number;
+  as_of: string;
+  stale: boolean;
+}
+
+// Lists are paged by cursor: pass next_cursor back as cursor for the next
+// page; it is null on the last page
+interface CursorPage {
+  next_cursor: string | null;
+  total: ListTotal | null;
+  limit: number;
+}
+
 // Configuration
 const API_BASE_URL = import.meta.env.VITE_API_URL || 'http://localhost:8001/api';
 const GMAIL_API_URL = 'http://localhost:8001';
@@ -327,17 +343,21 @@ class ApiService {
   }
 
   // Medical Cases
+  // The body is a plain list; the next page cursor and the total come back
+  // in the X-Next-Cursor and X-Total-Count headers
   async getMedicalCases(params?: {
     status?: string;
     priority?: string;
-    skip?: number;
+    cursor?: string;
     limit?: number;
+    include_total?: boolean;
   }): Promise<ApiResponse<any[]>> {
     const searchParams = new URLSearchParams();
     if (params?.status) searchParams.append('status', params.status);
     if (params?.priority) searchParams.append('priority', params.priority);
-    if (params?.skip) searchParams.append('skip', params.skip.toString());
+    if (params?.cursor) searchParams.append('cursor', params.cursor);
     if (params?.limit) searchParams.append('limit', params.limit.toString());
+    if (params?.include_total) searchParams.append('include_total', 'true');
 
     const url = `/medical-cases${searchParams.toString() ? '?' + searchParams.toString() : ''}`;
     return this.request(url);
@@ -397,18 +417,20 @@ class ApiService {
 
   // Request History
   async getRequestHistory(params?: {
-    skip?: number;
+    cursor?: string;
     limit?: number;
+    include_total?: boolean;
     start_date?: string;
     end_date?: string;
     status?: string;
     patient_name?: string;
     referring_physician?: string;
     institution?: string;
-  }): Promise<ApiResponse<any>> {
+  }): Promise<ApiResponse<CursorPage & { items: any[] }>> {
     const searchParams = new URLSearchParams();
-    if (params?.skip) searchParams.append('skip', params.skip.toString());
+    if (params?.cursor) searchParams.append('cursor', params.cursor);
     if (params?.limit) searchParams.append('limit', params.limit.toString());
+    if (params?.include_total) searchParams.append('include_total', 'true');
     if (params?.start_date) searchParams.append('start_date', params.start_date);
     if (params?.end_date) searchParams.append('end_date', params.end_date);
     if (params?.status) searchParams.append('status', params.status);
@@ -501,13 +523,15 @@ class ApiService {
 
   // Email Monitor
   async getEmails(params?: {
-    skip?: number;
+    cursor?: string;
     limit?: number;
+    include_total?: boolean;
     status?: string;
-  }): Promise<ApiResponse<any>> {
+  }): Promise<ApiResponse<CursorPage & { emails: any[] }>> {
     const searchParams = new URLSearchParams();
-    if (params?.skip) searchParams.append('skip', params.skip.toString());
+    if (params?.cursor) searchParams.append('cursor', params.cursor);
     if (params?.limit) searchParams.append('limit', params.limit.toString());
+    if (params?.include_total) searchParams.append('include_total', 'true');
     if (params?.status) searchParams.append('status', params.status);
 
     const url = `/emails${searchParams.toString() ? '?' + searchParams.toString() : ''}`;
@@ -0,0 +1,69 @@
+-- VITAL RED Schema Upgrade for Existing Databases (XAMPP MySQL / MariaDB)
+-- Hospital Universitaria ESE - Departamento de Innovación y Desarrollo
+--
+-- The service creates missing tables on startup, but never alters tables
+-- that already exist. Run this script once on databases created before the
+-- durable work queue, keyset pagination and the attachment blob store,
+-- before starting the new service version:
+--
+--     mysql -u root -p vital_red < upgrade_ingestion_schema.sql
+--
+-- Every step checks information_schema first, so running it again is safe.
+-- Tables that do not exist yet are skipped: the service creates them complete.
+
+USE vital_red;
+
+DROP PROCEDURE IF EXISTS vital_red_add_column;
+DROP PROCEDURE IF EXISTS vital_red_add_index;
+
+DELIMITER //
+
+CREATE PROCEDURE vital_red_add_column(IN table_name_in VARCHAR(64), IN column_name_in VARCHAR(64),
+                                      IN definition_in TEXT)
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.TABLES
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = table_name_in)
+       AND NOT EXISTS (SELECT 1 FROM information_schema.COLUMNS
+                       WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = table_name_in
+                         AND COLUMN_NAME = column_name_in) THEN
+        SET @ddl = CONCAT('ALTER TABLE `', table_name_in, '` ADD COLUMN `', column_name_in, '` ', definition_in);
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END //
+
+CREATE PROCEDURE vital_red_add_index(IN table_name_in VARCHAR(64), IN index_name_in VARCHAR(64),
+                                     IN columns_in TEXT)
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.TABLES
+               WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = table_name_in)
+       AND NOT EXISTS (SELECT 1 FROM information_schema.STATISTICS
+                       WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = table_name_in
+                         AND INDEX_NAME = index_name_in) THEN
+        SET @ddl = CONCAT('CREATE INDEX `', index_name_in, '` ON `', table_name_in, '` (', columns_in, ')');
+        PREPARE stmt FROM @ddl;
+        EXECUTE stmt;
+        DEALLOCATE PREPARE stmt;
+    END IF;
+END //
+
+DELIMITER ;
+
+-- Durable work queue: worker leases and the claim query
+CALL vital_red_add_column('processing_queue', 'locked_by', 'VARCHAR(100) NULL');
+CALL vital_red_add_column('processing_queue', 'lease_expires_at', 'DATETIME NULL');
+CALL vital_red_add_index('processing_queue', 'ix_processing_queue_claim', 'status, priority, scheduled_at');
+CALL vital_red_add_index('processing_queue', 'ix_processing_queue_email_message_id', 'email_message_id');
+
+-- Keyset pagination: newest first, optionally within one status
+CALL vital_red_add_index('email_messages', 'ix_email_messages_created', 'created_at, id');
+CALL vital_red_add_index('email_messages', 'ix_email_messages_status_created', 'status, created_at, id');
+CALL vital_red_add_index('medical_referrals', 'ix_medical_referrals_created', 'created_at, id');
+CALL vital_red_add_index('medical_referrals', 'ix_medical_referrals_status_created', 'status, created_at, id');
+
+-- Attachment blob store: attachments are resolved by content hash
+CALL vital_red_add_index('email_attachments', 'ix_email_attachments_file_hash', 'file_hash');
+
+DROP PROCEDURE vital_red_add_column;
+DROP PROCEDURE vital_red_add_index;